@@ -1,3 +1,5 @@
+import os
+
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 try:
@@ -12,6 +14,11 @@ try:
     from . import ocr_engine
 except ImportError:
     import ocr_engine
+# Tracing opcional: la imagen del backend (build context "backend") no siempre lleva common/
+try:
+    from common import tracing
+except ImportError:
+    tracing = None
 # OCR opcional: no dejes que un cambio en OCR tumbe el backend en Cloud Run
 run_ocr = getattr(ocr_engine, "run_ocr", None)
 if run_ocr is None:
@@ -21,6 +28,20 @@ if run_ocr is None:
 
 app = FastAPI(title="ScanKey OCR Backend", version="v1")
 
+if tracing is not None:
+    # Continúa la traza del gateway/motor (traceparent); mismas variables SCN_TRACE_* que ellos
+    tracing.configure(
+        "ocr-backend",
+        tracing.build_exporter(
+            os.getenv("SCN_TRACE_EXPORTER", ""),
+            os.getenv("SCN_TRACE_FILE", "/tmp/scn-traces/ocr-backend.jsonl"),
+            os.getenv("SCN_TRACE_COLLECTOR_URL", ""),
+        ),
+        float(os.getenv("SCN_TRACE_SAMPLE_RATE", "0.1")),
+    )
+    if tracing.get_tracer().enabled:
+        app.middleware("http")(tracing.trace_requests)
+
 
 # --- CORS (web/app) ---
 app.add_middleware(
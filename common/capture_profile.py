@@ -0,0 +1,69 @@
+"""
+Capture profile — resolución y compresión recomendadas para que el cliente no suba fotos de
+12 MP cuando el modelo consume 224x224.
+
+El lado mayor recomendado es el máximo de lo que necesita cada consumidor de la imagen:
+- modelo: lado de entrada x roi_factor (la llave ocupa solo parte de la foto)
+- quality gate: métricas calibradas sobre fotos de móvil; por debajo de ~1024 px la
+  varianza laplaciana sube y las capturas borrosas parecen nítidas
+- OCR (si está activo): el texto grabado necesita más detalle
+Versionado con el modelo: profile_version cambia si cambia el modelo o cualquier entrada.
+Compartido por motor (origen de input_shape) y gateway (añade sus límites y su OCR).
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+DEFAULT_INPUT_HW = (224, 224)
+DEFAULT_ROI_FACTOR = 2.0
+DEFAULT_QUALITY_MIN_EDGE = 1024
+DEFAULT_OCR_MIN_EDGE = 1280
+DEFAULT_JPEG_QUALITY = 85
+
+
+def build_capture_profile(
+    model_version: Optional[str],
+    input_hw: Sequence[int] = DEFAULT_INPUT_HW,
+    ocr_enabled: bool = False,
+    roi_factor: float = DEFAULT_ROI_FACTOR,
+    quality_min_edge: int = DEFAULT_QUALITY_MIN_EDGE,
+    ocr_min_edge: int = DEFAULT_OCR_MIN_EDGE,
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+    max_bytes: Optional[int] = None,
+    accepted_formats: Sequence[str] = ("image/jpeg", "image/png", "image/webp"),
+) -> Dict[str, Any]:
+    h, w = (int(input_hw[0]), int(input_hw[1])) if len(input_hw) >= 2 else DEFAULT_INPUT_HW
+    model_edge = int(round(max(h, w) * roi_factor))
+    needs: Dict[str, int] = {"model": model_edge, "quality": int(quality_min_edge)}
+    if ocr_enabled:
+        needs["ocr"] = int(ocr_min_edge)
+    max_edge = max(needs.values())
+    inputs = {
+        "model_version": model_version,
+        "model_input": [h, w],
+        "ocr_enabled": bool(ocr_enabled),
+        "roi_factor": roi_factor,
+        "quality_min_edge": int(quality_min_edge),
+        "ocr_min_edge": int(ocr_min_edge),
+    }
+    profile = {
+        "max_edge": max_edge,
+        "min_edge": model_edge,
+        "format": "image/jpeg",
+        "jpeg_quality": int(jpeg_quality),
+        "accepted_formats": list(accepted_formats),
+        "max_bytes": max_bytes,
+        "strip_metadata": True,
+        "needs": needs,
+        "inputs": inputs,
+    }
+    digest = hashlib.sha256(json.dumps(profile, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    profile["profile_version"] = f"{model_version or 'unknown'}:{digest}"
+    return profile
+
+
+def profile_inputs(profile: Dict[str, Any]) -> Tuple[Optional[str], Tuple[int, int], bool]:
+    """(model_version, (h, w), ocr_enabled) de un perfil ya construido (p. ej. el del motor)."""
+    inputs = profile.get("inputs") or {}
+    hw = inputs.get("model_input") or DEFAULT_INPUT_HW
+    return inputs.get("model_version"), (int(hw[0]), int(hw[1])), bool(inputs.get("ocr_enabled"))
@@ -0,0 +1,56 @@
+"""
+Deadline — presupuesto de tiempo que el gateway propaga al motor.
+
+El gateway manda X-Request-Budget-Ms (ms que va a esperar la respuesta de este intento);
+el motor lo convierte en un deadline local (reloj monotónico, sin depender de relojes
+sincronizados) y consulta allows(etapa, coste) antes de cada etapa opcional.
+Sin cabecera: presupuesto ilimitado (comportamiento de siempre).
+"""
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+BUDGET_HEADER = "X-Request-Budget-Ms"
+
+
+class Deadline:
+    def __init__(
+        self,
+        budget_ms: Optional[float],
+        margin_ms: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._clock = clock
+        self.budget_ms = budget_ms if budget_ms is not None and budget_ms > 0 else None
+        self._t_end = clock() + (self.budget_ms - margin_ms) / 1000.0 if self.budget_ms is not None else None
+        self.skipped: List[str] = []
+
+    @classmethod
+    def from_headers(cls, headers: Optional[Mapping[str, str]], margin_ms: float = 0.0) -> "Deadline":
+        raw = (headers.get(BUDGET_HEADER) if headers else None) or ""
+        try:
+            budget = float(raw)
+        except ValueError:
+            budget = None
+        return cls(budget, margin_ms=margin_ms)
+
+    def remaining_ms(self) -> Optional[float]:
+        if self._t_end is None:
+            return None
+        return max(0.0, (self._t_end - self._clock()) * 1000.0)
+
+    def allows(self, stage: str, cost_ms: float) -> bool:
+        """True si queda presupuesto para una etapa de coste estimado cost_ms; si no, la anota como saltada."""
+        remaining = self.remaining_ms()
+        if remaining is None or remaining >= cost_ms:
+            return True
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+        return False
+
+    def report(self) -> Dict[str, Any]:
+        remaining = self.remaining_ms()
+        return {
+            "budget_ms": self.budget_ms,
+            "remaining_ms": int(remaining) if remaining is not None else None,
+            "skipped_stages": list(self.skipped),
+        }
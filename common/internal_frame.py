@@ -0,0 +1,65 @@
+"""
+Internal frame — transporte binario gateway -> motor sin multipart.
+
+Formato (un body HTTP):
+  b"SCN1" | u32 big-endian longitud de cabecera | cabecera JSON | bytes de cada parte, en orden
+  cabecera = {"fields": {"modo": ..., ...},
+              "parts": [{"name": "front", "filename": ..., "content_type": ..., "size": n}, ...]}
+
+El emisor puede mandar la cabecera y después las imágenes por chunks (tamaños conocidos);
+el receptor corta las partes por offset sin buscar boundaries ni copiar.
+"""
+import json
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+MAGIC = b"SCN1"
+CONTENT_TYPE = "application/x-scn-frame"
+_PREFIX = struct.Struct(">4sI")
+# Cabecera con campos de formulario y metadatos de partes: nunca cerca de esto
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class FrameError(ValueError):
+    """Body que no es un frame válido (magic, longitudes o cabecera)."""
+
+
+def encode_header(fields: Dict[str, Any], parts: List[Dict[str, Any]]) -> bytes:
+    """Prefijo + cabecera; parts: [{"name", "filename", "content_type", "size"}] en el orden del body."""
+    header = json.dumps({"fields": fields or {}, "parts": parts}, ensure_ascii=False, separators=(",", ":"))
+    hb = header.encode("utf-8")
+    return _PREFIX.pack(MAGIC, len(hb)) + hb
+
+
+def encode_frame(fields: Dict[str, Any], parts: List[Tuple[str, Optional[str], Optional[str], bytes]]) -> bytes:
+    """Frame completo en memoria; parts: [(name, filename, content_type, data)]."""
+    meta = [{"name": n, "filename": fn, "content_type": ct, "size": len(d)} for n, fn, ct, d in parts]
+    return b"".join([encode_header(fields, meta)] + [d for _n, _fn, _ct, d in parts])
+
+
+def decode_frame(buf: bytes) -> Tuple[Dict[str, Any], Dict[str, Tuple[Optional[str], Optional[str], memoryview]]]:
+    """(fields, {name: (filename, content_type, datos)}); los datos son vistas sobre buf."""
+    if len(buf) < _PREFIX.size:
+        raise FrameError("frame truncado")
+    magic, hlen = _PREFIX.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise FrameError("magic inválido")
+    if hlen > MAX_HEADER_BYTES or _PREFIX.size + hlen > len(buf):
+        raise FrameError("cabecera inválida")
+    try:
+        header = json.loads(bytes(buf[_PREFIX.size:_PREFIX.size + hlen]).decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        raise FrameError("cabecera no es JSON")
+    fields = header.get("fields") or {}
+    view = memoryview(buf)
+    pos = _PREFIX.size + hlen
+    parts: Dict[str, Tuple[Optional[str], Optional[str], memoryview]] = {}
+    for p in header.get("parts") or []:
+        size = int(p.get("size") or 0)
+        if size < 0 or pos + size > len(buf):
+            raise FrameError("parte truncada")
+        parts[str(p.get("name"))] = (p.get("filename"), p.get("content_type"), view[pos:pos + size])
+        pos += size
+    if pos != len(buf):
+        raise FrameError("bytes sobrantes tras las partes")
+    return fields, parts
@@ -0,0 +1,135 @@
+"""
+Load shedder — desactiva etapas de baja prioridad del motor mientras hay sobrecarga.
+
+Presión = peticiones de analyze en vuelo (incluidas las que esperan hilo) y CPU del proceso.
+- Por encima de los umbrales altos durante step_up_s: sube un nivel (se apaga una etapa más,
+  en el orden de `stages`, de menos a más importante)
+- Por debajo de los umbrales bajos durante step_down_s: baja un nivel
+Entre ambos umbrales no cambia (histéresis). Nivel > 0 = degraded_mode.
+Thread-safe: el motor lo consulta desde los hilos del threadpool.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class LoadShedder:
+    def __init__(
+        self,
+        stages: Sequence[str],
+        inflight_high: int = 8,
+        inflight_low: int = 2,
+        cpu_high: float = 0.90,
+        cpu_low: float = 0.60,
+        step_up_s: float = 2.0,
+        step_down_s: float = 10.0,
+        cpu_sample_s: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        cpu_clock: Callable[[], float] = time.process_time,
+        cpu_count: Optional[int] = None,
+    ):
+        self.stages = [s for s in stages if s]
+        self.inflight_high = max(1, int(inflight_high))
+        self.inflight_low = max(0, min(int(inflight_low), self.inflight_high - 1))
+        self.cpu_high = float(cpu_high)
+        self.cpu_low = min(float(cpu_low), self.cpu_high)
+        self.step_up_s = float(step_up_s)
+        self.step_down_s = float(step_down_s)
+        self.cpu_sample_s = float(cpu_sample_s)
+        self._clock = clock
+        self._cpu_clock = cpu_clock
+        self._ncpu = max(1, int(cpu_count or os.cpu_count() or 1))
+        self._lock = threading.Lock()
+        self.level = 0
+        self.inflight = 0
+        self.cpu = 0.0
+        self._cpu_t = clock()
+        self._cpu_p = cpu_clock()
+        self._over_since: Optional[float] = None
+        self._under_since: Optional[float] = None
+        self.transitions = 0
+
+    # ---------- Señales ----------
+    def enter(self) -> None:
+        with self._lock:
+            self.inflight += 1
+            self._update()
+
+    def exit(self) -> None:
+        with self._lock:
+            self.inflight = max(0, self.inflight - 1)
+            self._update()
+
+    def _sample_cpu(self, now: float) -> None:
+        dt = now - self._cpu_t
+        if dt < self.cpu_sample_s:
+            return
+        p = self._cpu_clock()
+        self.cpu = max(0.0, (p - self._cpu_p) / dt / self._ncpu)
+        self._cpu_t, self._cpu_p = now, p
+
+    def _update(self) -> None:
+        now = self._clock()
+        self._sample_cpu(now)
+        over = self.inflight >= self.inflight_high or self.cpu >= self.cpu_high
+        under = self.inflight <= self.inflight_low and self.cpu <= self.cpu_low
+        # Cada condición cuenta desde que empezó; entre umbrales se reinician ambas
+        self._over_since = (self._over_since if self._over_since is not None else now) if over else None
+        self._under_since = (self._under_since if self._under_since is not None else now) if under else None
+        if over and self.level < len(self.stages) and now - self._over_since >= self.step_up_s:
+            self.level += 1
+            self._over_since = now
+            self.transitions += 1
+        elif under and self.level > 0 and now - self._under_since >= self.step_down_s:
+            self.level -= 1
+            self._under_since = now
+            self.transitions += 1
+
+    # ---------- Consulta ----------
+    def sheds(self, stage: str) -> bool:
+        """True si la etapa está apagada ahora mismo."""
+        with self._lock:
+            self._update()
+            return stage in self.stages[: self.level]
+
+    def shed_stages(self) -> List[str]:
+        """Etapas apagadas ahora mismo (el motor lo fija al entrar en cada petición)."""
+        with self._lock:
+            self._update()
+            return list(self.stages[: self.level])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._update()
+            return {
+                "degraded_mode": self.level > 0,
+                "level": self.level,
+                "shed_stages": list(self.stages[: self.level]),
+                "inflight": self.inflight,
+                "cpu": round(self.cpu, 3),
+                "transitions": self.transitions,
+            }
+
+
+class LoadTrackingMiddleware:
+    """
+    ASGI puro: cuenta en el shedder las peticiones de `paths` hasta que termina la respuesta.
+    El app interno solo retorna tras enviar el último chunk (more_body=False) o al fallar,
+    así que un stream NDJSON sigue en vuelo mientras corren sus etapas.
+    """
+
+    def __init__(self, app, shedder: LoadShedder, paths: Sequence[str]):
+        self.app = app
+        self.shedder = shedder
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        self.shedder.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shedder.exit()
@@ -2,7 +2,7 @@
 Multi-label Fase 5 — Provenance y metadatos por atributo.
 Fuentes válidas, helpers para value/confidence/source.
 """
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 
 # Fuentes válidas
 SOURCES = frozenset(("model", "ocr", "catalog", "heuristic", "manual", "unknown"))
@@ -63,6 +63,22 @@ def make_attr(value: Any, confidence: Optional[float] = None, source: str = "unk
     return out
 
 
+def get_normalizer(field_name: str) -> Optional[Callable[[Any], Any]]:
+    """
+    Devuelve la función normalizadora de multilabel_vocab para field_name.
+    None si el campo no tiene normalizador (se usa raw tal cual).
+    Pensado para resolver la tabla una sola vez al importar (gateway/normalize).
+    """
+    norm_name = _NORMALIZERS.get(field_name)
+    if norm_name is None:
+        return None
+    try:
+        from common import multilabel_vocab as vocab
+    except ImportError:
+        import multilabel_vocab as vocab  # fallback si ejecución desde common/
+    return getattr(vocab, norm_name, None)
+
+
 def normalize_attr(
     field_name: str,
     raw_value: Any,
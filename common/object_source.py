@@ -0,0 +1,201 @@
+"""
+Object source — el motor lee imágenes por referencia (gs://bucket/obj o file:///ruta) en vez
+de recibirlas en el multipart.
+
+- gs://: solo buckets permitidos; un único storage.Client reutilizado (pool de conexiones)
+  y caché local read-through en disco con LRU por tamaño. Se asume que los objetos no se
+  reescriben (los jobs suben cada imagen a una ruta única), así que la clave es la URI.
+- file://: solo bajo las raíces permitidas (nunca rutas arbitrarias del contenedor); sin caché.
+Thread-safe: analyze_key corre en el threadpool.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from common.timings import gcs_op
+
+
+class ObjectSourceError(ValueError):
+    """URI inválida, no permitida o ilegible."""
+
+
+class ObjectNotFound(ObjectSourceError):
+    pass
+
+
+def parse_uri(uri: str) -> Tuple[str, str, str]:
+    """("gs", bucket, objeto) o ("file", "", ruta absoluta)."""
+    uri = (uri or "").strip()
+    if uri.startswith("gs://"):
+        bucket, _, obj = uri[5:].partition("/")
+        if not bucket or not obj:
+            raise ObjectSourceError(f"URI gs inválida: {uri[:200]}")
+        return "gs", bucket, obj
+    if uri.startswith("file://"):
+        path = uri[7:]
+        if not path.startswith("/"):
+            raise ObjectSourceError(f"URI file debe ser absoluta: {uri[:200]}")
+        return "file", "", path
+    raise ObjectSourceError(f"esquema no soportado (gs:// o file://): {uri[:200]}")
+
+
+class ObjectReader:
+    def __init__(
+        self,
+        buckets: Sequence[str] = (),
+        local_roots: Sequence[str] = (),
+        cache_dir: Optional[str] = None,
+        cache_max_bytes: int = 256 * 1024 * 1024,
+        max_object_bytes: int = 20 * 1024 * 1024,
+        gcs_fetch: Optional[Callable[[str, str], bytes]] = None,
+    ):
+        self.buckets = set(b for b in buckets if b)
+        self.local_roots = [os.path.realpath(r) for r in local_roots if r]
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = int(cache_max_bytes)
+        self.max_object_bytes = int(max_object_bytes)
+        self._gcs_fetch = gcs_fetch or self._gcs_download
+        self._client = None
+        self._lock = threading.Lock()
+        # clave -> tamaño, en orden de uso (el primero es el próximo en salir)
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_index()
+
+    # ---------- Lectura ----------
+    def read(self, uri: str) -> bytes:
+        scheme, bucket, obj = parse_uri(uri)
+        if scheme == "file":
+            return self._read_local(obj)
+        if bucket not in self.buckets:
+            raise ObjectSourceError(f"bucket no permitido: {bucket}")
+        key = hashlib.sha256(f"gs://{bucket}/{obj}".encode("utf-8")).hexdigest()
+        data = self._cache_get(key)
+        if data is not None:
+            return data
+        data = self._gcs_fetch(bucket, obj)
+        if len(data) > self.max_object_bytes:
+            raise ObjectSourceError(f"objeto demasiado grande ({len(data)} bytes)")
+        self._cache_put(key, data)
+        return data
+
+    def _read_local(self, path: str) -> bytes:
+        real = os.path.realpath(path)
+        if not any(real == r or real.startswith(r + os.sep) for r in self.local_roots):
+            raise ObjectSourceError("ruta local fuera de las raíces permitidas")
+        try:
+            if os.path.getsize(real) > self.max_object_bytes:
+                raise ObjectSourceError("fichero demasiado grande")
+            with open(real, "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            raise ObjectNotFound(f"no existe: {path[:200]}")
+
+    def _gcs_download(self, bucket: str, obj: str) -> bytes:
+        from google.api_core.exceptions import NotFound
+        from google.cloud import storage
+
+        with self._lock:
+            if self._client is None:
+                self._client = storage.Client()
+            client = self._client
+        try:
+            with gcs_op("download"):
+                return client.bucket(bucket).blob(obj).download_as_bytes()
+        except NotFound:
+            raise ObjectNotFound(f"no existe: gs://{bucket}/{obj[:200]}")
+
+    # ---------- Caché en disco ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load_index(self) -> None:
+        entries = []
+        for root, _dirs, names in os.walk(self.cache_dir):
+            for name in names:
+                p = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name, st.st_size))
+        for _mtime, name, size in sorted(entries):
+            self._index[name] = size
+            self._cached_bytes += size
+        self._evict()
+
+    def _cache_get(self, key: str) -> Optional[bytes]:
+        if not self.cache_dir:
+            self.misses += 1
+            return None
+        with self._lock:
+            known = key in self._index
+            if known:
+                self._index.move_to_end(key)
+        if known:
+            try:
+                with open(self._path(key), "rb") as fh:
+                    data = fh.read()
+                os.utime(self._path(key))
+                with self._lock:
+                    self.hits += 1
+                return data
+            except OSError:
+                with self._lock:
+                    self._cached_bytes -= self._index.pop(key, 0)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _cache_put(self, key: str, data: bytes) -> None:
+        if not self.cache_dir or len(data) > self.cache_max_bytes:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._lock:
+            self._cached_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._cached_bytes += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        """Con el lock tomado (o en __init__): saca los menos usados hasta caber."""
+        while self._cached_bytes > self.cache_max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._cached_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "buckets": sorted(self.buckets),
+                "cache_entries": len(self._index),
+                "cache_bytes": self._cached_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
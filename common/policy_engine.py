@@ -15,6 +15,26 @@ ACTION_REQUIRE_MANUAL_REVIEW = "REQUIRE_MANUAL_REVIEW"
 ACTION_ALLOW_WITH_OVERRIDE = "ALLOW_WITH_OVERRIDE"
 ACTION_RUN_OCR = "RUN_OCR"
 
+# Umbrales v1 (defaults). evaluate_policy(thresholds=...) permite sobrescribirlos (replay offline).
+DEFAULT_POLICY_THRESHOLDS: Dict[str, float] = {
+    "quality_block": 0.35,
+    "roi_block": 0.45,
+    "risk_score_review": 70,
+    "quality_warning": 0.55,
+    "roi_warning": 0.60,
+    "margin_narrow": 0.08,
+}
+
+
+def resolve_thresholds(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+    """Defaults v1 + overrides conocidos (claves desconocidas -> ValueError)."""
+    th = dict(DEFAULT_POLICY_THRESHOLDS)
+    for k, v in (overrides or {}).items():
+        if k not in th:
+            raise ValueError(f"umbral de política desconocido: {k}")
+        th[k] = float(v)
+    return th
+
 
 def _get_float(val: Any, default: Optional[float]) -> Optional[float]:
     if val is None:
@@ -31,7 +51,11 @@ def _get_str(val: Any) -> str:
     return str(val or "").strip()
 
 
-def build_policy_inputs(response: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+def build_policy_inputs(
+    response: Dict[str, Any],
+    context: Optional[Dict[str, Any]] = None,
+    thresholds: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
     """
     Extrae señales de response para evaluar políticas.
     Lee de response y response.debug.
@@ -40,6 +64,7 @@ def build_policy_inputs(response: Dict[str, Any], context: Optional[Dict[str, An
     """
     if not response:
         return {}
+    th = thresholds or DEFAULT_POLICY_THRESHOLDS
 
     debug = response.get("debug") or {}
     results = response.get("results") or response.get("candidates") or []
@@ -58,9 +83,17 @@ def build_policy_inputs(response: Dict[str, Any], context: Optional[Dict[str, An
     if not isinstance(risk_reasons, list):
         risk_reasons = []
 
+    # Calidad apagada por sobrecarga o saltada por deadline: desconocida, no perfecta
+    deadline_info = debug.get("deadline") if isinstance(debug.get("deadline"), dict) else {}
+    not_measured = list(debug.get("shed_stages") or []) + list(deadline_info.get("skipped_stages") or [])
+    quality_unknown = debug.get("quality_score") is None and "quality" in not_measured
     quality_score = _get_float(debug.get("quality_score"), 1.0)
     roi_score = _get_float(debug.get("roi_score"), 1.0)
-    quality_warning = bool(debug.get("quality_warning")) or (quality_score is not None and quality_score < 0.55) or (roi_score is not None and roi_score < 0.60)
+    quality_warning = (
+        bool(debug.get("quality_warning"))
+        or (quality_score is not None and quality_score < th["quality_warning"])
+        or (roi_score is not None and roi_score < th["roi_warning"])
+    )
     consistency_conflicts = debug.get("consistency_conflicts") or []
     consistency_strong_conflicts = debug.get("consistency_strong_conflicts") or consistency_conflicts
     consistency_weak_conflicts = debug.get("consistency_weak_conflicts") or []
@@ -83,6 +116,7 @@ def build_policy_inputs(response: Dict[str, Any], context: Optional[Dict[str, An
         "risk_level": _get_str(debug.get("risk_level")).upper() or "LOW",
         "risk_reasons": risk_reasons,
         "quality_warning": quality_warning,
+        "quality_unknown": quality_unknown,
         "consistency_conflicts": consistency_conflicts,
         "consistency_strong_conflicts": consistency_strong_conflicts,
         "consistency_weak_conflicts": consistency_weak_conflicts,
@@ -128,11 +162,11 @@ def _has_sufficient_text_evidence(inputs: Dict[str, Any]) -> bool:
     return bool(_has_brand_model(inputs) or len(explain) > 20)
 
 
-def _is_margin_narrow(inputs: Dict[str, Any]) -> bool:
+def _is_margin_narrow(inputs: Dict[str, Any], threshold: float = DEFAULT_POLICY_THRESHOLDS["margin_narrow"]) -> bool:
     m = inputs.get("margin")
     if m is None:
         return False
-    return m < 0.08
+    return m < threshold
 
 
 def _has_ab_conflict(inputs: Dict[str, Any]) -> bool:
@@ -162,12 +196,18 @@ def _has_patentada(inputs: Dict[str, Any]) -> bool:
     return top1.get("patentada") is True
 
 
-def evaluate_policy(response: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+def evaluate_policy(
+    response: Dict[str, Any],
+    context: Optional[Dict[str, Any]] = None,
+    thresholds: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     """
     Evalúa reglas deterministas y devuelve acción, reasons y user_message.
     Prioridad: BLOCK > REQUIRE_MANUAL_REVIEW > ALLOW_WITH_OVERRIDE > RUN_OCR > WARN > ALLOW
+    thresholds: overrides de DEFAULT_POLICY_THRESHOLDS (None = v1).
     """
-    inputs = build_policy_inputs(response, context)
+    th = resolve_thresholds(thresholds) if thresholds else DEFAULT_POLICY_THRESHOLDS
+    inputs = build_policy_inputs(response, context, th)
     reasons: List[str] = []
     applied_rules: List[str] = []
 
@@ -183,9 +223,10 @@ def evaluate_policy(response: Dict[str, Any], context: Optional[Dict[str, Any]]
     low_confidence = inputs.get("low_confidence", False)
     high_confidence = inputs.get("high_confidence", False)
     quality_warning = inputs.get("quality_warning", False)
+    quality_unknown = inputs.get("quality_unknown", False)
 
     # ----- REGLA 1 — BLOCK -----
-    if quality_score < 0.35:
+    if quality_score < th["quality_block"]:
         reasons.append("quality_block")
         applied_rules.append("rule_block_quality")
         return _make_result(
@@ -195,7 +236,7 @@ def evaluate_policy(response: Dict[str, Any], context: Optional[Dict[str, Any]]
             inputs,
             applied_rules,
         )
-    if roi_score < 0.45:
+    if roi_score < th["roi_block"]:
         reasons.append("roi_block")
         applied_rules.append("rule_block_roi")
         return _make_result(
@@ -207,12 +248,12 @@ def evaluate_policy(response: Dict[str, Any], context: Optional[Dict[str, Any]]
         )
 
     # ----- REGLA 2 — REQUIRE_MANUAL_REVIEW -----
-    if low_confidence or risk_level == "HIGH" or risk_score >= 70:
+    if low_confidence or risk_level == "HIGH" or risk_score >= th["risk_score_review"]:
         if low_confidence:
             reasons.append("low_confidence")
         if risk_level == "HIGH":
             reasons.append("risk_high")
-        if risk_score >= 70 and risk_level != "HIGH":
+        if risk_score >= th["risk_score_review"] and risk_level != "HIGH":
             reasons.append("risk_score_high")
         applied_rules.append("rule_require_manual_review")
         return _make_result(
@@ -224,9 +265,11 @@ def evaluate_policy(response: Dict[str, Any], context: Optional[Dict[str, Any]]
         )
 
     # ----- REGLA 3 — ALLOW_WITH_OVERRIDE -----
-    if quality_warning or risk_level == "MEDIUM":
+    if quality_warning or quality_unknown or risk_level == "MEDIUM":
         if quality_warning:
             reasons.append("quality_warning")
+        if quality_unknown:
+            reasons.append("quality_unknown")
         if risk_level == "MEDIUM":
             reasons.append("risk_medium")
         applied_rules.append("rule_allow_with_override")
@@ -261,7 +304,7 @@ def evaluate_policy(response: Dict[str, Any], context: Optional[Dict[str, Any]]
         )
 
     # ----- REGLA 5 — WARN -----
-    margin_narrow = _is_margin_narrow(inputs)
+    margin_narrow = _is_margin_narrow(inputs, th["margin_narrow"])
     ab_conflict = _has_ab_conflict(inputs)
     mfr_mismatch = _has_manufacturer_mismatch(inputs)
     consistency_conflicts = _has_consistency_conflicts(inputs)
@@ -287,7 +330,7 @@ def evaluate_policy(response: Dict[str, Any], context: Optional[Dict[str, Any]]
     # ----- REGLA 6 — ALLOW -----
     supports = inputs.get("consistency_supports") or []
     many_supports = len(supports) >= 2
-    if high_confidence and risk_level == "LOW" and quality_score >= 0.55 and roi_score >= 0.60:
+    if high_confidence and risk_level == "LOW" and quality_score >= th["quality_warning"] and roi_score >= th["roi_warning"]:
         reasons.append("all_ok")
         if many_supports:
             reasons.append("consistency_supports")
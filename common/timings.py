@@ -0,0 +1,124 @@
+"""
+Timings — spans por etapa y métricas en formato Prometheus, sin dependencias.
+
+- StageTimer: un objeto por petición; `with timer.span("decode"):` acumula ms por etapa
+  (A y B suman en la misma etapa) y observa el histograma scn_stage_duration_seconds.
+- gcs_op("upload"): latencia y cuenta de cada operación GCS (scn_gcs_operation_duration_seconds,
+  con outcome ok/error; el _count del histograma es el contador).
+- REGISTRY.render(): texto de exposición para GET /metrics.
+Cada span y cada gcs_op abre además un span de traza (common/tracing) si la petición se traza.
+Thread-safe (el motor corre en threadpool). Por proceso: con varios workers cada uno expone
+lo suyo, igual que /health.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from common import tracing
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_METRIC = "scn_stage_duration_seconds"
+GCS_METRIC = "scn_gcs_operation_duration_seconds"
+
+
+class MetricsRegistry:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._help: Dict[str, str] = {}
+        # nombre -> {labels ordenadas -> [cuentas por bucket..., +Inf, suma]}
+        self._series: Dict[str, Dict[Tuple[Tuple[str, str], ...], List[float]]] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            row = series.get(key)
+            if row is None:
+                row = series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    @staticmethod
+    def _fmt_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(key) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            snapshot = {name: {k: list(v) for k, v in series.items()} for name, series in self._series.items()}
+        for name in sorted(snapshot):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key in sorted(snapshot[name]):
+                row = snapshot[name][key]
+                for i, b in enumerate(self.buckets):
+                    lines.append(f"{name}_bucket{self._fmt_labels(key, ('le', repr(float(b))))} {int(row[i])}")
+                lines.append(f"{name}_bucket{self._fmt_labels(key, ('le', '+Inf'))} {int(row[-2])}")
+                lines.append(f"{name}_sum{self._fmt_labels(key)} {row[-1]:.6f}")
+                lines.append(f"{name}_count{self._fmt_labels(key)} {int(row[-2])}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe(STAGE_METRIC, "Duración de cada etapa de analyze (s).")
+REGISTRY.describe(GCS_METRIC, "Latencia de operaciones GCS (s); _count = número de operaciones.")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class StageTimer:
+    def __init__(
+        self,
+        service: str,
+        registry: MetricsRegistry = REGISTRY,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.service = service
+        self._registry = registry
+        self._clock = clock
+        self._t0 = clock()
+        self._ms: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        t = self._clock()
+        try:
+            with tracing.span(stage):
+                yield
+        finally:
+            self.record(stage, self._clock() - t)
+
+    def record(self, stage: str, seconds: float) -> None:
+        self._ms[stage] = self._ms.get(stage, 0.0) + seconds * 1000.0
+        self._registry.observe(STAGE_METRIC, seconds, service=self.service, stage=stage)
+
+    def timings_ms(self, prefix: str = "") -> Dict[str, float]:
+        """{etapa: ms} hasta ahora, más total (desde la creación del timer)."""
+        out = {f"{prefix}{k}": round(v, 1) for k, v in self._ms.items()}
+        out[f"{prefix}total"] = round((self._clock() - self._t0) * 1000.0, 1)
+        return out
+
+
+@contextmanager
+def gcs_op(op: str, registry: MetricsRegistry = REGISTRY, clock: Callable[[], float] = time.perf_counter) -> Iterator[None]:
+    t = clock()
+    outcome = "error"
+    try:
+        with tracing.span(f"gcs.{op}"):
+            yield
+        outcome = "ok"
+    finally:
+        registry.observe(GCS_METRIC, clock() - t, op=op, outcome=outcome)
@@ -0,0 +1,281 @@
+"""
+Tracing — spans entre gateway, motor y OCR con propagación W3C (cabecera traceparent).
+
+- configure(service, exporter, sample_rate): un tracer por proceso; sin exporter todo es no-op.
+- trace_requests: middleware HTTP; span de servidor que continúa el traceparent entrante o
+  abre traza nueva (muestreo por traza en la raíz; los saltos siguientes heredan la decisión).
+- span("ocr"): hijo del span actual (no-op fuera de una petición trazada). StageTimer y gcs_op
+  (common/timings) abren spans, así que las etapas y GCS salen en la traza sin más cambios.
+- inject(headers): traceparent para llamadas salientes (motor, OCR).
+Exporters: JsonlExporter (una línea JSON por span) y HttpExporter (POST por lotes a un colector,
+en un hilo aparte; si la cola se llena descarta spans antes que frenar peticiones).
+"""
+import json
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+TRACEPARENT = "traceparent"
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """SpanContext de "00-<trace_id 32 hex>-<span_id 16 hex>-<flags>"; None si no es válido."""
+    parts = (value or "").strip().lower().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[0] == "ff" or parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return SpanContext(parts[1], parts[2], bool(flags & 1))
+
+
+def format_traceparent(ctx: SpanContext) -> str:
+    return f"00-{ctx.trace_id}-{ctx.span_id}-{'01' if ctx.sampled else '00'}"
+
+
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        line = json.dumps(span, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line)
+
+
+class HttpExporter:
+    def __init__(
+        self,
+        url: str,
+        batch_size: int = 100,
+        interval_s: float = 2.0,
+        max_queue: int = 10000,
+        timeout_s: float = 2.0,
+        post: Optional[Callable[[str, bytes], None]] = None,
+    ):
+        self.url = url
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self._post = post or self._urllib_post
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.failed_batches = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict[str, Any]) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _urllib_post(self, url: str, body: bytes) -> None:
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout_s) as r:
+            r.read()
+
+    def flush(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+        try:
+            self._post(self.url, json.dumps({"spans": batch}, default=str).encode("utf-8"))
+        except Exception:
+            self.failed_batches += 1
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval_s)
+            while not self._queue.empty():
+                self.flush()
+
+
+def build_exporter(kind: str, path: str = "", url: str = ""):
+    """"jsonl" | "http" | "" (sin exporter = tracing apagado)."""
+    kind = (kind or "").strip().lower()
+    if kind == "jsonl" and path:
+        return JsonlExporter(path)
+    if kind == "http" and url:
+        return HttpExporter(url)
+    return None
+
+
+_CURRENT: ContextVar[Optional["Span"]] = ContextVar("scn_trace_span", default=None)
+
+
+class Span:
+    __slots__ = ("tracer", "name", "context", "parent_id", "attrs", "start", "_t0", "ended")
+
+    def __init__(self, tracer: "Tracer", name: str, context: SpanContext, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = tracer.clock()
+        self._t0 = time.perf_counter()
+        self.ended = False
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.ended:
+            return
+        self.ended = True
+        if not self.context.sampled or self.tracer.exporter is None:
+            return
+        record = {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.tracer.service,
+            "start": round(self.start, 6),
+            "duration_ms": round((time.perf_counter() - self._t0) * 1000.0, 3),
+            "status": "error" if error is not None else "ok",
+            "attrs": self.attrs,
+        }
+        if error is not None:
+            record["error"] = type(error).__name__
+        try:
+            self.tracer.exporter.export(record)
+        except Exception:
+            pass
+
+
+class Tracer:
+    def __init__(
+        self,
+        service: str,
+        exporter: Any = None,
+        sample_rate: float = 1.0,
+        rng: Callable[[], float] = random.random,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.service = service
+        self.exporter = exporter
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self._rng = rng
+        self.clock = clock
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def begin(self, name: str, parent: Optional[SpanContext] = None, **attrs: Any) -> Span:
+        """Span sin activar (p. ej. streams que viven entre varios yields); hay que llamar a end()."""
+        if parent is None:
+            cur = _CURRENT.get()
+            parent = cur.context if cur is not None else None
+        if parent is None:
+            ctx = SpanContext(secrets.token_hex(16), secrets.token_hex(8), self._rng() < self.sample_rate)
+            return Span(self, name, ctx, None, attrs)
+        return Span(self, name, SpanContext(parent.trace_id, secrets.token_hex(8), parent.sampled), parent.span_id, attrs)
+
+    @contextmanager
+    def start_span(self, name: str, parent: Optional[SpanContext] = None, **attrs: Any) -> Iterator[Span]:
+        sp = self.begin(name, parent, **attrs)
+        token = _CURRENT.set(sp)
+        try:
+            yield sp
+        except BaseException as e:
+            sp.end(e)
+            raise
+        finally:
+            _CURRENT.reset(token)
+            sp.end()
+
+
+_tracer = Tracer("unknown")
+
+
+def configure(service: str, exporter: Any = None, sample_rate: float = 1.0) -> Tracer:
+    global _tracer
+    _tracer = Tracer(service, exporter, sample_rate)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def current_span() -> Optional[Span]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """Hijo del span actual; fuera de una petición trazada no hace nada (yield None)."""
+    parent = _CURRENT.get()
+    if parent is None:
+        yield None
+        return
+    with parent.tracer.start_span(name, parent.context, **attrs) as sp:
+        yield sp
+
+
+def begin(name: str, **attrs: Any) -> Optional[Span]:
+    """Hijo del span actual sin activarlo (streams); None fuera de una petición trazada."""
+    parent = _CURRENT.get()
+    return parent.tracer.begin(name, parent.context, **attrs) if parent is not None else None
+
+
+def inject(headers: Dict[str, str], sp: Optional[Span] = None) -> Dict[str, str]:
+    """Añade traceparent del span dado (o del actual) a headers; sin span no toca nada."""
+    sp = sp or _CURRENT.get()
+    if sp is not None:
+        headers[TRACEPARENT] = format_traceparent(sp.context)
+    return headers
+
+
+async def trace_requests(request, call_next):
+    """Middleware HTTP (app.middleware("http")): span de servidor por petición."""
+    tracer = _tracer
+    if not tracer.enabled:
+        return await call_next(request)
+    parent = parse_traceparent(request.headers.get(TRACEPARENT))
+    with tracer.start_span(f"{request.method} {request.url.path}", parent, **{"http.method": request.method}) as sp:
+        resp = await call_next(request)
+        route = request.scope.get("route")
+        if getattr(route, "path", None):
+            # Plantilla de la ruta (/api/jobs/{job_id}) en vez de la URL: nombres con cardinalidad baja
+            sp.name = f"{request.method} {route.path}"
+        sp.set("http.status_code", resp.status_code)
+        rid = getattr(request.state, "request_id", None)
+        if rid:
+            sp.set("request_id", rid)
+        return resp
@@ -0,0 +1,164 @@
+"""
+Admission control delante del motor: límite de concurrencia adaptativo (AIMD)
+con cola de espera acotada.
+- Respuesta rápida y sana (latencia <= objetivo): +1/limit por respuesta (~+1 por ventana)
+- Latencia > objetivo, 5xx o error de red: limit *= backoff (como mucho una vez por cooldown)
+- Cola llena o espera > queue_timeout: MotorOverloaded -> 503 + Retry-After
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+from .config import (
+    SCN_ADMISSION_INITIAL_LIMIT,
+    SCN_ADMISSION_MIN_LIMIT,
+    SCN_ADMISSION_MAX_LIMIT,
+    SCN_ADMISSION_MAX_QUEUE,
+    SCN_ADMISSION_QUEUE_TIMEOUT_S,
+    SCN_ADMISSION_LATENCY_TARGET_MS,
+)
+
+_EWMA_ALPHA = 0.2
+
+
+class MotorOverloaded(Exception):
+    """No hay hueco ni sitio en la cola; retry_after en segundos."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """Single event loop (uvicorn worker): sin locks, solo futures del loop."""
+
+    def __init__(
+        self,
+        initial_limit: int = SCN_ADMISSION_INITIAL_LIMIT,
+        min_limit: int = SCN_ADMISSION_MIN_LIMIT,
+        max_limit: int = SCN_ADMISSION_MAX_LIMIT,
+        max_queue: int = SCN_ADMISSION_MAX_QUEUE,
+        queue_timeout_s: float = SCN_ADMISSION_QUEUE_TIMEOUT_S,
+        latency_target_ms: float = SCN_ADMISSION_LATENCY_TARGET_MS,
+        backoff: float = 0.7,
+        cooldown_s: float = 1.0,
+    ):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(max(int(initial_limit), self.min_limit), self.max_limit))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout_s = float(queue_timeout_s)
+        self.latency_target_s = float(latency_target_ms) / 1000.0
+        self.backoff = float(backoff)
+        self.cooldown_s = float(cooldown_s)
+        self.inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_drop = 0.0
+        self.latency_ewma_s = 0.0
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.timeouts_total = 0
+
+    # ---------- Estado ----------
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que se vacíe la cola actual (1..30)."""
+        lat = self.latency_ewma_s or self.latency_target_s
+        est = lat * (self.queued + 1) / max(1.0, self.limit)
+        return int(min(30, max(1, math.ceil(est))))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "latency_ewma_ms": round(self.latency_ewma_s * 1000, 1),
+            "latency_target_ms": round(self.latency_target_s * 1000, 1),
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+            "queue_timeouts_total": self.timeouts_total,
+        }
+
+    # ---------- Adquirir / liberar ----------
+    async def acquire(self) -> None:
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            self.admitted_total += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_total += 1
+            raise MotorOverloaded("cola llena", self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                # Se concedió el hueco justo al expirar: devolverlo
+                self._release_slot()
+            else:
+                fut.cancel()
+            self._discard(fut)
+            self.rejected_total += 1
+            self.timeouts_total += 1
+            raise MotorOverloaded("espera en cola agotada", self.retry_after())
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release_slot()
+            else:
+                fut.cancel()
+            self._discard(fut)
+            raise
+        self.admitted_total += 1
+
+    def release(self, latency_s: float, ok: bool) -> None:
+        """Libera el hueco y ajusta el límite con la latencia/resultado observados."""
+        self.latency_ewma_s = (
+            latency_s if self.latency_ewma_s == 0.0
+            else (1 - _EWMA_ALPHA) * self.latency_ewma_s + _EWMA_ALPHA * latency_s
+        )
+        now = time.monotonic()
+        if not ok or latency_s > self.latency_target_s:
+            if now - self._last_drop >= self.cooldown_s:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_drop = now
+        elif self.inflight >= int(self.limit) or self._waiters:
+            # Solo crecer si el límite se está usando (si no, no hay señal)
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        self._release_slot()
+
+    def cancel(self) -> None:
+        """Devuelve el hueco sin ajustar el límite (la petición no llegó a salir hacia el motor)."""
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        self.inflight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.inflight < int(self.limit):
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self.inflight += 1
+            fut.set_result(None)
+
+    def _discard(self, fut: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+
+
+_limiter = AdaptiveLimiter()
+
+
+def get_limiter() -> AdaptiveLimiter:
+    return _limiter
@@ -0,0 +1,96 @@
+"""Body limit — middleware ASGI que corta uploads grandes mientras se leen (413 temprano)."""
+import json
+from typing import Iterable
+
+from fastapi import HTTPException
+
+from .config import MAX_REQUEST_BYTES
+
+
+class _BodyTooLarge(HTTPException):
+    """HTTPException para que FastAPI no la convierta en 400 al parsear el form."""
+
+    def __init__(self, limit: int):
+        super().__init__(413, f"Payload demasiado grande (> {limit // (1024 * 1024)}MB)")
+
+
+def _payload_too_large_body(limit: int) -> bytes:
+    return json.dumps(
+        {
+            "ok": False,
+            "error": "PAYLOAD_TOO_LARGE",
+            "detail": f"Payload demasiado grande (> {limit // (1024 * 1024)}MB)",
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+class BodySizeLimitMiddleware:
+    """
+    Limita el tamaño del body en las rutas indicadas SIN bufferizarlo:
+    - Content-Length declarado > límite -> 413 antes de leer nada
+    - chunked / Content-Length falso -> cuenta bytes en receive() y corta al pasarse
+    El parser multipart de Starlette lee a través de receive(), así que nunca llega
+    a spoolear más de max_bytes.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_bytes = int(max_bytes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.max_bytes
+        for name, value in scope.get("headers") or []:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = -1
+                if declared > limit:
+                    await self._send_413(send)
+                    return
+                break
+
+        received = 0
+        response_started = False
+
+        async def _receive():
+            nonlocal received
+            message = await receive()
+            if message.get("type") == "http.request":
+                received += len(message.get("body") or b"")
+                if received > limit:
+                    raise _BodyTooLarge(limit)
+            return message
+
+        async def _send(message):
+            nonlocal response_started
+            if message.get("type") == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, _receive, _send)
+        except _BodyTooLarge:
+            if not response_started:
+                await self._send_413(send)
+
+    async def _send_413(self, send):
+        body = _payload_too_large_body(self.max_bytes)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,109 @@
+"""Compression — middleware ASGI: gzip/brotli negociado por Accept-Encoding en rutas JSON concretas."""
+import gzip
+from typing import Iterable, Optional
+
+from .config import SCN_COMPRESSION_MIN_BYTES, SCN_GZIP_LEVEL, SCN_BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _accepted(header: str) -> set:
+    """Codificaciones aceptadas (q>0) de un Accept-Encoding."""
+    out = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            out.add(name.strip().lower())
+    return out
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """br si el cliente lo acepta y brotli está instalado; si no gzip; None = sin comprimir."""
+    acc = _accepted(accept_encoding or "")
+    if brotli is not None and "br" in acc:
+        return "br"
+    if "gzip" in acc or "*" in acc:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=SCN_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=SCN_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Comprime respuestas application/json en las rutas indicadas (exactas o prefijo con "/"
+    final). Bufferiza solo el body JSON (respuestas de analyze/job, decenas de KB); el resto
+    de content-types (p.ej. text/event-stream) pasa sin tocar.
+    """
+
+    def __init__(self, app, paths: Iterable[str], minimum_size: int = SCN_COMPRESSION_MIN_BYTES):
+        self.app = app
+        paths = tuple(paths)
+        self.exact = frozenset(p for p in paths if not p.endswith("/"))
+        self.prefixes = tuple(p for p in paths if p.endswith("/"))
+        self.minimum_size = int(minimum_size)
+
+    def _matches(self, path: str) -> bool:
+        return path in self.exact or path.startswith(self.prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._matches(scope.get("path") or ""):
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope.get("headers") or []:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+        chunks = []
+
+        async def _send(message):
+            nonlocal start, passthrough
+            mtype = message["type"]
+            if mtype == "http.response.start":
+                headers = dict((k.lower(), v) for k, v in message.get("headers") or [])
+                ct = headers.get(b"content-type", b"").split(b";")[0].strip()
+                if ct != b"application/json" or b"content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if mtype != "http.response.body" or passthrough:
+                await send(message)
+                return
+            chunks.append(message.get("body") or b"")
+            if message.get("more_body"):
+                return
+            body = b"".join(chunks)
+            headers = [(k, v) for k, v in start.get("headers") or [] if k.lower() != b"content-length"]
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers.append((b"content-encoding", encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+            headers.append((b"content-length", str(len(body)).encode()))
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, _send)
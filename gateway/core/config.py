@@ -1,21 +1,49 @@
 """Config — lectura de env vars, flags, constantes."""
 import os
-from typing import Set
+from typing import List, Set, Tuple
 
 APP_VERSION = "0.5.0"
 SCHEMA_VERSION = "2026-02-17"
 POLICY_VERSION = "v1"
 
 MOTOR_URL = (os.getenv("MOTOR_URL") or "").rstrip("/")
+# Varios motores detrás del gateway: "url1,url2" o "nombre=url" (p.ej. "int8=http://motor-q:8081,fp32=http://motor:8081")
+MOTOR_URLS_RAW = (os.getenv("MOTOR_URLS") or "").strip()
 API_KEYS_RAW = os.getenv("API_KEYS", "")
 ALLOWED_ORIGINS_RAW = os.getenv("ALLOWED_ORIGINS", "*")
 TIMEOUT = float(os.getenv("TIMEOUT", "15"))
+# Transporte interno hacia el motor: "multipart" (default) o "frame" (binario, cliente persistente)
+SCN_MOTOR_TRANSPORT = os.getenv("SCN_MOTOR_TRANSPORT", "multipart").strip().lower()
+# Socket Unix del motor (docker-compose en el mismo host); solo con transporte "frame"
+SCN_MOTOR_UDS = (os.getenv("SCN_MOTOR_UDS") or "").strip()
+SCN_MOTOR_MAX_KEEPALIVE = int(os.getenv("SCN_MOTOR_MAX_KEEPALIVE", "16"))
+# Balanceo entre MOTOR_URLS: least_outstanding | ewma (latencia EWMA x peticiones en vuelo)
+SCN_MOTOR_LB_STRATEGY = os.getenv("SCN_MOTOR_LB_STRATEGY", "least_outstanding").strip().lower()
+# Expulsión pasiva tras N fallos seguidos (red/5xx) durante EJECT_S; chequeo activo de /ready cada INTERVAL_S
+SCN_MOTOR_EJECT_AFTER = int(os.getenv("SCN_MOTOR_EJECT_AFTER", "3"))
+SCN_MOTOR_EJECT_S = float(os.getenv("SCN_MOTOR_EJECT_S", "30"))
+SCN_MOTOR_HEALTH_INTERVAL_S = float(os.getenv("SCN_MOTOR_HEALTH_INTERVAL_S", "5"))
+# Afinidad: la misma imagen va a la misma réplica (rendezvous hashing) salvo que esté por
+# encima de LOAD_FACTOR x carga media; entonces se desborda a la siguiente del ranking
+SCN_FEATURE_GATEWAY_MOTOR_AFFINITY = os.getenv("SCN_FEATURE_GATEWAY_MOTOR_AFFINITY", "false").lower() in ("1", "true", "yes")
+SCN_MOTOR_AFFINITY_LOAD_FACTOR = float(os.getenv("SCN_MOTOR_AFFINITY_LOAD_FACTOR", "1.25"))
+# X-Request-Budget-Ms (= TIMEOUT) en cada POST al motor: OCR/quality/muestras se saltan si no caben
+SCN_FEATURE_GATEWAY_DEADLINE_HEADER = os.getenv("SCN_FEATURE_GATEWAY_DEADLINE_HEADER", "true").lower() in ("1", "true", "yes")
 
 SCN_FEATURE_GATEWAY_IDTOKEN_PROXY_ENABLED = os.getenv("SCN_FEATURE_GATEWAY_IDTOKEN_PROXY_ENABLED", "true").lower() == "true"
 MOTOR_AUTH_HEADER = os.getenv("MOTOR_AUTH_HEADER", "Authorization")
 
 KEY_BUCKET = os.getenv("KEY_BUCKET", "scankey-dc007-keys")
+# Jobs: el motor lee A/B de KEY_BUCKET por gs:// (front_uri/back_uri) en vez de recibirlas del gateway
+SCN_FEATURE_GATEWAY_ANALYZE_BY_REF = os.getenv("SCN_FEATURE_GATEWAY_ANALYZE_BY_REF", "false").lower() in ("1", "true", "yes")
 KEY_PREFIX = os.getenv("KEY_PREFIX", "ingest").strip("/")
+# Ingest por URL firmada: el cliente sube A/B directo al store y luego llama a finalize
+SCN_FEATURE_GATEWAY_SIGNED_UPLOADS = os.getenv("SCN_FEATURE_GATEWAY_SIGNED_UPLOADS", "false").lower() in ("1", "true", "yes")
+SCN_UPLOAD_STORE = (os.getenv("SCN_UPLOAD_STORE") or "").strip().lower()  # gcs | local (vacío: gcs; local también necesita GCS para los jobs)
+SCN_UPLOAD_LOCAL_DIR = os.getenv("SCN_UPLOAD_LOCAL_DIR", "/tmp/scn_uploads")
+SCN_UPLOAD_URL_TTL_S = int(os.getenv("SCN_UPLOAD_URL_TTL_S", "900"))
+# Compartido entre réplicas: firma upload_token (y las URLs del store local)
+SCN_UPLOAD_SIGNING_SECRET = (os.getenv("SCN_UPLOAD_SIGNING_SECRET") or "").strip()
 JOB_PREFIX = os.getenv("JOB_PREFIX", "jobs").strip("/")
 FEEDBACK_PREFIX = os.getenv("FEEDBACK_PREFIX", "feedback").strip("/")
 IDEMPOTENCY_KEYS_PREFIX = os.getenv("IDEMPOTENCY_KEYS_PREFIX", "idempotency_keys").strip("/")
@@ -23,11 +51,91 @@ IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
 
 SCN_FEATURE_QUALITY_GATE_ACTIVE = os.getenv("SCN_FEATURE_QUALITY_GATE_ACTIVE", "false").lower() in ("1", "true", "yes")
 SCN_FEATURE_POLICY_ENGINE_ACTIVE = os.getenv("SCN_FEATURE_POLICY_ENGINE_ACTIVE", "false").lower() in ("1", "true", "yes")
+# Con policy activa: miniatura en el gateway y 422 POLICY_BLOCK sin motor si quality < quality_block - MARGIN
+SCN_FEATURE_GATEWAY_QUALITY_PRECHECK = os.getenv("SCN_FEATURE_GATEWAY_QUALITY_PRECHECK", "false").lower() in ("1", "true", "yes")
+SCN_QUALITY_PRECHECK_SIDE = int(os.getenv("SCN_QUALITY_PRECHECK_SIDE", "256"))
+SCN_QUALITY_PRECHECK_MARGIN = float(os.getenv("SCN_QUALITY_PRECHECK_MARGIN", "0.10"))
+# debug.timings: ms por etapa (motor + gateway.*) en la respuesta de analyze-key (opt-in); /metrics siempre
+SCN_DEBUG_INCLUDE_TIMINGS = os.getenv("SCN_DEBUG_INCLUDE_TIMINGS", "false").lower() in ("1", "true", "yes")
+# Tracing (traceparent W3C hacia motor y OCR): jsonl -> SCN_TRACE_FILE, http -> SCN_TRACE_COLLECTOR_URL; vacío = apagado
+SCN_TRACE_EXPORTER = os.getenv("SCN_TRACE_EXPORTER", "").strip().lower()
+SCN_TRACE_FILE = os.getenv("SCN_TRACE_FILE", "/tmp/scn-traces/gateway.jsonl")
+SCN_TRACE_COLLECTOR_URL = os.getenv("SCN_TRACE_COLLECTOR_URL", "").strip()
+# Fracción de trazas nuevas que se exportan; si llega traceparent manda su flag de muestreo
+SCN_TRACE_SAMPLE_RATE = float(os.getenv("SCN_TRACE_SAMPLE_RATE", "0.1"))
 
 MAX_PAYLOAD_MB = float(os.getenv("SCN_MAX_PAYLOAD_MB", "10"))
 MAX_PAYLOAD_BYTES = int(MAX_PAYLOAD_MB * 1024 * 1024)
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp"}
 MAX_IMAGE_DIM = int(os.getenv("SCN_MAX_IMAGE_DIM", "8192"))
+# /api/capture-profile: lado mayor/JPEG recomendados al cliente (common/capture_profile)
+SCN_CAPTURE_PROFILE_TTL_S = float(os.getenv("SCN_CAPTURE_PROFILE_TTL_S", "300"))
+SCN_CAPTURE_ROI_FACTOR = float(os.getenv("SCN_CAPTURE_ROI_FACTOR", "2.0"))
+SCN_CAPTURE_QUALITY_MIN_EDGE = int(os.getenv("SCN_CAPTURE_QUALITY_MIN_EDGE", "1024"))
+SCN_CAPTURE_OCR_MIN_EDGE = int(os.getenv("SCN_CAPTURE_OCR_MIN_EDGE", "1280"))
+SCN_CAPTURE_JPEG_QUALITY = int(os.getenv("SCN_CAPTURE_JPEG_QUALITY", "85"))
+# Anti decompression bomb: ancho*alto máximo declarado en cabecera
+MAX_IMAGE_PIXELS = int(os.getenv("SCN_MAX_IMAGE_PIXELS", "50000000"))
+# false (default): validar solo cabecera (el motor decodifica igualmente); true: además PIL verify() completo
+SCN_IMAGE_FULL_VERIFY = os.getenv("SCN_IMAGE_FULL_VERIFY", "false").lower() in ("1", "true", "yes")
+# Body completo (front + back + form): se corta mientras se lee, antes del parser multipart
+MAX_REQUEST_MB = float(os.getenv("SCN_MAX_REQUEST_MB", str(MAX_PAYLOAD_MB * 2 + 1)))
+MAX_REQUEST_BYTES = int(MAX_REQUEST_MB * 1024 * 1024)
+# Uploads de analyze: validar y reenviar al motor desde el spool de Starlette sin copiar a bytes
+SCN_FEATURE_GATEWAY_STREAM_UPLOADS = os.getenv("SCN_FEATURE_GATEWAY_STREAM_UPLOADS", "true").lower() in ("1", "true", "yes")
+
+# Respuestas de analyze/job: gzip/brotli según Accept-Encoding (por debajo del mínimo no compensa)
+SCN_FEATURE_GATEWAY_COMPRESSION = os.getenv("SCN_FEATURE_GATEWAY_COMPRESSION", "true").lower() in ("1", "true", "yes")
+SCN_COMPRESSION_MIN_BYTES = int(os.getenv("SCN_COMPRESSION_MIN_BYTES", "1024"))
+SCN_GZIP_LEVEL = int(os.getenv("SCN_GZIP_LEVEL", "6"))
+SCN_BROTLI_QUALITY = int(os.getenv("SCN_BROTLI_QUALITY", "5"))
+
+# Admission control delante del motor (AIMD + cola acotada -> 503 + Retry-After). Apagado por
+# defecto: el objetivo de latencia hay que fijarlo con la p99 real del motor (OCR incluido)
+SCN_FEATURE_GATEWAY_ADMISSION = os.getenv("SCN_FEATURE_GATEWAY_ADMISSION", "false").lower() in ("1", "true", "yes")
+SCN_ADMISSION_INITIAL_LIMIT = int(os.getenv("SCN_ADMISSION_INITIAL_LIMIT", "8"))
+SCN_ADMISSION_MIN_LIMIT = int(os.getenv("SCN_ADMISSION_MIN_LIMIT", "2"))
+SCN_ADMISSION_MAX_LIMIT = int(os.getenv("SCN_ADMISSION_MAX_LIMIT", "64"))
+SCN_ADMISSION_MAX_QUEUE = int(os.getenv("SCN_ADMISSION_MAX_QUEUE", "32"))
+SCN_ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("SCN_ADMISSION_QUEUE_TIMEOUT_S", "3"))
+SCN_ADMISSION_LATENCY_TARGET_MS = float(os.getenv("SCN_ADMISSION_LATENCY_TARGET_MS", "10000"))
+
+# Analyze idénticos concurrentes (doble tap, reintentos) comparten una llamada al motor
+SCN_FEATURE_GATEWAY_SINGLEFLIGHT = os.getenv("SCN_FEATURE_GATEWAY_SINGLEFLIGHT", "true").lower() in ("1", "true", "yes")
+# Caché de contratos normalizados (mismas imágenes + modo + vista + model_version del motor)
+SCN_FEATURE_GATEWAY_ANALYZE_CACHE = os.getenv("SCN_FEATURE_GATEWAY_ANALYZE_CACHE", "false").lower() in ("1", "true", "yes")
+SCN_ANALYZE_CACHE_MAX_ENTRIES = int(os.getenv("SCN_ANALYZE_CACHE_MAX_ENTRIES", "2048"))
+SCN_ANALYZE_CACHE_TTL_S = float(os.getenv("SCN_ANALYZE_CACHE_TTL_S", "600"))
+
+# Jobs: long-poll (?wait=) y SSE (/api/job/{id}/events) alimentados en proceso
+SCN_JOB_WAIT_MAX_S = float(os.getenv("SCN_JOB_WAIT_MAX_S", "30"))
+SCN_JOB_EVENTS_MAX_S = float(os.getenv("SCN_JOB_EVENTS_MAX_S", "120"))
+# Sin cambios en este intervalo: keepalive SSE y relectura de GCS (job procesado en otra réplica)
+SCN_JOB_EVENTS_HEARTBEAT_S = float(os.getenv("SCN_JOB_EVENTS_HEARTBEAT_S", "10"))
+SCN_JOB_EVENTS_MAX_JOBS = int(os.getenv("SCN_JOB_EVENTS_MAX_JOBS", "1024"))
+
+# Feedback en segmentos NDJSON (spool local con fsync -> GCS cada N segundos o MB, con manifest)
+SCN_FEATURE_GATEWAY_FEEDBACK_SEGMENTS = os.getenv("SCN_FEATURE_GATEWAY_FEEDBACK_SEGMENTS", "false").lower() in ("1", "true", "yes")
+SCN_FEEDBACK_SPOOL_DIR = os.getenv("SCN_FEEDBACK_SPOOL_DIR", "").strip() or os.path.join(
+    os.path.dirname(__file__), "..", ".feedback_spool"
+)
+SCN_FEEDBACK_SEGMENT_MAX_MB = float(os.getenv("SCN_FEEDBACK_SEGMENT_MAX_MB", "8"))
+SCN_FEEDBACK_SEGMENT_MAX_AGE_S = float(os.getenv("SCN_FEEDBACK_SEGMENT_MAX_AGE_S", "60"))
+# Prefijo de segmentos y manifest (default: hostname); el writer añade siempre un uuid4 por proceso
+SCN_INSTANCE_ID = (os.getenv("SCN_INSTANCE_ID") or os.getenv("HOSTNAME") or "").strip()
+
+# Trabajo CPU-bound (validación de imagen, JSON + normalize) fuera del event loop
+SCN_FEATURE_GATEWAY_CPU_OFFLOAD = os.getenv("SCN_FEATURE_GATEWAY_CPU_OFFLOAD", "true").lower() in ("1", "true", "yes")
+SCN_CPU_THREAD_WORKERS = int(os.getenv("SCN_CPU_THREAD_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 0 = sin pool de procesos (las etapas enrutadas a "process" van al pool de hilos)
+SCN_CPU_PROCESS_WORKERS = int(os.getenv("SCN_CPU_PROCESS_WORKERS", "0"))
+# etapa=inline|thread|process separadas por comas; etapas no listadas -> thread
+SCN_CPU_ROUTES = os.getenv("SCN_CPU_ROUTES", "image_validation=thread,normalize=thread,quality_precheck=thread,hash=thread,upload_copy=thread")
+# Monitor de lag del event loop (estado en /health)
+SCN_FEATURE_GATEWAY_LOOP_MONITOR = os.getenv("SCN_FEATURE_GATEWAY_LOOP_MONITOR", "true").lower() in ("1", "true", "yes")
+SCN_LOOP_MONITOR_INTERVAL_MS = float(os.getenv("SCN_LOOP_MONITOR_INTERVAL_MS", "50"))
+SCN_LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("SCN_LOOP_BLOCK_THRESHOLD_MS", "20"))
+SCN_LOOP_WARN_MS = float(os.getenv("SCN_LOOP_WARN_MS", "250"))
 
 WORKSHOP_LOGIN_EMAIL = (os.getenv("WORKSHOP_LOGIN_EMAIL") or "").strip()
 WORKSHOP_LOGIN_PASSWORD = (os.getenv("WORKSHOP_LOGIN_PASSWORD") or "").strip()
@@ -36,6 +144,27 @@ WORKSHOP_TOKEN = (os.getenv("WORKSHOP_TOKEN") or "").strip()
 SCN_LOCAL_DEV = os.getenv("SCN_LOCAL_DEV", "").lower() in ("1", "true", "yes")
 
 
+def parse_motor_urls(raw: str, fallback: str = "") -> List[Tuple[str, str]]:
+    """[(nombre, url)] desde MOTOR_URLS; sin MOTOR_URLS -> [("motor", MOTOR_URL)] si está definido."""
+    out: List[Tuple[str, str]] = []
+    for i, item in enumerate((raw or "").split(",")):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition("=")
+        if not sep or "://" in name:
+            name, url = f"motor{i}", item
+        out.append((name.strip(), url.strip().rstrip("/")))
+    if not out and fallback:
+        out.append(("motor", fallback))
+    return out
+
+
+MOTOR_BACKENDS = parse_motor_urls(MOTOR_URLS_RAW, MOTOR_URL)
+if not MOTOR_URL and MOTOR_BACKENDS:
+    MOTOR_URL = MOTOR_BACKENDS[0][1]
+
+
 def parse_api_keys(raw: str) -> Set[str]:
     parts = []
     for chunk in (raw or "").replace("\n", ";").replace(",", ";").split(";"):
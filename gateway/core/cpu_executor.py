@@ -0,0 +1,117 @@
+"""
+CPU executor — trabajo CPU-bound fuera del event loop, enrutado por etapa.
+- inline: en el loop (trabajo trivial o flag desactivado)
+- thread: pool de hilos (PIL, zlib, json sueltan el GIL en buena parte)
+- process: pool de procesos opcional; fn y argumentos tienen que ser picklables
+  (funciones de módulo, dicts/bytes). Sin workers de proceso cae al pool de hilos.
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .config import (
+    SCN_CPU_PROCESS_WORKERS,
+    SCN_CPU_ROUTES,
+    SCN_CPU_THREAD_WORKERS,
+    SCN_FEATURE_GATEWAY_CPU_OFFLOAD,
+)
+
+ROUTE_INLINE = "inline"
+ROUTE_THREAD = "thread"
+ROUTE_PROCESS = "process"
+_ROUTES = (ROUTE_INLINE, ROUTE_THREAD, ROUTE_PROCESS)
+
+
+def parse_routes(raw: str) -> Dict[str, str]:
+    """'a=thread,b=process' -> {"a": "thread", "b": "process"}; rutas desconocidas se ignoran."""
+    out: Dict[str, str] = {}
+    for item in (raw or "").split(","):
+        stage, _, route = item.partition("=")
+        stage, route = stage.strip(), route.strip().lower()
+        if stage and route in _ROUTES:
+            out[stage] = route
+    return out
+
+
+class CpuExecutor:
+    def __init__(
+        self,
+        routes: Optional[Dict[str, str]] = None,
+        thread_workers: int = SCN_CPU_THREAD_WORKERS,
+        process_workers: int = SCN_CPU_PROCESS_WORKERS,
+        enabled: bool = SCN_FEATURE_GATEWAY_CPU_OFFLOAD,
+    ):
+        self.routes = dict(routes or {})
+        self.enabled = enabled
+        self.thread_workers = max(1, int(thread_workers))
+        self.process_workers = max(0, int(process_workers))
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._procs: Optional[ProcessPoolExecutor] = None
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def route(self, stage: str) -> str:
+        if not self.enabled:
+            return ROUTE_INLINE
+        r = self.routes.get(stage, ROUTE_THREAD)
+        if r == ROUTE_PROCESS and not self.process_workers:
+            return ROUTE_THREAD
+        return r
+
+    def _pool(self, route: str):
+        if route == ROUTE_PROCESS:
+            if self._procs is None:
+                self._procs = ProcessPoolExecutor(max_workers=self.process_workers)
+            return self._procs
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="cpu")
+        return self._threads
+
+    async def run(self, stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        route = self.route(stage)
+        t0 = time.perf_counter()
+        try:
+            if route == ROUTE_INLINE:
+                return fn(*args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool(route), functools.partial(fn, *args, **kwargs))
+        finally:
+            self._record(stage, route, (time.perf_counter() - t0) * 1000.0)
+
+    def _record(self, stage: str, route: str, ms: float) -> None:
+        st = self._stats.get(stage)
+        if st is None:
+            st = self._stats[stage] = {"route": route, "calls": 0, "total_ms": 0.0, "max_ms": 0.0}
+        st["route"] = route
+        st["calls"] += 1
+        st["total_ms"] += ms
+        st["max_ms"] = max(st["max_ms"], ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "thread_workers": self.thread_workers,
+            "process_workers": self.process_workers,
+            "stages": {
+                k: {
+                    "route": v["route"],
+                    "calls": int(v["calls"]),
+                    "avg_ms": round(v["total_ms"] / v["calls"], 2) if v["calls"] else 0.0,
+                    "max_ms": round(v["max_ms"], 2),
+                }
+                for k, v in self._stats.items()
+            },
+        }
+
+
+_executor = CpuExecutor(parse_routes(SCN_CPU_ROUTES))
+
+
+def get_cpu_executor() -> CpuExecutor:
+    return _executor
+
+
+async def run_cpu(stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Ejecuta fn(*args, **kwargs) según la ruta de la etapa (ver SCN_CPU_ROUTES)."""
+    return await _executor.run(stage, fn, *args, **kwargs)
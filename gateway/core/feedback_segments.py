@@ -0,0 +1,346 @@
+"""
+Feedback segments — write-behind de /api/feedback en segmentos NDJSON.
+- append(): una línea al segmento abierto del spool local + fsync (el ack es durable en disco).
+  Group commit: las líneas que llegan mientras un fsync está en curso se escriben juntas en el
+  siguiente, y write+fsync corren en un hilo (el loop no se bloquea en disco)
+- Idempotencia: índice local en el spool (clave -> ruta del segmento, con TTL), sin GET/PUT a GCS
+  por evento; la clave va en la línea del segmento y sube con él
+- El segmento se sella al pasar de max_bytes o max_age_s y se sube a
+  {prefix}/segments/YYYY/MM/DD/<segmento>.ndjson en un hilo (no bloquea el loop)
+- Manifest por proceso y día ({prefix}/segments/YYYY/MM/DD/_manifest/<instancia>-<writer>.json)
+  con ruta, registros, bytes y sha256 de cada segmento. writer = uuid4 del proceso: en Cloud Run
+  el hostname se repite (localhost) y dos instancias no pueden compartir manifest ni nombres
+- Con segmentos la idempotencia es por instancia (índice del spool local), no global en GCS
+- Arranque: segmentos abiertos o sellados de un proceso anterior se suben en el siguiente flush
+Un solo event loop: sin locks; el estado solo se toca desde el loop (los hilos hacen E/S).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import (
+    FEEDBACK_PREFIX,
+    IDEMPOTENCY_TTL_SECONDS,
+    KEY_BUCKET,
+    SCN_FEEDBACK_SEGMENT_MAX_AGE_S,
+    SCN_FEEDBACK_SEGMENT_MAX_MB,
+    SCN_FEEDBACK_SPOOL_DIR,
+    SCN_INSTANCE_ID,
+)
+from .gcs_utils import gcs_get_json, gcs_ok, gcs_put_bytes, gcs_put_json
+
+_log = logging.getLogger(__name__)
+
+_OPEN_SUFFIX = ".ndjson.open"
+_SEALED_SUFFIX = ".ndjson"
+_IDEM_INDEX = "idempotency.idx"
+
+
+class FeedbackSegmentWriter:
+    def __init__(
+        self,
+        spool_dir: str = SCN_FEEDBACK_SPOOL_DIR,
+        instance_id: str = SCN_INSTANCE_ID,
+        bucket: str = KEY_BUCKET,
+        prefix: str = FEEDBACK_PREFIX,
+        max_bytes: int = int(SCN_FEEDBACK_SEGMENT_MAX_MB * 1024 * 1024),
+        max_age_s: float = SCN_FEEDBACK_SEGMENT_MAX_AGE_S,
+        put_bytes: Callable[[str, str, bytes, str], None] = gcs_put_bytes,
+        put_json: Callable[[str, str, Dict[str, Any]], None] = gcs_put_json,
+        get_json: Callable[[str, str], Dict[str, Any]] = gcs_get_json,
+        idempotency_ttl_s: float = IDEMPOTENCY_TTL_SECONDS,
+    ):
+        self.spool_dir = spool_dir
+        self.instance_id = instance_id or socket.gethostname() or "gateway"
+        self.writer_id = uuid.uuid4().hex[:12]
+        self.bucket = bucket
+        self.prefix = prefix
+        self.max_bytes = max(1, int(max_bytes))
+        self.max_age_s = max(0.1, float(max_age_s))
+        self._put_bytes = put_bytes
+        self._put_json = put_json
+        self._get_json = get_json
+        self._fh = None
+        self._name: Optional[str] = None
+        self._opened_at = 0.0
+        self._bytes = 0
+        self._records = 0
+        self._seq = 0
+        self._manifests: Dict[str, Dict[str, Any]] = {}
+        self._upload: Optional[asyncio.Future] = None
+        self._ticker: Optional[asyncio.Task] = None
+        self._pending: List[Tuple[bytes, Optional[str], asyncio.Future]] = []
+        self._committer: Optional[asyncio.Task] = None
+        self.idempotency_ttl_s = float(idempotency_ttl_s)
+        self._idem: Dict[str, Tuple[float, str]] = {}
+        self._idem_fh = None
+        self.commits_total = 0
+        self.records_total = 0
+        self.segments_uploaded = 0
+        self.upload_errors = 0
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._recover()
+
+    # ---------- Rutas ----------
+    def _segment_dp(self, name: str) -> str:
+        # <instancia>-<YYYYmmddTHHMMSS>-<writer><seq>: la fecha del nombre fija la carpeta del segmento
+        stamp = name.rsplit("-", 2)[-2]
+        return f"{stamp[0:4]}/{stamp[4:6]}/{stamp[6:8]}"
+
+    def segment_path(self, name: str) -> str:
+        return f"{self.prefix}/segments/{self._segment_dp(name)}/{name}.ndjson"
+
+    def manifest_path(self, dp: str) -> str:
+        return f"{self.prefix}/segments/{dp}/_manifest/{self.instance_id}-{self.writer_id}.json"
+
+    # ---------- Escritura ----------
+    def _recover(self) -> None:
+        """Segmentos abiertos de un proceso anterior: se sellan tal cual (cada línea ya tuvo fsync)."""
+        for fn in os.listdir(self.spool_dir):
+            if fn.endswith(_OPEN_SUFFIX):
+                src = os.path.join(self.spool_dir, fn)
+                os.replace(src, src[: -len(_OPEN_SUFFIX)] + _SEALED_SUFFIX)
+        self._load_idempotency()
+
+    def _load_idempotency(self) -> None:
+        """Carga el índice de claves y lo reescribe sin las caducadas (o líneas a medias)."""
+        path = os.path.join(self.spool_dir, _IDEM_INDEX)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return
+        cutoff = time.time() - self.idempotency_ttl_s
+        for line in raw.splitlines():
+            try:
+                rec = json.loads(line)
+                if rec["t"] >= cutoff:
+                    self._idem[rec["k"]] = (rec["t"], rec["path"])
+            except (ValueError, KeyError, TypeError):
+                continue
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            for k, (t, seg) in self._idem.items():
+                f.write(self._idem_line(k, t, seg))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _idem_line(key: str, t: float, path: str) -> bytes:
+        return json.dumps({"k": key, "t": t, "path": path}, separators=(",", ":")).encode("utf-8") + b"\n"
+
+    def seen(self, key: str) -> Optional[str]:
+        """Ruta del segmento donde ya se guardó el evento con esta clave (None si no o caducó)."""
+        hit = self._idem.get(key)
+        if hit is None:
+            return None
+        if time.time() - hit[0] > self.idempotency_ttl_s:
+            del self._idem[key]
+            return None
+        return hit[1]
+
+    def _open(self) -> None:
+        now = time.time()
+        stamp = datetime.fromtimestamp(now, timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self._seq += 1
+        self._name = f"{self.instance_id}-{stamp}-{self.writer_id}{self._seq:06d}"
+        self._fh = open(os.path.join(self.spool_dir, self._name + _OPEN_SUFFIX), "ab")
+        self._opened_at = now
+        self._bytes = 0
+        self._records = 0
+
+    async def append(self, record: Dict[str, Any], idempotency_key: Optional[str] = None) -> str:
+        """
+        Añade el evento al segmento abierto y espera a su fsync; devuelve la ruta GCS final del
+        segmento. Con idempotency_key la clave queda en la línea y en el índice local.
+        """
+        if idempotency_key:
+            record = {**record, "idempotency_key": idempotency_key}
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((line, idempotency_key or None, fut))
+        if self._committer is None or self._committer.done():
+            self._committer = loop.create_task(self._commit_loop())
+        return await fut
+
+    async def _commit_loop(self) -> None:
+        """Group commit: vacía lo encolado en un write+fsync por vuelta (en un hilo)."""
+        while self._pending:
+            batch, self._pending = self._pending, []
+            if self._fh is None:
+                self._open()
+            path = self.segment_path(self._name)
+            now = time.time()
+            data = b"".join(line for line, _k, _f in batch)
+            idem = b"".join(self._idem_line(k, now, path) for _l, k, _f in batch if k)
+            try:
+                await asyncio.to_thread(self._write_durable, self._fh, data, idem)
+            except Exception as e:
+                _log.warning("feedback_segments_write_failed: %s", e)
+                for _l, _k, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.commits_total += 1
+            self._bytes += len(data)
+            self._records += len(batch)
+            self.records_total += len(batch)
+            for _l, k, fut in batch:
+                if k:
+                    self._idem[k] = (now, path)
+                if not fut.done():
+                    fut.set_result(path)
+            if self._bytes >= self.max_bytes:
+                self.seal()
+
+    def _write_durable(self, fh, data: bytes, idem: bytes) -> None:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+        if idem:
+            if self._idem_fh is None:
+                self._idem_fh = open(os.path.join(self.spool_dir, _IDEM_INDEX), "ab")
+            self._idem_fh.write(idem)
+            self._idem_fh.flush()
+            os.fsync(self._idem_fh.fileno())
+
+    async def _drain(self) -> None:
+        """Espera a que no haya ningún write+fsync en curso (antes de sellar desde fuera)."""
+        while self._committer is not None and not self._committer.done():
+            await asyncio.shield(self._committer)
+
+    def seal(self) -> Optional[str]:
+        """Cierra el segmento abierto (si tiene algo) y lo deja listo para subir."""
+        if self._fh is None:
+            return None
+        self._fh.close()
+        self._fh = None
+        src = os.path.join(self.spool_dir, self._name + _OPEN_SUFFIX)
+        os.replace(src, src[: -len(_OPEN_SUFFIX)] + _SEALED_SUFFIX)
+        return self._name
+
+    def due(self) -> bool:
+        return self._fh is not None and time.time() - self._opened_at >= self.max_age_s
+
+    def sealed(self) -> List[str]:
+        return sorted(fn[: -len(_SEALED_SUFFIX)] for fn in os.listdir(self.spool_dir) if fn.endswith(_SEALED_SUFFIX))
+
+    # ---------- Subida ----------
+    def _manifest(self, dp: str) -> Dict[str, Any]:
+        m = self._manifests.get(dp)
+        if m is None:
+            try:
+                m = self._get_json(self.bucket, self.manifest_path(dp))
+            except FileNotFoundError:
+                m = {}
+            m.setdefault("instance", self.instance_id)
+            m.setdefault("writer", self.writer_id)
+            m.setdefault("segments", [])
+            self._manifests = {dp: m}  # solo el día en curso en memoria
+        return m
+
+    def upload_sealed(self) -> int:
+        """Sube los segmentos sellados y actualiza el manifest del día (síncrono, corre en un hilo)."""
+        if not gcs_ok():
+            return 0
+        done = 0
+        for name in self.sealed():
+            local = os.path.join(self.spool_dir, name + _SEALED_SUFFIX)
+            with open(local, "rb") as f:
+                data = f.read()
+            path = self.segment_path(name)
+            if data:
+                self._put_bytes(self.bucket, path, data, "application/x-ndjson")
+                dp = self._segment_dp(name)
+                m = self._manifest(dp)
+                if not any(s.get("path") == path for s in m["segments"]):
+                    m["segments"].append(
+                        {
+                            "path": path,
+                            "records": data.count(b"\n"),
+                            "bytes": len(data),
+                            "sha256": hashlib.sha256(data).hexdigest(),
+                            "uploaded_at": datetime.now(timezone.utc).isoformat(),
+                        }
+                    )
+                    m["updated_at"] = datetime.now(timezone.utc).isoformat()
+                    self._put_json(self.bucket, self.manifest_path(dp), m)
+            os.remove(local)
+            self.segments_uploaded += 1
+            done += 1
+        return done
+
+    async def flush(self, force: bool = False) -> int:
+        """Sella el segmento si toca (o force) y sube los sellados; una sola subida a la vez."""
+        if force or self.due():
+            await self._drain()
+            self.seal()
+        if self._upload is not None and not self._upload.done():
+            if not force:
+                return 0
+            # Apagado: esperar a la subida en curso (el hilo sigue aunque se cancele el ticker)
+            await asyncio.wait([self._upload])
+        if not self.sealed():
+            return 0
+        self._upload = asyncio.ensure_future(asyncio.to_thread(self.upload_sealed))
+        try:
+            return await asyncio.shield(self._upload)
+        except Exception as e:
+            self.upload_errors += 1
+            _log.warning("feedback_segments_upload_failed: %s", e)
+            return 0
+
+    def ensure_ticker(self) -> None:
+        """Task periódica de flush en el loop actual (arranque de la app o primer evento)."""
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.get_running_loop().create_task(self._tick())
+
+    async def _tick(self) -> None:
+        while True:
+            # Primera vuelta inmediata: sube lo que dejó sellado un proceso anterior
+            await self.flush()
+            await asyncio.sleep(min(self.max_age_s, 5.0))
+
+    async def close(self) -> int:
+        """Apagado: para el ticker, sella el segmento abierto y sube lo pendiente."""
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        n = await self.flush(force=True)
+        if self._idem_fh is not None:
+            self._idem_fh.close()
+            self._idem_fh = None
+        return n
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "instance_id": self.instance_id,
+            "writer_id": self.writer_id,
+            "open_records": self._records if self._fh is not None else 0,
+            "open_bytes": self._bytes if self._fh is not None else 0,
+            "sealed_pending": len(self.sealed()),
+            "records_total": self.records_total,
+            "commits_total": self.commits_total,
+            "idempotency_keys": len(self._idem),
+            "segments_uploaded": self.segments_uploaded,
+            "upload_errors": self.upload_errors,
+        }
+
+
+_writer: Optional[FeedbackSegmentWriter] = None
+
+
+def get_feedback_writer() -> FeedbackSegmentWriter:
+    global _writer
+    if _writer is None:
+        _writer = FeedbackSegmentWriter()
+    return _writer
@@ -1,10 +1,12 @@
-"""GCS helpers — put/get JSON, put/get bytes, find_job_path."""
+"""GCS helpers — put/get JSON, put/get bytes, find_job_path. Cada llamada a GCS pasa por gcs_op (/metrics)."""
 import json
 import hashlib
 import os
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any
 
+from common.timings import gcs_op
+
 from .config import KEY_BUCKET, JOB_PREFIX, SCN_LOCAL_DEV
 
 try:
@@ -38,10 +40,11 @@ def gcs_put_json(bucket: str, path: str, obj: Dict[str, Any]):
         raise RuntimeError("GCS no disponible (modo local)")
     b = _gcs.bucket(bucket)
     blob = b.blob(path)
-    blob.upload_from_string(
-        json.dumps(obj, ensure_ascii=False).encode("utf-8"),
-        content_type="application/json; charset=utf-8",
-    )
+    with gcs_op("upload"):
+        blob.upload_from_string(
+            json.dumps(obj, ensure_ascii=False).encode("utf-8"),
+            content_type="application/json; charset=utf-8",
+        )
 
 
 def gcs_get_json(bucket: str, path: str) -> Dict[str, Any]:
@@ -49,9 +52,13 @@ def gcs_get_json(bucket: str, path: str) -> Dict[str, Any]:
         raise FileNotFoundError("GCS no disponible (modo local)")
     b = _gcs.bucket(bucket)
     blob = b.blob(path)
-    if not blob.exists():
+    with gcs_op("exists"):
+        found = blob.exists()
+    if not found:
         raise FileNotFoundError(path)
-    return json.loads(blob.download_as_bytes().decode("utf-8"))
+    with gcs_op("download"):
+        raw = blob.download_as_bytes()
+    return json.loads(raw.decode("utf-8"))
 
 
 def gcs_put_bytes(bucket: str, path: str, data: bytes, content_type: str = "image/jpeg"):
@@ -59,7 +66,8 @@ def gcs_put_bytes(bucket: str, path: str, data: bytes, content_type: str = "imag
         raise RuntimeError("GCS no disponible (modo local)")
     b = _gcs.bucket(bucket)
     blob = b.blob(path)
-    blob.upload_from_string(data, content_type=content_type)
+    with gcs_op("upload"):
+        blob.upload_from_string(data, content_type=content_type)
 
 
 def gcs_get_bytes(bucket: str, path: str) -> bytes:
@@ -67,9 +75,12 @@ def gcs_get_bytes(bucket: str, path: str) -> bytes:
         raise FileNotFoundError("GCS no disponible (modo local)")
     b = _gcs.bucket(bucket)
     blob = b.blob(path)
-    if not blob.exists():
+    with gcs_op("exists"):
+        found = blob.exists()
+    if not found:
         raise FileNotFoundError(path)
-    return blob.download_as_bytes()
+    with gcs_op("download"):
+        return blob.download_as_bytes()
 
 
 def find_job_path(bucket: str, job_id: str, job_prefix: str, lookback_days: int = 14) -> str:
@@ -80,6 +91,45 @@ def find_job_path(bucket: str, job_id: str, job_prefix: str, lookback_days: int
     for i in range(lookback_days + 1):
         dp = date_prefix(now - timedelta(days=i))
         p = f"{job_prefix}/{dp}/{job_id}.json"
-        if b.blob(p).exists():
+        with gcs_op("exists"):
+            found = b.blob(p).exists()
+        if found:
             return p
     raise FileNotFoundError(job_id)
+
+
+def gcs_stat(bucket: str, path: str):
+    """(size, content_type) del objeto o None si no existe."""
+    if not _gcs:
+        raise FileNotFoundError("GCS no disponible (modo local)")
+    with gcs_op("stat"):
+        blob = _gcs.bucket(bucket).get_blob(path)
+    if blob is None:
+        return None
+    return int(blob.size or 0), blob.content_type
+
+
+def gcs_signed_put_url(bucket: str, path: str, content_type: str, max_bytes: int, expires_s: int) -> str:
+    """
+    URL V4 firmada para PUT directo del cliente. La firma fija Content-Type y
+    x-goog-content-length-range: el cliente debe mandar ambas cabeceras tal cual.
+    Con credenciales sin clave privada (Cloud Run) se firma vía IAM signBlob.
+    """
+    if not _gcs:
+        raise RuntimeError("GCS no disponible (modo local)")
+    kwargs = {}
+    creds = _gcs._credentials
+    if not hasattr(creds, "signer"):
+        import google.auth.transport.requests
+
+        if not creds.valid:
+            creds.refresh(google.auth.transport.requests.Request())
+        kwargs = {"service_account_email": creds.service_account_email, "access_token": creds.token}
+    return _gcs.bucket(bucket).blob(path).generate_signed_url(
+        version="v4",
+        expiration=timedelta(seconds=expires_s),
+        method="PUT",
+        content_type=content_type,
+        headers={"x-goog-content-length-range": f"1,{max_bytes}"},
+        **kwargs,
+    )
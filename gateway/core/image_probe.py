@@ -0,0 +1,97 @@
+"""Image probe — formato y dimensiones leyendo solo la cabecera (JPEG SOF, PNG IHDR, WebP VP8*)."""
+import struct
+from typing import BinaryIO, Tuple
+
+# SOF0..SOF15 salvo DHT (C4), JPG (C8) y DAC (CC)
+_JPEG_SOF = frozenset((0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF))
+# Marcadores sin longitud (TEM, RST0..7)
+_JPEG_STANDALONE = frozenset([0x01] + list(range(0xD0, 0xD8)))
+# Tope de segmentos recorridos antes de encontrar SOF (EXIF/ICC/XMP grandes se saltan con seek)
+_JPEG_MAX_SEGMENTS = 256
+
+
+class ImageHeaderError(ValueError):
+    """Cabecera ausente, truncada o de un formato no soportado."""
+
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    b = f.read(n)
+    if len(b) != n:
+        raise ImageHeaderError("cabecera truncada")
+    return b
+
+
+def _probe_jpeg(f: BinaryIO) -> Tuple[int, int]:
+    for _ in range(_JPEG_MAX_SEGMENTS):
+        b = _read_exact(f, 1)
+        if b[0] != 0xFF:
+            raise ImageHeaderError("marcador JPEG inválido")
+        marker = 0xFF
+        while marker == 0xFF:  # bytes de relleno
+            marker = _read_exact(f, 1)[0]
+        if marker in _JPEG_STANDALONE:
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / SOS antes de SOF
+            raise ImageHeaderError("JPEG sin SOF")
+        (length,) = struct.unpack(">H", _read_exact(f, 2))
+        if length < 2:
+            raise ImageHeaderError("segmento JPEG inválido")
+        if marker in _JPEG_SOF:
+            _precision, h, w = struct.unpack(">BHH", _read_exact(f, 5))
+            return w, h
+        f.seek(length - 2, 1)
+    raise ImageHeaderError("demasiados segmentos JPEG antes de SOF")
+
+
+def _probe_png(f: BinaryIO) -> Tuple[int, int]:
+    _length, ctype = struct.unpack(">I4s", _read_exact(f, 8))
+    if ctype != b"IHDR":
+        raise ImageHeaderError("PNG sin IHDR")
+    w, h = struct.unpack(">II", _read_exact(f, 8))
+    return w, h
+
+
+def _probe_webp(f: BinaryIO) -> Tuple[int, int]:
+    ctype, _size = struct.unpack("<4sI", _read_exact(f, 8))
+    if ctype == b"VP8 ":
+        data = _read_exact(f, 10)
+        if data[3:6] != b"\x9d\x01\x2a":
+            raise ImageHeaderError("VP8 sin start code")
+        w, h = struct.unpack("<HH", data[6:10])
+        return w & 0x3FFF, h & 0x3FFF
+    if ctype == b"VP8L":
+        data = _read_exact(f, 5)
+        if data[0] != 0x2F:
+            raise ImageHeaderError("VP8L sin firma")
+        bits = int.from_bytes(data[1:5], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if ctype == b"VP8X":
+        data = _read_exact(f, 10)
+        w = int.from_bytes(data[4:7], "little") + 1
+        h = int.from_bytes(data[7:10], "little") + 1
+        return w, h
+    raise ImageHeaderError(f"chunk WebP no soportado: {ctype!r}")
+
+
+def probe_image(f: BinaryIO) -> Tuple[str, int, int]:
+    """
+    Devuelve (format, width, height) leyendo solo la cabecera desde la posición 0.
+    format: "jpeg" | "png" | "webp". Lanza ImageHeaderError si no es imagen soportada.
+    No decodifica píxeles: un cuerpo corrupto tras la cabecera no se detecta aquí.
+    """
+    f.seek(0)
+    head = f.read(12)
+    if head[:3] == b"\xff\xd8\xff":
+        f.seek(2)
+        fmt, (w, h) = "jpeg", _probe_jpeg(f)
+    elif head[:8] == b"\x89PNG\r\n\x1a\n":
+        f.seek(8)
+        fmt, (w, h) = "png", _probe_png(f)
+    elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        f.seek(12)
+        fmt, (w, h) = "webp", _probe_webp(f)
+    else:
+        raise ImageHeaderError("formato no reconocido")
+    if w <= 0 or h <= 0:
+        raise ImageHeaderError(f"dimensiones inválidas: {w}x{h}")
+    return fmt, w, h
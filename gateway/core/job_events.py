@@ -0,0 +1,99 @@
+"""
+Job events — notificación en proceso de cambios de estado de jobs.
+- Último estado conocido y ruta GCS por job (LRU acotado): polls/SSE leen de memoria
+- Cada escritura del job publica una versión nueva y despierta a los que esperan
+- Procesamiento por job deduplicado en este proceso (una sola task por job)
+Solo cubre la instancia actual: otra réplica vuelve a leer de GCS.
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import SCN_JOB_EVENTS_MAX_JOBS
+
+TERMINAL_STATUSES = ("done", "error")
+
+
+class _Entry:
+    __slots__ = ("path", "job", "version", "changed")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.job: Optional[Dict[str, Any]] = None
+        self.version = 0
+        self.changed = asyncio.Event()
+
+
+class JobHub:
+    def __init__(self, max_jobs: int = SCN_JOB_EVENTS_MAX_JOBS):
+        self.max_jobs = max(1, int(max_jobs))
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _entry(self, job_id: str, path: Optional[str] = None) -> Optional[_Entry]:
+        e = self._entries.get(job_id)
+        if e is None:
+            if path is None:
+                return None
+            e = _Entry(path)
+            self._entries[job_id] = e
+            while len(self._entries) > self.max_jobs:
+                self._entries.popitem(last=False)
+        elif path:
+            e.path = path
+        self._entries.move_to_end(job_id)
+        return e
+
+    def path(self, job_id: str) -> Optional[str]:
+        e = self._entries.get(job_id)
+        return e.path if e else None
+
+    def get(self, job_id: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+        e = self._entries.get(job_id)
+        if e is None or e.job is None:
+            return 0, None
+        return e.version, dict(e.job)
+
+    def publish(self, job_id: str, path: str, job: Dict[str, Any]) -> int:
+        """Registra el estado escrito/leído; si cambió, nueva versión y despierta a los que esperan."""
+        e = self._entry(job_id, path)
+        if e.job == job:
+            return e.version
+        e.job = dict(job)
+        e.version += 1
+        old, e.changed = e.changed, asyncio.Event()
+        old.set()
+        return e.version
+
+    async def wait_for_change(self, job_id: str, since_version: int, timeout_s: float) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Devuelve en cuanto haya versión > since_version, o el estado actual al expirar."""
+        e = self._entries.get(job_id)
+        if e is None:
+            return 0, None
+        if e.version <= since_version and timeout_s > 0:
+            try:
+                await asyncio.wait_for(e.changed.wait(), timeout=timeout_s)
+            except asyncio.TimeoutError:
+                pass
+        return self.get(job_id)
+
+    # ---------- Procesamiento deduplicado ----------
+    def is_processing(self, job_id: str) -> bool:
+        t = self._tasks.get(job_id)
+        return t is not None and not t.done()
+
+    def ensure_processing(self, job_id: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Lanza fn() como task si no hay una en curso para el job; devuelve la task."""
+        t = self._tasks.get(job_id)
+        if t is None or t.done():
+            t = asyncio.ensure_future(fn())
+            self._tasks[job_id] = t
+            t.add_done_callback(lambda _t, k=job_id: self._tasks.pop(k, None) if self._tasks.get(k) is _t else None)
+        return t
+
+
+_hub = JobHub()
+
+
+def get_job_hub() -> JobHub:
+    return _hub
@@ -0,0 +1,26 @@
+"""JSON response — render con orjson si está instalado (compacto, UTF-8), fallback a Starlette."""
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Misma salida que JSONResponse (compacta, ensure_ascii=False) pero ~5-10x más rápida
+    con orjson. Tipos que orjson no serializa -> render estándar de Starlette.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(content, option=_ORJSON_OPTS)
+            except TypeError:
+                pass
+        return super().render(content)
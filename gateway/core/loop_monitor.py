@@ -0,0 +1,76 @@
+"""
+Loop monitor — lag del event loop (cuánto tarda en despertar un sleep de intervalo fijo).
+Un lag alto es trabajo síncrono bloqueando el loop: todas las peticiones concurrentes
+esperan detrás (head-of-line). Ventana de las últimas muestras para p50/p99 y acumulado
+de tiempo bloqueado por encima del umbral.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from .config import SCN_LOOP_BLOCK_THRESHOLD_MS, SCN_LOOP_MONITOR_INTERVAL_MS, SCN_LOOP_WARN_MS
+
+_log = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    def __init__(
+        self,
+        interval_ms: float = SCN_LOOP_MONITOR_INTERVAL_MS,
+        block_threshold_ms: float = SCN_LOOP_BLOCK_THRESHOLD_MS,
+        warn_ms: float = SCN_LOOP_WARN_MS,
+        window: int = 1200,
+    ):
+        self.interval_s = max(0.001, interval_ms / 1000.0)
+        self.block_threshold_ms = block_threshold_ms
+        self.warn_ms = warn_ms
+        self._lags: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.max_ms = 0.0
+        self.blocked_ms_total = 0.0
+        self.blocked_events = 0
+
+    def ensure_started(self) -> None:
+        """Arranca la task en el loop actual (idempotente; se llama en cada petición)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def record(self, lag_ms: float) -> None:
+        lag_ms = max(0.0, lag_ms)
+        self._lags.append(lag_ms)
+        self.max_ms = max(self.max_ms, lag_ms)
+        if lag_ms >= self.block_threshold_ms:
+            self.blocked_ms_total += lag_ms
+            self.blocked_events += 1
+        if lag_ms >= self.warn_ms:
+            _log.warning("event_loop_blocked", extra={"lag_ms": round(lag_ms, 1)})
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t = loop.time()
+            await asyncio.sleep(self.interval_s)
+            self.record((loop.time() - t - self.interval_s) * 1000.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        lags = sorted(self._lags)
+
+        def _pct(p: float) -> float:
+            return round(lags[min(len(lags) - 1, int(p * len(lags)))], 2) if lags else 0.0
+
+        return {
+            "samples": len(lags),
+            "lag_ms_p50": _pct(0.50),
+            "lag_ms_p99": _pct(0.99),
+            "lag_ms_max": round(self.max_ms, 2),
+            "blocked_ms_total": round(self.blocked_ms_total, 1),
+            "blocked_events": self.blocked_events,
+        }
+
+
+_monitor = LoopLagMonitor()
+
+
+def get_loop_monitor() -> LoopLagMonitor:
+    return _monitor
@@ -0,0 +1,225 @@
+"""
+Motor pool — varios backends de motor detrás del gateway (MOTOR_URLS).
+- Elección: least_outstanding (menos peticiones en vuelo; empate -> menor latencia EWMA)
+  o ewma (latencia EWMA x (en vuelo + 1))
+- Expulsión pasiva: eject_after fallos seguidos (red o 5xx) -> fuera durante eject_s
+- Chequeo activo: GET /ready de cada backend cada health_interval_s (solo con más de uno)
+- Si todos están caídos se elige igualmente entre todos (mejor intentar que 503 seguro)
+- Afinidad opcional (acquire con key): rendezvous hashing sobre la huella de la imagen, con
+  carga acotada (no más de load_factor x media en vuelo); añadir una réplica solo mueve ~1/n claves
+Un solo event loop: sin locks.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+from .config import (
+    MOTOR_BACKENDS,
+    SCN_MOTOR_AFFINITY_LOAD_FACTOR,
+    SCN_MOTOR_EJECT_AFTER,
+    SCN_MOTOR_EJECT_S,
+    SCN_MOTOR_HEALTH_INTERVAL_S,
+    SCN_MOTOR_LB_STRATEGY,
+)
+
+_log = logging.getLogger(__name__)
+_EWMA_ALPHA = 0.3
+_FINGERPRINT_SPAN = 64 * 1024
+STRATEGIES = ("least_outstanding", "ewma")
+
+
+class Backend:
+    __slots__ = (
+        "name", "url", "outstanding", "ewma_ms", "ready", "consecutive_failures",
+        "ejected_until", "requests", "failures", "ejections", "_seed",
+    )
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.outstanding = 0
+        self.ewma_ms: Optional[float] = None
+        self.ready = True
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        # Por nombre (no url): renombrar hosts no mueve las claves
+        self._seed = name.encode("utf-8")
+
+
+class MotorPool:
+    def __init__(
+        self,
+        backends: Sequence[Tuple[str, str]],
+        strategy: str = SCN_MOTOR_LB_STRATEGY,
+        eject_after: int = SCN_MOTOR_EJECT_AFTER,
+        eject_s: float = SCN_MOTOR_EJECT_S,
+        health_interval_s: float = SCN_MOTOR_HEALTH_INTERVAL_S,
+        affinity_load_factor: float = SCN_MOTOR_AFFINITY_LOAD_FACTOR,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backends: List[Backend] = [Backend(n, u) for n, u in backends]
+        self.strategy = strategy if strategy in STRATEGIES else STRATEGIES[0]
+        self.eject_after = max(1, int(eject_after))
+        self.eject_s = float(eject_s)
+        self.health_interval_s = float(health_interval_s)
+        self.affinity_load_factor = max(1.0, float(affinity_load_factor))
+        self.affinity_hits = 0
+        self.affinity_spills = 0
+        self._clock = clock
+        self._health_task: Optional[asyncio.Task] = None
+
+    def _available(self, exclude: Iterable[Backend]) -> List[Backend]:
+        now = self._clock()
+        excluded = set(id(b) for b in exclude)
+        cands = [b for b in self.backends if id(b) not in excluded] or list(self.backends)
+        up = [b for b in cands if b.ready and b.ejected_until <= now]
+        return up or cands
+
+    def _cost(self, b: Backend) -> Tuple[float, float]:
+        ewma = b.ewma_ms if b.ewma_ms is not None else 0.0
+        if self.strategy == "ewma":
+            return (ewma * (b.outstanding + 1), b.outstanding)
+        return (b.outstanding, ewma)
+
+    def _by_affinity(self, key: str, cands: List[Backend]) -> Backend:
+        """Primera del ranking rendezvous para key con hueco bajo el límite de carga."""
+        k = key.encode("utf-8")
+        ranked = sorted(
+            cands,
+            key=lambda b: hashlib.blake2b(k, digest_size=8, key=b._seed).digest(),
+            reverse=True,
+        )
+        total = sum(b.outstanding for b in cands) + 1
+        cap = math.ceil(self.affinity_load_factor * total / len(cands))
+        for i, b in enumerate(ranked):
+            if b.outstanding + 1 <= cap:
+                if i == 0:
+                    self.affinity_hits += 1
+                else:
+                    self.affinity_spills += 1
+                return b
+        self.affinity_spills += 1
+        return min(cands, key=self._cost)
+
+    def acquire(self, exclude: Iterable[Backend] = (), key: Optional[str] = None) -> Backend:
+        """Elige backend y cuenta la petición en vuelo (liberar con release); key -> afinidad."""
+        if not self.backends:
+            raise RuntimeError("sin backends de motor")
+        self.ensure_health_task()
+        cands = self._available(exclude)
+        b = self._by_affinity(key, cands) if key and len(cands) > 1 else min(cands, key=self._cost)
+        b.outstanding += 1
+        b.requests += 1
+        return b
+
+    def release(self, b: Backend, latency_s: float, ok: bool) -> None:
+        b.outstanding = max(0, b.outstanding - 1)
+        if ok:
+            ms = latency_s * 1000.0
+            b.ewma_ms = ms if b.ewma_ms is None else (1 - _EWMA_ALPHA) * b.ewma_ms + _EWMA_ALPHA * ms
+            b.consecutive_failures = 0
+            return
+        b.failures += 1
+        b.consecutive_failures += 1
+        if b.consecutive_failures >= self.eject_after and len(self.backends) > 1:
+            b.ejected_until = self._clock() + self.eject_s
+            b.consecutive_failures = 0
+            b.ejections += 1
+            _log.warning("motor_backend_ejected", extra={"backend": b.name, "eject_s": self.eject_s})
+
+    # ---------- Chequeo activo ----------
+    def ensure_health_task(self) -> None:
+        if len(self.backends) < 2 or self.health_interval_s <= 0:
+            return
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def check_once(self, headers_for: Callable[[str], Dict[str, str]]) -> None:
+        """GET /ready en todos los backends (en paralelo); ready=False si no contesta 200."""
+        async with httpx.AsyncClient(timeout=httpx.Timeout(min(self.health_interval_s, 2.0) or 2.0)) as client:
+
+            async def _one(b: Backend):
+                try:
+                    r = await client.get(f"{b.url}/ready", headers=headers_for(b.url))
+                    ok = r.status_code == 200
+                except Exception:
+                    ok = False
+                if ok != b.ready:
+                    _log.info("motor_backend_ready_changed", extra={"backend": b.name, "ready": ok})
+                b.ready = ok
+
+            await asyncio.gather(*(_one(b) for b in self.backends))
+
+    async def _health_loop(self) -> None:
+        from .security import get_auth_headers
+
+        while True:
+            try:
+                await self.check_once(get_auth_headers)
+            except Exception as e:
+                _log.warning("motor_health_check_failed: %s", e)
+            await asyncio.sleep(self.health_interval_s)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = self._clock()
+        return {
+            "strategy": self.strategy,
+            "affinity": {"hits": self.affinity_hits, "spills": self.affinity_spills},
+            "backends": [
+                {
+                    "name": b.name,
+                    "url": b.url,
+                    "ready": b.ready,
+                    "ejected": b.ejected_until > now,
+                    "outstanding": b.outstanding,
+                    "ewma_ms": round(b.ewma_ms, 1) if b.ewma_ms is not None else None,
+                    "requests": b.requests,
+                    "failures": b.failures,
+                    "ejections": b.ejections,
+                }
+                for b in self.backends
+            ],
+        }
+
+
+def image_fingerprint(body: Any) -> Optional[str]:
+    """
+    Huella barata de una imagen (bytes o spool) para la afinidad: tamaño + primeros y
+    últimos 64 KiB. No lee el fichero entero; el reintento de la misma subida coincide.
+    """
+    if body is None:
+        return None
+    h = hashlib.blake2b(digest_size=12)
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        mv = memoryview(body)
+        h.update(len(mv).to_bytes(8, "big"))
+        h.update(mv[:_FINGERPRINT_SPAN])
+        h.update(mv[-_FINGERPRINT_SPAN:])
+        return h.hexdigest()
+    pos = body.tell()
+    try:
+        body.seek(0, 2)
+        size = body.tell()
+        h.update(size.to_bytes(8, "big"))
+        body.seek(0)
+        h.update(body.read(_FINGERPRINT_SPAN))
+        body.seek(max(0, size - _FINGERPRINT_SPAN))
+        h.update(body.read(_FINGERPRINT_SPAN))
+    finally:
+        body.seek(pos)
+    return h.hexdigest()
+
+
+_pool = MotorPool(MOTOR_BACKENDS)
+
+
+def get_motor_pool() -> MotorPool:
+    return _pool
@@ -1,11 +1,122 @@
-"""Motor proxy — _motor_post, _motor_get."""
-from typing import Optional
+"""Motor proxy — _motor_post, _motor_get, motor_stream."""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
 import httpx
 from fastapi import Request, HTTPException
 
-from .config import MOTOR_URL, TIMEOUT
+from common import tracing
+from common.deadline import BUDGET_HEADER
+from common.internal_frame import CONTENT_TYPE as FRAME_CONTENT_TYPE, encode_header
+
+from .admission import MotorOverloaded, get_limiter
+from .motor_pool import get_motor_pool, image_fingerprint
+from .config import (
+    MOTOR_URL,
+    TIMEOUT,
+    SCN_FEATURE_GATEWAY_ADMISSION,
+    SCN_MOTOR_TRANSPORT,
+    SCN_MOTOR_UDS,
+    SCN_MOTOR_MAX_KEEPALIVE,
+    SCN_FEATURE_GATEWAY_DEADLINE_HEADER,
+    SCN_FEATURE_GATEWAY_MOTOR_AFFINITY,
+)
 from .security import get_auth_headers
 
+# Transporte "frame": ruta pública -> ruta interna del motor que acepta application/x-scn-frame
+_FRAME_PATHS = {"/api/analyze-key": "/internal/analyze-key"}
+_FRAME_CHUNK = 64 * 1024
+# Intentos de POST (el segundo va a otro backend): el gateway espera como mucho TIMEOUT por intento
+_POST_ATTEMPTS = 2
+
+_frame_client: Optional[httpx.AsyncClient] = None
+_frame_client_loop = None
+
+
+def _use_frame(path: str) -> bool:
+    return SCN_MOTOR_TRANSPORT == "frame" and path in _FRAME_PATHS
+
+
+def _get_frame_client() -> httpx.AsyncClient:
+    """Cliente persistente (keep-alive; UDS si SCN_MOTOR_UDS) ligado al event loop actual."""
+    global _frame_client, _frame_client_loop
+    loop = asyncio.get_running_loop()
+    if _frame_client is None or _frame_client.is_closed or _frame_client_loop is not loop:
+        transport = httpx.AsyncHTTPTransport(uds=SCN_MOTOR_UDS) if SCN_MOTOR_UDS else None
+        _frame_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(TIMEOUT),
+            transport=transport,
+            limits=httpx.Limits(max_keepalive_connections=SCN_MOTOR_MAX_KEEPALIVE),
+        )
+        _frame_client_loop = loop
+    return _frame_client
+
+
+@asynccontextmanager
+async def _client_for(path: str):
+    if _use_frame(path):
+        yield _get_frame_client()
+    else:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(TIMEOUT)) as client:
+            yield client
+
+
+def _part_size(body) -> int:
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    body.seek(0, os.SEEK_END)
+    size = body.tell()
+    body.seek(0)
+    return size
+
+
+def _routing_key(files, data=None) -> Optional[str]:
+    """Huella de front (o su URI) para la afinidad de réplica (None = balanceo normal)."""
+    if not SCN_FEATURE_GATEWAY_MOTOR_AFFINITY:
+        return None
+    if files and "front" in files:
+        return image_fingerprint(files["front"][1])
+    return (data or {}).get("front_uri") or None
+
+
+def _frame_body(files, data):
+    """(bytes totales, iterador async): cabecera y después cada imagen por chunks desde su spool."""
+    parts, meta = [], []
+    for name, (filename, body, ctype) in (files or {}).items():
+        meta.append({"name": name, "filename": filename, "content_type": ctype, "size": _part_size(body)})
+        parts.append(body)
+    header = encode_header(dict(data or {}), meta)
+
+    async def _chunks():
+        yield header
+        for body in parts:
+            if isinstance(body, (bytes, bytearray)):
+                yield bytes(body)
+                continue
+            body.seek(0)
+            while True:
+                chunk = body.read(_FRAME_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+
+    return len(header) + sum(m["size"] for m in meta), _chunks()
+
+
+def _post_kwargs(base_url: str, path: str, files, data, headers: Dict[str, str]) -> Dict[str, Any]:
+    """Argumentos de client.post/stream para multipart o frame (el iterador del frame es de un solo uso)."""
+    if not _use_frame(path):
+        return {"url": f"{base_url}{path}", "headers": headers, "files": files, "data": data}
+    length, content = _frame_body(files, data)
+    return {
+        "url": f"{base_url}{_FRAME_PATHS[path]}",
+        "headers": dict(headers, **{"Content-Type": FRAME_CONTENT_TYPE, "Content-Length": str(length)}),
+        "content": content,
+    }
+
 
 async def motor_post(
     path: str,
@@ -14,41 +125,246 @@ async def motor_post(
     request_id: Optional[str] = None,
     req: Optional[Request] = None,
 ) -> httpx.Response:
+    """POST al motor pasando por admission control (503 + Retry-After si está saturado)."""
     if not MOTOR_URL:
         raise HTTPException(500, "MOTOR_URL no configurado")
-    headers = dict(get_auth_headers())
+    if not SCN_FEATURE_GATEWAY_ADMISSION:
+        return await _motor_post_raw(path, files, data, request_id, req)
+    limiter = await _admit()
+    t0 = time.monotonic()
+    ok = False
+    try:
+        r = await _motor_post_raw(path, files, data, request_id, req)
+        ok = r.status_code < 500
+        return r
+    finally:
+        limiter.release(time.monotonic() - t0, ok)
+
+
+async def _admit():
+    limiter = get_limiter()
+    try:
+        await limiter.acquire()
+    except MotorOverloaded as e:
+        raise HTTPException(
+            503,
+            f"Motor saturado ({e.reason}); reintenta en {e.retry_after}s",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return limiter
+
+
+def _request_deadline(req: Optional[Request], attempts: int) -> float:
+    """Fin (monotónico) de la espera total: TIMEOUT por intento desde que llegó la petición."""
+    start = getattr(getattr(req, "state", None), "t_start", None) if req is not None else None
+    return (start if start is not None else time.monotonic()) + TIMEOUT * attempts
+
+
+def _attempt_budget_s(deadline: Optional[float]) -> float:
+    """Lo que el gateway va a esperar este intento: TIMEOUT, recortado a lo que queda del total."""
+    if deadline is None:
+        return TIMEOUT
+    return max(0.0, min(TIMEOUT, deadline - time.monotonic()))
+
+
+def _motor_headers(
+    request_id: Optional[str],
+    req: Optional[Request],
+    audience: Optional[str] = None,
+    span: Optional[tracing.Span] = None,
+    budget_s: Optional[float] = None,
+) -> Dict[str, str]:
+    headers = dict(get_auth_headers(audience))
     if request_id:
         headers["X-Request-ID"] = request_id
+    tracing.inject(headers, span)
+    if SCN_FEATURE_GATEWAY_DEADLINE_HEADER:
+        # Lo que este intento va a esperar: el motor salta etapas opcionales que no quepan
+        budget_s = TIMEOUT if budget_s is None else budget_s
+        headers[BUDGET_HEADER] = str(max(1, int(budget_s * 1000)))
     if req is not None:
         workshop_token = (req.headers.get("X-Workshop-Token") or "").strip()
         if workshop_token:
             headers["X-Workshop-Token"] = workshop_token
+    return headers
+
+
+class MotorStream:
+    """
+    Eventos NDJSON de un POST stream=1 al motor. El hueco de admission y el backend se toman al
+    crearlo y se devuelven una sola vez: al terminar la iteración, con aclose() (aunque no se
+    haya llegado a iterar, p. ej. cliente desconectado antes del body) o, en último caso, al
+    recolectarlo el GC.
+    """
+
+    def __init__(self, path, files, data, request_id, req, limiter, pool, backend):
+        self.path = path
+        self._files = files
+        self._data = data
+        self._request_id = request_id
+        self._req = req
+        self._limiter = limiter
+        self._pool = pool
+        self._backend = backend
+        self._t0 = time.monotonic()
+        self._deadline = _request_deadline(req, 1)
+        self._span = tracing.begin(f"motor POST {path}", backend=backend.name, stream=True)
+        self._gen = None
+        self.released = False
+
+    def __aiter__(self):
+        if self._gen is None:
+            self._gen = self._events()
+        return self._gen
+
+    def _release(self, ok: bool) -> None:
+        if self.released:
+            return
+        self.released = True
+        latency = time.monotonic() - self._t0
+        self._pool.release(self._backend, latency, ok)
+        if self._limiter is not None:
+            self._limiter.release(latency, ok)
+        if self._span is not None:
+            self._span.set("ok", ok)
+            self._span.end()
+
+    async def aclose(self) -> None:
+        if self._gen is not None:
+            await self._gen.aclose()
+        self._release(False)
+
+    def __del__(self):
+        # Red de seguridad: release es síncrono (contadores del loop), no hace falta await
+        if not getattr(self, "released", True):
+            self._release(False)
+
+    async def _events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Sin reintentos (ya se habrá emitido algo); status != 200 o línea ilegible -> un evento "error"."""
+        ok = False
+        try:
+            async with _client_for(self.path) as client:
+                form = dict(self._data or {}, stream="1")
+                headers = _motor_headers(
+                    self._request_id, self._req, self._backend.url, self._span, _attempt_budget_s(self._deadline)
+                )
+                kwargs = _post_kwargs(self._backend.url, self.path, self._files, form, headers)
+                async with client.stream("POST", **kwargs) as r:
+                    if r.status_code != 200:
+                        body = await r.aread()
+                        try:
+                            detail = json.loads(body)
+                        except Exception:
+                            detail = body[:500].decode("utf-8", "replace")
+                        ok = r.status_code < 500
+                        yield {"event": "error", "status": r.status_code, "data": detail}
+                        return
+                    async for line in r.aiter_lines():
+                        if not line.strip():
+                            continue
+                        try:
+                            ev = json.loads(line)
+                        except ValueError:
+                            yield {"event": "error", "status": 502, "data": "línea NDJSON inválida del motor"}
+                            return
+                        yield ev
+                    ok = True
+        except httpx.TimeoutException as e:
+            yield {"event": "error", "status": 504, "data": f"motor timeout: {type(e).__name__}"}
+        except httpx.HTTPError as e:
+            yield {"event": "error", "status": 504, "data": f"motor error: {type(e).__name__}"}
+        finally:
+            self._release(ok)
+
+
+async def motor_stream(
+    path: str,
+    files=None,
+    data=None,
+    request_id: Optional[str] = None,
+    req: Optional[Request] = None,
+) -> MotorStream:
+    """
+    POST con stream=1: devuelve un MotorStream (iterable async de eventos {"event", "data"}).
+    Admisión y elección de backend se resuelven en el await, antes de que el endpoint devuelva
+    su 200: saturado o sin backend -> HTTPException 503 de verdad, no un stream cortado.
+    Quien lo recibe tiene que iterarlo o llamar a aclose() (libera admission y backend).
+    """
+    if not MOTOR_URL:
+        raise HTTPException(500, "MOTOR_URL no configurado")
+    limiter = await _admit() if SCN_FEATURE_GATEWAY_ADMISSION else None
+    pool = get_motor_pool()
+    try:
+        backend = pool.acquire(key=_routing_key(files, data))
+    except RuntimeError as e:
+        if limiter is not None:
+            limiter.cancel()
+        raise HTTPException(503, f"motor no disponible: {e}")
+    return MotorStream(path, files, data, request_id, req, limiter, pool, backend)
+
+
+async def _motor_post_raw(
+    path: str,
+    files=None,
+    data=None,
+    request_id: Optional[str] = None,
+    req: Optional[Request] = None,
+) -> httpx.Response:
+    pool = get_motor_pool()
+    key = _routing_key(files, data)
+    # Presupuesto total desde la llegada al gateway (cola de admission, validación y hash incluidos)
+    deadline = _request_deadline(req, _POST_ATTEMPTS)
+    tried = []
     last_exc = None
-    for attempt in (1, 2):
+    for attempt in range(1, _POST_ATTEMPTS + 1):
+        budget_s = _attempt_budget_s(deadline)
+        if budget_s <= 0:
+            raise HTTPException(504, "motor timeout: presupuesto agotado")
+        # El reintento va a otro backend si hay más de uno (con afinidad: el siguiente del ranking)
+        backend = pool.acquire(exclude=tried, key=key)
+        tried.append(backend)
+        t0 = time.monotonic()
+        ok = False
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(TIMEOUT)) as client:
-                return await client.post(f"{MOTOR_URL}{path}", headers=headers, files=files, data=data)
+            with tracing.span(f"motor POST {path}", backend=backend.name, attempt=attempt) as sp:
+                async with _client_for(path) as client:
+                    headers = _motor_headers(request_id, req, backend.url, budget_s=budget_s)
+                    r = await client.post(
+                        **_post_kwargs(backend.url, path, files, data, headers), timeout=httpx.Timeout(budget_s)
+                    )
+                if sp is not None:
+                    sp.set("http.status_code", r.status_code)
+            ok = r.status_code < 500
+            return r
         except httpx.TimeoutException as e:
             last_exc = e
-            if attempt == 2:
+            if attempt == _POST_ATTEMPTS:
                 raise HTTPException(504, f"motor timeout: {type(last_exc).__name__}")
         except Exception as e:
             last_exc = e
-            if attempt == 2:
+            if attempt == _POST_ATTEMPTS:
                 raise HTTPException(504, f"motor error: {type(last_exc).__name__}")
+        finally:
+            pool.release(backend, time.monotonic() - t0, ok)
 
 
 async def motor_get(path: str, request_id: Optional[str] = None) -> httpx.Response:
     if not MOTOR_URL:
         raise HTTPException(500, "MOTOR_URL no configurado")
-    headers = dict(get_auth_headers())
-    if request_id:
-        headers["X-Request-ID"] = request_id
+    pool = get_motor_pool()
+    tried = []
     last_exc = None
     for attempt in (1, 2):
+        backend = pool.acquire(exclude=tried)
+        tried.append(backend)
+        t0 = time.monotonic()
+        ok = False
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(TIMEOUT)) as client:
-                return await client.get(f"{MOTOR_URL}{path}", headers=headers)
+            with tracing.span(f"motor GET {path}", backend=backend.name, attempt=attempt):
+                async with httpx.AsyncClient(timeout=httpx.Timeout(TIMEOUT)) as client:
+                    r = await client.get(f"{backend.url}{path}", headers=_motor_headers(request_id, None, backend.url))
+            ok = r.status_code < 500
+            return r
         except httpx.TimeoutException as e:
             last_exc = e
             if attempt == 2:
@@ -57,3 +373,5 @@ async def motor_get(path: str, request_id: Optional[str] = None) -> httpx.Respon
             last_exc = e
             if attempt == 2:
                 raise HTTPException(504, f"motor error: {type(last_exc).__name__}")
+        finally:
+            pool.release(backend, time.monotonic() - t0, ok)
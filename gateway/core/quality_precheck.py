@@ -0,0 +1,56 @@
+"""
+Quality pre-check — descarta en el gateway capturas claramente inservibles (oscuras,
+quemadas, borrosas) antes de gastar inferencia en el motor.
+
+Mismas métricas que common/quality_gate (compute_quality_for_side) sobre una miniatura:
+JPEG se decodifica con draft() a 1/2..1/8 de escala, así que cuesta milisegundos. Reducir la
+imagen la hace parecer más nítida, nunca menos, así que el pre-check solo puede ser más
+permisivo que el motor; además el umbral es quality_block - margin (solo casos claros).
+main.py responde con el mismo 422 POLICY_BLOCK que devolvería la política tras el motor.
+"""
+import io
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from common.policy_engine import DEFAULT_POLICY_THRESHOLDS
+from common.quality_gate import compute_quality_for_side
+
+from .config import SCN_QUALITY_PRECHECK_MARGIN, SCN_QUALITY_PRECHECK_SIDE
+
+
+def thumbnail_quality(body: Any, side: int = SCN_QUALITY_PRECHECK_SIDE) -> Dict[str, Any]:
+    """{"quality_score", "reasons"} de la miniatura (lado mayor <= side) de bytes o spool."""
+    fobj = io.BytesIO(body) if isinstance(body, (bytes, bytearray)) else body
+    pos = fobj.tell()
+    try:
+        fobj.seek(0)
+        img = Image.open(fobj)
+        img.draft("L", (side, side))
+        img = img.convert("L")
+        img.thumbnail((side, side))
+    finally:
+        fobj.seek(pos)
+    _signals, score, reasons = compute_quality_for_side(img, "A")
+    return {"quality_score": score, "reasons": reasons}
+
+
+def precheck_quality(front: Any, back: Any = None, margin: float = SCN_QUALITY_PRECHECK_MARGIN) -> Optional[Dict[str, Any]]:
+    """
+    La peor cara si queda por debajo de quality_block - margin (el motor combina A/B con el
+    mínimo); None si hay que seguir al motor. Imagen ilegible -> None (decide el motor).
+    """
+    limit = DEFAULT_POLICY_THRESHOLDS["quality_block"] - margin
+    worst = None
+    for body in (front, back):
+        if body is None:
+            continue
+        try:
+            q = thumbnail_quality(body)
+        except Exception:
+            return None
+        if worst is None or q["quality_score"] < worst["quality_score"]:
+            worst = q
+    if worst is None or worst["quality_score"] >= limit:
+        return None
+    return worst
@@ -0,0 +1,82 @@
+"""
+Response cache — contratos normalizados de analyze en memoria (LRU acotado + TTL).
+Clave: hashes de imagen + modo + token de taller + proyección; las entradas valen solo
+para el model_version vigente: si el motor reporta otro, se vacía la caché entera.
+"""
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .config import SCN_ANALYZE_CACHE_MAX_ENTRIES, SCN_ANALYZE_CACHE_TTL_S
+
+
+class AnalyzeCache:
+    """Single event loop: sin locks. Valores copiados al entrar y salir (el caller los muta)."""
+
+    def __init__(self, max_entries: int = SCN_ANALYZE_CACHE_MAX_ENTRIES, ttl_s: float = SCN_ANALYZE_CACHE_TTL_S):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self.model_version: Optional[str] = None
+        self._data: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value: Dict[str, Any], model_version: Optional[str]) -> None:
+        self.observe_model_version(model_version)
+        self._data[key] = (time.monotonic() + self.ttl_s, copy.deepcopy(value))
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def observe_model_version(self, model_version: Optional[str]) -> None:
+        """Nuevo modelo en el motor -> todo lo cacheado es de la versión anterior."""
+        if not model_version or model_version == self.model_version:
+            return
+        if self._data:
+            self.invalidations += 1
+            self._data.clear()
+        self.model_version = model_version
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "model_version": self.model_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def motor_model_version(raw: Any) -> Optional[str]:
+    """model_version que reporta el motor (debug.model_version o top-level)."""
+    if not isinstance(raw, dict):
+        return None
+    debug = raw.get("debug") if isinstance(raw.get("debug"), dict) else {}
+    mv = debug.get("model_version") or raw.get("model_version")
+    return str(mv) if mv else None
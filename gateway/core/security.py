@@ -1,6 +1,7 @@
 """Security — API key, auth helpers."""
 import hmac
 import time
+from typing import Dict, Optional, Tuple
 from fastapi import Request, HTTPException
 
 import google.auth.transport.requests
@@ -18,8 +19,7 @@ from .config import (
 )
 
 _API_KEYS = parse_api_keys(API_KEYS_RAW)
-_cached_id_token = None
-_cached_id_token_expiry = 0
+_id_token_cache: Dict[str, Tuple[str, float]] = {}
 _TOKEN_REFRESH_MARGIN_SECONDS = 60
 
 
@@ -33,28 +33,31 @@ def require_apikey(req: Request):
 
 
 def fetch_id_token_cached(audience: str) -> str:
-    global _cached_id_token, _cached_id_token_expiry
+    """ID token por audiencia (cada servicio del motor es una audiencia distinta en Cloud Run)."""
     now = time.time()
-    if _cached_id_token and _cached_id_token_expiry > now + _TOKEN_REFRESH_MARGIN_SECONDS:
-        return _cached_id_token
+    cached = _id_token_cache.get(audience)
+    if cached and cached[1] > now + _TOKEN_REFRESH_MARGIN_SECONDS:
+        return cached[0]
     request_object = google.auth.transport.requests.Request()
     new_token = id_token.fetch_id_token(request_object, audience)
     try:
         claims = id_token.verify_oauth2_token(new_token, request_object, audience=audience)
-        _cached_id_token_expiry = claims.get("exp", 0)
+        expiry = claims.get("exp", 0)
     except Exception as e:
         print(f"Warning: Could not extract expiry from ID token: {e}. Assuming 1 hour validity.")
-        _cached_id_token_expiry = now + 3600
-    _cached_id_token = new_token
-    return _cached_id_token
+        expiry = now + 3600
+    _id_token_cache[audience] = (new_token, expiry)
+    return new_token
 
 
-def get_auth_headers() -> dict:
+def get_auth_headers(audience: Optional[str] = None) -> dict:
+    """Cabecera de auth hacia el motor; audience = URL del backend elegido (default MOTOR_URL)."""
     headers = {}
     if SCN_FEATURE_GATEWAY_IDTOKEN_PROXY_ENABLED:
-        if not MOTOR_URL:
+        audience = audience or MOTOR_URL
+        if not audience:
             raise HTTPException(500, "MOTOR_URL no configurado para ID Token Proxy")
-        token = fetch_id_token_cached(MOTOR_URL)
+        token = fetch_id_token_cached(audience)
         headers[MOTOR_AUTH_HEADER] = f"Bearer {token}"
     return headers
 
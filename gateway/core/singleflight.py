@@ -0,0 +1,89 @@
+"""
+Singleflight — peticiones idénticas concurrentes comparten una sola llamada.
+La primera (leader) lanza la llamada como task; las demás esperan el mismo resultado.
+Si el cliente del leader se desconecta, la task sigue para el resto.
+"""
+import asyncio
+import hashlib
+import io
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+_HASH_CHUNK = 64 * 1024
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders_total = 0
+        self.coalesced_total = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced_total += 1
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        self.leaders_total += 1
+        return await asyncio.shield(task)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "inflight": len(self._inflight),
+            "leaders_total": self.leaders_total,
+            "coalesced_total": self.coalesced_total,
+        }
+
+
+def hash_body(body: Any, h: Optional["hashlib._Hash"] = None) -> "hashlib._Hash":
+    """Añade al hash bytes o un file-like (por chunks, rebobinando al terminar)."""
+    h = h or hashlib.sha256()
+    if body is None:
+        return h
+    if isinstance(body, (bytes, bytearray)):
+        h.update(body)
+        return h
+    body.seek(0)
+    while True:
+        chunk = body.read(_HASH_CHUNK)
+        if not chunk:
+            break
+        h.update(chunk)
+    body.seek(0)
+    return h
+
+
+def upload_digest(body: Any) -> Optional[str]:
+    """sha256 hex de una imagen (bytes o spool); None si no hay."""
+    if body is None:
+        return None
+    return hash_body(body).hexdigest()
+
+
+def detach_body(body: Any) -> Any:
+    """
+    Handle propio de un upload para una task que puede sobrevivir a la petición (leader de
+    singleflight): spool en disco -> dup del descriptor (sin copiar; el fichero ya está
+    desenlazado y vive mientras quede un fd); spool aún en memoria (< max_size) o bytes -> bytes.
+    """
+    if body is None or isinstance(body, (bytes, bytearray)):
+        return body
+    if getattr(body, "_rolled", None) is False or isinstance(body, io.BytesIO):
+        return _read_all(body)
+    fh = os.fdopen(os.dup(body.fileno()), "rb")  # comparte offset: el leader no lee mientras tanto
+    fh.seek(0)
+    return fh
+
+
+def _read_all(body: Any) -> bytes:
+    body.seek(0)
+    data = body.read()
+    body.seek(0)
+    return data
+
+
+def close_detached(body: Any) -> None:
+    if body is not None and not isinstance(body, (bytes, bytearray)):
+        body.close()
@@ -0,0 +1,152 @@
+"""
+Upload store — subida directa del cliente para ingest (el gateway no toca los bytes).
+
+Contrato común (GCS en prod, disco local con SCN_UPLOAD_STORE=local en dev/tests):
+- sign_put(path, content_type, max_bytes, expires_s, base_url) -> {"method", "url", "headers"}
+- stat(path) -> (size, content_type) | None
+- read(path) -> bytes, uri(path) -> URI que entiende el motor (gs:// o file://)
+El upload_token que devuelve el gateway va firmado (HMAC) con job_id y rutas: finalize no
+necesita estado en servidor y no acepta rutas que no haya emitido el gateway.
+Solo los bytes van al store: los jobs siguen en GCS, así que el ingest necesita GCS con
+cualquiera de los dos (sin GCS, /uploads y /finalize responden 501).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+from .config import (
+    KEY_BUCKET,
+    SCN_UPLOAD_LOCAL_DIR,
+    SCN_UPLOAD_SIGNING_SECRET,
+    SCN_UPLOAD_STORE,
+)
+from .gcs_utils import gcs_get_bytes, gcs_signed_put_url, gcs_stat
+
+_log = logging.getLogger(__name__)
+LOCAL_UPLOAD_ROUTE = "/api/ingest-key/local-upload"
+
+if SCN_UPLOAD_SIGNING_SECRET:
+    _SECRET = SCN_UPLOAD_SIGNING_SECRET.encode("utf-8")
+else:
+    # Sin secreto compartido, un token solo vale en la réplica que lo emitió
+    _SECRET = secrets.token_bytes(32)
+
+
+def _mac(msg: str) -> str:
+    return hmac.new(_SECRET, msg.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def sign_token(payload: Dict[str, Any]) -> str:
+    body = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{body}.{_mac(body)}"
+
+
+def verify_token(token: str, now: Optional[float] = None) -> Dict[str, Any]:
+    """Payload del token; ValueError si la firma no cuadra o ha caducado."""
+    body, _, mac = (token or "").partition(".")
+    if not body or not hmac.compare_digest(mac, _mac(body)):
+        raise ValueError("firma inválida")
+    payload = json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+    if float(payload.get("exp") or 0) < (now if now is not None else time.time()):
+        raise ValueError("token caducado")
+    return payload
+
+
+class GcsUploadStore:
+    name = "gcs"
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    def sign_put(self, path: str, content_type: str, max_bytes: int, expires_s: int, base_url: str = "") -> Dict[str, Any]:
+        return {
+            "method": "PUT",
+            "url": gcs_signed_put_url(self.bucket, path, content_type, max_bytes, expires_s),
+            "headers": {"Content-Type": content_type, "x-goog-content-length-range": f"1,{max_bytes}"},
+        }
+
+    def stat(self, path: str) -> Optional[Tuple[int, Optional[str]]]:
+        return gcs_stat(self.bucket, path)
+
+    def read(self, path: str) -> bytes:
+        return gcs_get_bytes(self.bucket, path)
+
+    def uri(self, path: str) -> str:
+        return f"gs://{self.bucket}/{path}"
+
+
+class LocalUploadStore:
+    """
+    Mismo contrato sobre un directorio: la "URL firmada" apunta a LOCAL_UPLOAD_ROUTE del
+    propio gateway con exp/ct/max/sig en la query (solo dev y tests).
+    """
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+
+    def _file(self, path: str) -> str:
+        full = os.path.realpath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            raise ValueError("ruta fuera del store")
+        return full
+
+    @staticmethod
+    def _sig(path: str, exp: int, content_type: str, max_bytes: int) -> str:
+        return _mac(f"PUT\n{path}\n{exp}\n{content_type}\n{max_bytes}")
+
+    def sign_put(self, path: str, content_type: str, max_bytes: int, expires_s: int, base_url: str = "") -> Dict[str, Any]:
+        exp = int(time.time() + expires_s)
+        query = urlencode({"exp": exp, "ct": content_type, "max": max_bytes, "sig": self._sig(path, exp, content_type, max_bytes)})
+        return {
+            "method": "PUT",
+            "url": f"{base_url.rstrip('/')}{LOCAL_UPLOAD_ROUTE}/{quote(path)}?{query}",
+            "headers": {"Content-Type": content_type},
+        }
+
+    def check_put(self, path: str, exp: int, content_type: str, max_bytes: int, sig: str) -> None:
+        """ValueError si la URL no la firmó este gateway o ha caducado."""
+        if not hmac.compare_digest(sig or "", self._sig(path, exp, content_type, max_bytes)):
+            raise ValueError("firma inválida")
+        if exp < time.time():
+            raise ValueError("URL caducada")
+
+    def open_write(self, path: str):
+        full = self._file(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        return full, open(f"{full}.part", "wb")
+
+    def stat(self, path: str) -> Optional[Tuple[int, Optional[str]]]:
+        try:
+            size = os.path.getsize(self._file(path))
+        except OSError:
+            return None
+        return size, None
+
+    def read(self, path: str) -> bytes:
+        with open(self._file(path), "rb") as fh:
+            return fh.read()
+
+    def uri(self, path: str) -> str:
+        return f"file://{self._file(path)}"
+
+
+_store = None
+
+
+def get_upload_store():
+    """GCS salvo SCN_UPLOAD_STORE=local; nunca cae solo al local (sin GCS no habría dónde guardar el job)."""
+    global _store
+    if _store is None:
+        kind = SCN_UPLOAD_STORE or "gcs"
+        _store = GcsUploadStore(KEY_BUCKET) if kind == "gcs" else LocalUploadStore(SCN_UPLOAD_LOCAL_DIR)
+        _log.info("upload_store", extra={"store": _store.name})
+    return _store
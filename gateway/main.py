@@ -1,7 +1,9 @@
 # IMPORTANTE: Dockerfile usa uvicorn main:APP
 """Gateway entrypoint — APP, middleware, route wiring."""
+import asyncio
 import io
 import json
+import os
 import time
 import uuid
 from datetime import datetime, timezone
@@ -10,13 +12,18 @@ from typing import Optional, Dict, Any
 import httpx
 from PIL import Image
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
-from fastapi.responses import Response, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request, Query
+from fastapi.responses import Response, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 
-from normalize import normalize_contract
+from normalize import normalize_contract, normalize_contract_bytes, project_contract, resolve_projection
+from common.policy_engine import ACTION_RUN_OCR
+from common.capture_profile import DEFAULT_INPUT_HW, build_capture_profile, profile_inputs
+from common.timings import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS, StageTimer
+from common import tracing
 from quality_gate_active import check_quality_gate
-from policy_actions import execute_policy_actions
+from policy_actions import OCR_URL as GATEWAY_OCR_URL, build_policy_block_response, execute_policy_actions
 from rate_limit import check_rate_limit, get_identifier, is_enabled as rate_limit_enabled
 from audit import audit_analyze, audit_feedback, audit_login
 
@@ -26,21 +33,50 @@ from core.config import (
     POLICY_VERSION,
     MOTOR_URL,
     KEY_BUCKET,
+    SCN_FEATURE_GATEWAY_ANALYZE_BY_REF,
     KEY_PREFIX,
+    SCN_FEATURE_GATEWAY_SIGNED_UPLOADS,
+    SCN_UPLOAD_URL_TTL_S,
     JOB_PREFIX,
     FEEDBACK_PREFIX,
     SCN_FEATURE_QUALITY_GATE_ACTIVE,
     SCN_FEATURE_POLICY_ENGINE_ACTIVE,
+    SCN_FEATURE_GATEWAY_QUALITY_PRECHECK,
+    SCN_DEBUG_INCLUDE_TIMINGS,
+    SCN_TRACE_EXPORTER,
+    SCN_TRACE_FILE,
+    SCN_TRACE_COLLECTOR_URL,
+    SCN_TRACE_SAMPLE_RATE,
     MAX_PAYLOAD_BYTES,
     MAX_PAYLOAD_MB,
     ALLOWED_IMAGE_TYPES,
     MAX_IMAGE_DIM,
+    SCN_CAPTURE_PROFILE_TTL_S,
+    SCN_CAPTURE_ROI_FACTOR,
+    SCN_CAPTURE_QUALITY_MIN_EDGE,
+    SCN_CAPTURE_OCR_MIN_EDGE,
+    SCN_CAPTURE_JPEG_QUALITY,
+    MAX_IMAGE_PIXELS,
+    SCN_IMAGE_FULL_VERIFY,
+    SCN_FEATURE_GATEWAY_STREAM_UPLOADS,
+    SCN_FEATURE_GATEWAY_COMPRESSION,
+    SCN_FEATURE_GATEWAY_SINGLEFLIGHT,
+    SCN_FEATURE_GATEWAY_ANALYZE_CACHE,
+    SCN_JOB_WAIT_MAX_S,
+    SCN_JOB_EVENTS_MAX_S,
+    SCN_JOB_EVENTS_HEARTBEAT_S,
+    SCN_FEATURE_GATEWAY_FEEDBACK_SEGMENTS,
+    SCN_FEATURE_GATEWAY_LOOP_MONITOR,
     WORKSHOP_LOGIN_EMAIL,
     WORKSHOP_LOGIN_PASSWORD,
     WORKSHOP_TOKEN,
     ALLOWED_ORIGINS_RAW,
 )
 from core.request_meta import get_request_id, client_ip
+from core.body_limit import BodySizeLimitMiddleware
+from core.compression import CompressionMiddleware
+from core.json_response import FastJSONResponse
+from core.image_probe import probe_image
 from core.security import require_apikey, get_auth_headers, validate_login, get_workshop_token
 from core.gcs_utils import (
     gcs_ok,
@@ -52,7 +88,17 @@ from core.gcs_utils import (
     sha256 as _sha256,
     date_prefix as _date_prefix,
 )
-from core.motor_proxy import motor_post as _motor_post, motor_get as _motor_get
+from core.motor_proxy import motor_post as _motor_post, motor_get as _motor_get, motor_stream as _motor_stream
+from core.admission import get_limiter
+from core.motor_pool import get_motor_pool
+from core.singleflight import SingleFlight, close_detached, detach_body, upload_digest
+from core.response_cache import AnalyzeCache, motor_model_version
+from core.job_events import TERMINAL_STATUSES, get_job_hub
+from core.feedback_segments import get_feedback_writer
+from core.cpu_executor import get_cpu_executor, run_cpu
+from core.loop_monitor import get_loop_monitor
+from core.quality_precheck import precheck_quality
+from core.upload_store import LOCAL_UPLOAD_ROUTE, get_upload_store, sign_token, verify_token
 from core.idempotency import (
     get_feedback_idempotency_key_from_request,
     check_idempotency_seen,
@@ -62,8 +108,21 @@ from core.idempotency import (
 import logging
 _log = logging.getLogger(__name__)
 
-APP = FastAPI(title="ScanKey Gateway", version=APP_VERSION, redirect_slashes=False)
+_ANALYZE_FLIGHT = SingleFlight()
+_ANALYZE_CACHE = AnalyzeCache()
 
+APP = FastAPI(
+    title="ScanKey Gateway",
+    version=APP_VERSION,
+    redirect_slashes=False,
+    default_response_class=FastJSONResponse,
+)
+
+# 413 mientras se lee el body (antes de que Starlette spoolee el multipart completo).
+# Se registra antes que CORS para quedar dentro: el 413 temprano también lleva Access-Control-*
+APP.add_middleware(
+    BodySizeLimitMiddleware, paths=("/api/analyze-key", "/api/analyze-key/stream", "/api/ingest-key")
+)
 # CORS
 allowed = [o.strip() for o in (ALLOWED_ORIGINS_RAW or "").split(",") if o.strip()]
 APP.add_middleware(
@@ -73,6 +132,8 @@ APP.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if SCN_FEATURE_GATEWAY_COMPRESSION:
+    APP.add_middleware(CompressionMiddleware, paths=("/api/analyze-key", "/api/job/"))
 
 
 def _now_iso() -> str:
@@ -132,12 +193,29 @@ def _proxy_httpx_json(r: httpx.Response, request_id: str):
         except Exception:
             payload = {"ok": False, "error": "invalid_json_from_upstream", "status_code": r.status_code}
         _inject_meta(payload, request_id)
-        return JSONResponse(content=payload, status_code=r.status_code)
+        return FastJSONResponse(content=payload, status_code=r.status_code)
     return Response(content=r.content, status_code=r.status_code, media_type=ct)
 
 
+@APP.on_event("startup")
+async def _startup_feedback_segments():
+    if SCN_FEATURE_GATEWAY_FEEDBACK_SEGMENTS:
+        # Recupera los segmentos del proceso anterior y arranca el flush periódico (primera vuelta ya)
+        get_feedback_writer().ensure_ticker()
+
+
+@APP.on_event("shutdown")
+async def _shutdown_feedback_segments():
+    if SCN_FEATURE_GATEWAY_FEEDBACK_SEGMENTS:
+        await get_feedback_writer().close()
+
+
 @APP.middleware("http")
 async def _mw_request_id(request: Request, call_next):
+    # Llegada de la petición: el presupuesto hacia el motor descuenta lo ya gastado aquí
+    request.state.t_start = time.monotonic()
+    if SCN_FEATURE_GATEWAY_LOOP_MONITOR:
+        get_loop_monitor().ensure_started()
     rid = get_request_id(request)
     request.state.request_id = rid
     resp = await call_next(request)
@@ -150,6 +228,7 @@ async def _mw_request_id(request: Request, call_next):
 _RATE_LIMIT_PATHS = {
     "/api/auth/login": "login",
     "/api/analyze-key": "analyze",
+    "/api/analyze-key/stream": "analyze",
     "/api/feedback": "feedback",
 }
 
@@ -184,10 +263,85 @@ async def _mw_rate_limit(request: Request, call_next):
     return resp
 
 
+tracing.configure(
+    "gateway",
+    tracing.build_exporter(SCN_TRACE_EXPORTER, SCN_TRACE_FILE, SCN_TRACE_COLLECTOR_URL),
+    SCN_TRACE_SAMPLE_RATE,
+)
+if tracing.get_tracer().enabled:
+    # Registrado el último = el más externo: el span cubre rate limit y request id
+    APP.middleware("http")(tracing.trace_requests)
+
+
 # ---------- Routes ----------
 @APP.get("/health")
 def health():
-    return {"ok": True, "service": "gateway", "version": APP_VERSION}
+    return {
+        "ok": True,
+        "service": "gateway",
+        "version": APP_VERSION,
+        "motor_admission": get_limiter().snapshot(),
+        "motor_backends": get_motor_pool().snapshot(),
+        "analyze_singleflight": _ANALYZE_FLIGHT.snapshot(),
+        "analyze_cache": _ANALYZE_CACHE.snapshot() if SCN_FEATURE_GATEWAY_ANALYZE_CACHE else None,
+        "feedback_segments": get_feedback_writer().snapshot() if SCN_FEATURE_GATEWAY_FEEDBACK_SEGMENTS else None,
+        "cpu_executor": get_cpu_executor().snapshot(),
+        "event_loop": get_loop_monitor().snapshot() if SCN_FEATURE_GATEWAY_LOOP_MONITOR else None,
+    }
+
+
+@APP.get("/metrics")
+def metrics():
+    """Histogramas Prometheus: etapas de analyze-key y operaciones GCS (como /health, sin API key)."""
+    return Response(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+_CAPTURE_PROFILE: Dict[str, Any] = {"profile": None, "expires": 0.0}
+_CAPTURE_PROFILE_FALLBACK_TTL_S = 30.0
+
+
+async def _capture_profile(rid: str) -> Dict[str, Any]:
+    """
+    Perfil del motor (input_shape, OCR, versión de modelo) + límites y OCR del gateway.
+    Cacheado SCN_CAPTURE_PROFILE_TTL_S; sin motor, perfil por defecto (224x224) durante 30 s.
+    """
+    now = time.monotonic()
+    if _CAPTURE_PROFILE["profile"] is not None and now < _CAPTURE_PROFILE["expires"]:
+        return _CAPTURE_PROFILE["profile"]
+    motor = None
+    try:
+        r = await _motor_get("/api/capture-profile", request_id=rid)
+        if r.status_code == 200:
+            motor = r.json()
+    except HTTPException:
+        pass
+    model_version, input_hw, motor_ocr = profile_inputs(motor) if motor else (None, DEFAULT_INPUT_HW, False)
+    profile = build_capture_profile(
+        model_version,
+        input_hw=input_hw,
+        ocr_enabled=motor_ocr or (SCN_FEATURE_POLICY_ENGINE_ACTIVE and bool(GATEWAY_OCR_URL)),
+        roi_factor=SCN_CAPTURE_ROI_FACTOR,
+        quality_min_edge=SCN_CAPTURE_QUALITY_MIN_EDGE,
+        ocr_min_edge=SCN_CAPTURE_OCR_MIN_EDGE,
+        jpeg_quality=SCN_CAPTURE_JPEG_QUALITY,
+        max_bytes=MAX_PAYLOAD_BYTES,
+    )
+    profile["source"] = "motor" if motor else "default"
+    ttl = SCN_CAPTURE_PROFILE_TTL_S if motor else _CAPTURE_PROFILE_FALLBACK_TTL_S
+    _CAPTURE_PROFILE.update(profile=profile, expires=now + ttl)
+    return profile
+
+
+@APP.get("/api/capture-profile")
+async def capture_profile(req: Request, _: bool = Depends(require_apikey)):
+    """Lado mayor, formato y calidad JPEG recomendados para subir capturas; ETag = profile_version."""
+    rid = getattr(req.state, "request_id", get_request_id(req))
+    profile = await _capture_profile(rid)
+    etag = f'"{profile["profile_version"]}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={int(SCN_CAPTURE_PROFILE_TTL_S)}"}
+    if (req.headers.get("if-none-match") or "").strip() == etag:
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(content=profile, headers=headers)
 
 
 @APP.post("/api/auth/login")
@@ -228,29 +382,179 @@ async def auth_login(req: Request):
 async def motor_health(req: Request):
     rid = getattr(req.state, "request_id", get_request_id(req))
     r = await _motor_get("/health", request_id=rid)
+    if SCN_FEATURE_GATEWAY_ANALYZE_CACHE and r.status_code == 200:
+        # Recarga de modelo en el motor -> invalidar sin esperar a la próxima respuesta de analyze
+        try:
+            _ANALYZE_CACHE.observe_model_version(motor_model_version(r.json()))
+        except Exception:
+            pass
     return _proxy_httpx_json(r, rid)
 
 
+def _check_image_header(fobj, field: str) -> None:
+    """
+    Formato y dimensiones desde la cabecera (sin decodificar). El motor decodifica la imagen
+    de todos modos; SCN_IMAGE_FULL_VERIFY=true añade el verify() completo de PIL.
+    """
+    try:
+        _fmt, w, h = probe_image(fobj)
+        if SCN_IMAGE_FULL_VERIFY:
+            fobj.seek(0)
+            Image.open(fobj).verify()
+    except Exception as e:
+        raise HTTPException(400, f"Imagen inválida: {field} ({type(e).__name__})")
+    if w > MAX_IMAGE_DIM or h > MAX_IMAGE_DIM:
+        raise HTTPException(400, f"Imagen demasiado grande: {w}x{h} (máx {MAX_IMAGE_DIM})")
+    if w * h > MAX_IMAGE_PIXELS:
+        raise HTTPException(400, f"Imagen demasiado grande: {w}x{h} (máx {MAX_IMAGE_PIXELS} px)")
+
+
 def _validate_image_payload(f_bytes: bytes, content_type: Optional[str], field: str) -> None:
     if len(f_bytes) > MAX_PAYLOAD_BYTES:
         raise HTTPException(413, f"Payload demasiado grande: {field} > {MAX_PAYLOAD_MB}MB")
     ct = (content_type or "").split(";")[0].strip().lower()
+    if ct and ct not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(415, f"Content-Type no soportado: {ct}. Usa image/jpeg, image/png o image/webp.")
+    _check_image_header(io.BytesIO(f_bytes), field)
+
+
+def _upload_size(up: UploadFile) -> int:
+    """Tamaño del upload sin leerlo (UploadFile.size o seek al final del spool)."""
+    if up.size is not None:
+        return int(up.size)
+    fobj = up.file
+    pos = fobj.tell()
+    fobj.seek(0, io.SEEK_END)
+    n = fobj.tell()
+    fobj.seek(pos)
+    return n
+
+
+def _validate_image_upload(up: UploadFile, field: str) -> int:
+    """
+    Igual que _validate_image_payload pero sobre el spool de Starlette, sin copiar a bytes.
+    Devuelve el tamaño; deja el fichero rebobinado para reenviarlo al motor.
+    """
+    size = _upload_size(up)
+    if size > MAX_PAYLOAD_BYTES:
+        raise HTTPException(413, f"Payload demasiado grande: {field} > {MAX_PAYLOAD_MB}MB")
+    ct = (up.content_type or "").split(";")[0].strip().lower()
     if ct and ct not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(415, f"Content-Type no soportado: {ct}. Usa image/jpeg, image/png o image/webp.")
     try:
-        img = Image.open(io.BytesIO(f_bytes))
-        img.verify()
-    except Exception as e:
-        raise HTTPException(400, f"Imagen inválida: {field} ({type(e).__name__})")
+        _check_image_header(up.file, field)
+    finally:
+        up.file.seek(0)
+    return size
+
+
+def _resolve_analyze_projection(view: Optional[str], fields: Optional[str]):
     try:
-        img2 = Image.open(io.BytesIO(f_bytes))
-        w, h = img2.size
-        if w > MAX_IMAGE_DIM or h > MAX_IMAGE_DIM:
-            raise HTTPException(400, f"Imagen demasiado grande: {w}x{h} (máx {MAX_IMAGE_DIM})")
-    except HTTPException:
-        raise
-    except Exception:
-        pass
+        return resolve_projection(view, fields)
+    except ValueError as e:
+        raise HTTPException(400, f"Proyección inválida: {e}")
+
+
+async def _analyze_uploads(f: UploadFile, b: Optional[UploadFile]):
+    """Valida front/back y devuelve (f_body, b_body, files) listos para el multipart al motor."""
+    if SCN_FEATURE_GATEWAY_STREAM_UPLOADS:
+        # httpx lee el spool por chunks al construir el multipart: la imagen no se copia a bytes
+        await run_cpu("image_validation", _validate_image_upload, f, "front")
+        b_size = _upload_size(b) if b is not None else 0
+        if b_size > 500:
+            await run_cpu("image_validation", _validate_image_upload, b, "back")
+        f_body = f.file
+        b_body = b.file if b_size else None
+    else:
+        f_bytes = await f.read()
+        b_bytes = await b.read() if b is not None else b""
+        await run_cpu("image_validation", _validate_image_payload, f_bytes, f.content_type, "front")
+        if b_bytes and len(b_bytes) > 500:
+            await run_cpu("image_validation", _validate_image_payload, b_bytes, b.content_type if b else None, "back")
+        f_body = f_bytes
+        b_body = b_bytes or None
+    files = {"front": ("front.jpg", f_body, f.content_type or "image/jpeg")}
+    if b_body is not None:
+        files["back"] = ("back.jpg", b_body, (b.content_type if b else None) or "image/jpeg")
+    return f_body, b_body, files
+
+
+def _body_bytes(body) -> bytes:
+    if isinstance(body, bytes):
+        return body
+    body.seek(0)
+    return body.read()
+
+
+def _upload_copies(files):
+    """Copias en bytes de las partes del multipart (la ruta upload_copy lee el spool en un hilo)."""
+    return {k: (name, _body_bytes(body), ct) for k, (name, body, ct) in files.items()}
+
+
+def _digest_uploads(f_body, b_body):
+    """(sha256 front, sha256 back) leyendo el spool por chunks, sin copiarlo (ruta hash=thread)."""
+    return upload_digest(f_body), upload_digest(b_body)
+
+
+async def _shared_motor_post(files, data, rid, req):
+    """
+    Llamada al motor de la task compartida de singleflight. Lleva handles propios de los uploads:
+    si el leader se cancela, FastAPI cierra su UploadFile y los followers siguen esperando.
+    """
+    own = {k: (name, detach_body(body), ct) for k, (name, body, ct) in files.items()}
+    try:
+        return await _motor_post("/api/analyze-key", files=own, data=data, request_id=rid, req=req)
+    finally:
+        for _name, body, _ct in own.values():
+            close_detached(body)
+
+
+def _analyze_form(modo: Optional[str], modo_taller: Optional[str]):
+    """(data para el motor, modo_taller normalizado)."""
+    data = {}
+    mt = (modo_taller or "").strip().lower()
+    if (modo or "").strip():
+        data["modo"] = modo
+    elif mt in ("1", "true", "yes", "y"):
+        data["modo"] = "taller"
+    return data, mt
+
+
+async def _run_gates(payload: Dict[str, Any], front_bytes, override: bool, is_workshop: bool):
+    """PolicyEngine activo o QualityGate activo: (block_resp o None, payload resultante)."""
+    if SCN_FEATURE_POLICY_ENGINE_ACTIVE:
+        needs_image = (payload.get("debug") or {}).get("policy_action") == ACTION_RUN_OCR
+        image_bytes = front_bytes() if needs_image else b""
+        block_resp, modified = await execute_policy_actions(payload, image_bytes, override, is_workshop)
+    elif SCN_FEATURE_QUALITY_GATE_ACTIVE:
+        block_resp, modified = check_quality_gate(payload, override)
+    else:
+        return None, payload
+    if block_resp is not None:
+        return block_resp, payload
+    return None, (modified if modified is not None else payload)
+
+
+async def _quality_precheck(f_body, b_body, rid: str) -> Optional[Dict[str, Any]]:
+    """Body 422 POLICY_BLOCK si la miniatura ya es claramente inservible (sin llamar al motor)."""
+    if not (SCN_FEATURE_GATEWAY_QUALITY_PRECHECK and SCN_FEATURE_POLICY_ENGINE_ACTIVE):
+        return None
+    q = await run_cpu("quality_precheck", precheck_quality, f_body, b_body)
+    if q is None:
+        return None
+    block = build_policy_block_response(
+        {
+            "debug": {
+                "policy_version": POLICY_VERSION,
+                "quality_score": q["quality_score"],
+                "policy_user_message": "Calidad insuficiente. Repite la captura.",
+                "policy_reasons": ["quality_block"],
+            }
+        }
+    )
+    block["debug"]["quality_reasons"] = q["reasons"]
+    block["debug"]["precheck"] = "gateway"
+    return _inject_meta(block, rid)
 
 
 @APP.post("/api/analyze-key")
@@ -262,75 +566,250 @@ async def proxy_analyze_key(
     image_back: UploadFile = File(None),
     modo: Optional[str] = Form(None),
     modo_taller: Optional[str] = Form(None),
+    view: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
 ):
     f = front or image_front
     b = back or image_back
     if f is None:
         raise HTTPException(400, "front requerido (front o image_front)")
-    f_bytes = await f.read()
-    b_bytes = await b.read() if b is not None else b""
-    _validate_image_payload(f_bytes, f.content_type, "front")
-    if b_bytes and len(b_bytes) > 500:
-        _validate_image_payload(b_bytes, b.content_type if b else None, "back")
-    files = {"front": ("front.jpg", f_bytes, f.content_type or "image/jpeg")}
-    if b_bytes:
-        files["back"] = ("back.jpg", b_bytes, (b.content_type if b else None) or "image/jpeg")
-    data = {}
-    mt = (modo_taller or "").strip().lower()
-    if (modo or "").strip():
-        data["modo"] = modo
-    elif mt in ("1", "true", "yes", "y"):
-        data["modo"] = "taller"
+    projection = _resolve_analyze_projection(view, fields)
+    # Con gates activos el contrato completo hace falta para decidir; se proyecta al final
+    gates_active = SCN_FEATURE_POLICY_ENGINE_ACTIVE or SCN_FEATURE_QUALITY_GATE_ACTIVE
+    timer = StageTimer("gateway")
+    with timer.span("read"):
+        f_body, b_body, files = await _analyze_uploads(f, b)
+
+    def _front_bytes() -> bytes:
+        """Bytes de front solo cuando hacen falta (OCR desde gateway)."""
+        return _body_bytes(f_body)
+
+    data, mt = _analyze_form(modo, modo_taller)
     rid = getattr(req.state, "request_id", get_request_id(req))
     api_key = (req.headers.get("x-api-key") or "").strip()
     ip = client_ip(req)
     role = "taller" if mt in ("1", "true", "yes", "y") or (req.headers.get("X-Workshop-Token") or "").strip() else "cliente"
     t0 = time.time()
-    r = await _motor_post("/api/analyze-key", files=files, data=data, request_id=rid, req=req)
+    token = (req.headers.get("X-Workshop-Token") or "").strip()
+    # Lo que devuelve normalize_contract para esta petición (con gates: contrato completo)
+    norm_view, norm_fields = (None, None) if gates_active else (view, fields)
+    request_key = cache_key = None
+    if SCN_FEATURE_GATEWAY_SINGLEFLIGHT or SCN_FEATURE_GATEWAY_ANALYZE_CACHE:
+        # Hash fuera del loop, por chunks sobre el spool (sin copiar el upload)
+        with timer.span("hash"):
+            f_digest, b_digest = await run_cpu("hash", _digest_uploads, f_body, b_body)
+        # El token de taller cambia la respuesta del motor (ocr_detail vs ocr_hint): entra en la clave
+        request_key = ":".join(
+            (
+                f_digest,
+                b_digest or "-",
+                data.get("modo") or "-",
+                _sha256(token.encode("utf-8"))[:16] if token else "-",
+            )
+        )
 
     def _audit_analyze_exit(status: int, top1=None, confidence=None, policy_action=None):
         audit_analyze(rid, "/api/analyze-key", status, role=role, ip=ip, api_key=api_key or None, top1=top1, confidence=confidence, policy_action=policy_action)
 
-    if r.status_code == 200:
+    with timer.span("precheck"):
+        block_resp = await _quality_precheck(f_body, b_body, rid)
+    if block_resp is not None:
+        _audit_analyze_exit(422, policy_action=block_resp["debug"]["policy_action"])
+        return FastJSONResponse(content=block_resp, status_code=422)
+
+    payload = None
+    if SCN_FEATURE_GATEWAY_ANALYZE_CACHE:
+        cache_key = f"{request_key}:{norm_view or '-'}:{norm_fields or '-'}"
+        payload = _ANALYZE_CACHE.get(cache_key)
+    cache_status = "hit" if payload is not None else "miss"
+
+    r = None
+    if payload is None:
+        with timer.span("motor"):
+            if SCN_FEATURE_GATEWAY_SINGLEFLIGHT:
+                r = await _ANALYZE_FLIGHT.do(request_key, lambda: _shared_motor_post(files, data, rid, req))
+            else:
+                r = await _motor_post("/api/analyze-key", files=files, data=data, request_id=rid, req=req)
         ct = (r.headers.get("content-type") or "").split(";")[0]
-        if ct == "application/json":
+        if r.status_code == 200 and ct == "application/json":
             try:
-                payload = r.json()
-                payload = normalize_contract(payload)
-                _inject_meta(payload, rid)
-                proc_ms = int((time.time() - t0) * 1000)
-                _log_analyze(rid, proc_ms, payload)
-                override = (req.headers.get("X-Quality-Override") or "").strip() == "1"
-                is_workshop = bool((req.headers.get("X-Workshop-Token") or "").strip()) or mt in ("1", "true", "yes", "y")
-                if SCN_FEATURE_POLICY_ENGINE_ACTIVE:
-                    block_resp, modified = await execute_policy_actions(payload, f_bytes, override, is_workshop)
-                    if block_resp is not None:
-                        _inject_meta(block_resp, rid)
-                        _audit_analyze_exit(422, policy_action=block_resp.get("policy_action"))
-                        return JSONResponse(content=block_resp, status_code=422)
-                    if modified is not None:
-                        payload = modified
-                elif SCN_FEATURE_QUALITY_GATE_ACTIVE:
-                    block_resp, modified = check_quality_gate(payload, override)
-                    if block_resp is not None:
-                        _inject_meta(block_resp, rid)
-                        _audit_analyze_exit(422, policy_action=block_resp.get("policy_action"))
-                        return JSONResponse(content=block_resp, status_code=422)
-                    if modified is not None:
-                        payload = modified
-                res0 = (payload.get("results") or [{}])[0] if isinstance(payload.get("results"), list) else {}
-                top1 = res0.get("model") or res0.get("id_model_ref")
-                conf = res0.get("confidence")
-                pa = (payload.get("debug") or {}).get("policy_action")
-                _audit_analyze_exit(200, top1=top1, confidence=conf, policy_action=pa)
-                return JSONResponse(content=payload, status_code=200)
+                with timer.span("normalize"):
+                    raw, payload = await run_cpu("normalize", normalize_contract_bytes, r.content, norm_view, norm_fields)
+                if cache_key is not None:
+                    _ANALYZE_CACHE.put(cache_key, payload, motor_model_version(raw))
             except Exception:
-                pass
+                payload = None
+
+    if payload is not None:
+        try:
+            _inject_meta(payload, rid)
+            proc_ms = int((time.time() - t0) * 1000)
+            _log_analyze(rid, proc_ms, payload)
+            override = (req.headers.get("X-Quality-Override") or "").strip() == "1"
+            is_workshop = bool(token) or mt in ("1", "true", "yes", "y")
+            with timer.span("gates"):
+                block_resp, payload = await _run_gates(payload, _front_bytes, override, is_workshop)
+            if block_resp is not None:
+                _inject_meta(block_resp, rid)
+                _audit_analyze_exit(422, policy_action=block_resp.get("policy_action"))
+                return FastJSONResponse(content=block_resp, status_code=422)
+            _attach_timings(payload, timer)
+            res0 = (payload.get("results") or [{}])[0] if isinstance(payload.get("results"), list) else {}
+            top1 = res0.get("model") or res0.get("id_model_ref")
+            conf = res0.get("confidence")
+            pa = (payload.get("debug") or {}).get("policy_action")
+            _audit_analyze_exit(200, top1=top1, confidence=conf, policy_action=pa)
+            if gates_active:
+                payload = _inject_meta(project_contract(payload, projection), rid)
+            resp = FastJSONResponse(content=payload, status_code=200)
+            if SCN_FEATURE_GATEWAY_ANALYZE_CACHE:
+                resp.headers["X-Cache"] = cache_status
+            return resp
+        except Exception:
+            if r is None:
+                raise
     final = _proxy_httpx_json(r, rid)
     _audit_analyze_exit(r.status_code)
     return final
 
 
+def _attach_timings(payload: Dict[str, Any], timer: StageTimer) -> None:
+    """Añade los ms del gateway (gateway.*) a debug.timings, junto a los del motor; sin debug no hace nada."""
+    debug = payload.get("debug") if isinstance(payload, dict) else None
+    if SCN_DEBUG_INCLUDE_TIMINGS and isinstance(debug, dict):
+        debug["timings"] = {**(debug.get("timings") or {}), **timer.timings_ms("gateway.")}
+
+
+# Clasificación progresiva: resultados y flags, sin debug (consistency/risk/policy llegan al final)
+_STREAM_CLASSIFICATION_FIELDS = "input_id,timestamp,manufacturer_hint,results,low_confidence,high_confidence"
+
+
+def _ndjson(event: str, data: Any, status: Optional[int] = None) -> bytes:
+    obj = {"event": event, "data": data}
+    if status is not None:
+        obj["status"] = status
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+@APP.post("/api/analyze-key/stream")
+async def proxy_analyze_key_stream(
+    req: Request,
+    front: UploadFile = File(None),
+    back: UploadFile = File(None),
+    image_front: UploadFile = File(None),
+    image_back: UploadFile = File(None),
+    modo: Optional[str] = Form(None),
+    modo_taller: Optional[str] = Form(None),
+    view: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+):
+    """
+    Variante progresiva de /api/analyze-key (NDJSON, una línea por evento):
+    classification (top-3 en cuanto el motor lo tiene) -> quality -> ocr -> policy ->
+    result (contrato final, como /api/analyze-key) | blocked (422) | error.
+    """
+    f = front or image_front
+    b = back or image_back
+    if f is None:
+        raise HTTPException(400, "front requerido (front o image_front)")
+    projection = _resolve_analyze_projection(view, fields)
+    gates_active = SCN_FEATURE_POLICY_ENGINE_ACTIVE or SCN_FEATURE_QUALITY_GATE_ACTIVE
+    f_body, b_body, files = await _analyze_uploads(f, b)
+    data, mt = _analyze_form(modo, modo_taller)
+    rid = getattr(req.state, "request_id", get_request_id(req))
+    api_key = (req.headers.get("x-api-key") or "").strip()
+    ip = client_ip(req)
+    token = (req.headers.get("X-Workshop-Token") or "").strip()
+    role = "taller" if mt in ("1", "true", "yes", "y") or token else "cliente"
+    override = (req.headers.get("X-Quality-Override") or "").strip() == "1"
+    is_workshop = bool(token) or mt in ("1", "true", "yes", "y")
+    t0 = time.time()
+    timer = StageTimer("gateway")
+
+    def _audit_exit(status: int, top1=None, confidence=None, policy_action=None):
+        audit_analyze(rid, "/api/analyze-key/stream", status, role=role, ip=ip, api_key=api_key or None, top1=top1, confidence=confidence, policy_action=policy_action)
+
+    # Antes de devolver la respuesta: FastAPI cierra los UploadFile en cuanto el endpoint
+    # retorna, antes de que corra el generador; el stream al motor lleva copias en memoria
+    with timer.span("precheck"):
+        block = await _quality_precheck(f_body, b_body, rid)
+    events = None
+    if block is None:
+        files = await run_cpu("upload_copy", _upload_copies, files)
+        # Admisión y backend antes del 200: saturación o sin motor -> 503 real
+        events = await _motor_stream("/api/analyze-key", files=files, data=data, request_id=rid, req=req)
+
+    async def _events():
+        if block is not None:
+            _audit_exit(422, policy_action=block["debug"]["policy_action"])
+            yield _ndjson("blocked", block, 422)
+            return
+        try:
+            async for chunk in _motor_events():
+                yield chunk
+        finally:
+            await events.aclose()
+
+    async def _motor_events():
+        t_motor = time.perf_counter()
+        async for ev in events:
+            name, ev_data = ev.get("event"), ev.get("data")
+            if name == "error":
+                _audit_exit(int(ev.get("status") or 502))
+                yield _ndjson("error", ev_data, ev.get("status"))
+                return
+            if name == "classification":
+                contract = await run_cpu("normalize", normalize_contract, ev_data, None, _STREAM_CLASSIFICATION_FIELDS)
+                yield _ndjson("classification", _inject_meta(contract, rid))
+            elif name in ("quality", "ocr"):
+                yield _ndjson(name, ev_data)
+            elif name == "final":
+                timer.record("motor", time.perf_counter() - t_motor)
+                with timer.span("normalize"):
+                    if gates_active:
+                        payload = await run_cpu("normalize", normalize_contract, ev_data)
+                    else:
+                        payload = await run_cpu("normalize", normalize_contract, ev_data, view, fields)
+                _inject_meta(payload, rid)
+                _log_analyze(rid, int((time.time() - t0) * 1000), payload)
+                with timer.span("gates"):
+                    block_resp, payload = await _run_gates(payload, lambda: _body_bytes(f_body), override, is_workshop)
+                if block_resp is not None:
+                    _inject_meta(block_resp, rid)
+                    _audit_exit(422, policy_action=block_resp.get("policy_action"))
+                    yield _ndjson("blocked", block_resp, 422)
+                    return
+                debug = payload.get("debug") or {}
+                if debug.get("policy_action") is not None:
+                    yield _ndjson(
+                        "policy",
+                        {k: debug.get(k) for k in ("policy_action", "policy_reasons", "policy_user_message")},
+                    )
+                res0 = (payload.get("results") or [{}])[0] if isinstance(payload.get("results"), list) else {}
+                _audit_exit(
+                    200,
+                    top1=res0.get("model") or res0.get("id_model_ref"),
+                    confidence=res0.get("confidence"),
+                    policy_action=debug.get("policy_action"),
+                )
+                _attach_timings(payload, timer)
+                if gates_active:
+                    payload = _inject_meta(project_contract(payload, projection), rid)
+                yield _ndjson("result", payload, 200)
+                return
+        # El motor cerró sin evento final (caída a mitad de inferencia)
+        _audit_exit(502)
+        yield _ndjson("error", {"detail": "Respuesta del motor incompleta"}, 502)
+
+    return StreamingResponse(
+        _events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Si el body no llega a empezar (cliente desconectado), el motor se libera igualmente
+        background=BackgroundTask(events.aclose) if events is not None else None,
+    )
+
+
 @APP.post("/api/ingest-key")
 async def ingest_key(
     req: Request,
@@ -357,65 +836,341 @@ async def ingest_key(
     gcs_put_bytes(KEY_BUCKET, a_path, f_bytes, f.content_type or "image/jpeg")
     if b_path:
         gcs_put_bytes(KEY_BUCKET, b_path, b_bytes, (b.content_type if b else None) or "image/jpeg")
+    job = _new_job(
+        job_id,
+        {"A": a_path, "B": b_path},
+        {"A": _sha256(f_bytes), "B": (_sha256(b_bytes) if b_bytes else None)},
+    )
+    _save_job(job_path, job)
+    return {"ok": True, "job_id": job_id, "status": "queued", "job_object": job_path}
+
+
+_UPLOAD_CONTENT_TYPES = ("image/jpeg", "image/png", "image/webp")
+# Los jobs viven en GCS aunque los bytes vayan al store local (SCN_UPLOAD_STORE=local)
+_INGEST_NEEDS_GCS = "Ingest no disponible sin GCS (los jobs se guardan en GCS, también con SCN_UPLOAD_STORE=local). Usa /api/analyze-key."
+
+
+def _new_job(job_id: str, objects: Dict[str, Optional[str]], hashes: Dict[str, Optional[str]], store: Optional[str] = None) -> Dict[str, Any]:
     job = {
         "job_id": job_id,
-        "input_id": input_id,
+        "input_id": job_id,
         "status": "queued",
         "created_at": _now_iso(),
         "bucket": KEY_BUCKET,
-        "objects": {"A": a_path, "B": b_path},
-        "hash": {"A": _sha256(f_bytes), "B": (_sha256(b_bytes) if b_bytes else None)},
+        "objects": objects,
+        "hash": hashes,
         "attempts": 0,
         "last_error": None,
         "result": None,
     }
-    gcs_put_json(KEY_BUCKET, job_path, job)
-    return {"ok": True, "job_id": job_id, "status": "queued", "job_object": job_path}
+    if store and store != "gcs":
+        job["store"] = store
+    return job
 
 
-@APP.get("/api/job/{job_id}")
-async def job_status(req: Request, job_id: str, process: str = "1", _: bool = Depends(require_apikey)):
+@APP.post("/api/ingest-key/uploads")
+async def ingest_key_uploads(req: Request, _: bool = Depends(require_apikey)):
+    """
+    Paso 1 del ingest directo: URLs firmadas (PUT) para A y opcionalmente B, más un
+    upload_token para /api/ingest-key/finalize. Los bytes no pasan por el gateway.
+    Body JSON opcional: {"back": bool, "content_type": "image/jpeg"}.
+    """
+    if not SCN_FEATURE_GATEWAY_SIGNED_UPLOADS:
+        raise HTTPException(501, "Subida directa no habilitada (SCN_FEATURE_GATEWAY_SIGNED_UPLOADS)")
     if not gcs_ok():
-        raise HTTPException(status_code=501, detail="Job status no disponible en modo local.")
+        raise HTTPException(status_code=501, detail=_INGEST_NEEDS_GCS)
+    try:
+        body = await req.json() if await req.body() else {}
+    except Exception:
+        raise HTTPException(400, "JSON inválido")
+    content_type = (body.get("content_type") or "image/jpeg").strip().lower()
+    if content_type not in _UPLOAD_CONTENT_TYPES:
+        raise HTTPException(415, f"content_type no soportado: {content_type}")
+    job_id = uuid.uuid4().hex
+    dp = _date_prefix(datetime.now(timezone.utc))
+    objects = {"A": f"{KEY_PREFIX}/{dp}/{job_id}_A.jpg", "B": f"{KEY_PREFIX}/{dp}/{job_id}_B.jpg" if body.get("back") else None}
+    store = get_upload_store()
+    exp = int(time.time() + SCN_UPLOAD_URL_TTL_S)
+    base_url = str(req.base_url)
+    uploads = {
+        side: store.sign_put(path, content_type, MAX_PAYLOAD_BYTES, SCN_UPLOAD_URL_TTL_S, base_url)
+        for side, path in (("front", objects["A"]), ("back", objects["B"]))
+        if path
+    }
+    token = sign_token({"j": job_id, "dp": dp, "o": objects, "s": store.name, "exp": exp})
+    return {
+        "ok": True,
+        "job_id": job_id,
+        "upload_token": token,
+        "expires_at": datetime.fromtimestamp(exp, timezone.utc).isoformat(),
+        "max_bytes": MAX_PAYLOAD_BYTES,
+        "uploads": uploads,
+    }
+
+
+@APP.put(LOCAL_UPLOAD_ROUTE + "/{path:path}", include_in_schema=False)
+async def ingest_key_local_upload(req: Request, path: str, exp: int, ct: str, sig: str, max_bytes: int = Query(..., alias="max")):
+    """Destino de las URLs del store local (dev/tests): valida firma, tipo y tamaño como GCS."""
+    store = get_upload_store()
+    if getattr(store, "name", None) != "local":
+        raise HTTPException(404, "Not Found")
+    try:
+        store.check_put(path, exp, ct, max_bytes, sig)
+    except ValueError as e:
+        raise HTTPException(403, f"URL de subida no válida: {e}")
+    if (req.headers.get("content-type") or "").split(";")[0].strip().lower() != ct:
+        raise HTTPException(403, "Content-Type distinto del firmado")
+    full, fh = store.open_write(path)
+    size = 0
     try:
-        job_path = find_job_path(KEY_BUCKET, job_id, JOB_PREFIX)
+        with fh:
+            async for chunk in req.stream():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(413, f"Archivo demasiado grande (máx {max_bytes} bytes)")
+                fh.write(chunk)
+        if not size:
+            raise HTTPException(400, "archivo vacío")
+        os.replace(fh.name, full)
+    except BaseException:
+        try:
+            os.remove(fh.name)
+        except OSError:
+            pass
+        raise
+    return Response(status_code=200)
+
+
+@APP.post("/api/ingest-key/finalize")
+async def ingest_key_finalize(req: Request, _: bool = Depends(require_apikey)):
+    """
+    Paso 2: comprueba que A (y B si se pidió y llegó) están en el store y encola el job.
+    Idempotente: repetir con el mismo upload_token devuelve el mismo job.
+    """
+    if not SCN_FEATURE_GATEWAY_SIGNED_UPLOADS:
+        raise HTTPException(501, "Subida directa no habilitada (SCN_FEATURE_GATEWAY_SIGNED_UPLOADS)")
+    if not gcs_ok():
+        raise HTTPException(status_code=501, detail=_INGEST_NEEDS_GCS)
+    try:
+        body = await req.json()
+    except Exception:
+        raise HTTPException(400, "JSON inválido")
+    try:
+        claims = verify_token(str(body.get("upload_token") or ""))
+    except Exception as e:
+        raise HTTPException(403, f"upload_token no válido: {e}")
+    store = get_upload_store()
+    if claims.get("s") != store.name:
+        raise HTTPException(409, "upload_token de otro store")
+    job_id = claims["j"]
+    job_path = f"{JOB_PREFIX}/{claims['dp']}/{job_id}.json"
+    try:
+        job = gcs_get_json(KEY_BUCKET, job_path)
+        return {"ok": True, "job_id": job_id, "status": job.get("status"), "job_object": job_path}
     except FileNotFoundError:
-        raise HTTPException(404, "job no encontrado")
-    job = gcs_get_json(KEY_BUCKET, job_path)
-    if job.get("status") in ("done", "error") or process not in ("1", "true", "yes", "y"):
-        return {"ok": True, **job}
-    if not MOTOR_URL:
-        job["last_error"] = "MOTOR_URL no configurado"
-        gcs_put_json(KEY_BUCKET, job_path, job)
-        return {"ok": True, **job}
+        pass
+    objects = dict(claims["o"])
+    for side, key in (("front", "A"), ("back", "B")):
+        if not objects.get(key):
+            continue
+        st = store.stat(objects[key])
+        if st is None or st[0] <= 0:
+            if key == "A":
+                raise HTTPException(409, "front no subido todavía")
+            objects["B"] = None
+            continue
+        if st[0] > MAX_PAYLOAD_BYTES:
+            raise HTTPException(413, f"{side} demasiado grande")
+    job = _new_job(job_id, objects, {"A": None, "B": None}, store.name)
+    _save_job(job_path, job)
+    return {"ok": True, "job_id": job_id, "status": "queued", "job_object": job_path}
+
+
+def _job_bytes(job: Dict[str, Any], path: str) -> bytes:
+    if job.get("store") == "local":
+        return get_upload_store().read(path)
+    return gcs_get_bytes(KEY_BUCKET, path)
+
+
+def _job_uri(job: Dict[str, Any], path: str) -> str:
+    if job.get("store") == "local":
+        return get_upload_store().uri(path)
+    return f"gs://{KEY_BUCKET}/{path}"
+
+
+def _save_job(job_path: str, job: Dict[str, Any]) -> None:
+    """Escribe el job en GCS y notifica a long-polls/SSE de este proceso."""
+    gcs_put_json(KEY_BUCKET, job_path, job)
+    get_job_hub().publish(job["job_id"], job_path, job)
+
+
+def _load_job(job_id: str):
+    """
+    (job_path, job). Terminal o en proceso aquí -> memoria; si no, GCS (otra réplica
+    puede haberlo cambiado) reutilizando la ruta conocida en vez de find_job_path.
+    """
+    hub = get_job_hub()
+    _, job = hub.get(job_id)
+    path = hub.path(job_id)
+    if job is not None and (job.get("status") in TERMINAL_STATUSES or hub.is_processing(job_id)):
+        return path, job
+    if path is None:
+        path = find_job_path(KEY_BUCKET, job_id, JOB_PREFIX)
+    job = gcs_get_json(KEY_BUCKET, path)
+    hub.publish(job_id, path, job)
+    return path, job
+
+
+async def _process_job(job_path: str, job: Dict[str, Any], rid: str) -> Dict[str, Any]:
+    """Analiza un job encolado contra el motor; cada cambio de estado se persiste y notifica."""
+    job = dict(job)
     try:
         job["status"] = "processing"
         job["attempts"] = int(job.get("attempts") or 0) + 1
-        gcs_put_json(KEY_BUCKET, job_path, job)
-        a_bytes = gcs_get_bytes(KEY_BUCKET, job["objects"]["A"])
+        _save_job(job_path, job)
         b_obj = job["objects"].get("B")
-        b_bytes = gcs_get_bytes(KEY_BUCKET, b_obj) if b_obj else b""
-        files = {"front": ("front.jpg", a_bytes, "image/jpeg")}
-        if b_bytes:
-            files["back"] = ("back.jpg", b_bytes, "image/jpeg")
         data = {"modo": "taller"}
-        rid = getattr(req.state, "request_id", get_request_id(req))
+        if SCN_FEATURE_GATEWAY_ANALYZE_BY_REF:
+            # Las imágenes no pasan por el gateway: el motor las lee de GCS (con caché local)
+            files = None
+            data["front_uri"] = _job_uri(job, job["objects"]["A"])
+            if b_obj:
+                data["back_uri"] = _job_uri(job, b_obj)
+        else:
+            a_bytes = _job_bytes(job, job["objects"]["A"])
+            b_bytes = _job_bytes(job, b_obj) if b_obj else b""
+            files = {"front": ("front.jpg", a_bytes, "image/jpeg")}
+            if b_bytes:
+                files["back"] = ("back.jpg", b_bytes, "image/jpeg")
         r = await _motor_post("/api/analyze-key", files=files, data=data, request_id=rid)
         if r.status_code >= 400:
             job["status"] = "error"
             job["last_error"] = f"motor {r.status_code}"
-            gcs_put_json(KEY_BUCKET, job_path, job)
-            return {"ok": True, **job}
+            _save_job(job_path, job)
+            return job
         job["status"] = "done"
         job["result"] = r.json()
         job["finished_at"] = _now_iso()
-        gcs_put_json(KEY_BUCKET, job_path, job)
-        return {"ok": True, **job}
+        _save_job(job_path, job)
+        return job
     except Exception as e:
         job["status"] = "error"
         job["last_error"] = f"{type(e).__name__}: {str(e)[:180]}"
-        gcs_put_json(KEY_BUCKET, job_path, job)
+        _save_job(job_path, job)
+        return job
+
+
+def _start_job_processing(job_id: str, job_path: str, job: Dict[str, Any], rid: str):
+    """Task de procesamiento (una por job en este proceso); None si no hay motor configurado."""
+    if not MOTOR_URL:
+        job["last_error"] = "MOTOR_URL no configurado"
+        _save_job(job_path, job)
+        return None
+    return get_job_hub().ensure_processing(job_id, lambda: _process_job(job_path, job, rid))
+
+
+@APP.get("/api/job/{job_id}")
+async def job_status(
+    req: Request,
+    job_id: str,
+    process: str = "1",
+    wait: float = 0,
+    status: Optional[str] = None,
+    _: bool = Depends(require_apikey),
+):
+    """
+    process=1: procesa el job si está encolado (una sola vez por proceso).
+    wait=N (long-poll, máx SCN_JOB_WAIT_MAX_S): espera hasta que el estado sea distinto de
+    `status` (por defecto el actual) o terminal, en vez de sondear GCS en bucle.
+    """
+    if not gcs_ok():
+        raise HTTPException(status_code=501, detail="Job status no disponible en modo local.")
+    try:
+        job_path, job = _load_job(job_id)
+    except FileNotFoundError:
+        raise HTTPException(404, "job no encontrado")
+    if job.get("status") in TERMINAL_STATUSES:
+        return {"ok": True, **job}
+    wait = min(max(float(wait or 0), 0.0), SCN_JOB_WAIT_MAX_S)
+    if process in ("1", "true", "yes", "y"):
+        rid = getattr(req.state, "request_id", get_request_id(req))
+        task = _start_job_processing(job_id, job_path, job, rid)
+        if task is None:
+            return {"ok": True, **job}
+        if wait <= 0:
+            return {"ok": True, **(await asyncio.shield(task))}
+    if wait <= 0:
         return {"ok": True, **job}
+    hub = get_job_hub()
+    baseline = status or job.get("status")
+    version, cur = hub.get(job_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        if cur is not None:
+            job = cur
+        if job.get("status") != baseline or job.get("status") in TERMINAL_STATUSES:
+            break
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        version, cur = await hub.wait_for_change(job_id, version, remaining)
+    return {"ok": True, **job}
+
+
+def _sse(event: str, data: Dict[str, Any], event_id: int) -> str:
+    return f"event: {event}\nid: {event_id}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@APP.get("/api/job/{job_id}/events")
+async def job_events(req: Request, job_id: str, process: str = "1", _: bool = Depends(require_apikey)):
+    """
+    SSE: evento `status` con el job al conectar y en cada cambio de estado; se cierra al
+    llegar a done/error o tras SCN_JOB_EVENTS_MAX_S. Keepalive cada SCN_JOB_EVENTS_HEARTBEAT_S.
+    """
+    if not gcs_ok():
+        raise HTTPException(status_code=501, detail="Job status no disponible en modo local.")
+    try:
+        job_path, job = _load_job(job_id)
+    except FileNotFoundError:
+        raise HTTPException(404, "job no encontrado")
+    if process in ("1", "true", "yes", "y") and job.get("status") not in TERMINAL_STATUSES:
+        rid = getattr(req.state, "request_id", get_request_id(req))
+        _start_job_processing(job_id, job_path, job, rid)
+    hub = get_job_hub()
+
+    async def _stream():
+        version, cur = hub.get(job_id)
+        current = cur or job
+        yield _sse("status", {"ok": True, **current}, version)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SCN_JOB_EVENTS_MAX_S
+        while current.get("status") not in TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                yield _sse("timeout", {"ok": True, "job_id": job_id, "status": current.get("status")}, version)
+                return
+            v2, cur = await hub.wait_for_change(job_id, version, min(remaining, SCN_JOB_EVENTS_HEARTBEAT_S))
+            if cur is None:
+                return
+            if v2 == version and not hub.is_processing(job_id):
+                # Nadie lo procesa aquí: puede avanzar en otra réplica -> releer GCS (publica si cambió)
+                try:
+                    _load_job(job_id)
+                except Exception:
+                    pass
+                v2, cur = hub.get(job_id)
+            if v2 > version:
+                version, current = v2, cur
+                yield _sse("status", {"ok": True, **current}, version)
+            else:
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @APP.post("/api/feedback")
@@ -430,7 +1185,13 @@ async def feedback(req: Request):
     if not isinstance(payload, dict):
         payload = {}
     idem_key = get_feedback_idempotency_key_from_request(req, payload)
-    seen, cached = check_idempotency_seen(idem_key)
+    writer = get_feedback_writer() if SCN_FEATURE_GATEWAY_FEEDBACK_SEGMENTS and gcs_ok() else None
+    if writer is not None:
+        # Índice local del spool: sin GET/PUT a GCS por evento (la clave sube dentro del segmento)
+        seen_path = writer.seen(idem_key)
+        seen, cached = seen_path is not None, {"ok": True, "stored": seen_path}
+    else:
+        seen, cached = check_idempotency_seen(idem_key)
     if seen and cached is not None:
         _log.info("feedback_idempotent", extra={"idempotency_key": idem_key[:16] + "..."})
         out = dict(cached) if isinstance(cached, dict) else {"ok": True}
@@ -443,13 +1204,19 @@ async def feedback(req: Request):
         top1 = payload.get("selected_id") or (payload.get("choice") or {}).get("id_model_ref")
         audit_feedback(rid, "/api/feedback", 200, role="cliente", ip=ip, api_key=api_key or None, top1=top1, deduped=False)
         return resp
-    dp = _date_prefix(datetime.now(timezone.utc))
-    ts = int(time.time())
-    input_id = payload.get("input_id") or payload.get("job_id") or uuid.uuid4().hex
-    path = f"{FEEDBACK_PREFIX}/{dp}/{input_id}_{ts}.json"
-    gcs_put_json(KEY_BUCKET, path, {"received_at": _now_iso(), **payload})
-    resp = {"ok": True, "stored": path}
-    store_idempotency(idem_key, resp)
+    if writer is not None:
+        # Ack tras el fsync en el spool local; el segmento sube a GCS en segundo plano
+        path = await writer.append({"received_at": _now_iso(), **payload}, idempotency_key=idem_key)
+        writer.ensure_ticker()
+        resp = {"ok": True, "stored": path}
+    else:
+        dp = _date_prefix(datetime.now(timezone.utc))
+        ts = int(time.time())
+        input_id = payload.get("input_id") or payload.get("job_id") or uuid.uuid4().hex
+        path = f"{FEEDBACK_PREFIX}/{dp}/{input_id}_{ts}.json"
+        gcs_put_json(KEY_BUCKET, path, {"received_at": _now_iso(), **payload})
+        resp = {"ok": True, "stored": path}
+        store_idempotency(idem_key, resp)
     top1 = payload.get("selected_id") or (payload.get("choice") or {}).get("id_model_ref")
     audit_feedback(rid, "/api/feedback", 200, role="cliente", ip=ip, api_key=api_key or None, top1=top1, deduped=False)
     return resp
@@ -5,18 +5,24 @@ y produce SIEMPRE la forma final del contrato.
 ROI/crop_bbox: fallback seguro a {0,0,1,1} cuando no hay detección fiable.
 Multi-label Fase 5: vocabularios canónicos, *_meta con value/confidence/source.
 """
+import json
 import os
+from functools import lru_cache
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, NamedTuple, Tuple
 
 from roi_bbox import ensure_valid_crop_bbox, apply_fallback_penalty, clamp_confidence, FULL_FRAME
 from common.size_class import extract_size_class_debug_only
 from common import multilabel_vocab
-from common.multilabel_attrs import normalize_attr
+from common.multilabel_attrs import normalize_attr, make_attr, get_normalizer
 
 SCN_FEATURE_RISK_ENGINE_PASSIVE = (
     os.getenv("SCN_FEATURE_RISK_ENGINE_PASSIVE", "true").lower() == "true"
 )
+# Tabla precompilada de campos *_meta; false = ruta legacy (lambdas + normalize_attr)
+SCN_FEATURE_NORMALIZE_FAST_PATH = (
+    os.getenv("SCN_FEATURE_NORMALIZE_FAST_PATH", "true").lower() == "true"
+)
 
 # Umbrales del contrato
 THRESHOLD_HIGH = 0.95
@@ -47,6 +53,211 @@ _META_FIELDS = (
     "requires_card",
 )
 
+# Alias raw por campo (orden de prioridad, semántica `a or b`). Resto: solo el propio campo.
+_RAW_ALIASES = {
+    "orientation": ("orientation", "orientacion"),
+    "head_color": ("head_color", "headColor"),
+    "visual_state": ("visual_state", "state"),
+}
+
+
+class _FieldSpec(NamedTuple):
+    """Campo *_meta resuelto al importar: alias, normalizador y claves derivadas."""
+    name: str
+    aliases: Tuple[str, ...]
+    normalizer: Optional[Callable[[Any], Any]]
+    confidence_key: str
+    meta_key: str
+
+
+def _compile_field_spec(field_name: str) -> _FieldSpec:
+    return _FieldSpec(
+        name=field_name,
+        aliases=_RAW_ALIASES.get(field_name, (field_name,)),
+        normalizer=get_normalizer(field_name),
+        confidence_key=f"{field_name}_confidence",
+        meta_key=f"{field_name}_meta",
+    )
+
+
+_FIELD_SPECS = {name: _compile_field_spec(name) for name in _META_FIELDS}
+_ORIENTATION_SPEC = _FIELD_SPECS["orientation"]
+_HEAD_COLOR_SPEC = _FIELD_SPECS["head_color"]
+_VISUAL_STATE_SPEC = _FIELD_SPECS["visual_state"]
+# Recomendados: mismo orden que la salida legacy (valores y luego *_meta)
+_EXTRA_SPECS = tuple(
+    _FIELD_SPECS[n]
+    for n in _META_FIELDS
+    if n not in ("orientation", "patentada", "head_color", "visual_state")
+)
+# Cualquier clave que pueda aportar un atributo *_meta; si el item no tiene ninguna, se salta todo
+_META_INPUT_KEYS = frozenset(
+    [a for spec in _FIELD_SPECS.values() for a in spec.aliases] + ["patent", "is_patented"]
+)
+
+
+# ---------- Proyección del contrato (view= / fields=) ----------
+# Claves de resultado que no dependen de atributos multi-label (_result_base)
+_BASE_RESULT_KEYS = frozenset(
+    ("rank", "brand", "model", "type", "confidence", "explain_text", "tags", "compatibility_tags", "id_model_ref", "crop_bbox")
+)
+_CONSISTENCY_DEBUG_KEYS = frozenset(
+    (
+        "consistency_score",
+        "consistency_reasons",
+        "consistency_conflicts",
+        "consistency_supports",
+        "consistency_level",
+        "consistency_strong_conflicts",
+        "consistency_weak_conflicts",
+        "evidence_notes",
+    )
+)
+_RISK_DEBUG_KEYS = frozenset(("margin", "risk_score", "risk_level", "risk_reasons"))
+_POLICY_DEBUG_KEYS = frozenset(("policy_action", "policy_reasons", "policy_user_message", "policy_version"))
+_PROJECTABLE_TOP_KEYS = frozenset(
+    (
+        "input_id",
+        "timestamp",
+        "manufacturer_hint",
+        "results",
+        "low_confidence",
+        "high_confidence",
+        "should_store_sample",
+        "storage_probability",
+        "current_samples_for_candidate",
+        "manual_correction_hint",
+        "debug",
+        "ocr_hint",
+        "ocr_detail",
+    )
+)
+
+
+class ContractProjection(NamedTuple):
+    """
+    Subconjunto del contrato pedido por el cliente (None = todo) y qué etapas hacen falta.
+    policy -> risk -> consistency -> *_meta: cada etapa necesita la anterior.
+    """
+    top_keys: Optional[frozenset]
+    result_keys: Optional[frozenset]
+    debug_keys: Optional[frozenset]
+    need_debug: bool
+    need_consistency: bool
+    need_risk: bool
+    need_policy: bool
+    need_meta: bool
+
+
+def _make_projection(top_keys, result_keys, debug_keys) -> ContractProjection:
+    need_debug = top_keys is None or "debug" in top_keys
+    need_policy = need_debug and (debug_keys is None or not _POLICY_DEBUG_KEYS.isdisjoint(debug_keys))
+    need_risk = need_policy or (need_debug and (debug_keys is None or not _RISK_DEBUG_KEYS.isdisjoint(debug_keys)))
+    need_consistency = need_risk or (
+        need_debug and (debug_keys is None or not _CONSISTENCY_DEBUG_KEYS.isdisjoint(debug_keys))
+    )
+    need_results = top_keys is None or "results" in top_keys
+    need_meta = need_consistency or (
+        need_results and (result_keys is None or not result_keys <= _BASE_RESULT_KEYS)
+    )
+    return ContractProjection(
+        top_keys, result_keys, debug_keys, need_debug, need_consistency, need_risk, need_policy, need_meta
+    )
+
+
+_FULL_PROJECTION = _make_projection(None, None, None)
+
+CONTRACT_VIEWS: Dict[str, ContractProjection] = {
+    # Lista de candidatos sin atributos ni debug: sin *_meta, consistency, risk ni policy
+    "minimal": _make_projection(
+        frozenset(("input_id", "timestamp", "results", "low_confidence", "high_confidence")),
+        frozenset(("rank", "brand", "model", "confidence", "explain_text")),
+        None,
+    ),
+    # App cliente: resultados base + mensaje de policy (policy necesita el contrato completo)
+    "client": _make_projection(
+        frozenset(
+            (
+                "input_id",
+                "timestamp",
+                "manufacturer_hint",
+                "results",
+                "low_confidence",
+                "high_confidence",
+                "should_store_sample",
+                "storage_probability",
+                "current_samples_for_candidate",
+                "manual_correction_hint",
+                "ocr_hint",
+                "debug",
+            )
+        ),
+        _BASE_RESULT_KEYS,
+        frozenset(("model_version", "policy_action", "policy_reasons", "policy_user_message")),
+    ),
+    # Taller: contrato multi-label completo, debug reducido a señales de decisión
+    "workshop": _make_projection(
+        None,
+        None,
+        frozenset(
+            ("model_version", "roi_source", "quality_score", "roi_score", "consistency_score", "consistency_level")
+        )
+        | _CONSISTENCY_DEBUG_KEYS
+        | _RISK_DEBUG_KEYS
+        | _POLICY_DEBUG_KEYS,
+    ),
+    "debug": _FULL_PROJECTION,
+}
+
+
+@lru_cache(maxsize=256)
+def resolve_projection(view: Optional[str] = None, fields: Optional[str] = None) -> Optional[ContractProjection]:
+    """
+    view: minimal | client | workshop | debug. fields: lista separada por comas de claves
+    top-level, "results.<clave>" o "debug.<clave>" (tiene prioridad sobre view).
+    None = contrato completo. Lanza ValueError si view/fields no son válidos.
+    """
+    fields = (fields or "").strip()
+    if fields:
+        top, res, dbg = set(), set(), set()
+        for tok in fields.split(","):
+            tok = tok.strip()
+            if not tok:
+                continue
+            head, _, sub = tok.partition(".")
+            if head not in _PROJECTABLE_TOP_KEYS or (sub and head not in ("results", "debug")):
+                raise ValueError(f"campo no soportado: {tok}")
+            top.add(head)
+            if head == "results" and sub:
+                res.add(sub)
+            elif head == "debug" and sub:
+                dbg.add(sub)
+        if not top:
+            raise ValueError("fields vacío")
+        if res:
+            res.add("rank")
+        return _make_projection(frozenset(top), frozenset(res) or None, frozenset(dbg) or None)
+    view = (view or "").strip().lower()
+    if not view:
+        return None
+    if view not in CONTRACT_VIEWS:
+        raise ValueError(f"view no soportada: {view} (usa {', '.join(CONTRACT_VIEWS)})")
+    projection = CONTRACT_VIEWS[view]
+    return None if projection is _FULL_PROJECTION else projection
+
+
+def project_contract(out: Dict[str, Any], projection: Optional[ContractProjection]) -> Dict[str, Any]:
+    """Filtra un contrato ya normalizado a la proyección (mantiene el orden de claves)."""
+    if projection is None:
+        return out
+    top, rk, dk = projection.top_keys, projection.result_keys, projection.debug_keys
+    res = out if top is None else {k: v for k, v in out.items() if k in top}
+    if rk is not None and isinstance(res.get("results"), list):
+        res["results"] = [{k: v for k, v in r.items() if k in rk} for r in res["results"]]
+    if dk is not None and isinstance(res.get("debug"), dict):
+        res["debug"] = {k: v for k, v in res["debug"].items() if k in dk}
+    return res
+
 
 def _get_confidence(item: Dict[str, Any]) -> float:
     """Acepta conf o confidence."""
@@ -112,16 +323,12 @@ def _normalize_patentada(item: Dict[str, Any]) -> bool:
     return b if b is not None else False
 
 
-def _normalize_result(
+def _result_core(
     item: Dict[str, Any],
     rank: int,
-    roi_sources: Optional[List[str]] = None,
-    has_ocr_in_response: bool = False,
-) -> Dict[str, Any]:
-    """
-    Normaliza un item a la forma del contrato. Siempre incluye crop_bbox válido.
-    Multi-label Fase 2: campos opcionales. Si no vienen, null/[] sin inventar.
-    """
+    roi_sources: Optional[List[str]],
+) -> Tuple[float, Dict[str, float], str, list]:
+    """confidence (con penalización ROI), crop_bbox, explain_text y tags de un item."""
     conf = _get_confidence(item)
     bbox, roi_source, was_fallback = ensure_valid_crop_bbox(item, "")
     conf = apply_fallback_penalty(conf, was_fallback)
@@ -135,7 +342,162 @@ def _normalize_result(
     elif was_fallback and not explain:
         explain = "Recorte no fiable."
 
-    tags = _normalize_tags(item)
+    return conf, bbox, explain, _normalize_tags(item)
+
+
+def _result_base(item: Dict[str, Any], rank: int, conf: float, bbox: Dict[str, float], explain: str, tags: list) -> Dict[str, Any]:
+    """Claves fijas del contrato por resultado (antes de orientation/head_color/...)."""
+    return {
+        "rank": rank,
+        "brand": item.get("brand"),
+        "model": item.get("model") or item.get("id_model_ref"),
+        "type": multilabel_vocab.normalize_type(item.get("type")) or ("No identificado" if rank > 1 and not item else "key"),
+        "confidence": conf,
+        "explain_text": explain,
+        "tags": tags,
+        "compatibility_tags": tags,
+        "id_model_ref": item.get("id_model_ref") or item.get("ref"),
+        "crop_bbox": bbox,
+    }
+
+
+def _finish_result(out: Dict[str, Any], item: Dict[str, Any]) -> Dict[str, Any]:
+    """Experimentales (sin *_meta por ahora) y fallback de label a brand/model."""
+    out["oxidation_present"] = multilabel_vocab.normalize_bool_or_null(item.get("oxidation_present"))
+    out["surface_damage"] = multilabel_vocab.normalize_bool_or_null(item.get("surface_damage"))
+    out["material_hint"] = (item.get("material_hint") or "").strip() or None
+    out["restricted_copy"] = multilabel_vocab.normalize_bool_or_null(item.get("restricted_copy"))
+    out["text_visible_head"] = (item.get("text_visible_head") or "").strip() or None
+    out["text_visible_blade"] = (item.get("text_visible_blade") or "").strip() or None
+    out["structural_notes"] = (item.get("structural_notes") or "").strip() or None
+
+    if item.get("label") is not None and out.get("brand") is None:
+        out["brand"] = item.get("label")
+    if item.get("label") is not None and out.get("model") is None:
+        out["model"] = item.get("label")
+    return out
+
+
+def _spec_field(spec: _FieldSpec, item: Dict[str, Any], conf: float, has_ocr: bool) -> Tuple[Any, Dict[str, Any]]:
+    """(valor normalizado, meta) de un campo vía tabla. Campo ausente -> (None, {}) sin normalizar."""
+    raw = None
+    for alias in spec.aliases:
+        raw = item.get(alias)
+        if raw:
+            break
+    if raw is None:
+        return None, {}
+    value = spec.normalizer(raw) if spec.normalizer is not None else raw
+    if value is None:
+        return None, {}
+    per_field_conf = item.get(spec.confidence_key)
+    c = float(per_field_conf) if per_field_conf is not None else conf
+    return value, make_attr(value, c, _infer_source(spec.name, item, has_ocr))
+
+
+def _patentada_field(item: Dict[str, Any], conf: float, has_ocr: bool) -> Tuple[bool, Dict[str, Any]]:
+    """patentada: default False cuando no viene; meta solo si hay valor raw."""
+    patentada_raw = item.get("patentada") if "patentada" in item else item.get("patent") or item.get("is_patented")
+    if patentada_raw is None:
+        return False, {}
+    norm = multilabel_vocab.normalize_bool_or_null(patentada_raw)
+    value = norm if norm is not None else False
+    src = _infer_source("patentada", item, has_ocr)
+    if norm is None:
+        return value, {"value": value, "source": src, "confidence": conf}
+    per_field_conf = item.get("patentada_confidence")
+    c = float(per_field_conf) if per_field_conf is not None else conf
+    return value, make_attr(value, c, src)
+
+
+def _normalize_result_fast(
+    item: Dict[str, Any],
+    rank: int,
+    roi_sources: Optional[List[str]] = None,
+    has_ocr_in_response: bool = False,
+) -> Dict[str, Any]:
+    """
+    Igual que _normalize_result_legacy pero con la tabla _FIELD_SPECS precompilada.
+    Items sin ninguna clave multi-label (rank 2/3, motor sin atributos) saltan la tabla entera.
+    """
+    conf, bbox, explain, tags = _result_core(item, rank, roi_sources)
+    out = _result_base(item, rank, conf, bbox, explain, tags)
+
+    if _META_INPUT_KEYS.isdisjoint(item):
+        out["orientation"] = None
+        out["head_color"] = None
+        out["visual_state"] = None
+        out["patentada"] = False
+        for spec in _EXTRA_SPECS:
+            out[spec.name] = None
+        return _finish_result(out, item)
+
+    has_ocr = bool(has_ocr_in_response)
+    orient_val, orient_meta = _spec_field(_ORIENTATION_SPEC, item, conf, has_ocr)
+    patentada_val, patentada_meta = _patentada_field(item, conf, has_ocr)
+    hc_val, hc_meta = _spec_field(_HEAD_COLOR_SPEC, item, conf, has_ocr)
+    vs_val, vs_meta = _spec_field(_VISUAL_STATE_SPEC, item, conf, has_ocr)
+
+    out["orientation"] = orient_val
+    out["head_color"] = hc_val
+    out["visual_state"] = vs_val
+    out["patentada"] = patentada_val
+    if orient_meta:
+        out["orientation_meta"] = orient_meta
+    if patentada_meta:
+        out["patentada_meta"] = patentada_meta
+    if hc_meta:
+        out["head_color_meta"] = hc_meta
+    if vs_meta:
+        out["visual_state_meta"] = vs_meta
+
+    extras = [_spec_field(spec, item, conf, has_ocr) for spec in _EXTRA_SPECS]
+    for spec, (val, _) in zip(_EXTRA_SPECS, extras):
+        out[spec.name] = val
+    for spec, (_, meta) in zip(_EXTRA_SPECS, extras):
+        if meta:
+            out[spec.meta_key] = meta
+    return _finish_result(out, item)
+
+
+def _normalize_result_light(
+    item: Dict[str, Any],
+    rank: int,
+    roi_sources: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Solo claves base (proyecciones sin atributos multi-label): sin *_meta ni experimentales."""
+    conf, bbox, explain, tags = _result_core(item, rank, roi_sources)
+    out = _result_base(item, rank, conf, bbox, explain, tags)
+    if item.get("label") is not None and out.get("brand") is None:
+        out["brand"] = item.get("label")
+    if item.get("label") is not None and out.get("model") is None:
+        out["model"] = item.get("label")
+    return out
+
+
+def _normalize_result(
+    item: Dict[str, Any],
+    rank: int,
+    roi_sources: Optional[List[str]] = None,
+    has_ocr_in_response: bool = False,
+) -> Dict[str, Any]:
+    """
+    Normaliza un item a la forma del contrato. Siempre incluye crop_bbox válido.
+    Multi-label Fase 2: campos opcionales. Si no vienen, null/[] sin inventar.
+    """
+    if SCN_FEATURE_NORMALIZE_FAST_PATH:
+        return _normalize_result_fast(item, rank, roi_sources, has_ocr_in_response)
+    return _normalize_result_legacy(item, rank, roi_sources, has_ocr_in_response)
+
+
+def _normalize_result_legacy(
+    item: Dict[str, Any],
+    rank: int,
+    roi_sources: Optional[List[str]] = None,
+    has_ocr_in_response: bool = False,
+) -> Dict[str, Any]:
+    """Implementación original (referencia para SCN_FEATURE_NORMALIZE_FAST_PATH=false y el benchmark)."""
+    conf, bbox, explain, tags = _result_core(item, rank, roi_sources)
     has_ocr = bool(has_ocr_in_response)
 
     def _field_with_meta(field_name: str, raw_getter, default=None):
@@ -179,22 +541,11 @@ def _normalize_result(
     hsec_val, hsec_meta = _field_with_meta("high_security", lambda: item.get("high_security"))
     rc_val, rc_meta = _field_with_meta("requires_card", lambda: item.get("requires_card"))
 
-    out: Dict[str, Any] = {
-        "rank": rank,
-        "brand": item.get("brand"),
-        "model": item.get("model") or item.get("id_model_ref"),
-        "type": multilabel_vocab.normalize_type(item.get("type")) or ("No identificado" if rank > 1 and not item else "key"),
-        "confidence": conf,
-        "explain_text": explain,
-        "tags": tags,
-        "compatibility_tags": tags,
-        "id_model_ref": item.get("id_model_ref") or item.get("ref"),
-        "crop_bbox": bbox,
-        "orientation": out_orientation,
-        "head_color": hc_val,
-        "visual_state": vs_val,
-        "patentada": patentada_val,
-    }
+    out: Dict[str, Any] = _result_base(item, rank, conf, bbox, explain, tags)
+    out["orientation"] = out_orientation
+    out["head_color"] = hc_val
+    out["visual_state"] = vs_val
+    out["patentada"] = patentada_val
     if orient_meta:
         out["orientation_meta"] = orient_meta
     if patentada_meta:
@@ -242,29 +593,24 @@ def _normalize_result(
     if rc_meta:
         out["requires_card_meta"] = rc_meta
 
-    # Experimentales (sin *_meta por ahora)
-    out["oxidation_present"] = multilabel_vocab.normalize_bool_or_null(item.get("oxidation_present"))
-    out["surface_damage"] = multilabel_vocab.normalize_bool_or_null(item.get("surface_damage"))
-    out["material_hint"] = (item.get("material_hint") or "").strip() or None
-    out["restricted_copy"] = multilabel_vocab.normalize_bool_or_null(item.get("restricted_copy"))
-    out["text_visible_head"] = (item.get("text_visible_head") or "").strip() or None
-    out["text_visible_blade"] = (item.get("text_visible_blade") or "").strip() or None
-    out["structural_notes"] = (item.get("structural_notes") or "").strip() or None
-
-    if item.get("label") is not None and out.get("brand") is None:
-        out["brand"] = item.get("label")
-    if item.get("label") is not None and out.get("model") is None:
-        out["model"] = item.get("label")
-    return out
+    return _finish_result(out, item)
 
 
-def normalize_contract(raw: Dict[str, Any]) -> Dict[str, Any]:
+def normalize_contract(
+    raw: Dict[str, Any],
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     Normaliza la respuesta del motor al contrato ScanKey estricto.
     - results SIEMPRE 3, rank 1..3, orden por confidence desc
     - high_confidence=true si top>=0.95, low_confidence=true si top<0.60
     - should_store_sample: top>=0.75, storage_probability=0.75, max 30 por modelo
+    view/fields (ver resolve_projection): devuelve solo esa parte y no calcula *_meta,
+    consistency, risk ni policy si su salida no se pide. Sin ellos: contrato completo.
     """
+    projection = resolve_projection(view, fields)
+    need = projection or _FULL_PROJECTION
     d = dict(raw or {})
 
     # Obtener lista de candidatos (candidates o results)
@@ -292,17 +638,23 @@ def normalize_contract(raw: Dict[str, Any]) -> Dict[str, Any]:
     def _get_bbox(it: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         return it.get("crop_bbox") or it.get("bbox")
 
-    ref_size_class, roi_reliable = extract_size_class_debug_only(items, _get_bbox)
+    if need.need_debug:
+        ref_size_class, roi_reliable = extract_size_class_debug_only(items, _get_bbox)
     size_class_applied = False  # Nunca reordenamos por size_class
 
     has_ocr = bool(d.get("ocr_detail") or d.get("ocr_hint"))
     roi_sources: List[str] = []
     results: List[Dict[str, Any]] = []
-    for i, it in enumerate(items[:3], start=1):
-        results.append(_normalize_result(dict(it or {}), i, roi_sources, has_ocr_in_response=has_ocr))
-
-    while len(results) < 3:
-        results.append(_normalize_result({}, len(results) + 1, roi_sources, has_ocr_in_response=has_ocr))
+    if need.need_meta:
+        for i, it in enumerate(items[:3], start=1):
+            results.append(_normalize_result(dict(it or {}), i, roi_sources, has_ocr_in_response=has_ocr))
+        while len(results) < 3:
+            results.append(_normalize_result({}, len(results) + 1, roi_sources, has_ocr_in_response=has_ocr))
+    else:
+        for i, it in enumerate(items[:3], start=1):
+            results.append(_normalize_result_light(dict(it or {}), i, roi_sources))
+        while len(results) < 3:
+            results.append(_normalize_result_light({}, len(results) + 1, roi_sources))
 
     top_conf = results[0]["confidence"]
 
@@ -341,65 +693,68 @@ def normalize_contract(raw: Dict[str, Any]) -> Dict[str, Any]:
     if not ts:
         ts = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    debug = dict(d.get("debug") or {})
-    # P0.2: quality_*, roi_score pasan tal cual desde motor (si existen)
-    debug["roi_source"] = roi_sources[0] if roi_sources else "fallback"
-    debug.setdefault("model_version", d.get("model_version") or "scankey-v2-prod")
-    debug["size_class"] = ref_size_class
-    debug["size_class_applied"] = size_class_applied
-
-    # Multi-label Fase 4: pasar desde motor o inferir para compatibilidad
-    if "multi_label_enabled" not in debug:
-        debug["multi_label_enabled"] = False
-    if "multi_label_fields_supported" not in debug:
-        debug["multi_label_fields_supported"] = []
-    if "multi_label_fields_present" not in debug:
-        debug["multi_label_fields_present"] = []
-
-    # Multi-label Fase 3: consistency (antes de risk para que risk lo use)
-    _out_pre = {
-        "results": results,
-        "low_confidence": low_confidence,
-        "high_confidence": high_confidence,
-        "manufacturer_hint": mh,
-        "ocr_detail": d.get("ocr_detail"),
-        "ocr_hint": d.get("ocr_hint"),
-    }
-    try:
-        from common.multilabel_consistency import compute_consistency
-        cons = compute_consistency(_out_pre)
-        debug["consistency_score"] = cons["consistency_score"]
-        debug["consistency_reasons"] = cons["consistency_reasons"]
-        debug["consistency_conflicts"] = cons["consistency_conflicts"]
-        debug["consistency_supports"] = cons["consistency_supports"]
-        debug["consistency_level"] = cons["consistency_level"]
-        if "consistency_strong_conflicts" in cons:
-            debug["consistency_strong_conflicts"] = cons["consistency_strong_conflicts"]
-        if "consistency_weak_conflicts" in cons:
-            debug["consistency_weak_conflicts"] = cons["consistency_weak_conflicts"]
-        if "evidence_notes" in cons:
-            debug["evidence_notes"] = cons["evidence_notes"]
-    except Exception:
-        debug["consistency_score"] = 70.0
-        debug["consistency_reasons"] = []
-        debug["consistency_conflicts"] = []
-        debug["consistency_supports"] = []
-        debug["consistency_level"] = "neutral"
-        debug.setdefault("consistency_strong_conflicts", [])
-        debug.setdefault("consistency_weak_conflicts", [])
-        debug.setdefault("evidence_notes", [])
-
-    # P0.3: risk engine pasivo — margin, risk_score, risk_level, risk_reasons
-    if SCN_FEATURE_RISK_ENGINE_PASSIVE:
-        try:
-            from common.risk_engine import compute_risk
-            risk_data = compute_risk(debug, _out_pre)
-            debug["margin"] = risk_data["margin"]
-            debug["risk_score"] = risk_data["risk_score"]
-            debug["risk_level"] = risk_data["risk_level"]
-            debug["risk_reasons"] = risk_data["risk_reasons"]
-        except Exception:
-            pass
+    debug: Dict[str, Any] = {}
+    if need.need_debug:
+        debug = dict(d.get("debug") or {})
+        # P0.2: quality_*, roi_score pasan tal cual desde motor (si existen)
+        debug["roi_source"] = roi_sources[0] if roi_sources else "fallback"
+        debug.setdefault("model_version", d.get("model_version") or "scankey-v2-prod")
+        debug["size_class"] = ref_size_class
+        debug["size_class_applied"] = size_class_applied
+
+        # Multi-label Fase 4: pasar desde motor o inferir para compatibilidad
+        if "multi_label_enabled" not in debug:
+            debug["multi_label_enabled"] = False
+        if "multi_label_fields_supported" not in debug:
+            debug["multi_label_fields_supported"] = []
+        if "multi_label_fields_present" not in debug:
+            debug["multi_label_fields_present"] = []
+
+        # Multi-label Fase 3: consistency (antes de risk para que risk lo use)
+        _out_pre = {
+            "results": results,
+            "low_confidence": low_confidence,
+            "high_confidence": high_confidence,
+            "manufacturer_hint": mh,
+            "ocr_detail": d.get("ocr_detail"),
+            "ocr_hint": d.get("ocr_hint"),
+        }
+        if need.need_consistency:
+            try:
+                from common.multilabel_consistency import compute_consistency
+                cons = compute_consistency(_out_pre)
+                debug["consistency_score"] = cons["consistency_score"]
+                debug["consistency_reasons"] = cons["consistency_reasons"]
+                debug["consistency_conflicts"] = cons["consistency_conflicts"]
+                debug["consistency_supports"] = cons["consistency_supports"]
+                debug["consistency_level"] = cons["consistency_level"]
+                if "consistency_strong_conflicts" in cons:
+                    debug["consistency_strong_conflicts"] = cons["consistency_strong_conflicts"]
+                if "consistency_weak_conflicts" in cons:
+                    debug["consistency_weak_conflicts"] = cons["consistency_weak_conflicts"]
+                if "evidence_notes" in cons:
+                    debug["evidence_notes"] = cons["evidence_notes"]
+            except Exception:
+                debug["consistency_score"] = 70.0
+                debug["consistency_reasons"] = []
+                debug["consistency_conflicts"] = []
+                debug["consistency_supports"] = []
+                debug["consistency_level"] = "neutral"
+                debug.setdefault("consistency_strong_conflicts", [])
+                debug.setdefault("consistency_weak_conflicts", [])
+                debug.setdefault("evidence_notes", [])
+
+        # P0.3: risk engine pasivo — margin, risk_score, risk_level, risk_reasons
+        if SCN_FEATURE_RISK_ENGINE_PASSIVE and need.need_risk:
+            try:
+                from common.risk_engine import compute_risk
+                risk_data = compute_risk(debug, _out_pre)
+                debug["margin"] = risk_data["margin"]
+                debug["risk_score"] = risk_data["risk_score"]
+                debug["risk_level"] = risk_data["risk_level"]
+                debug["risk_reasons"] = risk_data["risk_reasons"]
+            except Exception:
+                pass
 
     out = {
         "input_id": d.get("input_id") or "",
@@ -412,22 +767,35 @@ def normalize_contract(raw: Dict[str, Any]) -> Dict[str, Any]:
         "storage_probability": storage_prob,
         "current_samples_for_candidate": current,
         "manual_correction_hint": d.get("manual_correction_hint") or {"fields": ["marca", "modelo", "tipo"]},
-        "debug": debug,
     }
+    if need.need_debug:
+        out["debug"] = debug
     if d.get("ocr_hint") is not None:
         out["ocr_hint"] = d["ocr_hint"]
     if d.get("ocr_detail") is not None:
         out["ocr_detail"] = d["ocr_detail"]
 
     # BLOQUE 3: PolicyEngine — añadir policy_* a debug
-    try:
-        from common.policy_engine import evaluate_policy, POLICY_VERSION
-        policy_result = evaluate_policy(out)
-        debug["policy_action"] = policy_result.get("action")
-        debug["policy_reasons"] = policy_result.get("reasons", [])
-        debug["policy_user_message"] = policy_result.get("user_message", "")
-        debug["policy_version"] = policy_result.get("debug", {}).get("policy_version", POLICY_VERSION)
-    except Exception:
-        pass
+    if need.need_policy:
+        try:
+            from common.policy_engine import evaluate_policy, POLICY_VERSION
+            policy_result = evaluate_policy(out)
+            debug["policy_action"] = policy_result.get("action")
+            debug["policy_reasons"] = policy_result.get("reasons", [])
+            debug["policy_user_message"] = policy_result.get("user_message", "")
+            debug["policy_version"] = policy_result.get("debug", {}).get("policy_version", POLICY_VERSION)
+        except Exception:
+            pass
 
-    return out
+    return project_contract(out, projection)
+
+
+def normalize_contract_bytes(
+    body: bytes, view: Optional[str] = None, fields: Optional[str] = None
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    (raw, contrato) desde el body JSON del motor: parseo + normalize en una sola llamada
+    de módulo, para ejecutarla en el CPU executor (hilo o proceso) fuera del event loop.
+    """
+    raw = json.loads(body)
+    return raw, normalize_contract(raw, view=view, fields=fields)
@@ -12,6 +12,7 @@ import httpx
 
 _log = logging.getLogger(__name__)
 
+from common import tracing
 from common.policy_engine import ACTION_BLOCK, ACTION_RUN_OCR, ACTION_ALLOW_WITH_OVERRIDE
 
 OCR_URL = os.getenv("OCR_URL", "").rstrip("/")
@@ -42,8 +43,9 @@ async def _call_ocr_from_gateway(image_bytes: bytes, is_workshop: bool = False)
         return None
     try:
         files = {"front": ("front.jpg", image_bytes, "image/jpeg")}
-        async with httpx.AsyncClient(timeout=OCR_TIMEOUT) as client:
-            r = await client.post(f"{OCR_URL}/api/ocr", files=files)
+        with tracing.span("ocr POST /api/ocr"):
+            async with httpx.AsyncClient(timeout=OCR_TIMEOUT) as client:
+                r = await client.post(f"{OCR_URL}/api/ocr", files=files, headers=tracing.inject({}))
         if r.status_code != 200:
             return None
         data = r.json()
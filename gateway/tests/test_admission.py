@@ -0,0 +1,116 @@
+"""
+Admission control delante del motor: AIMD, cola acotada y 503 + Retry-After.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pytest
+from fastapi import HTTPException
+
+from core.admission import AdaptiveLimiter, MotorOverloaded
+
+
+def test_queue_full_rejects_fast():
+    async def run():
+        lim = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=1, queue_timeout_s=5)
+        await lim.acquire()
+        waiter = asyncio.ensure_future(lim.acquire())
+        await asyncio.sleep(0)
+        assert lim.queued == 1
+        with pytest.raises(MotorOverloaded) as e:
+            await lim.acquire()
+        assert e.value.retry_after >= 1
+        lim.release(0.01, True)
+        await waiter
+        assert lim.inflight == 1 and lim.queued == 0
+        assert lim.rejected_total == 1
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_rejects():
+    async def run():
+        lim = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=4, queue_timeout_s=0.05)
+        await lim.acquire()
+        with pytest.raises(MotorOverloaded):
+            await lim.acquire()
+        assert lim.queued == 0 and lim.timeouts_total == 1
+        lim.release(0.01, True)
+        assert lim.inflight == 0
+
+    asyncio.run(run())
+
+
+def test_aimd_decrease_on_slow_and_increase_when_saturated():
+    lim = AdaptiveLimiter(initial_limit=10, min_limit=2, max_limit=20, latency_target_ms=100, cooldown_s=0)
+    lim.inflight = 1
+    lim.release(0.5, True)  # lento -> *0.7
+    assert int(lim.limit) == 7
+    for _ in range(5):
+        lim.inflight = 1
+        lim.release(1.0, False)
+    assert lim.limit == 2  # suelo min_limit
+    before = lim.limit
+    lim.inflight = 2  # saturado y rápido -> crece
+    lim.release(0.01, True)
+    assert lim.limit > before
+    grown = lim.limit
+    lim.inflight = 1  # infrautilizado -> no crece
+    lim.release(0.01, True)
+    assert lim.limit == grown
+
+
+def test_cooldown_limits_decrease_rate():
+    lim = AdaptiveLimiter(initial_limit=10, latency_target_ms=100, cooldown_s=60)
+    for _ in range(5):
+        lim.inflight = 1
+        lim.release(1.0, False)
+    assert int(lim.limit) == 7
+
+
+def test_motor_post_503_with_retry_after():
+    os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+    from core import motor_proxy
+
+    lim = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=0)
+    lim.inflight = 1
+
+    async def run():
+        with patch.object(motor_proxy, "MOTOR_URL", "http://motor:8080"), \
+                patch.object(motor_proxy, "SCN_FEATURE_GATEWAY_ADMISSION", True), \
+                patch.object(motor_proxy, "get_limiter", return_value=lim):
+            await motor_proxy.motor_post("/api/analyze-key")
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(run())
+    assert e.value.status_code == 503
+    assert int(e.value.headers["Retry-After"]) >= 1
+
+
+def test_motor_post_releases_slot_and_marks_5xx():
+    from core import motor_proxy
+
+    class R:
+        status_code = 503
+
+    async def fake_raw(*a, **kw):
+        return R()
+
+    lim = AdaptiveLimiter(initial_limit=4, latency_target_ms=10_000, cooldown_s=0)
+
+    async def run():
+        with patch.object(motor_proxy, "MOTOR_URL", "http://motor:8080"), \
+                patch.object(motor_proxy, "SCN_FEATURE_GATEWAY_ADMISSION", True), \
+                patch.object(motor_proxy, "get_limiter", return_value=lim), \
+                patch.object(motor_proxy, "_motor_post_raw", side_effect=fake_raw):
+            return await motor_proxy.motor_post("/api/analyze-key")
+
+    assert asyncio.run(run()).status_code == 503
+    assert lim.inflight == 0
+    assert lim.limit < 4  # 5xx cuenta como señal de sobrecarga
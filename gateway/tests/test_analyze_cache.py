@@ -0,0 +1,99 @@
+"""
+Caché de contratos normalizados en el gateway: hit sin motor, claves por vista y
+token de taller, invalidación por model_version, TTL/LRU y hit ratio.
+"""
+import io
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from core.response_cache import AnalyzeCache, motor_model_version
+
+
+def test_lru_ttl_and_copies():
+    c = AnalyzeCache(max_entries=2, ttl_s=60)
+    v = {"results": [{"brand": "JMA"}]}
+    c.put("a", v, "m1")
+    v["results"][0]["brand"] = "X"  # mutar el original no afecta
+    got = c.get("a")
+    assert got == {"results": [{"brand": "JMA"}]}
+    got["results"].clear()  # mutar lo devuelto tampoco
+    assert c.get("a")["results"]
+    c.put("b", {}, "m1")
+    c.put("c", {}, "m1")
+    assert c.get("b") is not None and c.evictions == 1
+    c.ttl_s = -1
+    c.put("d", {}, "m1")
+    assert c.get("d") is None
+    snap = c.snapshot()
+    assert snap["hits"] == 3 and snap["misses"] == 1 and snap["hit_ratio"] == 0.75
+
+
+def test_model_version_change_invalidates():
+    c = AnalyzeCache()
+    c.put("a", {}, "m1")
+    c.observe_model_version(None)
+    c.observe_model_version("m1")
+    assert c.get("a") == {}
+    c.put("b", {}, "m2")
+    assert c.get("a") is None and c.get("b") == {}
+    assert c.invalidations == 1 and c.model_version == "m2"
+    assert motor_model_version({"debug": {"model_version": "v9"}}) == "v9"
+    assert motor_model_version({"model_version": "v8"}) == "v8"
+    assert motor_model_version({}) is None
+
+
+def test_gateway_cache_hit_skips_motor():
+    os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+    import main as main_mod
+
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 16)).save(buf, format="PNG")
+    files = {"front": ("f.png", buf.getvalue(), "image/png")}
+    version = {"mv": "m1"}
+
+    class MockResp:
+        status_code = 200
+        headers = {"content-type": "application/json"}
+
+        @property
+        def content(self):
+            return json.dumps(self.json()).encode("utf-8")
+
+        def json(self):
+            return {
+                "results": [{"brand": "JMA", "model": "TE8I", "confidence": 0.9}],
+                "debug": {"model_version": version["mv"]},
+            }
+
+    cache = AnalyzeCache()
+    client = TestClient(main_mod.APP)
+    motor = AsyncMock(return_value=MockResp())
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_ANALYZE_CACHE", True), \
+            patch.object(main_mod, "_ANALYZE_CACHE", cache), \
+            patch("main._motor_post", new=motor):
+        r1 = client.post("/api/analyze-key", files=files)
+        r2 = client.post("/api/analyze-key", files=files)
+        assert (r1.headers["x-cache"], r2.headers["x-cache"]) == ("miss", "hit")
+        assert motor.await_count == 1
+        assert r1.json()["results"] == r2.json()["results"]
+        assert r1.json()["request_id"] != r2.json()["request_id"]
+        # Otra vista y otro token de taller: entradas distintas
+        assert client.post("/api/analyze-key?view=minimal", files=files).headers["x-cache"] == "miss"
+        r = client.post("/api/analyze-key", files=files, headers={"X-Workshop-Token": "t"})
+        assert r.headers["x-cache"] == "miss"
+        assert motor.await_count == 3
+        # Nuevo modelo en el motor: lo cacheado con m1 se descarta
+        version["mv"] = "m2"
+        cache.observe_model_version("m2")
+        assert client.post("/api/analyze-key", files=files).headers["x-cache"] == "miss"
+        assert motor.await_count == 4
+    assert cache.snapshot()["hits"] == 1
@@ -0,0 +1,194 @@
+"""
+Analyze progresivo: /api/analyze-key/stream reenvía los eventos del motor como NDJSON.
+"""
+import io
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+import main as main_mod  # noqa: E402
+
+_RAW = {
+    "input_id": "abc",
+    "results": [
+        {"brand": "JMA", "model": "TE8I", "confidence": 0.91},
+        {"brand": "JMA", "model": "TE8D", "confidence": 0.05},
+        {"brand": "TESA", "model": "T60", "confidence": 0.01},
+    ],
+    "debug": {"model_version": "v-test"},
+}
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 16)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _post(events, **params):
+    calls = []
+
+    async def fake_stream(path, files=None, data=None, request_id=None, req=None):
+        calls.append(path)
+        for ev in events:
+            yield ev
+
+    with patch("main._motor_stream", side_effect=fake_stream):
+        r = TestClient(main_mod.APP).post(
+            "/api/analyze-key/stream",
+            params=params,
+            files={"front": ("f.png", _png(), "image/png")},
+        )
+    assert calls == ["/api/analyze-key"]
+    return r, [json.loads(line) for line in r.text.splitlines() if line.strip()]
+
+
+def test_stream_emits_classification_then_result():
+    r, evs = _post(
+        [
+            {"event": "classification", "data": _RAW},
+            {"event": "quality", "data": {"quality_score": 0.8}},
+            {"event": "final", "data": _RAW},
+        ]
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert [e["event"] for e in evs] == ["classification", "quality", "policy", "result"]
+    cls = evs[0]["data"]
+    assert cls["results"][0]["model"] == "TE8I"
+    assert "debug" not in cls and cls.get("request_id")
+    assert evs[1]["data"] == {"quality_score": 0.8}
+    assert evs[2]["data"]["policy_action"] == evs[3]["data"]["debug"]["policy_action"]
+    assert evs[3]["status"] == 200
+    assert evs[3]["data"]["request_id"] == cls["request_id"]
+
+
+def test_stream_result_honours_projection():
+    _r, evs = _post([{"event": "final", "data": _RAW}], fields="input_id,results")
+    assert evs[-1]["event"] == "result"
+    assert "debug" not in evs[-1]["data"]
+    assert evs[-1]["data"]["input_id"] == "abc"
+
+
+def test_stream_forwards_motor_error_and_truncation():
+    _r, evs = _post([{"event": "error", "status": 503, "data": {"detail": "busy"}}])
+    assert evs == [{"event": "error", "status": 503, "data": {"detail": "busy"}}]
+
+    _r, evs = _post([{"event": "classification", "data": _RAW}])
+    assert [e["event"] for e in evs] == ["classification", "error"]
+    assert evs[-1]["status"] == 502
+
+
+def test_stream_rejects_bad_view_before_calling_motor():
+    with patch("main._motor_stream") as ms:
+        r = TestClient(main_mod.APP).post(
+            "/api/analyze-key/stream",
+            params={"view": "nope"},
+            files={"front": ("f.png", _png(), "image/png")},
+        )
+    assert r.status_code == 400
+    ms.assert_not_called()
+
+
+def test_stream_rejected_by_admission_or_without_backend_is_real_503():
+    from core.admission import AdaptiveLimiter
+    from core.motor_pool import MotorPool
+
+    full = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=0)
+    full.inflight = 1
+    with patch("core.motor_proxy.MOTOR_URL", "http://motor:8080"), patch(
+        "core.motor_proxy.SCN_FEATURE_GATEWAY_ADMISSION", True
+    ), patch("core.motor_proxy.get_limiter", return_value=full):
+        r = TestClient(main_mod.APP).post("/api/analyze-key/stream", files={"front": ("f.png", _png(), "image/png")})
+    assert r.status_code == 503 and r.headers.get("retry-after")
+    assert not r.headers["content-type"].startswith("application/x-ndjson")
+
+    # Sin backends: 503 y el hueco de admission se devuelve
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=0)
+    with patch("core.motor_proxy.MOTOR_URL", "http://motor:8080"), patch(
+        "core.motor_proxy.SCN_FEATURE_GATEWAY_ADMISSION", True
+    ), patch("core.motor_proxy.get_limiter", return_value=limiter), patch(
+        "core.motor_proxy.get_motor_pool", return_value=MotorPool([])
+    ):
+        r = TestClient(main_mod.APP).post("/api/analyze-key/stream", files={"front": ("f.png", _png(), "image/png")})
+    assert r.status_code == 503 and limiter.inflight == 0
+
+
+def _stream_env(limiter, pool, handler=None):
+    import contextlib
+    import httpx
+
+    @contextlib.asynccontextmanager
+    async def client_for(path):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+            yield c
+
+    return [
+        patch("core.motor_proxy.MOTOR_URL", "http://motor:8080"),
+        patch("core.motor_proxy.SCN_FEATURE_GATEWAY_ADMISSION", True),
+        patch("core.motor_proxy.get_limiter", return_value=limiter),
+        patch("core.motor_proxy.get_motor_pool", return_value=pool),
+        patch("core.motor_proxy._client_for", client_for),
+        patch("core.motor_proxy.get_auth_headers", return_value={}),
+    ]
+
+
+def test_unconsumed_motor_stream_releases_admission_and_backend():
+    import asyncio
+    import contextlib
+    import gc
+    from core.admission import AdaptiveLimiter
+    from core.motor_pool import MotorPool
+    from core.motor_proxy import motor_stream
+
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=0)
+    pool = MotorPool([("a", "http://motor:8080")])
+    backend = pool.backends[0]
+
+    async def run():
+        # Sin iterar y cerrado explícitamente (lo que hace el endpoint al desconectarse el cliente)
+        stream = await motor_stream("/api/analyze-key", data={})
+        assert limiter.inflight == 1 and backend.outstanding == 1
+        await stream.aclose()
+        assert limiter.inflight == 0 and backend.outstanding == 0
+        # Sin iterar y abandonado: el GC devuelve los contadores
+        await motor_stream("/api/analyze-key", data={})
+        gc.collect()
+        assert limiter.inflight == 0 and backend.outstanding == 0
+
+    with contextlib.ExitStack() as stack:
+        for p in _stream_env(limiter, pool):
+            stack.enter_context(p)
+        asyncio.run(run())
+
+
+def test_motor_stream_malformed_line_becomes_error_event():
+    import asyncio
+    import contextlib
+    import httpx
+    from core.admission import AdaptiveLimiter
+    from core.motor_pool import MotorPool
+    from core.motor_proxy import motor_stream
+
+    limiter = AdaptiveLimiter(initial_limit=2)
+    pool = MotorPool([("a", "http://motor:8080")])
+    body = json.dumps({"event": "classification", "data": _RAW}) + "\n{roto\n"
+
+    async def run():
+        return [ev async for ev in await motor_stream("/api/analyze-key", data={})]
+
+    with contextlib.ExitStack() as stack:
+        for p in _stream_env(limiter, pool, lambda req: httpx.Response(200, content=body.encode("utf-8"))):
+            stack.enter_context(p)
+        evs = asyncio.run(run())
+    assert [e["event"] for e in evs] == ["classification", "error"] and evs[-1]["status"] == 502
+    assert limiter.inflight == 0 and pool.backends[0].outstanding == 0
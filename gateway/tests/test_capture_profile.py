@@ -0,0 +1,79 @@
+"""
+/api/capture-profile: perfil de captura derivado del input_shape del motor y del OCR,
+versionado con el modelo (ETag) y con fallback por defecto si el motor no responde.
+"""
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+import main as main_mod  # noqa: E402
+from common.capture_profile import build_capture_profile  # noqa: E402
+from core.security import require_apikey  # noqa: E402
+
+
+def test_max_edge_follows_consumers():
+    base = build_capture_profile("m1", input_hw=(224, 224))
+    assert base["max_edge"] == 1024 and base["min_edge"] == 448
+    assert build_capture_profile("m1", input_hw=(224, 224), ocr_enabled=True)["max_edge"] == 1280
+    assert build_capture_profile("m1", input_hw=(384, 640), quality_min_edge=512)["max_edge"] == 1280
+    # Versionado con el modelo y con las entradas
+    assert base["profile_version"].startswith("m1:")
+    assert build_capture_profile("m2")["profile_version"] != base["profile_version"]
+    assert build_capture_profile("m1", ocr_enabled=True)["profile_version"] != base["profile_version"]
+
+
+class _Resp:
+    status_code = 200
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def client():
+    main_mod.APP.dependency_overrides[require_apikey] = lambda: True
+    main_mod._CAPTURE_PROFILE.update(profile=None, expires=0.0)
+    yield TestClient(main_mod.APP)
+    main_mod.APP.dependency_overrides.pop(require_apikey, None)
+    main_mod._CAPTURE_PROFILE.update(profile=None, expires=0.0)
+
+
+def test_profile_from_motor_is_cached_and_etagged(client):
+    motor = build_capture_profile("scankey-v3", input_hw=(320, 320), ocr_enabled=True)
+    calls = []
+
+    async def fake_get(path, request_id=None):
+        calls.append(path)
+        return _Resp(motor)
+
+    with patch("main._motor_get", side_effect=fake_get):
+        r1 = client.get("/api/capture-profile")
+        r2 = client.get("/api/capture-profile", headers={"If-None-Match": r1.headers["etag"]})
+    assert calls == ["/api/capture-profile"]
+    body = r1.json()
+    assert body["source"] == "motor" and body["max_edge"] == 1280 and body["min_edge"] == 640
+    assert body["profile_version"].startswith("scankey-v3:")
+    assert body["max_bytes"] == main_mod.MAX_PAYLOAD_BYTES
+    assert r1.headers["etag"] == f'"{body["profile_version"]}"'
+    assert r2.status_code == 304
+
+
+def test_default_profile_when_motor_down(client):
+    async def fake_get(path, request_id=None):
+        raise HTTPException(504, "motor timeout")
+
+    with patch("main._motor_get", side_effect=fake_get):
+        body = client.get("/api/capture-profile").json()
+    assert body["source"] == "default" and body["inputs"]["model_input"] == [224, 224]
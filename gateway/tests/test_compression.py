@@ -0,0 +1,91 @@
+"""
+Tests de respuestas comprimidas/compactas del gateway:
+- FastJSONResponse produce el mismo JSON que JSONResponse
+- gzip negociado por Accept-Encoding solo en las rutas configuradas y por encima del mínimo
+"""
+import gzip
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.testclient import TestClient
+
+from core import compression
+from core.compression import CompressionMiddleware, choose_encoding
+from core.json_response import FastJSONResponse
+
+BIG = {"results": [{"brand": "JMA", "model": f"TE{i}", "confidence": 0.5, "ñ": "á"} for i in range(100)]}
+
+
+def _app():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(CompressionMiddleware, paths=("/api/analyze-key", "/api/job/"), minimum_size=512)
+
+    @app.get("/api/analyze-key")
+    def analyze():
+        return BIG
+
+    @app.get("/api/job/{job_id}")
+    def job(job_id: str):
+        return {"ok": True, "job_id": job_id}
+
+    @app.get("/api/job/{job_id}/text")
+    def text(job_id: str):
+        return PlainTextResponse("x" * 2000)
+
+    @app.get("/health")
+    def health():
+        return BIG
+
+    return app
+
+
+def test_fast_json_matches_starlette_render():
+    import json
+    payload = {"a": 1, "b": [1.5, None, True], "c": {"ñ": "ü"}, "d": "x" * 10}
+    fast = FastJSONResponse(payload).body
+    std = JSONResponse(payload).body
+    assert json.loads(fast) == json.loads(std)
+    assert b" " not in fast  # compacto
+
+
+def test_gzip_on_configured_path():
+    raw = TestClient(_app()).get("/api/analyze-key", headers={"Accept-Encoding": "gzip"})
+    assert raw.status_code == 200
+    assert raw.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in raw.headers["vary"]
+    assert raw.json() == BIG  # httpx descomprime
+    assert int(raw.headers["content-length"]) < len(FastJSONResponse(BIG).body)
+
+
+def test_no_compression_without_accept_or_outside_paths_or_small():
+    c = TestClient(_app())
+    r = c.get("/api/analyze-key", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+    r = c.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+    r = c.get("/api/job/abc", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers  # < minimum_size
+    assert r.json() == {"ok": True, "job_id": "abc"}
+    r = c.get("/api/job/abc/text", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers  # no JSON
+
+
+def test_choose_encoding(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br, gzip") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("") is None
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding("gzip, br;q=0.5") == "br"
+
+
+def test_gzip_roundtrip_deterministic():
+    body = FastJSONResponse(BIG).body
+    out = compression.compress(body, "gzip")
+    assert gzip.decompress(out) == body
+    assert compression.compress(body, "gzip") == out
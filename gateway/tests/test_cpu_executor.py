@@ -0,0 +1,71 @@
+"""
+CPU executor (rutas por etapa) y monitor de lag del event loop.
+"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pytest
+from fastapi import HTTPException
+
+from core.cpu_executor import CpuExecutor, parse_routes
+from core.loop_monitor import LoopLagMonitor
+
+
+def test_parse_routes_ignores_unknown():
+    assert parse_routes("a=thread, b=PROCESS,c=gpu,=inline,d") == {"a": "thread", "b": "process"}
+
+
+def test_routes_thread_inline_and_process_fallback():
+    ex = CpuExecutor({"fast": "inline", "heavy": "process"}, thread_workers=2, process_workers=0)
+    assert ex.route("fast") == "inline"
+    assert ex.route("heavy") == "thread"  # sin workers de proceso
+    assert ex.route("other") == "thread"
+    assert CpuExecutor({"x": "thread"}, enabled=False).route("x") == "inline"
+
+    async def run():
+        main_thread = threading.get_ident()
+        t_inline = await ex.run("fast", threading.get_ident)
+        t_pool = await ex.run("other", threading.get_ident)
+        return main_thread, t_inline, t_pool
+
+    main_thread, t_inline, t_pool = asyncio.run(run())
+    assert t_inline == main_thread and t_pool != main_thread
+    snap = ex.snapshot()["stages"]
+    assert snap["fast"]["route"] == "inline" and snap["other"]["calls"] == 1
+
+
+def test_exceptions_propagate_from_pool():
+    ex = CpuExecutor({}, thread_workers=1)
+
+    def boom():
+        raise HTTPException(400, "imagen inválida")
+
+    with pytest.raises(HTTPException) as ei:
+        asyncio.run(ex.run("image_validation", boom))
+    assert ei.value.status_code == 400
+
+
+def test_offloaded_work_does_not_block_loop():
+    ex = CpuExecutor({}, thread_workers=2)
+    mon = LoopLagMonitor(interval_ms=5, block_threshold_ms=50, warn_ms=10_000)
+
+    async def run():
+        mon.ensure_started()
+        await asyncio.sleep(0.02)
+        await ex.run("normalize", time.sleep, 0.2)  # sleep suelta el GIL como PIL/zlib
+        blocked_offloaded = mon.blocked_events
+        time.sleep(0.2)  # bloqueo real del loop
+        await asyncio.sleep(0.02)
+        return blocked_offloaded
+
+    blocked_offloaded = asyncio.run(run())
+    assert blocked_offloaded == 0
+    snap = mon.snapshot()
+    assert snap["blocked_events"] >= 1 and snap["lag_ms_max"] >= 150
+    assert snap["samples"] > 0
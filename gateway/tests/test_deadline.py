@@ -0,0 +1,98 @@
+"""
+Deadline propagation: common/deadline (lado motor) y cabecera X-Request-Budget-Ms del gateway.
+"""
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+from common.deadline import BUDGET_HEADER, Deadline
+import core.motor_proxy as mp
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_budget_gates_stages_and_reports_skips():
+    clock = FakeClock()
+    d = Deadline(3000, margin_ms=250, clock=clock)
+    assert d.allows("catalog_enrichment", 50)
+    clock.t += 0.5  # inferencia
+    assert d.remaining_ms() == 2250
+    assert d.allows("quality", 200)
+    assert not d.allows("ocr", 2500)
+    assert not d.allows("ocr", 2500)
+    clock.t += 5
+    assert not d.allows("sample_store", 800)
+    assert d.report() == {"budget_ms": 3000, "remaining_ms": 0, "skipped_stages": ["ocr", "sample_store"]}
+
+
+def test_missing_or_invalid_header_is_unlimited():
+    for headers in (None, {}, {BUDGET_HEADER: "nope"}, {BUDGET_HEADER: "0"}):
+        d = Deadline.from_headers(headers)
+        assert d.budget_ms is None and d.remaining_ms() is None
+        assert d.allows("ocr", 10 ** 9)
+    assert Deadline.from_headers({BUDGET_HEADER: "1500"}).budget_ms == 1500
+
+
+def test_gateway_sends_budget_header():
+    with patch.object(mp, "get_auth_headers", return_value={}), patch.object(mp, "TIMEOUT", 12.5):
+        with patch.object(mp, "SCN_FEATURE_GATEWAY_DEADLINE_HEADER", True):
+            assert mp._motor_headers("r1", None)[BUDGET_HEADER] == "12500"
+        with patch.object(mp, "SCN_FEATURE_GATEWAY_DEADLINE_HEADER", False):
+            assert BUDGET_HEADER not in mp._motor_headers("r1", None)
+
+
+def test_budget_counts_from_gateway_arrival_and_across_attempts():
+    """Cada intento manda lo que de verdad queda: TIMEOUT por intento desde la llegada, no TIMEOUT fijo."""
+    import asyncio
+    import contextlib
+    import time
+    from types import SimpleNamespace
+
+    import httpx
+    from core.motor_pool import MotorPool
+
+    sent = []
+
+    def handler(request):
+        sent.append(int(request.headers[BUDGET_HEADER]))
+        if len(sent) == 1:
+            raise httpx.ReadTimeout("lento", request=request)
+        return httpx.Response(200, json={"ok": True})
+
+    @contextlib.asynccontextmanager
+    async def client_for(path):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+            yield c
+
+    pool = MotorPool([("a", "http://a:8080"), ("b", "http://b:8080")])
+    # Petición que ya lleva 11 s en el gateway (p. ej. cola de admission)
+    req = SimpleNamespace(state=SimpleNamespace(t_start=time.monotonic() - 11.0), headers={})
+    with patch.object(mp, "get_auth_headers", return_value={}), patch.object(mp, "TIMEOUT", 10.0), \
+            patch.object(mp, "SCN_FEATURE_GATEWAY_DEADLINE_HEADER", True), \
+            patch.object(mp, "get_motor_pool", return_value=pool), patch.object(mp, "_client_for", client_for):
+        r = asyncio.run(mp._motor_post_raw("/api/analyze-key", None, {"x": "1"}, "r1", req))
+    assert r.status_code == 200
+    # Total 2 x 10 s desde la llegada: quedan ~9 s, nunca el TIMEOUT completo
+    assert all(8500 <= ms <= 9000 for ms in sent) and len(sent) == 2
+
+    # Presupuesto ya agotado al llegar al motor: 504 sin ocupar un backend
+    sent.clear()
+    late = SimpleNamespace(state=SimpleNamespace(t_start=time.monotonic() - 25.0), headers={})
+    with patch.object(mp, "TIMEOUT", 10.0), patch.object(mp, "get_motor_pool", return_value=pool):
+        with pytest.raises(mp.HTTPException) as exc:
+            asyncio.run(mp._motor_post_raw("/api/analyze-key", None, {"x": "1"}, "r1", late))
+    assert exc.value.status_code == 504
+    assert sent == []
@@ -0,0 +1,192 @@
+"""
+Feedback write-behind: spool NDJSON con fsync, sellado por tamaño/edad, subida + manifest.
+"""
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from core.feedback_segments import FeedbackSegmentWriter
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+
+    def put_bytes(self, bucket, path, data, content_type):
+        self.objects[path] = data
+
+    def put_json(self, bucket, path, obj):
+        self.objects[path] = json.loads(json.dumps(obj))
+
+    def get_json(self, bucket, path):
+        if path not in self.objects:
+            raise FileNotFoundError(path)
+        return json.loads(json.dumps(self.objects[path]))
+
+
+def _writer(tmp_path, gcs, **kw):
+    return FeedbackSegmentWriter(
+        spool_dir=str(tmp_path),
+        instance_id="gw-a",
+        bucket="b",
+        prefix="feedback",
+        put_bytes=gcs.put_bytes,
+        put_json=gcs.put_json,
+        get_json=gcs.get_json,
+        **kw,
+    )
+
+
+def _append(w, *records):
+    async def run():
+        return [await w.append(r) for r in records]
+    out = asyncio.run(run())
+    return out[0] if len(out) == 1 else out
+
+
+def test_append_is_durable_and_seals_by_size(tmp_path):
+    gcs = FakeBucket()
+    w = _writer(tmp_path, gcs, max_bytes=60)
+    p1 = _append(w, {"input_id": "a", "selected_id": "x"})
+    assert p1.startswith("feedback/segments/") and p1.endswith(".ndjson")
+    open_files = list(tmp_path.glob("*.ndjson.open"))
+    assert len(open_files) == 1
+    assert json.loads(open_files[0].read_text().splitlines()[0])["input_id"] == "a"
+    p2 = _append(w, {"input_id": "b", "selected_id": "y"})  # pasa de 60 bytes -> sellado
+    assert p2 == p1
+    assert w.sealed() and not list(tmp_path.glob("*.ndjson.open"))
+    p3 = _append(w, {"input_id": "c"})
+    assert p3 != p1
+
+
+def test_flush_uploads_segments_and_manifest(tmp_path):
+    gcs = FakeBucket()
+    w = _writer(tmp_path, gcs, max_bytes=10 ** 6)
+    path, _ = _append(w, {"input_id": "a"}, {"input_id": "b"})
+    with patch("core.feedback_segments.gcs_ok", return_value=True):
+        assert asyncio.run(w.flush()) == 0  # ni lleno ni viejo: sigue abierto
+        assert asyncio.run(w.flush(force=True)) == 1
+        _append(w, {"input_id": "c"})
+        asyncio.run(w.flush(force=True))
+    assert gcs.objects[path].count(b"\n") == 2
+    manifests = [k for k in gcs.objects if "/_manifest/" in k]
+    assert manifests == [manifests[0]] and manifests[0].endswith(f"/_manifest/gw-a-{w.writer_id}.json")
+    segs = gcs.objects[manifests[0]]["segments"]
+    assert [s["records"] for s in segs] == [2, 1]
+    assert segs[0]["path"] == path
+    assert not os.listdir(tmp_path)
+    assert w.snapshot()["segments_uploaded"] == 2
+
+
+def test_two_writers_sharing_hostname_do_not_collide(tmp_path):
+    """Cloud Run: todas las instancias se llaman localhost; ni segmentos ni manifests se pisan."""
+    gcs = FakeBucket()
+    w1 = FeedbackSegmentWriter(
+        spool_dir=str(tmp_path / "a"), instance_id="", bucket="b", prefix="feedback",
+        put_bytes=gcs.put_bytes, put_json=gcs.put_json, get_json=gcs.get_json,
+    )
+    w2 = FeedbackSegmentWriter(
+        spool_dir=str(tmp_path / "b"), instance_id="", bucket="b", prefix="feedback",
+        put_bytes=gcs.put_bytes, put_json=gcs.put_json, get_json=gcs.get_json,
+    )
+    assert w1.instance_id == w2.instance_id and w1.writer_id != w2.writer_id
+    p1 = _append(w1, {"input_id": "a"})
+    p2 = _append(w2, {"input_id": "b"})
+    assert p1 != p2
+    with patch("core.feedback_segments.gcs_ok", return_value=True):
+        asyncio.run(w1.flush(force=True))
+        asyncio.run(w2.flush(force=True))
+    assert json.loads(gcs.objects[p1])["input_id"] == "a"
+    assert json.loads(gcs.objects[p2])["input_id"] == "b"
+    manifests = sorted(k for k in gcs.objects if "/_manifest/" in k)
+    assert len(manifests) == 2
+    assert sorted(gcs.objects[m]["segments"][0]["path"] for m in manifests) == sorted([p1, p2])
+
+
+def test_recovers_open_segment_and_keeps_it_local_without_gcs(tmp_path):
+    gcs = FakeBucket()
+    w = _writer(tmp_path, gcs)
+    path = _append(w, {"input_id": "a"})
+    w._fh.close()  # proceso muerto sin sellar
+
+    w2 = _writer(tmp_path, gcs)
+    assert len(w2.sealed()) == 1
+    with patch("core.feedback_segments.gcs_ok", return_value=False):
+        asyncio.run(w2.flush())
+    assert len(w2.sealed()) == 1 and not gcs.objects
+    with patch("core.feedback_segments.gcs_ok", return_value=True):
+        asyncio.run(w2.flush())
+    assert json.loads(gcs.objects[path])["input_id"] == "a"
+
+
+def test_feedback_endpoint_acks_from_spool(tmp_path):
+    os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+    import main as main_mod
+    from fastapi.testclient import TestClient
+
+    gcs = FakeBucket()
+    w = _writer(tmp_path, gcs)
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_FEEDBACK_SEGMENTS", True), \
+            patch.object(main_mod, "get_feedback_writer", return_value=w), \
+            patch.object(main_mod, "gcs_ok", return_value=True), \
+            patch.object(main_mod, "gcs_put_json") as put_json, \
+            patch.object(main_mod, "check_idempotency_seen") as check_seen, \
+            patch.object(main_mod, "store_idempotency") as store:
+        client = TestClient(main_mod.APP)
+        r = client.post("/api/feedback", json={"input_id": "i1", "selected_id": "s1"})
+        again = client.post("/api/feedback", json={"input_id": "i1", "selected_id": "s1"})
+    assert r.status_code == 200
+    assert r.json()["stored"].startswith("feedback/segments/")
+    assert again.json() == {**r.json(), "deduped": True}
+    # Ni el evento ni la idempotencia tocan GCS por petición
+    put_json.assert_not_called()
+    check_seen.assert_not_called()
+    store.assert_not_called()
+    assert w.records_total == 1
+    line = json.loads(next(tmp_path.glob("*.ndjson.open")).read_text())
+    assert line["input_id"] == "i1" and "received_at" in line and line["idempotency_key"]
+
+
+def test_group_commit_and_idempotency_index_survives_restart(tmp_path):
+    gcs = FakeBucket()
+    w = _writer(tmp_path, gcs)
+
+    async def burst():
+        return await asyncio.gather(*(w.append({"input_id": str(i)}, idempotency_key=f"k{i}") for i in range(20)))
+
+    paths = asyncio.run(burst())
+    assert len(set(paths)) == 1 and w.records_total == 20
+    assert w.commits_total < 20  # las líneas concurrentes comparten fsync
+    assert w.seen("k3") == paths[0] and w.seen("nope") is None
+    with patch("core.feedback_segments.gcs_ok", return_value=True):
+        asyncio.run(w.close())
+    assert gcs.objects[paths[0]].count(b"\n") == 20
+
+    # Otro proceso: el segmento ya subió, pero el índice local sigue deduplicando (con TTL)
+    assert _writer(tmp_path, gcs).seen("k3") == paths[0]
+    assert _writer(tmp_path, gcs, idempotency_ttl_s=-1).seen("k3") is None
+
+
+def test_app_startup_uploads_leftovers_and_shutdown_flushes(tmp_path):
+    os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+    import main as main_mod
+    from fastapi.testclient import TestClient
+
+    gcs = FakeBucket()
+    (tmp_path / "gw-a-20240101T000000-1000001.ndjson.open").write_bytes(b'{"input_id":"old"}\n')
+    w = _writer(tmp_path, gcs)
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_FEEDBACK_SEGMENTS", True), \
+            patch.object(main_mod, "get_feedback_writer", return_value=w), \
+            patch.object(main_mod, "gcs_ok", return_value=True), \
+            patch("core.feedback_segments.gcs_ok", return_value=True):
+        with TestClient(main_mod.APP) as client:
+            stored = client.post("/api/feedback", json={"input_id": "new"}).json()["stored"]
+    assert json.loads(gcs.objects["feedback/segments/2024/01/01/gw-a-20240101T000000-1000001.ndjson"])["input_id"] == "old"
+    assert json.loads(gcs.objects[stored])["input_id"] == "new"
+    assert not list(tmp_path.glob("*.ndjson*"))
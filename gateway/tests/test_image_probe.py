@@ -0,0 +1,87 @@
+"""
+Tests de core.image_probe: dimensiones desde cabecera (JPEG SOF, PNG IHDR, WebP)
+y límites de validación del gateway sin decodificar la imagen.
+"""
+import io
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from core.image_probe import ImageHeaderError, probe_image
+
+
+def _encode(fmt: str, size=(37, 21), mode="RGB", **kw) -> bytes:
+    buf = io.BytesIO()
+    Image.new(mode, size, (200, 10, 10) if mode == "RGB" else (200, 10, 10, 128)).save(buf, format=fmt, **kw)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize(
+    "fmt,kw,mode",
+    [
+        ("JPEG", {}, "RGB"),
+        ("JPEG", {"progressive": True}, "RGB"),
+        ("PNG", {}, "RGB"),
+        ("WEBP", {"quality": 80}, "RGB"),            # VP8 (lossy)
+        ("WEBP", {"lossless": True}, "RGB"),         # VP8L
+        ("WEBP", {"quality": 80}, "RGBA"),           # VP8X (alpha)
+    ],
+)
+def test_probe_dimensions_match_pil(fmt, kw, mode):
+    data = _encode(fmt, mode=mode, **kw)
+    got = probe_image(io.BytesIO(data))
+    assert got == (fmt.lower(), 37, 21)
+
+
+def test_probe_jpeg_skips_large_app_segment():
+    data = _encode("JPEG", size=(640, 480))
+    app1 = b"\xff\xe1" + (60002).to_bytes(2, "big") + b"\x00" * 60000
+    data = data[:2] + app1 + data[2:]
+    assert probe_image(io.BytesIO(data)) == ("jpeg", 640, 480)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"not an image",
+        b"\xff\xd8\xff\xe0\x00\x10JFIF",                # JPEG truncado antes de SOF
+        b"\x89PNG\r\n\x1a\n\x00\x00",                   # PNG truncado
+        b"RIFF\x00\x00\x00\x00WEBPVP8Z\x00\x00\x00\x00",  # chunk WebP desconocido
+    ],
+)
+def test_probe_rejects_invalid(data):
+    with pytest.raises(ImageHeaderError):
+        probe_image(io.BytesIO(data))
+
+
+def test_validate_rejects_decompression_bomb_without_decoding(monkeypatch):
+    """Cabecera PNG que declara 8000x8000: se rechaza por píxeles sin abrir con PIL."""
+    import main as m
+
+    data = _encode("PNG", size=(100, 100))
+    ihdr = data[16:24]
+    bomb = data.replace(ihdr, (8000).to_bytes(4, "big") * 2, 1)
+    monkeypatch.setattr(m, "MAX_IMAGE_PIXELS", 1_000_000)
+    with pytest.raises(HTTPException) as e:
+        m._validate_image_payload(bomb, "image/png", "front")
+    assert e.value.status_code == 400
+
+
+def test_validate_header_only_and_full_verify(monkeypatch):
+    """Por defecto basta la cabecera; con SCN_IMAGE_FULL_VERIFY el cuerpo corrupto da 400."""
+    import main as m
+
+    data = _encode("PNG", size=(50, 50))
+    corrupt = data[:40] + b"\x00" * (len(data) - 40)
+    m._validate_image_payload(corrupt, "image/png", "front")
+    monkeypatch.setattr(m, "SCN_IMAGE_FULL_VERIFY", True)
+    with pytest.raises(HTTPException) as e:
+        m._validate_image_payload(corrupt, "image/png", "front")
+    assert e.value.status_code == 400
@@ -0,0 +1,166 @@
+"""
+Jobs: long-poll (?wait=) y SSE (/api/job/{id}/events) alimentados por el JobHub en
+proceso; menos lecturas de GCS y procesamiento deduplicado.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+import pytest
+
+from core.job_events import JobHub
+
+os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+import main as main_mod  # noqa: E402
+from core.security import require_apikey  # noqa: E402
+
+JOB_PATH = "jobs/2026/01/01/j1.json"
+
+
+class _Store:
+    """GCS falso: cuenta lecturas del job."""
+
+    def __init__(self):
+        self.objects = {
+            JOB_PATH: {
+                "job_id": "j1", "input_id": "j1", "status": "queued", "attempts": 0,
+                "objects": {"A": "ingest/a.jpg", "B": None}, "result": None, "last_error": None,
+            }
+        }
+        self.reads = 0
+        self.finds = 0
+
+    def get_json(self, bucket, path):
+        self.reads += 1
+        return dict(self.objects[path])
+
+    def put_json(self, bucket, path, obj):
+        self.objects[path] = dict(obj)
+
+    def find(self, bucket, job_id, prefix):
+        self.finds += 1
+        return JOB_PATH
+
+
+class _MotorResp:
+    status_code = 200
+    headers = {"content-type": "application/json"}
+
+    def json(self):
+        return {"results": [{"brand": "JMA"}]}
+
+
+@pytest.fixture
+def env():
+    store = _Store()
+    hub = JobHub()
+    calls = []
+
+    async def fake_motor(path, files=None, data=None, request_id=None, req=None):
+        calls.append(path)
+        await asyncio.sleep(0.05)
+        return _MotorResp()
+
+    main_mod.APP.dependency_overrides[require_apikey] = lambda: True
+    with patch.object(main_mod, "gcs_ok", return_value=True), \
+            patch.object(main_mod, "gcs_get_json", side_effect=store.get_json), \
+            patch.object(main_mod, "gcs_put_json", side_effect=store.put_json), \
+            patch.object(main_mod, "find_job_path", side_effect=store.find), \
+            patch.object(main_mod, "gcs_get_bytes", return_value=b"img"), \
+            patch.object(main_mod, "get_job_hub", return_value=hub), \
+            patch.object(main_mod, "MOTOR_URL", "http://motor:8080"), \
+            patch("main._motor_post", side_effect=fake_motor):
+        yield store, calls
+    main_mod.APP.dependency_overrides.pop(require_apikey, None)
+
+
+def _run(coro_fn):
+    async def run():
+        transport = httpx.ASGITransport(app=main_mod.APP)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gw") as c:
+            return await coro_fn(c)
+    return asyncio.run(run())
+
+
+def test_process_then_terminal_from_memory(env):
+    store, calls = env
+
+    async def flow(c):
+        r1 = await c.get("/api/job/j1")
+        r2 = await c.get("/api/job/j1")
+        return r1.json(), r2.json()
+
+    j1, j2 = _run(flow)
+    assert j1["status"] == "done" and j2["status"] == "done"
+    assert calls == ["/api/analyze-key"]
+    assert store.finds == 1 and store.reads == 1  # el segundo poll no toca GCS
+
+
+def test_concurrent_process_polls_share_one_motor_call(env):
+    store, calls = env
+
+    async def flow(c):
+        return await asyncio.gather(c.get("/api/job/j1"), c.get("/api/job/j1"))
+
+    rs = _run(flow)
+    assert [r.json()["status"] for r in rs] == ["done", "done"]
+    assert len(calls) == 1
+
+
+def test_long_poll_returns_on_state_change(env):
+    store, calls = env
+
+    async def flow(c):
+        waiter = asyncio.ensure_future(c.get("/api/job/j1", params={"process": "0", "wait": 5}))
+        await asyncio.sleep(0.02)
+        await c.get("/api/job/j1")
+        first = (await waiter).json()
+        done = await c.get("/api/job/j1", params={"process": "0", "wait": 5, "status": "processing"})
+        return first, done.json()
+
+    first, done = _run(flow)
+    assert first["status"] in ("processing", "done")
+    assert done["status"] == "done"
+
+
+def test_long_poll_times_out_with_current_state(env):
+    async def flow(c):
+        return (await c.get("/api/job/j1", params={"process": "0", "wait": 0.1})).json()
+
+    assert _run(flow)["status"] == "queued"
+
+
+def test_sse_streams_until_terminal(env):
+    store, calls = env
+
+    async def flow(c):
+        return (await c.get("/api/job/j1/events")).text
+
+    text = _run(flow)
+    statuses = [line for line in text.splitlines() if line.startswith("data:")]
+    assert '"status": "processing"' in statuses[0]  # la task arranca antes del primer evento
+    assert '"status": "done"' in statuses[-1]
+    assert "event: status" in text
+    assert len(calls) == 1
+
+
+def test_analyze_by_ref_sends_uris_without_downloading(env):
+    seen = {}
+
+    async def fake_motor(path, files=None, data=None, request_id=None, req=None):
+        seen["files"], seen["data"] = files, data
+        return _MotorResp()
+
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_ANALYZE_BY_REF", True), \
+            patch.object(main_mod, "gcs_get_bytes", side_effect=AssertionError("no debe descargar")), \
+            patch("main._motor_post", side_effect=fake_motor):
+        r = _run(lambda c: c.get("/api/job/j1"))
+    assert r.json()["status"] == "done"
+    assert seen["files"] is None
+    assert seen["data"] == {"modo": "taller", "front_uri": f"gs://{main_mod.KEY_BUCKET}/ingest/a.jpg"}
@@ -0,0 +1,106 @@
+"""
+LoadShedder del motor: niveles con histéresis según analyze en vuelo y CPU.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from common.load_shedder import LoadShedder
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+        self.cpu = 0.0
+
+    def now(self):
+        return self.t
+
+    def cpu_time(self):
+        return self.cpu
+
+
+def _shedder(clock, **kw):
+    return LoadShedder(
+        ["quality", "sample_store", "ocr"],
+        inflight_high=4,
+        inflight_low=1,
+        step_up_s=2,
+        step_down_s=10,
+        clock=clock.now,
+        cpu_clock=clock.cpu_time,
+        cpu_count=1,
+        **kw,
+    )
+
+
+def test_sheds_one_stage_per_step_and_recovers_with_hysteresis():
+    c = Clock()
+    ls = _shedder(c)
+    for _ in range(4):
+        ls.enter()
+    assert not ls.sheds("quality")  # sobrecarga recién empezada
+    c.t = 2.0
+    assert ls.sheds("quality") and not ls.sheds("sample_store")
+    c.t = 4.0
+    assert ls.shed_stages() == ["quality", "sample_store"]
+    ls.exit()  # 3 en vuelo: entre umbrales, se mantiene
+    c.t = 30.0
+    assert ls.snapshot()["level"] == 2
+    ls.exit()
+    ls.exit()  # 1 en vuelo: por debajo del umbral bajo
+    c.t = 35.0
+    assert ls.snapshot()["level"] == 2
+    c.t = 40.0
+    assert ls.shed_stages() == ["quality"]
+    c.t = 50.0
+    snap = ls.snapshot()
+    assert snap["degraded_mode"] is False and snap["shed_stages"] == [] and snap["transitions"] == 4
+
+
+def test_cpu_pressure_alone_triggers_shedding():
+    c = Clock()
+    ls = _shedder(c, cpu_high=0.9, cpu_low=0.5)
+    c.t, c.cpu = 1.0, 0.95  # 95% de una CPU en el último segundo
+    ls.snapshot()
+    assert ls.cpu >= 0.9
+    c.t, c.cpu = 3.0, 2.9
+    assert ls.sheds("quality")
+    assert ls.snapshot()["inflight"] == 0
+
+
+def test_tracking_middleware_keeps_stream_inflight_until_last_chunk():
+    """Un stream cuenta como en vuelo mientras se generan sus etapas, no solo hasta las cabeceras."""
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse, StreamingResponse
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    from common.load_shedder import LoadTrackingMiddleware
+
+    shedder = _shedder(Clock())
+    seen = []
+
+    def _stages():
+        for i in range(3):
+            seen.append(shedder.inflight)
+            yield f"{i}\n"
+
+    async def analyze(request):
+        return StreamingResponse(_stages(), media_type="application/x-ndjson")
+
+    async def health(request):
+        return PlainTextResponse(str(shedder.inflight))
+
+    app = Starlette(routes=[Route("/api/analyze-key", analyze, methods=["POST"]), Route("/health", health)])
+    app.add_middleware(LoadTrackingMiddleware, shedder=shedder, paths=("/api/analyze-key",))
+    client = TestClient(app)
+
+    r = client.post("/api/analyze-key")
+    assert r.text == "0\n1\n2\n"
+    assert seen == [1, 1, 1]
+    assert shedder.inflight == 0
+    # Rutas fuera de `paths` no cuentan
+    assert client.get("/health").text == "0"
@@ -0,0 +1,118 @@
+"""
+Transporte interno "frame": codec de common/internal_frame y envío desde motor_proxy.
+"""
+import asyncio
+import io
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+import pytest
+
+os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+from common.internal_frame import CONTENT_TYPE, FrameError, decode_frame, encode_frame
+import core.motor_proxy as mp
+from core.motor_pool import MotorPool
+
+
+def test_frame_roundtrip_and_views():
+    buf = encode_frame({"modo": "taller"}, [("front", "f.jpg", "image/jpeg", b"\xff\xd8abc"), ("back", None, None, b"")])
+    fields, parts = decode_frame(buf)
+    assert fields == {"modo": "taller"}
+    assert parts["front"][:2] == ("f.jpg", "image/jpeg")
+    assert isinstance(parts["front"][2], memoryview) and bytes(parts["front"][2]) == b"\xff\xd8abc"
+    assert bytes(parts["back"][2]) == b""
+
+
+@pytest.mark.parametrize(
+    "buf",
+    [b"", b"XXXX\x00\x00\x00\x02{}", b"SCN1\x00\x00\x00\x09{}", b"SCN1\x00\x00\x00\x02{}extra"],
+)
+def test_frame_rejects_malformed(buf):
+    with pytest.raises(FrameError):
+        decode_frame(buf)
+
+
+def test_frame_transport_posts_to_internal_path_without_multipart():
+    seen = {}
+
+    def handler(request: httpx.Request):
+        seen["url"] = str(request.url)
+        seen["headers"] = request.headers
+        body = request.read()
+        seen["fields"], parts = decode_frame(body)
+        seen["parts"] = {k: bytes(v[2]) for k, v in parts.items()}
+        return httpx.Response(200, json={"ok": True})
+
+    spool = io.BytesIO(b"F" * 200000)
+    spool.seek(123)  # el spool puede venir a mitad de lectura tras validar
+    files = {"front": ("front.jpg", spool, "image/jpeg"), "back": ("back.jpg", b"BB", "image/png")}
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch.object(mp, "SCN_MOTOR_TRANSPORT", "frame"), \
+                patch.object(mp, "get_motor_pool", return_value=MotorPool([("m", "http://motor:8081")])), \
+                patch.object(mp, "get_auth_headers", return_value={}), \
+                patch.object(mp, "_get_frame_client", return_value=client):
+            return await mp._motor_post_raw("/api/analyze-key", files=files, data={"modo": "cliente"}, request_id="r1")
+
+    r = asyncio.run(run())
+    assert r.status_code == 200
+    assert seen["url"] == "http://motor:8081/internal/analyze-key"
+    assert seen["headers"]["content-type"] == CONTENT_TYPE
+    assert int(seen["headers"]["content-length"]) == len(encode_frame(
+        {"modo": "cliente"},
+        [("front", "front.jpg", "image/jpeg", b"F" * 200000), ("back", "back.jpg", "image/png", b"BB")],
+    ))
+    assert seen["headers"]["x-request-id"] == "r1"
+    assert seen["fields"] == {"modo": "cliente"}
+    assert seen["parts"] == {"front": b"F" * 200000, "back": b"BB"}
+
+
+def test_multipart_stays_default_and_other_paths_unchanged():
+    assert mp.SCN_MOTOR_TRANSPORT == os.getenv("SCN_MOTOR_TRANSPORT", "multipart")
+    with patch.object(mp, "SCN_MOTOR_TRANSPORT", "frame"):
+        kw = mp._post_kwargs("http://motor:8080", "/api/other", {"x": ("x", b"1", "a/b")}, {"k": "v"}, {})
+    assert "files" in kw and kw["url"].endswith("/api/other")
+
+
+def _motor_app():
+    pytest.importorskip("onnxruntime")
+    import motor.main as motor_main
+
+    return motor_main
+
+
+def test_motor_frame_route_front_only_and_by_uri(tmp_path):
+    """El endpoint frame del motor con solo front (caso normal) y con front_uri, como el multipart."""
+    from fastapi.testclient import TestClient
+    from PIL import Image
+    from common.object_source import ObjectReader
+
+    motor_main = _motor_app()
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (120, 90, 60)).save(buf, format="JPEG")
+    jpg = buf.getvalue()
+    (tmp_path / "front.jpg").write_bytes(jpg)
+
+    client = TestClient(motor_main.app)
+    with patch.object(motor_main, "SCN_MOCK_ENGINE", True), \
+            patch.object(motor_main, "_OBJECTS", ObjectReader(local_roots=[str(tmp_path)])):
+        multipart = client.post("/api/analyze-key", files={"front": ("f.jpg", jpg, "image/jpeg")}, data={"modo": "cliente"})
+        frame = client.post(
+            "/internal/analyze-key",
+            content=encode_frame({"modo": "cliente"}, [("front", "f.jpg", "image/jpeg", jpg)]),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
+        by_uri = client.post(
+            "/internal/analyze-key",
+            content=encode_frame({"front_uri": f"file://{tmp_path / 'front.jpg'}"}, []),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
+    assert multipart.status_code == frame.status_code == by_uri.status_code == 200
+    assert frame.json()["candidates"] == multipart.json()["candidates"]
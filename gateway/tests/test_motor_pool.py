@@ -0,0 +1,157 @@
+"""
+Motor pool: elección entre backends, EWMA, expulsión/recuperación y reintento en otro backend.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+
+os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+from core.config import parse_motor_urls
+from core.motor_pool import MotorPool, image_fingerprint
+import core.motor_proxy as mp
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+
+def _pool(**kw):
+    kw.setdefault("health_interval_s", 0)
+    return MotorPool([("a", "http://a:8081"), ("b", "http://b:8081")], **kw)
+
+
+def test_parse_motor_urls():
+    assert parse_motor_urls("", "http://motor:8081") == [("motor", "http://motor:8081")]
+    assert parse_motor_urls(" a=http://a:1/ , http://b:2", "") == [("a", "http://a:1"), ("motor1", "http://b:2")]
+    assert parse_motor_urls("", "") == []
+
+
+def test_least_outstanding_then_ewma_tiebreak():
+    pool = _pool()
+    a = pool.acquire()
+    b = pool.acquire()
+    assert {a.name, b.name} == {"a", "b"}
+    pool.release(a, 0.5, True)
+    pool.release(b, 0.1, True)
+    assert pool.acquire().name == "b"  # mismo en vuelo (0) -> menor latencia
+
+
+def test_ewma_strategy_weights_latency_by_load():
+    pool = _pool(strategy="ewma")
+    a, b = pool.backends
+    a.ewma_ms, b.ewma_ms = 100.0, 30.0
+    b.outstanding = 3  # 30 x 4 = 120 > 100 x 1
+    assert pool.acquire().name == "a"
+
+
+def test_ejection_and_recovery():
+    clock = FakeClock()
+    pool = _pool(eject_after=2, eject_s=10, clock=clock)
+    a, b = pool.backends
+    for _ in range(2):
+        pool.release(pool.acquire(exclude=[b]), 0.01, False)
+    assert a.ejections == 1
+    assert all(pool.acquire() is b for _ in range(3))
+    clock.t += 11
+    b.outstanding = 5
+    assert pool.acquire() is a
+    assert pool.snapshot()["backends"][0]["ejected"] is False
+
+
+def test_fails_open_when_all_down_and_single_backend_never_ejected():
+    pool = _pool()
+    for b in pool.backends:
+        b.ready = False
+    assert pool.acquire() in pool.backends
+    single = MotorPool([("m", "http://m:8081")], eject_after=1, health_interval_s=0)
+    single.release(single.acquire(), 0.01, False)
+    assert single.backends[0].ejections == 0
+
+
+def test_check_once_marks_not_ready():
+    pool = _pool()
+
+    def handler(request):
+        return httpx.Response(200 if request.url.host == "a" else 503)
+
+    real_client = httpx.AsyncClient
+    with patch("core.motor_pool.httpx.AsyncClient", lambda **kw: real_client(transport=httpx.MockTransport(handler))):
+        asyncio.run(pool.check_once(lambda aud: {}))
+    assert [b.ready for b in pool.backends] == [True, False]
+
+
+def test_retry_goes_to_other_backend():
+    pool = _pool()
+    hosts = []
+
+    def handler(request):
+        hosts.append(request.url.host)
+        if len(hosts) == 1:
+            raise httpx.ConnectError("down")
+        return httpx.Response(200, json={"ok": True})
+
+    real_client = httpx.AsyncClient
+
+    async def run():
+        with patch.object(mp, "get_motor_pool", return_value=pool), \
+                patch.object(mp, "get_auth_headers", return_value={}), \
+                patch("core.motor_proxy.httpx.AsyncClient", lambda **kw: real_client(transport=httpx.MockTransport(handler))):
+            return await mp._motor_post_raw("/api/analyze-key", data={"modo": "cliente"})
+
+    assert asyncio.run(run()).status_code == 200
+    assert len(set(hosts)) == 2
+    assert sum(b.failures for b in pool.backends) == 1
+    assert all(b.outstanding == 0 for b in pool.backends)
+
+
+def _pool_n(n, **kw):
+    kw.setdefault("health_interval_s", 0)
+    return MotorPool([(f"m{i}", f"http://m{i}:8081") for i in range(n)], **kw)
+
+
+def test_affinity_is_sticky_and_mostly_stable_when_adding_replicas():
+    keys = [f"img{i}" for i in range(400)]
+    pool3, pool4 = _pool_n(3), _pool_n(4)
+
+    def route(pool, k):
+        b = pool.acquire(key=k)
+        pool.release(b, 0.01, True)
+        return b.name
+
+    first = {k: route(pool3, k) for k in keys}
+    assert all(route(pool3, k) == first[k] for k in keys)
+    assert pool3.affinity_spills == 0
+    moved = sum(route(pool4, k) != first[k] for k in keys)
+    assert moved < len(keys) * 0.4  # ~1/4 se va a la réplica nueva
+
+
+def test_affinity_spills_over_bounded_load():
+    pool = _pool_n(2, affinity_load_factor=1.0)
+    held = [pool.acquire(key="hot") for _ in range(4)]
+    assert sorted(b.outstanding for b in pool.backends) == [2, 2]
+    assert pool.affinity_hits >= 1 and pool.affinity_spills >= 1
+    for b in held:
+        pool.release(b, 0.01, True)
+
+
+def test_image_fingerprint_bytes_and_spool_match():
+    import io
+
+    data = bytes(range(256)) * 2000
+    spool = io.BytesIO(data)
+    spool.seek(10)
+    assert image_fingerprint(data) == image_fingerprint(spool)
+    assert spool.tell() == 10
+    assert image_fingerprint(data) != image_fingerprint(data[:-1] + b"x")
+    assert image_fingerprint(None) is None
@@ -0,0 +1,99 @@
+"""
+Tabla precompilada de normalize_contract: la ruta rápida produce exactamente
+la misma salida (mismo orden de claves) que la implementación legacy.
+"""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import normalize
+from normalize import normalize_contract
+
+SAMPLES_DIR = Path(__file__).resolve().parent.parent.parent / "ui-studio" / "scripts" / "sample_responses"
+
+_BBOX = {"x": 0.1, "y": 0.1, "w": 0.5, "h": 0.5}
+
+
+def _full_item(**extra):
+    item = {
+        "rank": 1, "brand": "JMA", "model": "TE8I", "confidence": 0.91, "crop_bbox": _BBOX,
+        "orientacion": "izq", "patent": "si", "headColor": "  Negro ", "state": "desgastado",
+        "brand_head_text": " JMA ", "brand_blade_text": "", "brand_visible_zone": "HEAD",
+        "ocr_brand_guess": "jma", "head_shape": "oval", "blade_profile": "TE8",
+        "tip_shape": "flat", "side_count": "2", "symmetry": "false", "wear_level": "medio",
+        "high_security": True, "requires_card": "no",
+        "head_color_confidence": 0.4, "orientation_source": "manual", "symmetry_confidence": 7,
+        "material_hint": " laton ", "oxidation_present": "yes",
+    }
+    item.update(extra)
+    return item
+
+
+def _raw(results, **extra):
+    raw = {
+        "input_id": "x",
+        "timestamp": "2025-01-01T00:00:00Z",
+        "results": results,
+        "manufacturer_hint": {"found": False, "name": None, "confidence": 0.0},
+        "debug": {"model_version": "v2"},
+    }
+    raw.update(extra)
+    return raw
+
+
+def _both(raw):
+    old = normalize.SCN_FEATURE_NORMALIZE_FAST_PATH
+    try:
+        normalize.SCN_FEATURE_NORMALIZE_FAST_PATH = True
+        fast = normalize_contract(raw)
+        normalize.SCN_FEATURE_NORMALIZE_FAST_PATH = False
+        legacy = normalize_contract(raw)
+    finally:
+        normalize.SCN_FEATURE_NORMALIZE_FAST_PATH = old
+    return fast, legacy
+
+
+def _assert_identical(raw):
+    fast, legacy = _both(raw)
+    assert json.dumps(fast, sort_keys=False) == json.dumps(legacy, sort_keys=False)
+    return fast
+
+
+def test_fast_path_identical_full_multilabel():
+    out = _assert_identical(_raw([_full_item(), {"label": "OTHER", "score": 0.05}, {}]))
+    r0 = out["results"][0]
+    assert r0["orientation"] == "left"
+    assert r0["orientation_meta"]["source"] == "manual"
+    assert r0["head_color_meta"]["confidence"] == 0.4
+    assert "confidence" not in r0["symmetry_meta"]
+    assert r0["patentada"] is True
+
+
+def test_fast_path_identical_with_ocr_sources():
+    raw = _raw([_full_item(), _full_item(confidence=0.3, patentada="quizas")], ocr_hint={"text": "JMA"})
+    out = _assert_identical(raw)
+    assert out["results"][0]["ocr_brand_guess_meta"]["source"] == "ocr"
+    assert out["results"][1]["patentada_meta"]["value"] is False
+
+
+def test_fast_path_identical_without_multilabel_fields():
+    raw = _raw([{"label": "JIS2I", "score": 0.92}, {"label": "X", "score": 0.05}])
+    out = _assert_identical(raw)
+    assert out["results"][0]["patentada"] is False
+    assert "orientation_meta" not in out["results"][0]
+
+
+def test_fast_path_identical_sample_responses():
+    for path in sorted(SAMPLES_DIR.glob("*.json")):
+        raw = json.loads(path.read_text(encoding="utf-8"))
+        _assert_identical(raw)
+
+
+def test_field_specs_resolved_at_import():
+    assert set(normalize._FIELD_SPECS) == set(normalize._META_FIELDS)
+    for spec in normalize._FIELD_SPECS.values():
+        assert spec.normalizer is not None, spec.name
+    assert normalize._FIELD_SPECS["head_color"].aliases == ("head_color", "headColor")
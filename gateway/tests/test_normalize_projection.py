@@ -0,0 +1,122 @@
+"""
+Proyección del contrato (view= / fields=): salida recortada y etapas
+(*_meta, consistency, risk, policy) que no se calculan si no se piden.
+"""
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pytest
+
+from normalize import normalize_contract, resolve_projection
+
+SAMPLES_DIR = Path(__file__).resolve().parent.parent.parent / "ui-studio" / "scripts" / "sample_responses"
+
+
+def _sample(name="with_meta_phase5"):
+    return json.loads((SAMPLES_DIR / f"{name}.json").read_text(encoding="utf-8"))
+
+
+def _strip_ts(d):
+    return {k: v for k, v in d.items() if k != "timestamp"}
+
+
+@pytest.mark.parametrize("view", [None, "debug", "DEBUG"])
+def test_full_and_debug_views_equal_default(view):
+    raw = _sample()
+    assert json.dumps(normalize_contract(raw, view=view)) == json.dumps(normalize_contract(raw))
+
+
+def test_minimal_view_skips_meta_and_debug_stages():
+    raw = _sample()
+    with patch("common.multilabel_consistency.compute_consistency", side_effect=AssertionError), \
+            patch("common.risk_engine.compute_risk", side_effect=AssertionError), \
+            patch("common.policy_engine.evaluate_policy", side_effect=AssertionError):
+        out = normalize_contract(raw, view="minimal")
+    assert set(out) == {"input_id", "timestamp", "results", "low_confidence", "high_confidence"}
+    full = normalize_contract(raw)
+    assert len(out["results"]) == 3
+    for got, ref in zip(out["results"], full["results"]):
+        assert got == {k: ref[k] for k in ("rank", "brand", "model", "confidence", "explain_text")}
+
+
+def test_client_view_keeps_policy_without_meta():
+    raw = _sample()
+    full = normalize_contract(raw)
+    out = normalize_contract(raw, view="client")
+    assert "debug" in out
+    assert set(out["debug"]) <= {"model_version", "policy_action", "policy_reasons", "policy_user_message"}
+    assert out["debug"]["policy_action"] == full["debug"]["policy_action"]
+    assert not any(k.endswith("_meta") for r in out["results"] for k in r)
+    assert out["results"][0]["crop_bbox"] == full["results"][0]["crop_bbox"]
+
+
+def test_workshop_view_full_results_reduced_debug():
+    raw = _sample()
+    full = normalize_contract(raw)
+    out = normalize_contract(raw, view="workshop")
+    assert out["results"] == full["results"]
+    assert "size_class" not in out["debug"]
+    assert out["debug"]["risk_level"] == full["debug"]["risk_level"]
+    assert out["debug"]["policy_action"] == full["debug"]["policy_action"]
+
+
+def test_fields_projection():
+    raw = _sample()
+    with patch("common.policy_engine.evaluate_policy", side_effect=AssertionError):
+        out = normalize_contract(raw, fields="results.brand,results.model,low_confidence")
+    assert set(out) == {"results", "low_confidence"}
+    assert set(out["results"][0]) == {"rank", "brand", "model"}
+    out = normalize_contract(raw, fields="debug.policy_action")
+    assert out == {"debug": {"policy_action": normalize_contract(raw)["debug"]["policy_action"]}}
+
+
+@pytest.mark.parametrize("view,fields", [("huge", None), (None, "results.brand,nope"), (None, "low_confidence.x")])
+def test_invalid_projection_raises(view, fields):
+    with pytest.raises(ValueError):
+        resolve_projection(view, fields)
+
+
+def test_gateway_analyze_view_param():
+    os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+    from io import BytesIO
+
+    from fastapi.testclient import TestClient
+    from PIL import Image
+
+    import main as main_mod
+
+    buf = BytesIO()
+    Image.new("RGB", (16, 16)).save(buf, format="PNG")
+    raw = _sample()
+
+    class MockResp:
+        status_code = 200
+        headers = {"content-type": "application/json"}
+
+        @property
+        def content(self):
+            return json.dumps(self.json()).encode("utf-8")
+
+        def json(self):
+            return json.loads(json.dumps(raw))
+
+    client = TestClient(main_mod.APP)
+    files = {"front": ("f.png", buf.getvalue(), "image/png")}
+    with patch("main._motor_post", new=AsyncMock(return_value=MockResp())):
+        r = client.post("/api/analyze-key?view=minimal", files=files)
+        assert r.status_code == 200
+        body = r.json()
+        assert "debug" not in body and body["request_id"]
+        assert set(body["results"][0]) == {"rank", "brand", "model", "confidence", "explain_text"}
+        with patch.object(main_mod, "SCN_FEATURE_POLICY_ENGINE_ACTIVE", True):
+            r = client.post("/api/analyze-key?view=minimal", files=files)
+        assert r.status_code in (200, 422)
+        if r.status_code == 200:
+            assert "debug" not in r.json() and r.json()["schema_version"]
+        assert client.post("/api/analyze-key?view=nope", files=files).status_code == 400
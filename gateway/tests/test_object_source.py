@@ -0,0 +1,76 @@
+"""
+common/object_source: lectura por URI del motor (gs:// con caché read-through, file:// acotado).
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pytest
+
+from common.object_source import ObjectNotFound, ObjectReader, ObjectSourceError, parse_uri
+
+
+class FakeGcs:
+    def __init__(self, objects):
+        self.objects = objects
+        self.calls = []
+
+    def __call__(self, bucket, obj):
+        self.calls.append((bucket, obj))
+        if (bucket, obj) not in self.objects:
+            raise ObjectNotFound(obj)
+        return self.objects[(bucket, obj)]
+
+
+def test_parse_uri():
+    assert parse_uri("gs://b/a/x.jpg") == ("gs", "b", "a/x.jpg")
+    assert parse_uri("file:///data/x.jpg") == ("file", "", "/data/x.jpg")
+    for bad in ("gs://b", "gs:///x", "file://rel/x", "http://x/y", ""):
+        with pytest.raises(ObjectSourceError):
+            parse_uri(bad)
+
+
+def test_read_through_cache_survives_restart(tmp_path):
+    gcs = FakeGcs({("keys", "ingest/a.jpg"): b"A" * 10})
+    r = ObjectReader(buckets=["keys"], cache_dir=str(tmp_path), gcs_fetch=gcs)
+    assert r.read("gs://keys/ingest/a.jpg") == b"A" * 10
+    assert r.read("gs://keys/ingest/a.jpg") == b"A" * 10
+    assert len(gcs.calls) == 1 and r.snapshot()["hits"] == 1
+    r2 = ObjectReader(buckets=["keys"], cache_dir=str(tmp_path), gcs_fetch=gcs)
+    assert r2.read("gs://keys/ingest/a.jpg") == b"A" * 10
+    assert len(gcs.calls) == 1
+
+
+def test_lru_eviction_by_size(tmp_path):
+    objs = {("keys", f"o{i}"): bytes([i]) * 40 for i in range(3)}
+    gcs = FakeGcs(objs)
+    r = ObjectReader(buckets=["keys"], cache_dir=str(tmp_path), cache_max_bytes=100, gcs_fetch=gcs)
+    r.read("gs://keys/o0")
+    r.read("gs://keys/o1")
+    r.read("gs://keys/o0")  # o0 pasa a ser el más reciente
+    r.read("gs://keys/o2")  # 120 > 100: sale o1
+    snap = r.snapshot()
+    assert snap["evictions"] == 1 and snap["cache_bytes"] == 80
+    r.read("gs://keys/o0")
+    r.read("gs://keys/o1")
+    assert gcs.calls.count(("keys", "o0")) == 1 and gcs.calls.count(("keys", "o1")) == 2
+
+
+def test_rejects_unlisted_bucket_and_paths_outside_roots(tmp_path):
+    root = tmp_path / "samples"
+    root.mkdir()
+    (root / "x.jpg").write_bytes(b"X")
+    (tmp_path / "secret").write_bytes(b"S")
+    r = ObjectReader(buckets=["keys"], local_roots=[str(root)], gcs_fetch=FakeGcs({}))
+    assert r.read(f"file://{root}/x.jpg") == b"X"
+    with pytest.raises(ObjectSourceError):
+        r.read("gs://other/x.jpg")
+    with pytest.raises(ObjectSourceError):
+        r.read(f"file://{root}/../secret")
+    with pytest.raises(ObjectNotFound):
+        r.read(f"file://{root}/missing.jpg")
+    with pytest.raises(ObjectNotFound):
+        r.read("gs://keys/missing.jpg")
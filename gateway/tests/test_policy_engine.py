@@ -77,6 +77,26 @@ def test_require_manual_review_risk_high():
     assert "risk_high" in out["reasons"]
 
 
+def test_quality_shed_or_skipped_is_unknown_not_perfect():
+    """Calidad apagada por sobrecarga o saltada por deadline: no cuenta como 1.0 (ALLOW)."""
+    base = {
+        "results": [{"brand": "X", "model": "Y", "confidence": 0.9}],
+        "low_confidence": False,
+        "high_confidence": True,
+    }
+    assert evaluate_policy({**base, "debug": {"risk_level": "LOW"}})["action"] == ACTION_ALLOW
+    for debug in (
+        {"risk_level": "LOW", "shed_stages": ["quality", "ocr"]},
+        {"risk_level": "LOW", "deadline": {"budget_ms": 900, "skipped_stages": ["quality"]}},
+    ):
+        out = evaluate_policy({**base, "debug": debug})
+        assert out["action"] == ACTION_ALLOW_WITH_OVERRIDE
+        assert "quality_unknown" in out["reasons"]
+    # Si la calidad sí se midió, manda la medida (BLOCK sigue activo)
+    out = evaluate_policy({**base, "debug": {"risk_level": "LOW", "quality_score": 0.2, "shed_stages": ["quality"]}})
+    assert out["action"] == ACTION_BLOCK
+
+
 def test_allow_with_override_quality_warning():
     """ALLOW_WITH_OVERRIDE por quality_warning."""
     resp = {
@@ -249,3 +269,22 @@ def test_normalize_integrates_policy():
     assert "consistency_score" in debug
     assert "consistency_conflicts" in debug
     assert "consistency_supports" in debug
+
+
+def test_thresholds_override_changes_block():
+    """Umbrales configurables (replay offline): quality 0.40 bloquea solo con quality_block=0.45."""
+    resp = {
+        "results": [{"brand": "X", "model": "Y", "confidence": 0.7}],
+        "low_confidence": False,
+        "high_confidence": False,
+        "debug": {"quality_score": 0.40, "roi_score": 0.8, "risk_level": "LOW"},
+    }
+    assert evaluate_policy(resp)["action"] != ACTION_BLOCK
+    assert evaluate_policy(resp, thresholds={"quality_block": 0.45})["action"] == ACTION_BLOCK
+
+
+def test_thresholds_unknown_key_raises():
+    """Umbral desconocido -> ValueError (config de replay mal escrita)."""
+    import pytest
+    with pytest.raises(ValueError):
+        evaluate_policy({"results": []}, thresholds={"unknown": 1})
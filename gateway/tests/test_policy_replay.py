@@ -0,0 +1,121 @@
+"""
+Replay offline del PolicyEngine (jobs/policy_replay.py).
+"""
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "jobs"))
+
+import pytest
+
+from policy_replay import extract_response, load_config, run_replay
+
+_BBOX = {"x": 0.1, "y": 0.1, "w": 0.5, "h": 0.5}
+
+
+def _resp(input_id, conf, quality):
+    return {
+        "input_id": input_id,
+        "results": [
+            {"brand": "JMA", "model": "TE8I", "confidence": conf, "crop_bbox": _BBOX},
+            {"brand": "JMA", "model": "TE8D", "confidence": 0.01, "crop_bbox": _BBOX},
+        ],
+        "debug": {"quality_score": quality, "roi_score": 0.9},
+    }
+
+
+def _write_cfg(tmp_path, name, **cfg):
+    cfg_dir = tmp_path / "configs"
+    cfg_dir.mkdir(exist_ok=True)
+    p = cfg_dir / f"{name}.json"
+    p.write_text(json.dumps(cfg), encoding="utf-8")
+    return str(p)
+
+
+def test_extract_response_formats():
+    direct = {"results": []}
+    assert extract_response(direct) is direct
+    job = {"job_id": "j1", "result": {"candidates": [{"label": "X"}]}}
+    assert extract_response(job)["input_id"] == "j1"
+    sidecar = {"input_id": "i1", "ts_utc": "t", "result": {"candidates": [], "top_label": "X"}}
+    assert extract_response(sidecar)["timestamp"] == "t"
+    assert extract_response({"input_id": "x", "analysis": None}) is None
+
+
+def test_load_config_rejects_unknown_threshold(tmp_path):
+    with pytest.raises(ValueError):
+        load_config(_write_cfg(tmp_path, "bad", policy_thresholds={"nope": 1}))
+
+
+def test_replay_distribution_and_diff(tmp_path):
+    lines = [_resp("a", 0.97, 0.9), _resp("b", 0.97, 0.40), _resp("c", 0.30, 0.9)]
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    src = data_dir / "export.ndjson"
+    src.write_text("\n".join(json.dumps(r) for r in lines) + "\nnot json\n", encoding="utf-8")
+    (data_dir / "sidecar.json").write_text(json.dumps({"input_id": "s", "analysis": None}), encoding="utf-8")
+
+    cfg_a = load_config(None)
+    cfg_b = load_config(_write_cfg(tmp_path, "strict", policy_engine_active=True, policy_thresholds={"quality_block": 0.45}))
+    report = run_replay([str(data_dir)], [cfg_a, cfg_b], workers=0, batch_size=2)
+
+    assert report["records"] == 3
+    assert report["errors"] == 1
+    assert report["skipped"] == 1
+    assert report["configs"]["strict"]["actions"]["BLOCK"] == 1
+    assert report["configs"]["strict"]["effects"]["block_422"] == 1
+    assert report["configs"]["default"]["effects"] == {"served": 3}
+    assert report["diff"]["changed"] == 1
+    assert report["diff"]["examples"][0]["input_id"] == "b"
+    assert report["diff"]["examples"][0]["b"] == "BLOCK"
+
+
+def test_replay_process_pool_matches_inprocess(tmp_path):
+    src = tmp_path / "export.ndjson"
+    src.write_text("\n".join(json.dumps(_resp(str(i), 0.5 + i / 100, 0.3 + i / 50)) for i in range(40)), encoding="utf-8")
+    cfgs = [load_config(None)]
+    inproc = run_replay([str(src)], cfgs, workers=0, batch_size=7)
+    pooled = run_replay([str(src)], cfgs, workers=2, batch_size=7)
+    assert inproc["configs"] == pooled["configs"]
+    assert pooled["records"] == 40
+
+
+class FakeBlob:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def download_as_bytes(self, start=0, end=None):
+        return self.data[start: None if end is None else end + 1]
+
+    def download_as_text(self):
+        return self.data.decode("utf-8")
+
+
+def test_replay_counts_malformed_lines_and_splits_gcs_ndjson(tmp_path, monkeypatch):
+    import policy_replay
+
+    good = [_resp(str(i), 0.5 + i / 100, 0.9) for i in range(9)]
+    lines = [json.dumps(r) for r in good[:4]] + ['{"input_id": "broken", '] + [json.dumps(r) for r in good[4:]]
+    data = ("\n".join(lines) + "\n").encode("utf-8")
+    (tmp_path / "export.ndjson").write_bytes(data)
+    cfgs = [load_config(None)]
+
+    local = run_replay([str(tmp_path / "export.ndjson")], cfgs, workers=0)
+    assert (local["records"], local["errors"]) == (9, 1)
+
+    blobs = {"gs://b/exports/a.ndjson": FakeBlob(data)}
+    monkeypatch.setattr(policy_replay, "_list_gcs", lambda src: [(u, len(b.data)) for u, b in blobs.items()])
+    monkeypatch.setattr(policy_replay, "_gcs_blob", lambda uri: blobs[uri])
+    tasks = list(policy_replay._iter_tasks(["gs://b/exports/"], gcs_chunk_bytes=100))
+    assert len(tasks) > 3 and {k for k, _ in tasks} == {"gcs_range"}
+    # Los trozos cubren cada línea exactamente una vez, corten donde corten
+    texts = [t for _k, item in tasks for t in policy_replay._task_texts("gcs_range", item)]
+    assert texts == lines
+
+    remote = run_replay(["gs://b/exports/"], cfgs, workers=0, gcs_chunk_bytes=100)
+    assert (remote["records"], remote["errors"]) == (9, 1)
+    assert remote["configs"] == local["configs"]
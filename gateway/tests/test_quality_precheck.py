@@ -0,0 +1,107 @@
+"""
+Quality pre-check en el gateway: miniatura con las métricas de common/quality_gate y
+422 POLICY_BLOCK sin llamar al motor si la captura es claramente inservible.
+"""
+import io
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+import main as main_mod  # noqa: E402
+from core.quality_precheck import precheck_quality, thumbnail_quality  # noqa: E402
+
+
+def _jpeg(arr: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(arr.astype(np.uint8)).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _dark() -> bytes:
+    return _jpeg(np.full((1200, 1600, 3), 3))
+
+
+def _sharp() -> bytes:
+    rng = np.random.default_rng(0)
+    return _jpeg(rng.integers(0, 256, size=(1200, 1600, 3)))
+
+
+def test_thumbnail_metrics_and_verdicts():
+    dark = thumbnail_quality(_dark())
+    assert dark["quality_score"] < 0.2 and "poca_luz" in dark["reasons"]
+    assert precheck_quality(_dark()) is not None
+    assert precheck_quality(_sharp()) is None
+    # La peor cara decide (el motor combina A/B con el mínimo)
+    assert precheck_quality(_sharp(), _dark()) is not None
+    # Imagen ilegible: no decide el gateway
+    assert precheck_quality(b"not an image") is None
+
+
+def test_spool_position_is_preserved():
+    spool = io.BytesIO(_dark())
+    spool.seek(7)
+    thumbnail_quality(spool)
+    assert spool.tell() == 7
+
+
+def _post(path, image):
+    calls = []
+
+    async def fake_motor(*a, **kw):
+        calls.append(a[0] if a else kw.get("path"))
+        raise AssertionError("no debe llamar al motor")
+
+    async def fake_stream(*a, **kw):
+        calls.append("stream")
+        raise AssertionError("no debe llamar al motor")
+        yield  # pragma: no cover
+
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_QUALITY_PRECHECK", True), \
+            patch.object(main_mod, "SCN_FEATURE_POLICY_ENGINE_ACTIVE", True), \
+            patch("main._motor_post", side_effect=fake_motor), \
+            patch("main._motor_stream", side_effect=fake_stream):
+        r = TestClient(main_mod.APP).post(path, files={"front": ("f.jpg", image, "image/jpeg")})
+    return r, calls
+
+
+def test_analyze_blocks_dark_capture_without_motor():
+    r, calls = _post("/api/analyze-key", _dark())
+    assert calls == []
+    assert r.status_code == 422
+    body = r.json()
+    assert body["error"] == "POLICY_BLOCK" and body["reasons"] == ["quality_block"]
+    assert body["debug"]["policy_action"] == "BLOCK" and body["debug"]["precheck"] == "gateway"
+
+
+def test_stream_emits_blocked_without_motor():
+    r, calls = _post("/api/analyze-key/stream", _dark())
+    assert calls == []
+    evs = [json.loads(line) for line in r.text.splitlines() if line.strip()]
+    assert [e["event"] for e in evs] == ["blocked"]
+    assert evs[0]["status"] == 422 and evs[0]["data"]["error"] == "POLICY_BLOCK"
+
+
+def test_usable_capture_goes_to_motor():
+    seen = []
+
+    async def fake_stream(path, files=None, data=None, request_id=None, req=None):
+        # El generador corre tras cerrar FastAPI los uploads: el cuerpo tiene que seguir legible
+        seen.append(files["front"][1])
+        yield {"event": "error", "status": 504, "data": "motor timeout"}
+
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_QUALITY_PRECHECK", True), \
+            patch.object(main_mod, "SCN_FEATURE_POLICY_ENGINE_ACTIVE", True), \
+            patch("main._motor_stream", side_effect=fake_stream):
+        r = TestClient(main_mod.APP).post("/api/analyze-key/stream", files={"front": ("f.jpg", _sharp(), "image/jpeg")})
+    assert [json.loads(line)["event"] for line in r.text.splitlines() if line.strip()] == ["error"]
+    assert seen == [_sharp()]
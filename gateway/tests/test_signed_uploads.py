@@ -0,0 +1,140 @@
+"""
+Ingest por URL firmada: /api/ingest-key/uploads -> PUT directo al store -> /api/ingest-key/finalize.
+Store local (mismo contrato que GCS) en un tmp_path.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+import pytest
+
+os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+import main as main_mod  # noqa: E402
+from core.security import require_apikey  # noqa: E402
+from core.upload_store import LocalUploadStore, sign_token, verify_token  # noqa: E402
+
+
+@pytest.fixture
+def env(tmp_path):
+    jobs = {}
+    store = LocalUploadStore(str(tmp_path))
+
+    def get_json(bucket, path):
+        if path not in jobs:
+            raise FileNotFoundError(path)
+        return dict(jobs[path])
+
+    def put_json(bucket, path, obj):
+        jobs[path] = dict(obj)
+
+    main_mod.APP.dependency_overrides[require_apikey] = lambda: True
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_SIGNED_UPLOADS", True), \
+            patch.object(main_mod, "gcs_ok", return_value=True), \
+            patch.object(main_mod, "gcs_get_json", side_effect=get_json), \
+            patch.object(main_mod, "gcs_put_json", side_effect=put_json), \
+            patch.object(main_mod, "get_upload_store", return_value=store):
+        yield jobs, store
+    main_mod.APP.dependency_overrides.pop(require_apikey, None)
+
+
+def _run(flow):
+    async def run():
+        transport = httpx.ASGITransport(app=main_mod.APP)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gw") as c:
+            return await flow(c)
+    return asyncio.run(run())
+
+
+def _local(url):
+    u = urlsplit(url)
+    return f"{u.path}?{u.query}"
+
+
+def test_upload_then_finalize_enqueues_job(env):
+    jobs, store = env
+
+    async def flow(c):
+        r = await c.post("/api/ingest-key/uploads", json={"back": True})
+        assert r.status_code == 200
+        up = r.json()
+        front = up["uploads"]["front"]
+        assert front["method"] == "PUT" and front["url"].startswith("http://gw/api/ingest-key/local-upload/")
+        put = await c.put(_local(front["url"]), content=b"\xff\xd8jpeg", headers=front["headers"])
+        assert put.status_code == 200
+        # back declarado pero no subido: el job sigue solo con A
+        f1 = await c.post("/api/ingest-key/finalize", json={"upload_token": up["upload_token"]})
+        f2 = await c.post("/api/ingest-key/finalize", json={"upload_token": up["upload_token"]})
+        return up, f1, f2
+
+    up, f1, f2 = _run(flow)
+    assert f1.status_code == 200 and f1.json()["status"] == "queued"
+    assert f2.json()["job_object"] == f1.json()["job_object"] and len(jobs) == 1
+    job = jobs[f1.json()["job_object"]]
+    assert job["job_id"] == up["job_id"] and job["store"] == "local" and job["objects"]["B"] is None
+    assert main_mod._job_bytes(job, job["objects"]["A"]) == b"\xff\xd8jpeg"
+    assert main_mod._job_uri(job, job["objects"]["A"]).startswith("file://")
+
+
+def test_finalize_without_front_is_409_and_tampered_token_403(env):
+    async def flow(c):
+        up = (await c.post("/api/ingest-key/uploads")).json()
+        missing = await c.post("/api/ingest-key/finalize", json={"upload_token": up["upload_token"]})
+        claims = verify_token(up["upload_token"])
+        claims["o"]["A"] = "otra/ruta.jpg"
+        forged = up["upload_token"].split(".")[0] + "." + sign_token(claims).split(".")[1]
+        bad = await c.post("/api/ingest-key/finalize", json={"upload_token": forged})
+        return missing, bad
+
+    missing, bad = _run(flow)
+    assert missing.status_code == 409
+    assert bad.status_code == 403
+
+
+def test_local_put_checks_signature_type_and_size(env):
+    async def flow(c):
+        up = (await c.post("/api/ingest-key/uploads", json={"content_type": "image/png"})).json()
+        front = up["uploads"]["front"]
+        url = _local(front["url"])
+        bad_sig = await c.put(url.replace("sig=", "sig=0"), content=b"x", headers=front["headers"])
+        bad_ct = await c.put(url, content=b"x", headers={"Content-Type": "image/jpeg"})
+        too_big = await c.put(url, content=b"x" * (up["max_bytes"] + 1), headers=front["headers"])
+        bad_type = await c.post("/api/ingest-key/uploads", json={"content_type": "text/html"})
+        return bad_sig, bad_ct, too_big, bad_type
+
+    bad_sig, bad_ct, too_big, bad_type = _run(flow)
+    assert bad_sig.status_code == 403 and bad_ct.status_code == 403
+    assert too_big.status_code == 413
+    assert bad_type.status_code == 415
+
+
+
+def test_store_never_falls_back_to_local_and_ingest_needs_gcs():
+    """Sin parchear gcs_ok: el store local es opt-in y, sin GCS, el ingest dice por qué no va."""
+    import core.upload_store as us
+    from core.gcs_utils import gcs_ok
+
+    with patch.object(us, "_store", None), patch.object(us, "SCN_UPLOAD_STORE", ""):
+        assert us.get_upload_store().name == "gcs"
+    with patch.object(us, "_store", None), patch.object(us, "SCN_UPLOAD_STORE", "local"):
+        assert us.get_upload_store().name == "local"
+
+    if gcs_ok():
+        pytest.skip("hay GCS en este entorno")
+    main_mod.APP.dependency_overrides[require_apikey] = lambda: True
+    try:
+        with patch.object(main_mod, "SCN_FEATURE_GATEWAY_SIGNED_UPLOADS", True):
+            up, fin = _run(lambda c: asyncio.gather(
+                c.post("/api/ingest-key/uploads", json={}),
+                c.post("/api/ingest-key/finalize", json={"upload_token": "x"}),
+            ))
+    finally:
+        main_mod.APP.dependency_overrides.pop(require_apikey, None)
+    assert up.status_code == fin.status_code == 501
+    assert "SCN_UPLOAD_STORE=local" in up.json()["detail"]
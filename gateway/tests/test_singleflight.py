@@ -0,0 +1,143 @@
+"""
+Singleflight de analyze: peticiones idénticas concurrentes -> una llamada al motor.
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+import pytest
+from PIL import Image
+
+from core.singleflight import SingleFlight, upload_digest
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "r"
+
+    async def run():
+        sf = SingleFlight()
+        out = await asyncio.gather(*(sf.do("k", work) for _ in range(5)))
+        assert out == ["r"] * 5
+        assert sf.snapshot() == {"inflight": 0, "leaders_total": 1, "coalesced_total": 4}
+        await sf.do("k", work)  # ya terminó: nueva llamada
+        return sf
+
+    sf = asyncio.run(run())
+    assert len(calls) == 2 and sf.leaders_total == 2
+
+
+def test_exception_fans_out_and_leader_cancel_keeps_followers():
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("x")
+
+    async def slow():
+        await asyncio.sleep(0.03)
+        return 42
+
+    async def run():
+        sf = SingleFlight()
+        res = await asyncio.gather(sf.do("a", boom), sf.do("a", boom), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in res)
+        leader = asyncio.ensure_future(sf.do("b", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(sf.do("b", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == 42
+
+    asyncio.run(run())
+
+
+def test_upload_digest_bytes_and_spool_equal_and_rewound():
+    data = b"abc" * 50000
+    f = io.BytesIO(data)
+    f.seek(10)
+    assert upload_digest(data) == upload_digest(f)
+    assert f.tell() == 0
+    assert upload_digest(None) is None
+
+
+def test_gateway_coalesces_identical_analyze():
+    os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+    import main as main_mod
+
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 16)).save(buf, format="PNG")
+    png = buf.getvalue()
+    calls = []
+    bodies = []
+
+    class MockResp:
+        status_code = 200
+        headers = {"content-type": "application/json"}
+
+        @property
+        def content(self):
+            return json.dumps(self.json()).encode("utf-8")
+
+        def json(self):
+            return {"results": [{"brand": "JMA", "model": "TE8I", "confidence": 0.9}]}
+
+    async def fake_post(path, files=None, data=None, request_id=None, req=None):
+        calls.append(data.get("modo"))
+        body = files["front"][1]
+        body.seek(0)
+        bodies.append((isinstance(body, bytes), body.read()))
+        await asyncio.sleep(0.05)
+        return MockResp()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main_mod.APP)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gw") as c:
+            def post(modo):
+                return c.post(
+                    "/api/analyze-key",
+                    files={"front": ("f.png", png, "image/png")},
+                    data={"modo": modo},
+                )
+            return await asyncio.gather(post("cliente"), post("cliente"), post("cliente"), post("taller"))
+
+    flight = main_mod.SingleFlight()
+    # Con uploads en spool (en disco: umbral del spool bajado) la task compartida lleva su
+    # propio handle del fichero, no una copia en bytes
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_SINGLEFLIGHT", True), \
+            patch.object(main_mod, "SCN_FEATURE_GATEWAY_STREAM_UPLOADS", True), \
+            patch("starlette.formparsers.MultiPartParser.max_file_size", 64), \
+            patch.object(main_mod, "_ANALYZE_FLIGHT", flight), \
+            patch("main._motor_post", side_effect=fake_post):
+        rs = asyncio.run(run())
+    assert [r.status_code for r in rs] == [200] * 4
+    assert sorted(calls) == ["cliente", "taller"]
+    assert flight.coalesced_total == 2
+    assert bodies == [(False, png), (False, png)]
+    assert len({r.json()["request_id"] for r in rs}) == 4  # meta por petición
+
+
+def test_detached_body_outlives_the_upload():
+    import tempfile
+    from core.singleflight import close_detached, detach_body
+
+    for size in (10, 10 ** 6):  # aún en memoria (bytes) y en disco (dup del fd)
+        spool = tempfile.SpooledTemporaryFile(max_size=100)
+        spool.write(b"k" * size)
+        spool.seek(3)
+        own = detach_body(spool)
+        spool.close()  # FastAPI cierra el UploadFile del leader
+        own = own if isinstance(own, bytes) else own.read()
+        assert own == b"k" * size
+    assert detach_body(b"abc") == b"abc" and detach_body(None) is None
+    close_detached(b"abc")
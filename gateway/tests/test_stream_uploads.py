@@ -0,0 +1,141 @@
+"""
+Uploads en streaming: 413 temprano (body limit), validación sobre el spool
+y reenvío al motor sin copiar la imagen a bytes.
+"""
+import os
+import sys
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from core.body_limit import BodySizeLimitMiddleware
+
+
+def _png_bytes(w=32, h=32):
+    buf = BytesIO()
+    Image.new("RGB", (w, h), (120, 80, 40)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _limited_app(max_bytes):
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, paths=("/up",), max_bytes=max_bytes)
+
+    @app.post("/up")
+    async def up(front: UploadFile = File(None)):
+        return {"ok": True, "size": front.size}
+
+    @app.post("/other")
+    async def other(front: UploadFile = File(None)):
+        return {"ok": True}
+
+    return app
+
+
+def test_body_limit_declared_content_length_413():
+    client = TestClient(_limited_app(1024))
+    r = client.post("/up", files={"front": ("a.png", b"x" * 4096, "image/png")})
+    assert r.status_code == 413
+    assert r.json()["error"] == "PAYLOAD_TOO_LARGE"
+
+
+def test_body_limit_chunked_stream_413():
+    """Sin Content-Length fiable: corta al contar bytes en receive()."""
+    client = TestClient(_limited_app(1024))
+
+    def _gen():
+        for _ in range(16):
+            yield b"y" * 512
+
+    r = client.post("/up", content=_gen(), headers={"content-type": "multipart/form-data; boundary=xx"})
+    assert r.status_code == 413
+
+
+def test_body_limit_only_listed_paths():
+    client = TestClient(_limited_app(1024))
+    assert client.post("/up", files={"front": ("a.png", b"x" * 10, "image/png")}).status_code == 200
+    assert client.post("/other", files={"front": ("a.png", b"x" * 4096, "image/png")}).status_code == 200
+
+
+def test_analyze_streams_spool_to_motor():
+    """El motor recibe un file-like (spool), no bytes; validación OK sobre el spool."""
+    os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+    import main as main_mod
+
+    class MockResp:
+        status_code = 200
+        headers = {"content-type": "application/json"}
+        content = b'{"ok":true,"results":[]}'
+
+        def json(self):
+            return {"ok": True, "results": []}
+
+    client = TestClient(main_mod.APP)
+    seen = {}
+
+    async def _fake_post(path, files=None, data=None, request_id=None, req=None):
+        name, body, ct = files["front"]
+        seen["is_bytes"] = isinstance(body, bytes)
+        seen["data"] = body.read()
+        seen["has_back"] = "back" in files
+        return MockResp()
+
+    # Spool en disco (umbral bajado): con singleflight (default) la task lleva un dup del fichero;
+    # por debajo del umbral el upload ya está en memoria y viaja como bytes
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_STREAM_UPLOADS", True), \
+            patch("starlette.formparsers.MultiPartParser.max_file_size", 64), \
+            patch("main._motor_post", new=AsyncMock(side_effect=_fake_post)):
+        png = _png_bytes()
+        r = client.post("/api/analyze-key", files={"front": ("f.png", png, "image/png")})
+    assert r.status_code == 200
+    assert seen["is_bytes"] is False
+    assert seen["data"] == png
+    assert seen["has_back"] is False
+
+
+def test_analyze_stream_rejects_non_image_from_first_chunk():
+    import main as main_mod
+
+    client = TestClient(main_mod.APP)
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_STREAM_UPLOADS", True), \
+            patch("main._motor_post", new=AsyncMock()) as motor:
+        r = client.post("/api/analyze-key", files={"front": ("f.jpg", b"%PDF-1.4 not an image", "image/jpeg")})
+    assert r.status_code == 400
+    motor.assert_not_called()
+
+
+def test_analyze_stream_payload_too_large_413():
+    import main as main_mod
+
+    client = TestClient(main_mod.APP)
+    with patch.object(main_mod, "SCN_FEATURE_GATEWAY_STREAM_UPLOADS", True), \
+            patch.object(main_mod, "MAX_PAYLOAD_BYTES", 100), \
+            patch("main._motor_post", new=AsyncMock()) as motor:
+        r = client.post("/api/analyze-key", files={"front": ("f.png", _png_bytes(), "image/png")})
+    assert r.status_code == 413
+    motor.assert_not_called()
+
+
+def test_early_413_carries_cors_headers():
+    """El límite va dentro de CORS: el navegador puede leer el 413 en vez de un error CORS opaco."""
+    import main as main_mod
+    from core.body_limit import MAX_REQUEST_BYTES
+
+    origin = main_mod.allowed[0] if main_mod.allowed and main_mod.allowed != ["*"] else "https://app.example"
+    client = TestClient(main_mod.APP)
+    with patch("main._motor_post", new=AsyncMock()) as motor:
+        r = client.post(
+            "/api/analyze-key",
+            content=b"x",
+            headers={"Origin": origin, "Content-Length": str(MAX_REQUEST_BYTES + 1), "Content-Type": "multipart/form-data; boundary=b"},
+        )
+    assert r.status_code == 413 and r.json()["error"] == "PAYLOAD_TOO_LARGE"
+    assert r.headers.get("access-control-allow-origin") in (origin, "*")
+    motor.assert_not_called()
@@ -0,0 +1,115 @@
+"""
+Tensor cache de train_v2 (megafactory/train/tensor_cache.py): build -> reabrir -> leer,
+invalidación cuando cambia el dataset y mismos tensores con y sin caché.
+"""
+import json
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from megafactory.train.tensor_cache import build_cache, scan_dataset
+
+
+def _dataset(root: Path):
+    """v2/<LABEL>/{A,B}/*.jpg con tamaños distintos (el caché redimensiona)."""
+    rng = np.random.default_rng(0)
+    for lab, sides in (("JMA-TE8I", ("A", "B")), ("TESA-T60", ("A",))):
+        for side in sides:
+            d = root / lab / side
+            d.mkdir(parents=True)
+            for i in range(2):
+                px = rng.integers(0, 256, size=(20 + 7 * i, 30, 3), dtype=np.uint8)
+                Image.fromarray(px).save(d / f"{i}.png")
+    (root / "TESA-T60" / "A" / "notes.txt").write_text("no es imagen")
+    return scan_dataset(root)
+
+
+def test_build_reopen_and_read_roundtrip(tmp_path):
+    samples, labels = _dataset(tmp_path / "v2")
+    assert labels == ["JMA-TE8I", "TESA-T60"] and len(samples) == 6
+    index = build_cache(samples, tmp_path / "cache", img=16)
+
+    reopened = json.loads((tmp_path / "cache" / "index.json").read_text(encoding="utf-8"))
+    assert reopened == index
+    assert index["dtype"] == "uint8" and index["shape"] == [6, 16, 16, 3]
+    assert [(e["label"], e["side"], e["path"]) for e in index["entries"]] == [(lab, side, p) for p, lab, side in sorted(samples)]
+    assert os.path.getsize(tmp_path / "cache" / index["file"]) == 6 * 16 * 16 * 3
+
+    arr = np.memmap(tmp_path / "cache" / index["file"], mode="r", dtype=np.dtype(index["dtype"]), shape=tuple(index["shape"]))
+    for e in index["entries"]:
+        expected = np.asarray(Image.open(e["path"]).convert("RGB").resize((16, 16), Image.BILINEAR))
+        assert np.array_equal(arr[e["row"]], expected)
+
+    # Sin cambios: se reutiliza tal cual (mismo índice, sin reescribir el memmap)
+    mtime = os.stat(tmp_path / "cache" / "images.u8").st_mtime_ns
+    assert build_cache(samples, tmp_path / "cache", img=16) == index
+    assert os.stat(tmp_path / "cache" / "images.u8").st_mtime_ns == mtime
+
+
+def test_shuffled_samples_reuse_the_cache(tmp_path):
+    """train_v2 baraja antes de build_cache: el caché hecho con la CLI (orden de escaneo) vale igual."""
+    import random
+
+    samples, _labels = _dataset(tmp_path / "v2")
+    index = build_cache(samples, tmp_path / "cache", img=16)
+    mtime = os.stat(tmp_path / "cache" / "images.u8").st_mtime_ns
+    shuffled = list(samples)
+    random.Random(3).shuffle(shuffled)
+    assert shuffled != samples
+    assert build_cache(shuffled, tmp_path / "cache", img=16) == index
+    assert os.stat(tmp_path / "cache" / "images.u8").st_mtime_ns == mtime
+
+
+def test_cache_invalidated_when_source_or_size_changes(tmp_path):
+    samples, _labels = _dataset(tmp_path / "v2")
+    cache = tmp_path / "cache"
+    first = build_cache(samples, cache, img=16)
+
+    # Fichero modificado: nueva huella y píxeles nuevos en su fila
+    changed = samples[0][0]
+    Image.new("RGB", (16, 16), (255, 0, 0)).save(changed)
+    os.utime(changed, ns=(1, 1))
+    second = build_cache(samples, cache, img=16)
+    assert second["fingerprint"] != first["fingerprint"]
+    arr = np.memmap(cache / "images.u8", mode="r", dtype=np.uint8, shape=tuple(second["shape"]))
+    row = next(e["row"] for e in second["entries"] if e["path"] == changed)
+    assert (arr[row] == (255, 0, 0)).all()
+
+    # Fichero nuevo y --img distinto también reconstruyen
+    Image.new("RGB", (8, 8)).save(tmp_path / "v2" / "TESA-T60" / "A" / "9.png")
+    samples, _labels = scan_dataset(tmp_path / "v2")
+    third = build_cache(samples, cache, img=16)
+    assert len(third["entries"]) == 7 and third["fingerprint"] != second["fingerprint"]
+    assert build_cache(samples, cache, img=12)["shape"] == [7, 12, 12, 3]
+
+    # Imagen ilegible: fuera del índice, sin romper el build
+    (tmp_path / "v2" / "TESA-T60" / "A" / "9.png").write_bytes(b"roto")
+    samples, _labels = scan_dataset(tmp_path / "v2")
+    fourth = build_cache(samples, cache, img=12)
+    assert len(fourth["entries"]) == 6 and fourth["skipped"] == [str(tmp_path / "v2" / "TESA-T60" / "A" / "9.png")]
+
+
+def test_train_v2_same_tensors_with_and_without_cache(tmp_path):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("torchvision")
+    from megafactory.train.train_v2 import make_datasets
+
+    samples, labels = _dataset(tmp_path / "v2")
+    label2idx = {lab: i for i, lab in enumerate(labels)}
+    _tr, plain = make_datasets(samples, [], samples, label2idx, 16)
+    _tr, cached = make_datasets(samples, [], samples, label2idx, 16, tmp_path / "cache")
+    assert len(plain) == len(cached) == len(samples)
+    for i in range(len(samples)):
+        x_plain, y_plain = plain[i]
+        x_cached, y_cached = cached[i]
+        assert x_cached.dtype == torch.uint8 and x_cached.shape == x_plain.shape == (3, 16, 16)
+        # train_v2 pasa uint8 a float en batch (_to_input): mismos valores que ToTensor
+        assert torch.allclose(x_cached.float().div_(255), x_plain, atol=1e-6)
+        assert y_cached == y_plain
@@ -0,0 +1,91 @@
+"""
+Timings por etapa (common/timings): histogramas Prometheus, debug.timings en analyze-key y
+GET /metrics del gateway.
+"""
+import io
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from common.timings import GCS_METRIC, STAGE_METRIC, MetricsRegistry, StageTimer, gcs_op
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_stage_timer_accumulates_and_renders_histogram():
+    reg = MetricsRegistry(buckets=(0.01, 0.1, 1.0))
+    clock = FakeClock()
+    timer = StageTimer("motor", registry=reg, clock=clock)
+    for dt in (0.005, 0.05):  # A y B suman en la misma etapa
+        with timer.span("decode"):
+            clock.t += dt
+    with timer.span("inference"):
+        clock.t += 0.5
+    assert timer.timings_ms("gateway.") == {"gateway.decode": 55.0, "gateway.inference": 500.0, "gateway.total": 555.0}
+
+    text = reg.render()
+    assert f"# TYPE {STAGE_METRIC} histogram" in text
+    assert f'{STAGE_METRIC}_bucket{{service="motor",stage="decode",le="0.01"}} 1' in text
+    assert f'{STAGE_METRIC}_bucket{{service="motor",stage="decode",le="0.1"}} 2' in text
+    assert f'{STAGE_METRIC}_bucket{{service="motor",stage="inference",le="0.1"}} 0' in text
+    assert f'{STAGE_METRIC}_bucket{{service="motor",stage="inference",le="+Inf"}} 1' in text
+    assert f'{STAGE_METRIC}_count{{service="motor",stage="decode"}} 2' in text
+    assert f'{STAGE_METRIC}_sum{{service="motor",stage="decode"}} 0.055000' in text
+
+
+def test_gcs_op_counts_errors_separately():
+    reg = MetricsRegistry(buckets=(1.0,))
+    with gcs_op("upload", registry=reg):
+        pass
+    with pytest.raises(FileNotFoundError):
+        with gcs_op("download", registry=reg):
+            raise FileNotFoundError("x")
+    text = reg.render()
+    assert f'{GCS_METRIC}_count{{op="upload",outcome="ok"}} 1' in text
+    assert f'{GCS_METRIC}_count{{op="download",outcome="error"}} 1' in text
+
+
+def test_analyze_merges_gateway_timings_and_exposes_metrics():
+    os.environ.setdefault("MOTOR_URL", "http://motor:8080")
+    import main as main_mod
+
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 16)).save(buf, format="PNG")
+    files = {"front": ("f.png", buf.getvalue(), "image/png")}
+    body = {
+        "results": [{"brand": "JMA", "model": "TE8I", "confidence": 0.9}],
+        "debug": {"model_version": "m1", "timings": {"inference": 12.5, "total": 20.0}},
+    }
+
+    class MockResp:
+        status_code = 200
+        headers = {"content-type": "application/json"}
+        content = json.dumps(body).encode("utf-8")
+
+    client = TestClient(main_mod.APP)
+    with patch("main._motor_post", new=AsyncMock(return_value=MockResp())):
+        # Opt-in: por defecto solo llegan los timings del motor
+        assert "gateway.total" not in client.post("/api/analyze-key", files=files).json()["debug"]["timings"]
+        with patch.object(main_mod, "SCN_DEBUG_INCLUDE_TIMINGS", True):
+            timings = client.post("/api/analyze-key", files=files).json()["debug"]["timings"]
+        assert timings["inference"] == 12.5 and timings["total"] == 20.0
+        assert {"gateway.read", "gateway.motor", "gateway.normalize", "gateway.gates", "gateway.total"} <= set(timings)
+
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    assert f'{STAGE_METRIC}_count{{service="gateway",stage="motor"}}' in r.text
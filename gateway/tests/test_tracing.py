@@ -0,0 +1,115 @@
+"""
+Tracing (common/tracing): traceparent W3C, muestreo por traza, middleware de servidor con
+spans de etapa/GCS como hijos, y propagación hacia el motor.
+"""
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from common import tracing
+from common.timings import MetricsRegistry, StageTimer, gcs_op
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def restore_tracer():
+    prev = tracing.get_tracer()
+    yield
+    tracing._tracer = prev
+
+
+def test_traceparent_roundtrip_and_invalid():
+    ctx = tracing.parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+    assert ctx == tracing.SpanContext("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)
+    assert tracing.format_traceparent(ctx) == "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    for bad in (None, "", "00-xyz-00f067aa0ba902b7-01", "00-" + "0" * 32 + "-00f067aa0ba902b7-01"):
+        assert tracing.parse_traceparent(bad) is None
+
+
+def test_sampling_decided_at_root_and_inherited():
+    exp = ListExporter()
+    tracer = tracing.Tracer("gateway", exp, sample_rate=0.5, rng=lambda: 0.9)
+    with tracer.start_span("root") as root:
+        with tracing.span("child") as child:
+            assert child.context.trace_id == root.context.trace_id and not child.context.sampled
+    assert exp.spans == []
+    # Un traceparent muestreado manda aunque el muestreo local diga que no
+    parent = tracing.parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+    with tracer.start_span("server", parent):
+        pass
+    assert [s["parent_id"] for s in exp.spans] == ["00f067aa0ba902b7"]
+
+
+def test_middleware_continues_trace_with_stage_and_gcs_children(restore_tracer, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.configure("motor", tracing.build_exporter("jsonl", str(path)), sample_rate=0.0)
+    app = FastAPI()
+    app.middleware("http")(tracing.trace_requests)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: str):
+        timer = StageTimer("motor", registry=MetricsRegistry())
+        with timer.span("inference"):
+            pass
+        with pytest.raises(FileNotFoundError):
+            with gcs_op("download", registry=MetricsRegistry()):
+                raise FileNotFoundError(item_id)
+        return {"ok": True}
+
+    tp = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    assert TestClient(app).get("/items/42", headers={"traceparent": tp}).status_code == 200
+    spans = {s["name"]: s for s in map(json.loads, path.read_text().splitlines())}
+    server = spans["GET /items/{item_id}"]
+    assert server["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736" and server["parent_id"] == "00f067aa0ba902b7"
+    assert server["attrs"]["http.status_code"] == 200 and server["service"] == "motor"
+    assert spans["inference"]["parent_id"] == server["span_id"]
+    assert spans["gcs.download"]["status"] == "error" and spans["gcs.download"]["error"] == "FileNotFoundError"
+
+    # Sin traceparent y sample_rate=0: la traza no se exporta
+    TestClient(app).get("/items/7")
+    assert len(path.read_text().splitlines()) == 3
+
+
+def test_motor_headers_carry_client_span(restore_tracer):
+    from core.motor_proxy import _motor_headers
+
+    tracer = tracing.configure("gateway", ListExporter(), sample_rate=1.0)
+    with patch("core.motor_proxy.get_auth_headers", return_value={}):
+        assert "traceparent" not in _motor_headers("rid", None)
+        with tracer.start_span("POST /api/analyze-key"):
+            with tracing.span("motor POST /api/analyze-key") as client_span:
+                headers = _motor_headers("rid", None)
+    assert tracing.parse_traceparent(headers["traceparent"]) == client_span.context
+
+
+def test_http_exporter_batches_and_counts_failures():
+    posted = []
+    exp = tracing.HttpExporter("http://collector/spans", batch_size=2, post=lambda url, body: posted.append(json.loads(body)))
+    for i in range(3):
+        exp._queue.put_nowait({"name": f"s{i}"})
+    exp.flush()
+    exp.flush()
+    assert [len(p["spans"]) for p in posted] == [2, 1]
+
+    def boom(url, body):
+        raise OSError("collector down")
+
+    exp._post = boom
+    exp._queue.put_nowait({"name": "x"})
+    exp.flush()
+    assert exp.failed_batches == 1
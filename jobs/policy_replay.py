@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Replay offline del PolicyEngine sobre respuestas de analyze guardadas.
+
+Pasa cada respuesta por normalize_contract (consistency + risk + policy) y
+re-evalúa la política con una o dos configuraciones, en un pool de procesos.
+Salida: distribución de acciones por config y diff A→B (transiciones + ejemplos).
+
+Fuentes (se pueden mezclar):
+  - *.ndjson / *.jsonl: una respuesta por línea (export)
+  - *.json: respuesta suelta, job del gateway ({"result": ...}) o sidecar del
+    motor (keys/... con "analysis", samples/... con "result.candidates")
+  - directorios locales (recursivo) y prefijos gs://bucket/prefix (los NDJSON de GCS se
+    reparten en tareas por rango de bytes; cada worker descarga solo su trozo)
+Un registro malformado cuenta como error y no descarta el resto del fichero.
+
+Config (JSON):
+  {"name": "strict", "policy_engine_active": true,
+   "risk_engine_passive": true, "policy_thresholds": {"quality_block": 0.40}}
+Umbrales válidos: common.policy_engine.DEFAULT_POLICY_THRESHOLDS.
+
+Uso:
+  PYTHONPATH=. python jobs/policy_replay.py exports/analyze.ndjson \\
+      --config-a configs/v1.json --config-b configs/strict.json --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "gateway"))
+
+from common.policy_engine import ACTION_BLOCK, evaluate_policy, resolve_thresholds  # noqa: E402
+
+_RISK_KEYS = ("margin", "risk_score", "risk_level", "risk_reasons")
+_MAX_EXAMPLES = 20
+_NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+_GCS_CHUNK_BYTES = 8 * 1024 * 1024
+_GCS_TAIL_BYTES = 64 * 1024
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "name": "default",
+    "policy_engine_active": False,
+    "risk_engine_passive": True,
+    "policy_thresholds": {},
+}
+
+
+def load_config(path: Optional[str]) -> Dict[str, Any]:
+    """Config de replay: defaults + JSON; valida umbrales al cargar (no en cada worker)."""
+    cfg = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f) or {}
+        cfg.update(data)
+        if "name" not in data:
+            cfg["name"] = Path(path).stem
+    cfg["policy_thresholds"] = resolve_thresholds(cfg.get("policy_thresholds"))
+    return cfg
+
+
+def extract_response(rec: Any) -> Optional[Dict[str, Any]]:
+    """Respuesta de analyze dentro de un registro guardado (o None si no hay)."""
+    if not isinstance(rec, dict):
+        return None
+    if isinstance(rec.get("results"), list) or isinstance(rec.get("candidates"), list):
+        return rec
+    for k in ("analysis", "result"):
+        inner = rec.get(k)
+        if not isinstance(inner, dict):
+            continue
+        if isinstance(inner.get("results"), list) or isinstance(inner.get("candidates"), list):
+            out = dict(inner)
+            out.setdefault("input_id", rec.get("input_id") or rec.get("job_id") or "")
+            out.setdefault("timestamp", rec.get("ts_utc") or rec.get("finished_at"))
+            return out
+    return None
+
+
+def _effect(action: Optional[str], cfg: Dict[str, Any]) -> str:
+    """Efecto visible para el cliente con esa config (solo BLOCK cambia el status)."""
+    if action == ACTION_BLOCK and cfg.get("policy_engine_active"):
+        return "block_422"
+    return "served"
+
+
+def _evaluate(normalized: Dict[str, Any], cfg: Dict[str, Any]) -> Optional[str]:
+    resp = normalized
+    if not cfg.get("risk_engine_passive", True):
+        debug = {k: v for k, v in (normalized.get("debug") or {}).items() if k not in _RISK_KEYS}
+        resp = dict(normalized, debug=debug)
+    return evaluate_policy(resp, thresholds=cfg["policy_thresholds"]).get("action")
+
+
+# ---------- Worker ----------
+_W_CONFIGS: List[Dict[str, Any]] = []
+_W_GCS = None
+
+
+def _init_worker(configs: List[Dict[str, Any]]) -> None:
+    global _W_CONFIGS
+    _W_CONFIGS = configs
+
+
+def _gcs_blob(uri: str):
+    global _W_GCS
+    if _W_GCS is None:
+        from google.cloud import storage
+        _W_GCS = storage.Client()
+    bucket, obj = uri[5:].split("/", 1)
+    return _W_GCS.bucket(bucket).blob(obj)
+
+
+def _read_gcs_range(uri: str, start: int, end: int, size: int) -> bytes:
+    """
+    Líneas de un NDJSON de GCS cuyo primer byte cae en [start, end): la línea que empieza antes
+    es del trozo anterior y la última se completa leyendo más allá de end.
+    """
+    blob = _gcs_blob(uri)
+    lo = max(0, start - 1)
+    data = blob.download_as_bytes(start=lo, end=end - 1)  # end inclusivo en GCS
+    if start > 0:
+        nl = data.find(b"\n")
+        if nl < 0:
+            return b""
+        data = data[nl + 1:]
+    pos = end
+    while data and not data.endswith(b"\n") and pos < size:
+        more = blob.download_as_bytes(start=pos, end=min(size, pos + _GCS_TAIL_BYTES) - 1)
+        if not more:
+            break
+        nl = more.find(b"\n")
+        if nl >= 0:
+            data += more[: nl + 1]
+            break
+        data += more
+        pos += len(more)
+    return data
+
+
+def _task_texts(kind: str, item: str) -> List[str]:
+    """Texto JSON de cada registro de la tarea (sin parsear: los errores se cuentan por registro)."""
+    if kind == "line":
+        return [item]
+    if kind == "gcs_range":
+        uri, _, rng = item.rpartition("#")
+        start, end, size = (int(x) for x in rng.split(":"))
+        return [ln for ln in _read_gcs_range(uri, start, end, size).decode("utf-8").splitlines() if ln.strip()]
+    text = _gcs_blob(item).download_as_text() if kind == "gcs" else Path(item).read_text(encoding="utf-8")
+    return [text]
+
+
+def replay_batch(batch: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """Procesa un lote en el worker; devuelve contadores (no respuestas) para minimizar IPC."""
+    from normalize import normalize_contract
+
+    configs = _W_CONFIGS
+    actions = [Counter() for _ in configs]
+    effects = [Counter() for _ in configs]
+    transitions: Counter = Counter()
+    examples: List[Dict[str, Any]] = []
+    records = skipped = errors = 0
+    for kind, item in batch:
+        try:
+            texts = _task_texts(kind, item)
+        except Exception:
+            # Fuente ilegible (descarga/lectura): un error por tarea
+            errors += 1
+            continue
+        for text in texts:
+            try:
+                raw = extract_response(json.loads(text))
+                if raw is None:
+                    skipped += 1
+                    continue
+                normalized = normalize_contract(raw)
+                acts = [_evaluate(normalized, cfg) for cfg in configs]
+            except Exception:
+                errors += 1
+                continue
+            records += 1
+            for i, (cfg, act) in enumerate(zip(configs, acts)):
+                actions[i][act or "NONE"] += 1
+                effects[i][_effect(act, cfg)] += 1
+            if len(acts) == 2 and acts[0] != acts[1]:
+                transitions[f"{acts[0]}->{acts[1]}"] += 1
+                if len(examples) < _MAX_EXAMPLES:
+                    examples.append({"input_id": normalized.get("input_id") or "", "a": acts[0], "b": acts[1]})
+    return {
+        "records": records,
+        "skipped": skipped,
+        "errors": errors,
+        "actions": actions,
+        "effects": effects,
+        "transitions": transitions,
+        "examples": examples,
+    }
+
+
+# ---------- Fuentes ----------
+def _list_gcs(src: str) -> Iterator[Tuple[str, int]]:
+    """(gs://bucket/objeto, bytes) de los .json/.ndjson/.jsonl bajo el prefijo."""
+    from google.cloud import storage
+    bucket, _, prefix = src[5:].partition("/")
+    for blob in storage.Client().list_blobs(bucket, prefix=prefix):
+        if blob.name.endswith((".json",) + _NDJSON_SUFFIXES):
+            yield f"gs://{bucket}/{blob.name}", int(blob.size or 0)
+
+
+def _iter_tasks(sources: Iterable[str], gcs_chunk_bytes: int = _GCS_CHUNK_BYTES) -> Iterator[Tuple[str, str]]:
+    """
+    (kind, item): 'line' = texto NDJSON, 'file' = ruta local, 'gcs' = gs://... JSON suelto,
+    'gcs_range' = gs://...#start:end:size (trozo de un NDJSON; lo descarga el worker).
+    """
+    for src in sources:
+        if src.startswith("gs://"):
+            for uri, size in _list_gcs(src):
+                if not uri.endswith(_NDJSON_SUFFIXES):
+                    yield "gcs", uri
+                    continue
+                for start in range(0, size, gcs_chunk_bytes):
+                    yield "gcs_range", f"{uri}#{start}:{min(size, start + gcs_chunk_bytes)}:{size}"
+            continue
+        p = Path(src)
+        paths = sorted(p.rglob("*")) if p.is_dir() else [p]
+        for fp in paths:
+            if fp.suffix in _NDJSON_SUFFIXES:
+                # NDJSON grande: se trocea por líneas para repartir entre workers
+                with open(fp, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            yield "line", line
+            elif fp.suffix == ".json" and fp.is_file():
+                yield "file", str(fp)
+
+
+def _batches(tasks: Iterator[Tuple[str, str]], size: int) -> Iterator[List[Tuple[str, str]]]:
+    batch: List[Tuple[str, str]] = []
+    for t in tasks:
+        if t[0] == "gcs_range":
+            # Un trozo de GCS ya es un lote (MBs de registros)
+            yield [t]
+            continue
+        batch.append(t)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _merge(total: Dict[str, Any], part: Dict[str, Any]) -> None:
+    for k in ("records", "skipped", "errors"):
+        total[k] += part[k]
+    for i, c in enumerate(part["actions"]):
+        total["actions"][i].update(c)
+    for i, c in enumerate(part["effects"]):
+        total["effects"][i].update(c)
+    total["transitions"].update(part["transitions"])
+    room = _MAX_EXAMPLES - len(total["examples"])
+    if room > 0:
+        total["examples"].extend(part["examples"][:room])
+
+
+def run_replay(
+    sources: List[str],
+    configs: List[Dict[str, Any]],
+    workers: int = 0,
+    batch_size: int = 2000,
+    gcs_chunk_bytes: int = _GCS_CHUNK_BYTES,
+) -> Dict[str, Any]:
+    """
+    Ejecuta el replay y devuelve el reporte.
+    workers=0 -> en proceso (tests, debug); >0 -> ProcessPoolExecutor.
+    """
+    t0 = time.time()
+    total: Dict[str, Any] = {
+        "records": 0,
+        "skipped": 0,
+        "errors": 0,
+        "actions": [Counter() for _ in configs],
+        "effects": [Counter() for _ in configs],
+        "transitions": Counter(),
+        "examples": [],
+    }
+    batches = _batches(_iter_tasks(sources, gcs_chunk_bytes), batch_size)
+    if workers <= 0:
+        _init_worker(configs)
+        for b in batches:
+            _merge(total, replay_batch(b))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(configs,)) as ex:
+            # Ventana acotada de lotes en vuelo: memoria constante con millones de registros
+            pending = []
+            for b in batches:
+                pending.append(ex.submit(replay_batch, b))
+                if len(pending) >= workers * 4:
+                    _merge(total, pending.pop(0).result())
+            for fut in pending:
+                _merge(total, fut.result())
+
+    elapsed = time.time() - t0
+    report: Dict[str, Any] = {
+        "records": total["records"],
+        "skipped": total["skipped"],
+        "errors": total["errors"],
+        "elapsed_s": round(elapsed, 2),
+        "records_per_s": round(total["records"] / elapsed, 1) if elapsed > 0 else None,
+        "configs": {},
+    }
+    for i, cfg in enumerate(configs):
+        report["configs"][cfg["name"]] = {
+            "policy_engine_active": bool(cfg.get("policy_engine_active")),
+            "policy_thresholds": cfg["policy_thresholds"],
+            "actions": dict(total["actions"][i].most_common()),
+            "effects": dict(total["effects"][i].most_common()),
+        }
+    if len(configs) == 2:
+        changed = sum(total["transitions"].values())
+        report["diff"] = {
+            "a": configs[0]["name"],
+            "b": configs[1]["name"],
+            "changed": changed,
+            "changed_pct": round(100.0 * changed / total["records"], 2) if total["records"] else 0.0,
+            "transitions": dict(total["transitions"].most_common()),
+            "examples": total["examples"],
+        }
+    return report
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Replay offline del PolicyEngine")
+    ap.add_argument("sources", nargs="+", help="ficheros .json/.ndjson, directorios o gs://bucket/prefix")
+    ap.add_argument("--config-a", default=None, help="config JSON (default: umbrales v1)")
+    ap.add_argument("--config-b", default=None, help="segunda config para diff A→B")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--batch-size", type=int, default=2000)
+    ap.add_argument("--gcs-chunk-mb", type=float, default=_GCS_CHUNK_BYTES / (1024 * 1024),
+                    help="tamaño de cada tarea al trocear NDJSON de GCS")
+    ap.add_argument("--out", default=None, help="escribir reporte JSON aquí (default stdout)")
+    args = ap.parse_args()
+
+    configs = [load_config(args.config_a)]
+    if args.config_b:
+        configs.append(load_config(args.config_b))
+        if configs[0]["name"] == configs[1]["name"]:
+            configs[1]["name"] += "_b"
+
+    report = run_replay(
+        args.sources,
+        configs,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        gcs_chunk_bytes=max(1, int(args.gcs_chunk_mb * 1024 * 1024)),
+    )
+    txt = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(txt + "\n", encoding="utf-8")
+    else:
+        print(txt)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Tensor cache para train_v2: decodifica y redimensiona cada imagen de datasets/v2 UNA vez y la
+guarda como uint8 (N, img, img, 3) en un np.memmap, con índice (label, side, path, sha256).
+
+Cada época lee filas del memmap (page cache del SO) en vez de decodificar JPEG; las
+augmentations se aplican sobre tensores uint8 y el paso a float se hace ya en batch.
+Mismo preprocesado que el camino sin caché (PIL RGB + resize bilineal a img x img), así que
+el modelo ve los mismos píxeles; el caché se reconstruye solo si cambian ficheros o --img.
+
+Uso suelto (prepara el caché antes de entrenar):
+  python megafactory/train/tensor_cache.py --data-root ~/WORK/scankey/datasets/v2 --cache-dir out_v2/tensor_cache
+"""
+import argparse, hashlib, io, json, os, random, time
+from pathlib import Path
+
+CACHE_VERSION = 1
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def scan_dataset(root):
+    """([(path, label, side)], labels) de v2/<LABEL>/{A,B}/...; mismo orden que el escaneo de train_v2."""
+    samples = []
+    labels = []
+    for lab_dir in sorted([p for p in Path(root).iterdir() if p.is_dir()]):
+        lab = lab_dir.name.upper()
+        for side in ("A", "B"):
+            side_dir = lab_dir / side
+            if not side_dir.exists():
+                continue
+            for img in side_dir.rglob("*"):
+                if img.suffix.lower() in IMAGE_EXTS:
+                    samples.append((str(img), lab, side))
+        if lab not in labels:
+            labels.append(lab)
+    return samples, labels
+
+
+def _fingerprint(samples, img):
+    """Cambia si se añade/quita/modifica algún fichero o cambia el tamaño de entrada (no el orden)."""
+    h = hashlib.sha256(f"v{CACHE_VERSION}:{img}".encode("utf-8"))
+    for p, lab, side in sorted(samples):
+        st = os.stat(p)
+        h.update(f"\n{p}\t{lab}\t{side}\t{st.st_size}\t{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _load(job):
+    """(sha256, uint8 HxWx3) de una imagen; (None, None) si no se puede leer."""
+    import numpy as np
+    from PIL import Image
+
+    path, img = job
+    try:
+        raw = Path(path).read_bytes()
+        im = Image.open(io.BytesIO(raw)).convert("RGB").resize((img, img), Image.BILINEAR)
+        return hashlib.sha256(raw).hexdigest(), np.asarray(im, dtype=np.uint8)
+    except Exception:
+        return None, None
+
+
+def build_cache(samples, cache_dir, img=224, workers=0, force=False):
+    """
+    Escribe <cache_dir>/images.u8 + index.json si no existe uno válido para estas muestras.
+    Devuelve el índice. Imágenes ilegibles se saltan (quedan fuera del índice).
+    Las filas van en orden de ruta, no en el de `samples` (train_v2 baraja antes de llamar):
+    las filas se buscan por entry["path"].
+    """
+    import numpy as np
+
+    samples = sorted(samples)
+    cache_dir = Path(cache_dir)
+    index_path = cache_dir / "index.json"
+    fp = _fingerprint(samples, img)
+    if not force and index_path.exists():
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        if index.get("fingerprint") == fp and (cache_dir / index["file"]).exists():
+            return index
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = cache_dir / "images.u8.tmp"
+    arr = np.memmap(tmp, mode="w+", dtype=np.uint8, shape=(max(1, len(samples)), img, img, 3))
+    jobs = [(p, img) for p, _lab, _side in samples]
+    t0 = time.time()
+    if workers > 1:
+        import multiprocessing as mp
+        with mp.Pool(workers) as pool:
+            results = pool.imap(_load, jobs, chunksize=32)
+            entries, skipped = _fill(arr, samples, results)
+    else:
+        entries, skipped = _fill(arr, samples, map(_load, jobs))
+    arr.flush()
+    del arr
+    os.replace(tmp, cache_dir / "images.u8")
+
+    index = {
+        "version": CACHE_VERSION,
+        "file": "images.u8",
+        "dtype": "uint8",
+        "shape": [max(1, len(samples)), img, img, 3],
+        "img": img,
+        "fingerprint": fp,
+        "skipped": skipped,
+        "seconds": round(time.time() - t0, 2),
+        "entries": entries,
+    }
+    index_path.write_text(json.dumps(index, ensure_ascii=False) + "\n", encoding="utf-8")
+    return index
+
+
+def _fill(arr, samples, results):
+    entries = []
+    skipped = []
+    for row, ((path, lab, side), (sha, pixels)) in enumerate(zip(samples, results)):
+        if pixels is None:
+            skipped.append(path)
+            continue
+        arr[row] = pixels
+        entries.append({"row": row, "label": lab, "side": side, "path": path, "sha256": sha})
+    return entries, skipped
+
+
+class MemmapKeyDataset:
+    """
+    Dataset map-style sobre el caché: (uint8 CxHxW, label_idx). El memmap se abre en cada
+    worker del DataLoader (no viaja en el pickle). Con train=True: flip horizontal (p=0.3) y
+    ColorJitter sobre el tensor uint8, los mismos que tfm_train de train_v2.
+    """
+
+    def __init__(self, cache_dir, entries, label2idx, shape, train=False):
+        self.path = str(Path(cache_dir) / "images.u8")
+        self.entries = entries
+        self.label2idx = label2idx
+        self.shape = tuple(shape)
+        self.train = train
+        self._arr = None
+        self._jitter = None
+        if train:
+            from torchvision import transforms
+            self._jitter = transforms.ColorJitter(brightness=0.15, contrast=0.15, saturation=0.10, hue=0.02)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_arr"] = None
+        return state
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        import numpy as np
+        import torch
+
+        if self._arr is None:
+            self._arr = np.memmap(self.path, mode="r", dtype=np.uint8, shape=self.shape)
+        e = self.entries[i]
+        x = torch.from_numpy(np.array(self._arr[e["row"]])).permute(2, 0, 1)
+        if self.train:
+            if random.random() < 0.3:
+                x = x.flip(-1)
+            x = self._jitter(x)
+        return x, self.label2idx[e["label"]]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data-root", default=os.path.expanduser("~/WORK/scankey/datasets/v2"),
+                    help="Root: v2/<LABEL>/{A,B}/*.jpg")
+    ap.add_argument("--cache-dir", default="out_v2/tensor_cache")
+    ap.add_argument("--img", type=int, default=224)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="procesos de decode")
+    ap.add_argument("--force", action="store_true", help="reconstruir aunque el caché esté al día")
+    args = ap.parse_args()
+
+    try:
+        import numpy  # noqa: F401
+        from PIL import Image  # noqa: F401
+    except Exception:
+        raise SystemExit("Falta numpy/pillow. Instala: pip install numpy pillow")
+
+    samples, labels = scan_dataset(args.data_root)
+    index = build_cache(samples, args.cache_dir, img=args.img, workers=args.workers, force=args.force)
+    print(f"OK: {len(index['entries'])} imágenes ({len(labels)} labels) en {args.cache_dir}; "
+          f"saltadas={len(index['skipped'])} build_s={index['seconds']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,11 @@
 import argparse, json, os, random, time
 from pathlib import Path
 
+try:
+    from .tensor_cache import MemmapKeyDataset, build_cache, scan_dataset
+except ImportError:
+    from tensor_cache import MemmapKeyDataset, build_cache, scan_dataset
+
 def _require(pkg):
     try:
         __import__(pkg)
@@ -9,6 +14,50 @@ def _require(pkg):
     except Exception:
         return False
 
+def make_datasets(samples, tr_samples, val_samples, label2idx, img, cache_dir=None):
+    """
+    (train_ds, val_ds). Con cache_dir: MemmapKeyDataset sobre el caché (uint8, se pasa a float
+    en batch); sin él: KeyDS decodificando JPEG en cada época (float como ToTensor).
+    """
+    from torch.utils.data import Dataset
+    from torchvision import transforms
+    from PIL import Image
+
+    if cache_dir is not None:
+        index = build_cache(samples, cache_dir, img=img, workers=os.cpu_count() or 1)
+        by_path = {e["path"]: e for e in index["entries"]}
+        if index["skipped"]:
+            print(f"WARN: {len(index['skipped'])} imágenes ilegibles fuera del entrenamiento")
+        tr_ds = MemmapKeyDataset(cache_dir, [by_path[p] for p, _l, _s in tr_samples if p in by_path], label2idx, index["shape"], train=True)
+        va_ds = MemmapKeyDataset(cache_dir, [by_path[p] for p, _l, _s in val_samples if p in by_path], label2idx, index["shape"])
+        return tr_ds, va_ds
+
+    tfm_train = transforms.Compose([
+        transforms.Resize((img, img)),
+        transforms.RandomHorizontalFlip(p=0.3),
+        transforms.ColorJitter(brightness=0.15, contrast=0.15, saturation=0.10, hue=0.02),
+        transforms.ToTensor(),
+    ])
+    tfm_val = transforms.Compose([
+        transforms.Resize((img, img)),
+        transforms.ToTensor(),
+    ])
+
+    class KeyDS(Dataset):
+        def __init__(self, pairs, tfm):
+            self.pairs = pairs
+            self.tfm = tfm
+        def __len__(self): return len(self.pairs)
+        def __getitem__(self, i):
+            p, lab = self.pairs[i]
+            img = Image.open(p).convert("RGB")
+            x = self.tfm(img)
+            y = label2idx[lab]
+            return x, y
+
+    return (KeyDS([(p, lab) for p, lab, _side in tr_samples], tfm_train),
+            KeyDS([(p, lab) for p, lab, _side in val_samples], tfm_val))
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data-root", default=os.path.expanduser("~/WORK/scankey/datasets/v2"),
@@ -18,6 +67,9 @@ def main():
     ap.add_argument("--batch", type=int, default=24)
     ap.add_argument("--img", type=int, default=224)
     ap.add_argument("--seed", type=int, default=1337)
+    ap.add_argument("--cache-dir", default="", help="Tensor cache uint8 (default: <out-dir>/tensor_cache)")
+    ap.add_argument("--no-cache", action="store_true", help="Decodificar JPEG en cada época (camino antiguo)")
+    ap.add_argument("--workers", type=int, default=2, help="num_workers del DataLoader")
     args = ap.parse_args()
 
     if not _require("torch") or not _require("torchvision"):
@@ -25,9 +77,8 @@ def main():
 
     import torch
     import torch.nn as nn
-    from torch.utils.data import Dataset, DataLoader
-    from torchvision import transforms, models
-    from PIL import Image
+    from torch.utils.data import DataLoader
+    from torchvision import models
 
     random.seed(args.seed)
     torch.manual_seed(args.seed)
@@ -37,19 +88,7 @@ def main():
     out.mkdir(parents=True, exist_ok=True)
 
     # Scan dataset: v2/<LABEL>/{A,B}/images...
-    samples = []
-    labels = []
-    for lab_dir in sorted([p for p in root.iterdir() if p.is_dir()]):
-        lab = lab_dir.name.upper()
-        for side in ("A", "B"):
-            side_dir = lab_dir / side
-            if not side_dir.exists():
-                continue
-            for img in side_dir.rglob("*"):
-                if img.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"):
-                    samples.append((str(img), lab))
-        if lab not in labels:
-            labels.append(lab)
+    samples, labels = scan_dataset(root)
 
     if not samples or len(labels) < 2:
         raise SystemExit(f"Dataset insuficiente. samples={len(samples)} labels={len(labels)}. Necesitas >=2 labels.")
@@ -63,31 +102,18 @@ def main():
     val_samples = samples[:n_val]
     tr_samples = samples[n_val:]
 
-    tfm_train = transforms.Compose([
-        transforms.Resize((args.img, args.img)),
-        transforms.RandomHorizontalFlip(p=0.3),
-        transforms.ColorJitter(brightness=0.15, contrast=0.15, saturation=0.10, hue=0.02),
-        transforms.ToTensor(),
-    ])
-    tfm_val = transforms.Compose([
-        transforms.Resize((args.img, args.img)),
-        transforms.ToTensor(),
-    ])
+    cache_dir = None
+    if not args.no_cache:
+        # Decode + resize una sola vez; cada época lee uint8 del memmap
+        cache_dir = Path(args.cache_dir) if args.cache_dir else out / "tensor_cache"
+    tr_ds, va_ds = make_datasets(samples, tr_samples, val_samples, label2idx, args.img, cache_dir)
 
-    class KeyDS(Dataset):
-        def __init__(self, pairs, tfm):
-            self.pairs = pairs
-            self.tfm = tfm
-        def __len__(self): return len(self.pairs)
-        def __getitem__(self, i):
-            p, lab = self.pairs[i]
-            img = Image.open(p).convert("RGB")
-            x = self.tfm(img)
-            y = label2idx[lab]
-            return x, y
+    tr = DataLoader(tr_ds, batch_size=args.batch, shuffle=True, num_workers=args.workers, persistent_workers=args.workers > 0)
+    va = DataLoader(va_ds, batch_size=args.batch, shuffle=False, num_workers=args.workers, persistent_workers=args.workers > 0)
 
-    tr = DataLoader(KeyDS(tr_samples, tfm_train), batch_size=args.batch, shuffle=True, num_workers=2)
-    va = DataLoader(KeyDS(val_samples, tfm_val), batch_size=args.batch, shuffle=False, num_workers=2)
+    def _to_input(x):
+        """uint8 del caché -> float [0,1] como ToTensor; el camino sin caché ya llega en float."""
+        return x.float().div_(255) if x.dtype == torch.uint8 else x
 
     # Model: mobilenet_v3_small finetune head
     m = models.mobilenet_v3_small(weights=models.MobileNet_V3_Small_Weights.DEFAULT)
@@ -105,7 +131,7 @@ def main():
         tot = 0
         with torch.no_grad():
             for x,y in va:
-                x,y = x.to(device), y.to(device)
+                x,y = _to_input(x.to(device)), y.to(device)
                 logits = m(x)
                 pred = logits.argmax(dim=1)
                 ok += (pred == y).sum().item()
@@ -119,7 +145,7 @@ def main():
     for ep in range(1, args.epochs + 1):
         m.train()
         for x,y in tr:
-            x,y = x.to(device), y.to(device)
+            x,y = _to_input(x.to(device)), y.to(device)
             opt.zero_grad(set_to_none=True)
             logits = m(x)
             loss = loss_fn(logits, y)
@@ -142,6 +168,7 @@ def main():
         "best_val_acc": best,
         "img": args.img,
         "device": device,
+        "tensor_cache": not args.no_cache,
         "seconds": round(time.time() - t0, 2),
     }, indent=2) + "\n", encoding="utf-8")
 
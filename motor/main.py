@@ -15,6 +15,13 @@ except Exception:
 
 # Catalog matching module (multi-label enrichment)
 from common import catalog_match
+from common.deadline import Deadline
+from common.load_shedder import LoadShedder, LoadTrackingMiddleware
+from common.internal_frame import CONTENT_TYPE as FRAME_CONTENT_TYPE, FrameError, decode_frame
+from common.object_source import ObjectNotFound, ObjectReader, ObjectSourceError
+from common.capture_profile import build_capture_profile
+from common import tracing
+from common.timings import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS, StageTimer, gcs_op
 
 if _catalog and hasattr(_catalog, "load"):
     _catalog.load()
@@ -33,7 +40,9 @@ from PIL import Image as PILImage
 import io
 from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers as StarletteHeaders
 
 from motor.model_bootstrap import ensure_model
 
@@ -75,7 +84,7 @@ SCN_FEATURE_OPENSET_CLUSTER_ENABLED = os.getenv("SCN_FEATURE_OPENSET_CLUSTER_ENA
 SCN_FEATURE_OBSERVABILITY_ENABLED = os.getenv("SCN_FEATURE_OBSERVABILITY_ENABLED", "true").lower() == "true"
 SCN_FEATURE_QUALITY_GATE_PASSIVE = os.getenv("SCN_FEATURE_QUALITY_GATE_PASSIVE", "true").lower() == "true"
 SCN_DEBUG_LOG_PAYLOADS = os.getenv("SCN_DEBUG_LOG_PAYLOADS", "false").lower() == "true"
-SCN_DEBUG_INCLUDE_TIMINGS = os.getenv("SCN_DEBUG_INCLUDE_TIMINGS", "true").lower() == "true"
+SCN_DEBUG_INCLUDE_TIMINGS = os.getenv("SCN_DEBUG_INCLUDE_TIMINGS", "false").lower() == "true"
 
 # --- Official Thresholds ---
 THRESHOLD_HIGH_CONFIDENCE = float(os.getenv("THRESHOLD_HIGH_CONFIDENCE", "0.95"))
@@ -91,6 +100,59 @@ MAX_AUTOSTORE_CAP = int(os.getenv("MAX_AUTOSTORE_CAP", "30"))
 THRESHOLD_MANUFACTURER_RERANK_CONFIDENCE = float(os.getenv("THRESHOLD_MANUFACTURER_RERANK_CONFIDENCE", "0.85"))
 MAX_MANUFACTURER_RERANK_CAP = float(os.getenv("MAX_MANUFACTURER_RERANK_CAP", "0.05")) # +/- 5%
 
+# Presupuesto propagado por el gateway (X-Request-Budget-Ms): coste estimado de cada etapa opcional
+SCN_DEADLINE_MARGIN_MS = float(os.getenv("SCN_DEADLINE_MARGIN_MS", "250"))  # serialización + red de vuelta
+SCN_STAGE_COST_CATALOG_MS = float(os.getenv("SCN_STAGE_COST_CATALOG_MS", "50"))
+SCN_STAGE_COST_QUALITY_MS = float(os.getenv("SCN_STAGE_COST_QUALITY_MS", "200"))
+SCN_STAGE_COST_OCR_MS = float(os.getenv("SCN_STAGE_COST_OCR_MS", "2500"))
+SCN_STAGE_COST_SAMPLE_STORE_MS = float(os.getenv("SCN_STAGE_COST_SAMPLE_STORE_MS", "800"))
+
+# Shedding adaptativo: etapas de baja prioridad (primera = la que antes se apaga) bajo sobrecarga
+SCN_FEATURE_LOAD_SHEDDING = os.getenv("SCN_FEATURE_LOAD_SHEDDING", "true").lower() == "true"
+SCN_SHED_STAGES = [s.strip() for s in os.getenv("SCN_SHED_STAGES", "quality,sample_store,ocr,ab_fusion").split(",") if s.strip()]
+_LOAD: Optional[LoadShedder] = (
+    LoadShedder(
+        SCN_SHED_STAGES,
+        inflight_high=int(os.getenv("SCN_SHED_INFLIGHT_HIGH", "8")),
+        inflight_low=int(os.getenv("SCN_SHED_INFLIGHT_LOW", "2")),
+        cpu_high=float(os.getenv("SCN_SHED_CPU_HIGH", "0.90")),
+        cpu_low=float(os.getenv("SCN_SHED_CPU_LOW", "0.60")),
+        step_up_s=float(os.getenv("SCN_SHED_STEP_UP_S", "2")),
+        step_down_s=float(os.getenv("SCN_SHED_STEP_DOWN_S", "10")),
+    )
+    if SCN_FEATURE_LOAD_SHEDDING
+    else None
+)
+_ANALYZE_PATHS = ("/api/analyze-key", "/internal/analyze-key")
+
+# Analyze por referencia (front_uri/back_uri): el motor lee de GCS o disco local sin pasar por el gateway
+SCN_FEATURE_ANALYZE_BY_URI = os.getenv("SCN_FEATURE_ANALYZE_BY_URI", "true").lower() == "true"
+_OBJECTS: Optional[ObjectReader] = (
+    ObjectReader(
+        buckets=[
+            b.strip()
+            for b in (os.getenv("SCN_URI_BUCKETS") or f"{os.getenv('KEY_BUCKET', '')},{os.getenv('GCS_BUCKET', '')}").split(",")
+            if b.strip()
+        ],
+        local_roots=[r.strip() for r in os.getenv("SCN_URI_LOCAL_ROOTS", "").split(",") if r.strip()],
+        cache_dir=os.getenv("SCN_URI_CACHE_DIR", "/tmp/scn_uri_cache") or None,
+        cache_max_bytes=int(float(os.getenv("SCN_URI_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    )
+    if SCN_FEATURE_ANALYZE_BY_URI
+    else None
+)
+
+# Tracing: continúa el traceparent del gateway; mismas variables que el gateway (fichero propio)
+tracing.configure(
+    "motor",
+    tracing.build_exporter(
+        os.getenv("SCN_TRACE_EXPORTER", ""),
+        os.getenv("SCN_TRACE_FILE", "/tmp/scn-traces/motor.jsonl"),
+        os.getenv("SCN_TRACE_COLLECTOR_URL", ""),
+    ),
+    float(os.getenv("SCN_TRACE_SAMPLE_RATE", "0.1")),
+)
+
 # OCR_URL for on-demand OCR
 OCR_URL = os.getenv("OCR_URL", "").rstrip("/")
 
@@ -171,6 +233,16 @@ async def legacy_results_middleware(request, call_next):
     if isinstance(res, list) and len(res) == 3:
         return Response(content=body, status_code=resp.status_code, media_type="application/json")
 
+    new_body = json.dumps(_ensure_legacy_results(obj), ensure_ascii=False).encode("utf-8")
+
+    return Response(content=new_body, status_code=resp.status_code, media_type="application/json")
+
+
+def _ensure_legacy_results(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """results (3 items model/confidence) derivado de candidates si no viene ya."""
+    res = obj.get("results") or []
+    if isinstance(res, list) and len(res) == 3:
+        return obj
     cands = obj.get("candidates") or []
     results=[]
     if isinstance(cands, list):
@@ -185,9 +257,7 @@ async def legacy_results_middleware(request, call_next):
         results.append({"model": None, "confidence": None})
 
     obj["results"] = results
-    new_body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
-
-    return Response(content=new_body, status_code=resp.status_code, media_type="application/json")
+    return obj
 
 @app.on_event("startup")
 def _scankey_bootstrap_event():
@@ -208,10 +278,22 @@ async def add_request_id_middleware(request, call_next):
     if not request_id:
         request_id = str(uuid.uuid4())
     request.state.request_id = request_id
+    # El presupuesto del gateway corre desde que llega la petición, no desde que el handler empieza
+    # (espera de hilo del threadpool y lectura del body incluidas)
+    request.state.deadline = Deadline.from_headers(request.headers, margin_ms=SCN_DEADLINE_MARGIN_MS)
     response = await call_next(request)
     response.headers["X-Request-ID"] = request_id
     return response
 
+
+# analyze en vuelo (también los que esperan hilo y los streams hasta su último chunk)
+if _LOAD is not None:
+    app.add_middleware(LoadTrackingMiddleware, shedder=_LOAD, paths=_ANALYZE_PATHS)
+
+
+if tracing.get_tracer().enabled:
+    app.middleware("http")(tracing.trace_requests)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -264,12 +346,13 @@ def _parse_gs_uri(uri: str) -> Tuple[Optional[str], Optional[str]]:
 def _list_count_images(bucket_name: str, prefix: str, limit: int = 9999) -> int:
     client = storage.Client()
     cnt = 0
-    for blob in client.list_blobs(bucket_name, prefix=prefix):
-        name = (blob.name or "").lower()
-        if name.endswith((".jpg", ".jpeg", ".png", ".webp")):
-            cnt += 1
-            if cnt >= limit:
-                break
+    with gcs_op("list"):
+        for blob in client.list_blobs(bucket_name, prefix=prefix):
+            name = (blob.name or "").lower()
+            if name.endswith((".jpg", ".jpeg", ".png", ".webp")):
+                cnt += 1
+                if cnt >= limit:
+                    break
     return cnt
 
 
@@ -344,9 +427,10 @@ def _dedup_check(bucket_name: str, prefix: str, content_hash: str) -> bool:
     """True si ya existe un objeto con este content_hash en el prefix (evitar duplicados)."""
     try:
         client = storage.Client()
-        for blob in client.list_blobs(bucket_name, prefix=prefix):
-            if content_hash in (blob.name or ""):
-                return True
+        with gcs_op("list"):
+            for blob in client.list_blobs(bucket_name, prefix=prefix):
+                if content_hash in (blob.name or ""):
+                    return True
     except Exception:
         pass
     return False
@@ -391,7 +475,8 @@ def _maybe_store_sample_to_gcs(
         client = storage.Client()
         bucket = client.bucket(bucket_name)
         blob = bucket.blob(obj)
-        blob.upload_from_string(raw_bytes, content_type=_guess_content_type(safe))
+        with gcs_op("upload"):
+            blob.upload_from_string(raw_bytes, content_type=_guess_content_type(safe))
         return {"stored": True, "gcs_uri": gcs_uri, "side": side2}
     except Exception as e:
         return {"stored": False, "reason": f"store_error: {type(e).__name__}: {e}", "gcs_uri": gcs_uri, "side": side2}
@@ -427,7 +512,8 @@ def _store_copy_to_keys_date(raw_bytes: bytes, filename_hint: str, input_id: str
         client = storage.Client()
         bucket = client.bucket(bucket_name)
 
-        bucket.blob(img_obj).upload_from_string(raw_bytes, content_type=ct)
+        with gcs_op("upload"):
+            bucket.blob(img_obj).upload_from_string(raw_bytes, content_type=ct)
 
         meta = {
             "input_id": input_id,
@@ -438,10 +524,11 @@ def _store_copy_to_keys_date(raw_bytes: bytes, filename_hint: str, input_id: str
             "sample_gcs_uri": sample_gcs_uri,
             "analysis": analysis,
         }
-        bucket.blob(meta_obj).upload_from_string(
-            json.dumps(meta, ensure_ascii=False),
-            content_type="application/json"
-        )
+        with gcs_op("upload"):
+            bucket.blob(meta_obj).upload_from_string(
+                json.dumps(meta, ensure_ascii=False),
+                content_type="application/json"
+            )
 
         return {
             "stored_keys": True,
@@ -457,7 +544,8 @@ def _store_json_sidecar(bucket_name: str, obj: str, payload: Dict[str, Any]) ->
         client = storage.Client()
         blob = client.bucket(bucket_name).blob(obj)
         txt = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
-        blob.upload_from_string(txt.encode("utf-8"), content_type="application/json")
+        with gcs_op("upload"):
+            blob.upload_from_string(txt.encode("utf-8"), content_type="application/json")
         return {"stored": True, "gcs_uri": f"gs://{bucket_name}/{obj}"}
     except Exception as e:
         return {"stored": False, "reason": f"{type(e).__name__}: {e}"}
@@ -504,10 +592,11 @@ def _store_inscription_event_to_gcs(inscription_norm: str, input_id: str, ts_utc
         client = storage.Client()
         bucket = client.bucket(bucket_name)
         blob = bucket.blob(event_obj)
-        blob.upload_from_string(
-            json.dumps(payload, ensure_ascii=False),
-            content_type="application/json"
-        )
+        with gcs_op("upload"):
+            blob.upload_from_string(
+                json.dumps(payload, ensure_ascii=False),
+                content_type="application/json"
+            )
         return {"stored_inscription_event": True, "gcs_uri": gcs_uri}
     except Exception as e:
         return {"stored_inscription_event": False, "reason": f"store_error: {type(e).__name__}: {e}", "gcs_uri": gcs_uri}
@@ -556,7 +645,8 @@ def _copy_to_by_ref(src_gcs_uri: str, ref_final_canon: str, side: str, input_id:
         bdst = client.bucket(bucket_dst)
 
         src_blob = bsrc.blob(obj_src)
-        bdst.copy_blob(src_blob, bdst, new_name=dst_obj)
+        with gcs_op("copy"):
+            bdst.copy_blob(src_blob, bdst, new_name=dst_obj)
 
         return {"stored": True, "gcs_uri": dst_gcs_uri, "count_before": cur, "max": max_n, "side": side2, "ref": ref2}
     except Exception as e:
@@ -584,7 +674,8 @@ def _load_inscriptions_index():
         client = storage.Client()
         bucket = client.bucket(bucket_name)
         blob = bucket.blob(index_obj)
-        data = blob.download_as_text()
+        with gcs_op("download"):
+            data = blob.download_as_text()
         index_data = json.loads(data)
         _INSCRIPTIONS_INDEX_CACHE = {"data": index_data, "timestamp": now}
         return index_data
@@ -790,6 +881,8 @@ def health():
         "multi_label_fields_supported": list(STATE.get("multi_label_fields_supported") or []),
         "model_path": STATE.get("model_path"),
         "error": STATE.get("error"),
+        "load": _LOAD.snapshot() if _LOAD is not None else None,
+        "objects": _OBJECTS.snapshot() if _OBJECTS is not None else None,
     }
 
 
@@ -800,6 +893,25 @@ def ready():
     return {"ok": True}
 
 
+@app.get("/api/capture-profile")
+def capture_profile():
+    """Resolución/compresión recomendadas para subir capturas (common/capture_profile)."""
+    ocr_enabled = (SCN_FEATURE_OCR_ON_DEMAND_ENABLED or SCN_FEATURE_OCR_ALWAYS_ENABLED) and bool(OCR_URL)
+    profile = build_capture_profile(
+        STATE.get("model_version") or os.getenv("MODEL_VERSION", "scankey-v2-prod"),
+        input_hw=_infer_shape_to_hw(STATE.get("input_shape")),
+        ocr_enabled=ocr_enabled,
+    )
+    profile["model_ready"] = bool(STATE["model_ready"])
+    return profile
+
+
+@app.get("/metrics")
+def metrics():
+    """Histogramas Prometheus: duración por etapa de analyze y latencia/cuenta de operaciones GCS."""
+    return Response(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/debug/routes")
 def debug_routes():
     return [{"path": r.path, "name": r.name, "methods": sorted(list(getattr(r, "methods", []) or []))} for r in app.router.routes]
@@ -827,6 +939,28 @@ def _predict(img: PILImage.Image) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]
     return cands, hint
 
 
+def _upload_from_uri(uri: Optional[str], side: str) -> Optional[UploadFile]:
+    """UploadFile en memoria con el objeto de uri (caché read-through); None si no hay uri."""
+    uri = (uri or "").strip()
+    if not uri:
+        return None
+    if _OBJECTS is None:
+        raise HTTPException(400, "analyze por URI desactivado (SCN_FEATURE_ANALYZE_BY_URI)")
+    try:
+        data = _OBJECTS.read(uri)
+    except ObjectNotFound as e:
+        raise HTTPException(404, f"{side}_uri: {e}")
+    except ObjectSourceError as e:
+        raise HTTPException(400, f"{side}_uri: {e}")
+    except Exception as e:
+        raise HTTPException(502, f"{side}_uri: error leyendo ({type(e).__name__})")
+    return UploadFile(
+        file=io.BytesIO(data),
+        filename=uri.rsplit("/", 1)[-1] or f"{side}.jpg",
+        headers=StarletteHeaders({"content-type": _guess_content_type(uri)}),
+    )
+
+
 @app.post("/api/analyze-key")
 def analyze_key(
     request: Request,
@@ -839,14 +973,57 @@ def analyze_key(
     modo: Optional[str] = Form(None),
     ref_hint: Optional[str] = Form(None),
     manufacturer_hint: Optional[str] = Form(None),
+    stream: Optional[str] = Form(None),
+    front_uri: Optional[str] = Form(None),
+    back_uri: Optional[str] = Form(None),
 ):
-    front_file = front or front_up or image_front
-    back_file = back or back_up or image_back
+    return _analyze_key(
+        request,
+        front=front or front_up or image_front,
+        back=back or back_up or image_back,
+        modo=modo,
+        ref_hint=ref_hint,
+        manufacturer_hint=manufacturer_hint,
+        stream=stream,
+        front_uri=front_uri,
+        back_uri=back_uri,
+    )
+
+
+def _analyze_key(
+    request: Request,
+    front: Optional[UploadFile] = None,
+    back: Optional[UploadFile] = None,
+    modo: Optional[str] = None,
+    ref_hint: Optional[str] = None,
+    manufacturer_hint: Optional[str] = None,
+    stream: Optional[str] = None,
+    front_uri: Optional[str] = None,
+    back_uri: Optional[str] = None,
+):
+    """
+    Núcleo de analyze-key (multipart y frame): sin defaults de FastAPI (File(None) es truthy).
+    stream=1: NDJSON progresivo ({"event", "data"} por línea): classification en cuanto hay
+    top-3, luego quality / ocr si se calculan, y final (respuesta completa) tras guardar muestras.
+    front_uri/back_uri (gs://... o file://...): imagen por referencia si no viene el fichero.
+    Con SCN_DEBUG_INCLUDE_TIMINGS, debug.timings lleva los ms de cada etapa (read, decode,
+    inference, catalog, quality, ocr, sample_store) y el total.
+    """
+    timer = StageTimer("motor")
+    want_stream = (stream or "").strip().lower() in ("1", "true", "yes")
+    deadline = getattr(request.state, "deadline", None) or Deadline.from_headers(
+        request.headers, margin_ms=SCN_DEADLINE_MARGIN_MS
+    )
+    # Etapas apagadas por sobrecarga: se fija al entrar para que la petición sea coherente
+    shed = _LOAD.shed_stages() if _LOAD is not None else []
+    with timer.span("read"):
+        front_file = front or _upload_from_uri(front_uri, "front")
+        back_file = back or _upload_from_uri(back_uri, "back")
 
     if front_file is None:
         raise HTTPException(
             status_code=422,
-            detail="Front image is required. Please provide it as 'front', 'front_up', or 'image_front' in multipart/form-data.",
+            detail="Front image is required. Please provide it as 'front', 'front_up', or 'image_front' in multipart/form-data, or as 'front_uri'.",
         )
 
     manufacturer_hint_to_use = manufacturer_hint if manufacturer_hint is not None else ref_hint
@@ -855,25 +1032,27 @@ def analyze_key(
     if modo2 not in ("taller", "cliente"):
         modo2 = "cliente"
 
-    try:
-        front_file.file.seek(0)
-    except Exception:
-        pass
-    data = front_file.file.read()
-
-    raw_back = b""
-    if back_file is not None:
+    with timer.span("read"):
         try:
-            back_file.file.seek(0)
+            front_file.file.seek(0)
         except Exception:
             pass
-        raw_back = back_file.file.read() or b""
+        data = front_file.file.read()
+
+        raw_back = b""
+        if back_file is not None:
+            try:
+                back_file.file.seek(0)
+            except Exception:
+                pass
+            raw_back = back_file.file.read() or b""
 
     if not data:
         raise HTTPException(400, "archivo vacío")
 
     try:
-        img = PILImage.open(io.BytesIO(data)).convert("RGB")
+        with timer.span("decode"):
+            img = PILImage.open(io.BytesIO(data)).convert("RGB")
     except Exception as e:
         # Logs sin imágenes: no incluir bytes ni hashes de imagen en errores
         raise HTTPException(
@@ -891,7 +1070,7 @@ def analyze_key(
             {"label": "OTHER", "score": 0.05, "brand": None, "model": None, "type": "Serreta", "compatibility_tags": [], "crop_bbox": {"x": 0, "y": 0, "w": 1, "h": 1}},
             {"label": None, "score": 0.03, "brand": None, "model": None, "type": "No identificado", "compatibility_tags": [], "crop_bbox": {"x": 0, "y": 0, "w": 1, "h": 1}},
         ]
-        return {
+        mock_payload = {
             "ok": True,
             "request_id": request.state.request_id,
             "input_id": input_id,
@@ -914,21 +1093,27 @@ def analyze_key(
                 "multi_label_fields_present": [],
             },
         }
+        if want_stream:
+            return _ndjson_stream(iter([("classification", mock_payload), ("final", mock_payload)]))
+        return mock_payload
 
     t0 = time.time()
-    cands_a, hint_from_predict = _predict(img)
+    with timer.span("inference"):
+        cands_a, hint_from_predict = _predict(img)
     dt_ms = int((time.time() - t0) * 1000)
 
     cands_b: List[Dict[str, Any]] = []
     img_back = None
     if raw_back and len(raw_back) > 500:
         try:
-            img_back = PILImage.open(io.BytesIO(raw_back)).convert("RGB")
+            with timer.span("decode"):
+                img_back = PILImage.open(io.BytesIO(raw_back)).convert("RGB")
         except Exception:
             pass
-    if img_back is not None and SCN_FEATURE_AB_FUSION_ENABLED:
+    if img_back is not None and SCN_FEATURE_AB_FUSION_ENABLED and "ab_fusion" not in shed:
         t1 = time.time()
-        cands_b, _ = _predict(img_back)
+        with timer.span("inference"):
+            cands_b, _ = _predict(img_back)
         dt_ms += int((time.time() - t1) * 1000)
 
     top_label = (cands_a[0]["label"] if cands_a else None)
@@ -941,8 +1126,13 @@ def analyze_key(
         manufacturer_hint_obj["name"] = manufacturer_hint_to_use
         manufacturer_hint_obj["confidence"] = 0.50  # weak hint by default
 
-    # Catalog match enrichment (A y B)
-    catalog_match_result = catalog_match.match_text(top_label or "", manufacturer_hint=manufacturer_hint_obj)
+    # Catalog match enrichment (A y B); sin presupuesto los candidatos van sin rich_data
+    run_catalog = deadline.allows("catalog_enrichment", SCN_STAGE_COST_CATALOG_MS)
+    t_cat = time.perf_counter()
+    catalog_match_result = (
+        catalog_match.match_text(top_label or "", manufacturer_hint=manufacturer_hint_obj)
+        if run_catalog else {"catalog_hits": []}
+    )
 
     def _enrich_cands(cands_list: List[Dict[str, Any]], cat_result: Any) -> List[Dict[str, Any]]:
         out = []
@@ -958,7 +1148,7 @@ def analyze_key(
     cat_b = catalog_match.match_text(
         " ".join(str(c.get("label") or "") for c in cands_b),
         manufacturer_hint=manufacturer_hint_obj,
-    ) if cands_b else {"catalog_hits": []}
+    ) if cands_b and run_catalog else {"catalog_hits": []}
     enrich_b = _enrich_cands(cands_b, cat_b) if cands_b else []
 
     # Fusión A/B si tenemos ambos
@@ -969,7 +1159,7 @@ def analyze_key(
         top_score = float(enriched_cands[0].get("score", enriched_cands[0].get("confidence", 0))) if enriched_cands else top_score
     else:
         enriched_cands = enrich_a
-
+    timer.record("catalog", time.perf_counter() - t_cat)
 
     high_confidence = top_score >= 0.95
     low_confidence = top_score < 0.60
@@ -980,11 +1170,15 @@ def analyze_key(
     disable_store_single = __import__("os").getenv("DISABLE_STORE_SINGLE_LABEL", "1").lower() in ("1", "true", "yes")
     can_store = not (disable_store_single and labels_count_local <= 1)
 
+    # Guardado de muestras (conteo en GCS + subidas): se salta entero si no llega el presupuesto
+    run_sample_store = "sample_store" not in shed and deadline.allows("sample_store", SCN_STAGE_COST_SAMPLE_STORE_MS)
+
     # Bloque 4.2: conteo real de muestras por candidato (ref_canon, lado A)
     current_samples_for_candidate = -1
-    if top_label:
+    if top_label and run_sample_store:
         ref_c = _canon(top_label)
-        current_samples_for_candidate = _count_samples_for_candidate(ref_c, side="A", max_n=max_n)
+        with timer.span("sample_count"):
+            current_samples_for_candidate = _count_samples_for_candidate(ref_c, side="A", max_n=max_n)
 
     # Regla: top >= 0.75, current < 30, luego storage_probability
     try:
@@ -1001,97 +1195,20 @@ def analyze_key(
         )
 
     should_store_sample = False
-    if top_label and can_store and rules_allow:
+    if top_label and can_store and rules_allow and run_sample_store:
         should_store_sample = random.random() < storage_probability
 
-    store = {"stored": False, "reason": "policy", "side": "A"}
+    store = {
+        "stored": False,
+        "reason": "policy" if run_sample_store else ("degraded" if "sample_store" in shed else "deadline"),
+        "side": "A",
+    }
     store_back = {"stored": False, "reason": "no_back", "side": "B"}
 
     input_id = uuid.uuid4().hex
     ts_utc = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
     ref_canon_store = _canon(top_label) if top_label else None
-    if should_store_sample:
-        store = _maybe_store_sample_to_gcs(data, getattr(front_file, "filename", "") or "front.jpg", modo2, side="A", ref_canon=ref_canon_store)
-        if store.get("stored"):
-            store.update(_store_copy_to_keys_date(
-                raw_bytes=data,
-                filename_hint=(getattr(front_file, "filename", "") or "front.jpg"),
-                input_id=input_id,
-                side="A",
-                sample_gcs_uri=store.get("gcs_uri"),
-            ))
-        if raw_back and len(raw_back) > 1000:
-            store_back = _maybe_store_sample_to_gcs(raw_back, getattr(back_file, "filename", "") or "back.jpg", modo2, side="B", ref_canon=ref_canon_store)
-            if store_back.get("stored"):
-                store_back.update(_store_copy_to_keys_date(
-                    raw_bytes=raw_back,
-                    filename_hint=(getattr(back_file, "filename", "") or "back.jpg"),
-                    input_id=input_id,
-                    side="B",
-                    sample_gcs_uri=store_back.get("gcs_uri"),
-                ))
-
-    base_meta = {
-        "input_id": input_id,
-        "ts_unix": int(time.time()),
-        "ts_utc": ts_utc,
-        "modo": modo2,
-        "result": {
-            "candidates": cands, # Original candidates
-            "top_label": top_label,
-            "top_score": top_score,
-            "hint": hint_from_predict,
-            "high_confidence": high_confidence,
-            "low_confidence": low_confidence,
-        },
-        "runtime": {
-            "service": os.getenv("K_SERVICE", ""),
-            "revision": os.getenv("K_REVISION", ""),
-            "project": os.getenv("GOOGLE_CLOUD_PROJECT", ""),
-            "processing_time_ms": dt_ms,
-        },
-        "model": {
-            "model_gcs_uri": os.getenv("MODEL_GCS_URI", ""),
-            "labels_gcs_uri": os.getenv("LABELS_GCS_URI", ""),
-            "model_version": os.getenv("MODEL_VERSION", ""),
-        },
-        "policy": {
-            "should_store_sample": should_store_sample,
-            "storage_probability": storage_probability,
-            "current_samples_for_candidate": current_samples_for_candidate,
-            "max_samples_per_ref_side": int((os.getenv("MAX_SAMPLES_PER_REF_SIDE", "30") or "30").strip() or "30"),
-        },
-    }
-
-    if store.get("stored") and store.get("gcs_uri"):
-        meta = dict(base_meta)
-        meta["img"] = {
-            "side": "A",
-            "filename": (getattr(front_file, "filename", "") or "front.jpg"),
-            "bytes": len(data),
-            "sha256": hashlib.sha256(data).hexdigest(),
-        }
-        store["meta"] = _store_meta_sidecar(meta, store["gcs_uri"])
-
-    if store_back.get("stored") and store_back.get("gcs_uri"):
-        meta = dict(base_meta)
-        meta["img"] = {
-            "side": "B",
-            "filename": (getattr(back_file, "filename", "") or "back.jpg"),
-            "bytes": len(raw_back),
-            "sha256": hashlib.sha256(raw_back).hexdigest(),
-        }
-        store_back["meta"] = _store_meta_sidecar(meta, store_back["gcs_uri"])
-
-    # SCN_FIX_CONTRACT_TAGS_APPLY
-    try:
-        if 'payload' in locals() and isinstance(locals()['payload'], dict):
-            locals()['payload'] = _scn_fix_tags(locals()['payload'])
-        if 'resp' in locals() and isinstance(locals()['resp'], dict):
-            locals()['resp'] = _scn_fix_tags(locals()['resp'])
-    except Exception:
-        pass
 
     model_version = STATE.get("model_version") or os.getenv("MODEL_VERSION", "scankey-v2-prod")
     supported = list(STATE.get("multi_label_fields_supported") or [])
@@ -1120,55 +1237,224 @@ def analyze_key(
             "multi_label_enabled": ml_enabled,
             "multi_label_fields_supported": supported,
             "multi_label_fields_present": present,
+            "degraded_mode": bool(shed),
         },
     }
+    if shed:
+        resp_payload["debug"]["shed_stages"] = list(shed)
+
+    def _stages():
+        """Etapas tras la inferencia; el guardado de muestras (GCS) va al final."""
+        nonlocal resp_payload, store, store_back
+        classification = {k: v for k, v in resp_payload.items() if k not in ("store", "store_back")}
+        classification["debug"] = dict(resp_payload["debug"])
+        if SCN_DEBUG_INCLUDE_TIMINGS:
+            classification["debug"]["timings"] = timer.timings_ms()
+        yield "classification", _ensure_legacy_results(classification)
+
+        # P0.2 QualityGate PASIVO: métricas en debug sin bloquear flujo
+        if (
+            SCN_FEATURE_QUALITY_GATE_PASSIVE
+            and img is not None
+            and "quality" not in shed
+            and deadline.allows("quality", SCN_STAGE_COST_QUALITY_MS)
+        ):
+            try:
+                from common.quality_gate import compute_quality_ab, compute_roi_score_from_bbox
+                with timer.span("quality"):
+                    quality_ab = compute_quality_ab(img, img_back)
+                merged = quality_ab.get("merged") or {}
+                resp_payload["debug"]["quality_score"] = merged.get("quality_score", 0.5)
+                resp_payload["debug"]["quality_reasons"] = merged.get("reasons", [])
+                resp_payload["debug"]["quality_signals"] = quality_ab
+                top_cand = enriched_cands[0] if enriched_cands else {}
+                crop_bbox = top_cand.get("crop_bbox") or top_cand.get("bbox")
+                roi_score = compute_roi_score_from_bbox(crop_bbox)
+                resp_payload["debug"]["roi_score"] = roi_score
+                yield "quality", {
+                    k: resp_payload["debug"][k]
+                    for k in ("quality_score", "quality_reasons", "quality_signals", "roi_score")
+                }
+            except Exception as qe:
+                _log.warning("quality_gate_compute_failed", extra={"error": str(qe)})
+
+        # Log mínimo: request_id, processing_time_ms, model_version, flags. Sin imágenes ni form-data.
+        _log.info(
+            "analyze_key",
+            extra={
+                "request_id": request.state.request_id,
+                "processing_time_ms": dt_ms,
+                "model_version": model_version,
+                "high_confidence": high_confidence,
+                "low_confidence": low_confidence,
+            },
+        )
 
-    # P0.2 QualityGate PASIVO: métricas en debug sin bloquear flujo
-    if SCN_FEATURE_QUALITY_GATE_PASSIVE and img is not None:
-        try:
-            from common.quality_gate import compute_quality_ab, compute_roi_score_from_bbox
-            quality_ab = compute_quality_ab(img, img_back)
-            merged = quality_ab.get("merged") or {}
-            resp_payload["debug"]["quality_score"] = merged.get("quality_score", 0.5)
-            resp_payload["debug"]["quality_reasons"] = merged.get("reasons", [])
-            resp_payload["debug"]["quality_signals"] = quality_ab
-            top_cand = enriched_cands[0] if enriched_cands else {}
-            crop_bbox = top_cand.get("crop_bbox") or top_cand.get("bbox")
-            roi_score = compute_roi_score_from_bbox(crop_bbox)
-            resp_payload["debug"]["roi_score"] = roi_score
-        except Exception as qe:
-            _log.warning("quality_gate_compute_failed", extra={"error": str(qe)})
-
-    # Log mínimo: request_id, processing_time_ms, model_version, flags. Sin imágenes ni form-data.
-    _log.info(
-        "analyze_key",
-        extra={
-            "request_id": request.state.request_id,
-            "processing_time_ms": dt_ms,
-            "model_version": model_version,
-            "high_confidence": high_confidence,
-            "low_confidence": low_confidence,
-        },
-    )
-
-    # OCR gated: solo si low_confidence, brand/model faltan, o manual_correction pide ocr_text
-    if SCN_FEATURE_OCR_ON_DEMAND_ENABLED and OCR_URL:
-        try:
-            from common.ocr_gate import should_run_ocr, apply_ocr_to_response
-            from ocr_on_demand import fetch_ocr_if_needed
-            top_res = enriched_cands[0] if enriched_cands else None
-            mch = resp_payload.get("manual_correction_hint")
-            if should_run_ocr(low_confidence, top_res, mch):
-                ocr_text = fetch_ocr_if_needed(data, low_confidence, top_res, mch)
-                # P0.1: ocr_detail solo si X-Workshop-Token coincide; modo=taller NO habilita
-                is_workshop = _is_workshop_authorized(request)
-                resp_payload = apply_ocr_to_response(resp_payload, ocr_text, is_workshop, ocr_ran=True)
-        except Exception:
-            pass
+        # OCR gated: solo si low_confidence, brand/model faltan, o manual_correction pide ocr_text
+        if SCN_FEATURE_OCR_ON_DEMAND_ENABLED and OCR_URL and "ocr" not in shed:
+            try:
+                from common.ocr_gate import should_run_ocr, apply_ocr_to_response
+                from ocr_on_demand import fetch_ocr_if_needed
+                top_res = enriched_cands[0] if enriched_cands else None
+                mch = resp_payload.get("manual_correction_hint")
+                if should_run_ocr(low_confidence, top_res, mch) and deadline.allows("ocr", SCN_STAGE_COST_OCR_MS):
+                    with timer.span("ocr"):
+                        ocr_text = fetch_ocr_if_needed(data, low_confidence, top_res, mch)
+                    # P0.1: ocr_detail solo si X-Workshop-Token coincide; modo=taller NO habilita
+                    is_workshop = _is_workshop_authorized(request)
+                    resp_payload = apply_ocr_to_response(resp_payload, ocr_text, is_workshop, ocr_ran=True)
+                    yield "ocr", {
+                        k: resp_payload.get(k)
+                        for k in ("ocr_hint", "ocr_detail", "manual_correction_hint")
+                        if resp_payload.get(k) is not None
+                    }
+            except Exception:
+                pass
+
+        t_store = time.perf_counter()
+        if should_store_sample:
+            store = _maybe_store_sample_to_gcs(data, getattr(front_file, "filename", "") or "front.jpg", modo2, side="A", ref_canon=ref_canon_store)
+            if store.get("stored"):
+                store.update(_store_copy_to_keys_date(
+                    raw_bytes=data,
+                    filename_hint=(getattr(front_file, "filename", "") or "front.jpg"),
+                    input_id=input_id,
+                    side="A",
+                    sample_gcs_uri=store.get("gcs_uri"),
+                ))
+            if raw_back and len(raw_back) > 1000:
+                store_back = _maybe_store_sample_to_gcs(raw_back, getattr(back_file, "filename", "") or "back.jpg", modo2, side="B", ref_canon=ref_canon_store)
+                if store_back.get("stored"):
+                    store_back.update(_store_copy_to_keys_date(
+                        raw_bytes=raw_back,
+                        filename_hint=(getattr(back_file, "filename", "") or "back.jpg"),
+                        input_id=input_id,
+                        side="B",
+                        sample_gcs_uri=store_back.get("gcs_uri"),
+                    ))
+
+        base_meta = {
+            "input_id": input_id,
+            "ts_unix": int(time.time()),
+            "ts_utc": ts_utc,
+            "modo": modo2,
+            "result": {
+                "candidates": cands_a, # Original candidates
+                "top_label": top_label,
+                "top_score": top_score,
+                "hint": hint_from_predict,
+                "high_confidence": high_confidence,
+                "low_confidence": low_confidence,
+            },
+            "runtime": {
+                "service": os.getenv("K_SERVICE", ""),
+                "revision": os.getenv("K_REVISION", ""),
+                "project": os.getenv("GOOGLE_CLOUD_PROJECT", ""),
+                "processing_time_ms": dt_ms,
+            },
+            "model": {
+                "model_gcs_uri": os.getenv("MODEL_GCS_URI", ""),
+                "labels_gcs_uri": os.getenv("LABELS_GCS_URI", ""),
+                "model_version": os.getenv("MODEL_VERSION", ""),
+            },
+            "policy": {
+                "should_store_sample": should_store_sample,
+                "storage_probability": storage_probability,
+                "current_samples_for_candidate": current_samples_for_candidate,
+                "max_samples_per_ref_side": int((os.getenv("MAX_SAMPLES_PER_REF_SIDE", "30") or "30").strip() or "30"),
+            },
+        }
 
+        if store.get("stored") and store.get("gcs_uri"):
+            meta = dict(base_meta)
+            meta["img"] = {
+                "side": "A",
+                "filename": (getattr(front_file, "filename", "") or "front.jpg"),
+                "bytes": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
+            store["meta"] = _store_meta_sidecar(meta, store["gcs_uri"])
+
+        if store_back.get("stored") and store_back.get("gcs_uri"):
+            meta = dict(base_meta)
+            meta["img"] = {
+                "side": "B",
+                "filename": (getattr(back_file, "filename", "") or "back.jpg"),
+                "bytes": len(raw_back),
+                "sha256": hashlib.sha256(raw_back).hexdigest(),
+            }
+            store_back["meta"] = _store_meta_sidecar(meta, store_back["gcs_uri"])
+        if should_store_sample:
+            timer.record("sample_store", time.perf_counter() - t_store)
+
+        resp_payload["store"] = store
+        resp_payload["store_back"] = store_back
+        if deadline.budget_ms is not None:
+            resp_payload["debug"]["deadline"] = deadline.report()
+        if SCN_DEBUG_INCLUDE_TIMINGS:
+            resp_payload["debug"]["timings"] = timer.timings_ms()
+        yield "final", resp_payload
+
+    if want_stream:
+        return _ndjson_stream(_stages())
+    for _stage, _payload in _stages():
+        pass
     return resp_payload
 
 
+def _ndjson_stream(stages) -> StreamingResponse:
+    """Una línea JSON por etapa; Starlette itera el generador síncrono en el threadpool."""
+    def _lines():
+        for stage, payload in stages:
+            if stage == "final":
+                payload = _ensure_legacy_results(_scn_fix_tags(payload))
+            yield json.dumps({"event": stage, "data": payload}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
+@app.post("/internal/analyze-key")
+async def analyze_key_frame(request: Request):
+    """
+    analyze-key con body application/x-scn-frame (common/internal_frame): mismos campos y
+    partes que el multipart, sin parser multipart. Solo para el gateway (tráfico interno).
+    """
+    if (request.headers.get("content-type") or "").split(";")[0].strip() != FRAME_CONTENT_TYPE:
+        raise HTTPException(415, f"content-type esperado: {FRAME_CONTENT_TYPE}")
+    body = await request.body()
+    try:
+        fields, parts = decode_frame(body)
+    except FrameError as e:
+        raise HTTPException(400, f"frame inválido: {e}")
+
+    def _upload(name: str) -> Optional[UploadFile]:
+        if name not in parts:
+            return None
+        filename, ctype, data = parts[name]
+        return UploadFile(
+            file=io.BytesIO(data),
+            filename=filename,
+            headers=StarletteHeaders({"content-type": ctype or "application/octet-stream"}),
+        )
+
+    out = await run_in_threadpool(
+        _analyze_key,
+        request,
+        front=_upload("front"),
+        back=_upload("back"),
+        modo=fields.get("modo"),
+        ref_hint=fields.get("ref_hint"),
+        manufacturer_hint=fields.get("manufacturer_hint"),
+        stream=fields.get("stream"),
+        front_uri=fields.get("front_uri"),
+        back_uri=fields.get("back_uri"),
+    )
+    if isinstance(out, dict):
+        # legacy_results_middleware solo mira /api/analyze-key
+        return JSONResponse(content=_ensure_legacy_results(out))
+    return out
+
+
 @app.post("/api/feedback")
 def feedback(
     request: Request,
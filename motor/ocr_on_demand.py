@@ -8,6 +8,8 @@ import urllib.error
 import json
 from typing import Optional, Dict, Any
 
+from common import tracing
+
 OCR_URL = os.getenv("OCR_URL", "").rstrip("/")
 TIMEOUT = int(os.getenv("OCR_TIMEOUT", "5"))
 
@@ -23,20 +25,21 @@ def _call_ocr(image_bytes: bytes) -> Optional[Dict[str, Any]]:
         body += b'Content-Disposition: form-data; name="front"; filename="front.jpg"\r\n'
         body += b"Content-Type: image/jpeg\r\n\r\n"
         body += image_bytes + b"\r\n--" + sep + b"--\r\n"
-        req = urllib.request.Request(
-            f"{OCR_URL}/api/ocr",
-            data=body,
-            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=TIMEOUT) as r:
-            resp_body = r.read().decode("utf-8", errors="replace")
-            data = json.loads(resp_body) if resp_body else None
-            if not data:
-                return None
-            wv = data.get("workshop_view") or {}
-            txt = wv.get("ocr_raw") or data.get("text", "")
-            return {"ok": data.get("ok", True), "text": txt}
+        with tracing.span("ocr POST /api/ocr"):
+            req = urllib.request.Request(
+                f"{OCR_URL}/api/ocr",
+                data=body,
+                headers=tracing.inject({"Content-Type": f"multipart/form-data; boundary={boundary}"}),
+                method="POST",
+            )
+            with urllib.request.urlopen(req, timeout=TIMEOUT) as r:
+                resp_body = r.read().decode("utf-8", errors="replace")
+        data = json.loads(resp_body) if resp_body else None
+        if not data:
+            return None
+        wv = data.get("workshop_view") or {}
+        txt = wv.get("ocr_raw") or data.get("text", "")
+        return {"ok": data.get("ok", True), "text": txt}
     except Exception:
         return None
 
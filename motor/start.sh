@@ -6,10 +6,17 @@ set -euo pipefail
 : "${GUNICORN_TIMEOUT:=900}"
 : "${GUNICORN_GRACEFUL_TIMEOUT:=900}"
 
+# Socket Unix adicional para el gateway co-localizado (transporte "frame")
+BIND_ARGS=(-b "0.0.0.0:${PORT}")
+if [ -n "${SCN_MOTOR_UDS:-}" ]; then
+  mkdir -p "$(dirname "${SCN_MOTOR_UDS}")"
+  BIND_ARGS+=(-b "unix:${SCN_MOTOR_UDS}")
+fi
+
 exec gunicorn \
   -k uvicorn.workers.UvicornWorker \
   -w "${GUNICORN_WORKERS}" \
-  -b "0.0.0.0:${PORT}" \
+  "${BIND_ARGS[@]}" \
   --timeout "${GUNICORN_TIMEOUT}" \
   --graceful-timeout "${GUNICORN_GRACEFUL_TIMEOUT}" \
   --access-logfile - \
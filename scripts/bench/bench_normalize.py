@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de gateway/normalize.normalize_contract: ruta rápida (tabla
+_FIELD_SPECS) vs legacy (lambdas + normalize_attr).
+
+Antes de medir verifica que ambas rutas producen la MISMA salida (json.dumps
+byte a byte, orden de claves incluido) para cada respuesta de ejemplo.
+
+Uso:
+  python scripts/bench/bench_normalize.py
+  python scripts/bench/bench_normalize.py --number 5000
+"""
+import argparse
+import copy
+import json
+import sys
+import timeit
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "gateway"))
+
+import normalize  # noqa: E402
+
+SAMPLES_DIR = PROJECT_ROOT / "ui-studio" / "scripts" / "sample_responses"
+
+# Respuesta con los 16 campos *_meta en top1/top2 (peor caso realista)
+_FULL_ITEM = {
+    "brand": "JMA", "model": "TE8I", "confidence": 0.91,
+    "crop_bbox": {"x": 0.1, "y": 0.1, "w": 0.5, "h": 0.5},
+    "orientation": "left", "patentada": False, "head_color": "negro", "visual_state": "good",
+    "brand_head_text": "JMA", "brand_blade_text": "TE8", "brand_visible_zone": "head",
+    "ocr_brand_guess": "JMA", "head_shape": "oval", "blade_profile": "TE8", "tip_shape": "flat",
+    "side_count": 2, "symmetry": True, "wear_level": "low", "high_security": False, "requires_card": False,
+}
+SYNTHETIC_FULL = {
+    "input_id": "bench",
+    "timestamp": "2025-01-01T00:00:00Z",
+    "results": [dict(_FULL_ITEM), dict(_FULL_ITEM, confidence=0.05, model="TE8D"), {"label": "X", "score": 0.01}],
+    "manufacturer_hint": {"found": True, "name": "JMA", "confidence": 0.9},
+    "debug": {"model_version": "bench"},
+}
+
+
+def _load_samples():
+    samples = {"synthetic_full": SYNTHETIC_FULL}
+    for p in sorted(SAMPLES_DIR.glob("*.json")):
+        samples[p.stem] = json.loads(p.read_text(encoding="utf-8"))
+    return samples
+
+
+def _run(raw, fast: bool):
+    normalize.SCN_FEATURE_NORMALIZE_FAST_PATH = fast
+    return normalize.normalize_contract(copy.deepcopy(raw))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--number", type=int, default=2000, help="iteraciones por muestra")
+    args = ap.parse_args()
+
+    samples = _load_samples()
+    original = normalize.SCN_FEATURE_NORMALIZE_FAST_PATH
+    try:
+        mismatches = []
+        for name, raw in samples.items():
+            a = json.dumps(_run(raw, True), sort_keys=False)
+            b = json.dumps(_run(raw, False), sort_keys=False)
+            if a != b:
+                mismatches.append(name)
+        if mismatches:
+            print(f"ERROR: salida distinta en {', '.join(mismatches)}")
+            return 1
+        print(f"OK: salida idéntica en {len(samples)} muestras\n")
+
+        print(f"{'muestra':<24} {'legacy us':>10} {'fast us':>10} {'speedup':>8}")
+        for name, raw in samples.items():
+            t = {}
+            for fast in (False, True):
+                normalize.SCN_FEATURE_NORMALIZE_FAST_PATH = fast
+                t[fast] = timeit.timeit(lambda: normalize.normalize_contract(raw), number=args.number)
+            us_legacy = t[False] / args.number * 1e6
+            us_fast = t[True] / args.number * 1e6
+            print(f"{name:<24} {us_legacy:>10.1f} {us_fast:>10.1f} {us_legacy / us_fast:>7.2f}x")
+    finally:
+        normalize.SCN_FEATURE_NORMALIZE_FAST_PATH = original
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())